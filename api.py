@@ -6,24 +6,61 @@ SRI 全局态势感知 — FastAPI 后端
     uvicorn api:app --reload --port 8000
 """
 
+import asyncio
+import base64
 import json
 import os
 import sqlite3
-from contextlib import contextmanager
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Any
 
 from fastapi import FastAPI, UploadFile, Form, File as FastAPIFile, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+from database import (
+    STAGE_ORDER, add_project, classify_stage, get_dashboard_stats, get_intel_summary,
+    get_sandbox_summary, init_db, invalidate_dashboard_stats, save_intelligence, search_kb_documents,
+)
+from db_pool import get_pool
+from job_queue import MAX_UPLOAD_BYTES, STATUSES as JOB_STATUSES, TERMINAL as JOB_TERMINAL, JobError, get_job_queue
+from llm_clients import get_client_registry
+from llm_service import (
+    SYSTEM_PROMPT, build_llm_router, chat_with_project, generate_followup_email, generate_insider_ammo,
+    generate_quiz, generate_sales_pitch, generate_tech_summary, get_openai_client,
+)
+from offload import get_lag_monitor, pool_stats, run_cpu, run_db, run_llm, shutdown_pools
+from services.context_packer import (
+    MAX_LOG_CANDIDATES, ContextItem, PackResult, count_tokens, pack, task_model,
+)
+from services.intel_summary import RAW_LOGS
+from services.llm_service import AITask
+from upload_pipeline import DOCUMENT_SUFFIXES, IMAGE_SUFFIXES, MEDIA_SUFFIXES, whisper_key
+
+_JOB_EVENT_INTERVAL = float(os.environ.get("SRI_JOB_EVENT_INTERVAL", "0.5"))   # SSE 轮询任务状态间隔（秒）
+
 
 # ── FastAPI App ──
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动时幂等建表 / 升级（含 stage_buckets 查找表与聚合索引），启动上传任务派发与事件循环延迟监控。"""
+    init_db()
+    get_job_queue().start()
+    get_lag_monitor().start()
+    yield
+    get_lag_monitor().stop()
+    get_job_queue().shutdown()
+    shutdown_pools()
+
+
 app = FastAPI(
     title="SRI 情报系统 API",
     description="为 leader-dashboard React 大屏提供实时业务数据",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS: 允许 React dev server 跨域
@@ -41,30 +78,57 @@ app.add_middleware(
 
 # ── Database Helper ──
 
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sri_intel.db")
-
 
-@contextmanager
 def get_db():
-    """获取数据库连接（with 语句自动关闭）"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """获取当前线程的只读连接（连接池复用，with 语句结束后归还）"""
+    return get_pool().read(row_factory=sqlite3.Row)
+
+
+def get_write_db():
+    """获取串行写连接（with 语句结束自动 commit，异常 rollback）"""
+    return get_pool().write(row_factory=sqlite3.Row)
+
+
+# async 端点内的 sqlite3 / LLM SDK 等同步调用一律经 offload.run_db / run_cpu / run_llm 执行，
+# 不得直接在事件循环上阻塞（benchmarks/check_loop_lag.py 回归检查）
+
+
+def _resolve_api_key(request: Request) -> str:
+    """请求头 X-API-Key，缺省回退环境变量 OPENAI_API_KEY。"""
+    return request.headers.get("X-API-Key", "").strip() or os.environ.get("OPENAI_API_KEY", "")
+
+
+def _parse_llm_configs(request: Request) -> dict:
+    """解析前端动态 LLM 路由配置（Header X-LLM-Config，Base64 JSON）；解析失败降级为单 Key 模式。"""
+    raw = request.headers.get("X-LLM-Config", "").strip()
+    if not raw:
+        return {}
     try:
-        yield conn
-    finally:
-        conn.close()
+        return json.loads(base64.b64decode(raw).decode("utf-8"))
+    except Exception:
+        return {}
 
 
-# ── 阶段映射：将自由文本的 current_stage 归集到 4 大漏斗桶 ──
+def _router_chat(api_key: str, llm_configs: dict | None, messages: list[dict], temperature: float) -> str:
+    """构建多模型路由并完成一次对话（同步，经 run_llm 调用）。"""
+    router = build_llm_router(primary_api_key=api_key, llm_configs=llm_configs)
+    return router.chat(messages=messages, temperature=temperature)
 
-STAGE_BUCKETS = {
-    "线索获取": ["线索", "初期接触", "线索获取"],
-    "方案报价": ["方案报价", "技术僵持"],
-    "商务谈判": ["商务谈判", "逼单/签约", "逼单"],
-    "合同签约": ["合同签约", "签约", "立项", "已签约"],
-}
 
-STAGE_ORDER = ["线索获取", "方案报价", "商务谈判", "合同签约"]
+def _project_id_by_name(name: str):
+    with get_db() as conn:
+        row = conn.execute("SELECT project_id FROM projects WHERE project_name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def _project_name(project_id) -> str | None:
+    with get_db() as conn:
+        row = conn.execute("SELECT project_name FROM projects WHERE project_id = ?", (project_id,)).fetchone()
+    return row[0] if row else None
+
+
+# ── 阶段映射：桶定义与归集逻辑在 database.py（同时用于建 stage_buckets 查找表）──
+
 STAGE_EMOJI = {
     "线索获取": "📡",
     "方案报价": "📋",
@@ -73,64 +137,43 @@ STAGE_EMOJI = {
 }
 
 
-def classify_stage(raw_stage: str) -> str:
-    """将数据库中的自由文本阶段归集到标准桶"""
-    if not raw_stage:
-        return "线索获取"
-    for bucket, keywords in STAGE_BUCKETS.items():
-        for kw in keywords:
-            if kw in raw_stage:
-                return bucket
-    return "线索获取"  # fallback
-
-
 # ── API Endpoints ──
 
 
 @app.get("/api/health")
 def health_check():
-    """健康检查"""
-    return {"status": "ok", "timestamp": datetime.now().isoformat()}
+    """健康检查（附连接池命中统计、卸载线程池与事件循环延迟）"""
+    return {
+        "status": "ok",
+        "timestamp": datetime.now().isoformat(),
+        "dbPool": get_pool().stats(),
+        "llmClients": get_client_registry().stats(),
+        "offload": pool_stats(),
+        "eventLoop": get_lag_monitor().stats(),
+    }
 
 
 @app.get("/api/kpi")
 def get_kpi() -> list[dict[str, Any]]:
     """
     返回顶部 4 张 KPI 卡片数据。
-    从真实 DB 聚合:
+    从真实 DB 聚合（单条聚合 SQL + 短 TTL 缓存，与 /api/pipeline 共享）:
       1. 在跟项目总数
       2. 关键人覆盖率
       3. 本月情报录入量
       4. 高风险项目（停滞在线索阶段的占比）
     """
-    with get_db() as conn:
-        cursor = conn.cursor()
-
-        # 1. 项目总数
-        cursor.execute("SELECT COUNT(*) FROM projects")
-        total_projects = cursor.fetchone()[0]
-
-        # 2. 有关键人覆盖的项目数
-        cursor.execute(
-            "SELECT COUNT(DISTINCT project_id) FROM stakeholders"
-        )
-        projects_with_stakeholders = cursor.fetchone()[0]
-        coverage_rate = (
-            round(projects_with_stakeholders / total_projects * 100, 1)
-            if total_projects > 0
-            else 0
-        )
-
-        # 3. 情报录入量（visit_logs 总条数）
-        cursor.execute("SELECT COUNT(*) FROM visit_logs")
-        total_logs = cursor.fetchone()[0]
-
-        # 4. 高风险：停留在"线索"阶段的项目数
-        cursor.execute("SELECT current_stage FROM projects")
-        stages = [row[0] for row in cursor.fetchall()]
-        risk_count = sum(
-            1 for s in stages if classify_stage(s or "") == "线索获取"
-        )
+    stats = get_dashboard_stats()
+    total_projects = stats["total_projects"]
+    projects_with_stakeholders = stats["projects_with_stakeholders"]
+    coverage_rate = (
+        round(projects_with_stakeholders / total_projects * 100, 1)
+        if total_projects > 0
+        else 0
+    )
+    total_logs = stats["total_logs"]
+    # 高风险：停留在"线索"阶段的项目数
+    risk_count = stats["stage_counts"]["线索获取"]
 
     return [
         {
@@ -182,21 +225,10 @@ def get_kpi() -> list[dict[str, Any]]:
 def get_pipeline() -> list[dict[str, Any]]:
     """
     返回战区漏斗数据。
-    将 projects.current_stage 归集到 4 大标准桶，
+    将 projects.current_stage 归集到 4 大标准桶（SQL 内经 stage_buckets 查找表归集），
     返回各桶的项目数和归一化百分比。
     """
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT current_stage FROM projects")
-        stages = [row[0] or "" for row in cursor.fetchall()]
-
-    # 统计各桶
-    bucket_counts: dict[str, int] = {s: 0 for s in STAGE_ORDER}
-    for raw in stages:
-        bucket = classify_stage(raw)
-        bucket_counts[bucket] += 1
-
-    total = len(stages) or 1
+    bucket_counts = get_dashboard_stats()["stage_counts"]
     max_count = max(bucket_counts.values()) or 1
 
     result = []
@@ -467,18 +499,15 @@ async def create_project(request: Request):
     if not name:
         return JSONResponse(content={"error": "项目名称不能为空"}, status_code=400)
 
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT project_id FROM projects WHERE project_name = ?", (name,))
-        existing = cursor.fetchone()
+    existing = await run_db(_project_id_by_name, name)
     if existing:
         return JSONResponse(
-            content={"error": f"项目【{name}】已存在 (ID: {existing[0]})，请换一个名称。"},
+            content={"error": f"项目【{name}】已存在 (ID: {existing})，请换一个名称。"},
             status_code=409,
         )
 
-    from database import add_project
-    new_id = add_project(
+    new_id = await run_db(
+        add_project,
         project_name=name,
         current_stage=body.get("stage", "线索"),
         client=body.get("client", ""),
@@ -490,6 +519,20 @@ async def create_project(request: Request):
     return {"success": True, "project_id": new_id, "message": f"项目【{name}】创建成功！"}
 
 
+def _find_client_conflict(client: str) -> tuple[str, str] | None:
+    """正式项目库中客户名与 client 互相包含的第一个项目 → (项目名, 归属人)。"""
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT project_name, COALESCE(client, '') as client, "
+            "COALESCE(applicant, '历史归属人') as applicant FROM projects"
+        ).fetchall()
+    for row in rows:
+        existing_client = row[1]
+        if existing_client and (client in existing_client or existing_client in client):
+            return row[0], row[2]
+    return None
+
+
 @app.post("/api/projects/submit")
 async def submit_project(request: Request):
     """
@@ -504,13 +547,10 @@ async def submit_project(request: Request):
         return JSONResponse(content={"error": "客户名和项目名不能为空"}, status_code=400)
 
     # ── 1. 精确查重：同名项目 ──
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT project_id FROM projects WHERE project_name = ?", (name,))
-        exact = cursor.fetchone()
+    exact = await run_db(_project_id_by_name, name)
     if exact:
         return JSONResponse(
-            content={"error": f"项目【{name}】已存在 (ID: {exact[0]})。"},
+            content={"error": f"项目【{name}】已存在 (ID: {exact})。"},
             status_code=409,
         )
 
@@ -520,19 +560,10 @@ async def submit_project(request: Request):
     conflict_owner = "未知销售"
 
     # 2a. 正式项目库
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT project_name, COALESCE(client, '') as client, "
-            "COALESCE(applicant, '历史归属人') as applicant FROM projects"
-        )
-        for row in cursor.fetchall():
-            existing_client = row[1]
-            if existing_client and (client in existing_client or existing_client in client):
-                conflict_found = row[0]
-                conflict_type = "正式项目库"
-                conflict_owner = row[2]
-                break
+    formal = await run_db(_find_client_conflict, client)
+    if formal:
+        conflict_found, conflict_owner = formal
+        conflict_type = "正式项目库"
 
     # 2b. 审核池排队中
     if not conflict_found:
@@ -623,8 +654,8 @@ async def approve_project(request: Request):
         return JSONResponse(content={"error": "未找到该待审项目"}, status_code=404)
 
     # 写入数据库
-    from database import add_project
-    new_id = add_project(
+    new_id = await run_db(
+        add_project,
         project_name=target["project_name"],
         current_stage=target.get("stage", "线索"),
         client=target.get("client", ""),
@@ -672,9 +703,7 @@ async def daily_log(request: Request):
     project_id = body.get("project_id")
     raw_text = body.get("text", "").strip()
     llm_configs = body.get("llm_configs", None)
-    api_key = request.headers.get("X-API-Key", "").strip()
-    if not api_key:
-        api_key = os.environ.get("OPENAI_API_KEY", "")
+    api_key = _resolve_api_key(request)
     # 如果 llm_configs 中有任何有效 key，也可以不要求顶层 apiKey
     has_any_key = bool(api_key)
     if llm_configs:
@@ -691,23 +720,20 @@ async def daily_log(request: Request):
         return JSONResponse(content={"error": "请先在右上角 ⚙️ 系统设置中输入有效的 API Key"}, status_code=401)
 
     try:
-        from llm_service import build_llm_router
-        router = build_llm_router(primary_api_key=api_key, llm_configs=llm_configs)
-        from llm_service import SYSTEM_PROMPT
-        parsed_json_str = router.chat(
-            messages=[
+        parsed_json_str = await run_llm(
+            _router_chat, api_key, llm_configs,
+            [
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": raw_text[:4000]},
             ],
-            temperature=0.2,
+            0.2,
         )
     except Exception as e:
         return {"success": False, "error": f"AI 解析失败: {str(e)}"}
 
     # 存入数据库
     try:
-        from database import save_intelligence
-        save_intelligence(project_id, raw_text[:2000], parsed_json_str)
+        await run_db(save_intelligence, project_id, raw_text[:2000], parsed_json_str)
     except Exception as e:
         print(f"⚠️ 数据库存储失败: {e}")
 
@@ -720,6 +746,26 @@ async def daily_log(request: Request):
     return {"success": True, "intelligence": intelligence, "message": "✅ 日常推进情报已入库！"}
 
 
+async def _enqueue_upload(kind: str, file: UploadFile, project_id: int, api_key: str) -> JSONResponse | dict:
+    """上传文件分块落盘并入队，立即返回任务快照（HTTP 202）；解析在 job_queue 进程池中执行。"""
+    if file.size == 0:
+        return {"success": False, "error": "文件内容为空"}
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        return JSONResponse(
+            content={"success": False, "error": f"文件超过 {MAX_UPLOAD_BYTES // (1024 * 1024)}MB 上限"},
+            status_code=413,
+        )
+    # 分块哈希 + 落盘 + 入队放到 cpu 池（直接读 multipart 的临时文件，不整体读入内存）
+    try:
+        job = await run_cpu(
+            get_job_queue().submit,
+            kind, file.file, filename=file.filename or "unknown", project_id=project_id, api_key=api_key,
+        )
+    except JobError as e:
+        return {"success": False, "error": str(e)}
+    return JSONResponse(content={"success": True, **_job_payload(job)}, status_code=202)
+
+
 @app.post("/api/intel/upload_image")
 async def upload_image(
     request: Request,
@@ -727,78 +773,19 @@ async def upload_image(
     project_id: int = Form(1),
 ):
     """
-    接收现场照片 (JPG/PNG)，调用 GPT-4o-mini 多模态视觉解析，
-    提取品牌、型号、关键参数，并给出销售建议。
+    接收现场照片 (JPG/PNG)，入队后台多模态视觉解析（提取品牌、型号、关键参数并给出销售建议）。
+    立即返回 job_id，结果经 GET /api/jobs/{job_id} 或 /api/jobs/{job_id}/events 获取。
     """
-    import base64 as _b64
-
-    api_key = request.headers.get("X-API-Key", "").strip()
-    if not api_key:
-        api_key = os.environ.get("OPENAI_API_KEY", "")
+    api_key = _resolve_api_key(request)
     if not api_key:
         return {"success": False, "error": "请先配置 API Key"}
 
     filename = file.filename or "unknown"
     suffix = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-    if suffix not in ("jpg", "jpeg", "png"):
+    if suffix not in IMAGE_SUFFIXES:
         return {"success": False, "error": f"不支持的图片类型: .{suffix}。仅支持 JPG/PNG"}
 
-    file_bytes = await file.read()
-    if len(file_bytes) == 0:
-        return {"success": False, "error": "文件内容为空"}
-
-    try:
-        b64_img = _b64.b64encode(file_bytes).decode("utf-8")
-        vision_prompt = "请提取这张业务照片中的品牌、型号、关键参数，并给出销售建议。"
-
-        if api_key.startswith("sk-ant-"):
-            # Anthropic Claude 视觉 API
-            import anthropic
-            client = anthropic.Anthropic(api_key=api_key)
-            response = client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=2000,
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {"type": "image", "source": {"type": "base64", "media_type": f"image/{suffix}", "data": b64_img}},
-                        {"type": "text", "text": vision_prompt},
-                    ],
-                }],
-            )
-            parsed_intel = response.content[0].text
-        else:
-            # OpenAI GPT-4o 视觉 API
-            from openai import OpenAI as _OpenAI_img
-            client = _OpenAI_img(api_key=api_key)
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": vision_prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/{suffix};base64,{b64_img}"}},
-                    ],
-                }],
-            )
-            parsed_intel = response.choices[0].message.content or ""
-    except Exception as e:
-        return {"success": False, "error": f"图片解析失败: {str(e)}"}
-
-    # 存入数据库
-    full_text = f"【🚨 深度文档/视觉情报提取】\n{parsed_intel}"
-    try:
-        from database import save_intelligence
-        save_intelligence(project_id, f"[图片情报] {filename}", full_text)
-    except Exception as e:
-        print(f"⚠️ 数据库存储失败: {e}")
-
-    return {
-        "success": True,
-        "filename": filename,
-        "parsed_intel": parsed_intel,
-        "message": "✅ 现场图片情报已解析并入库！",
-    }
+    return await _enqueue_upload("image", file, project_id, api_key)
 
 
 @app.post("/api/intel/upload_media")
@@ -808,83 +795,21 @@ async def upload_media(
     project_id: int = Form(1),
 ):
     """
-    接收音频/视频文件 (MP3/WAV/M4A/MP4/MOV)，
-    使用 Whisper 转文字，再调用 AI 解析为结构化情报。
+    接收音频/视频文件 (MP3/WAV/M4A/MP4/MOV)，入队后台 Whisper 转文字 + AI 解析为结构化情报。
+    立即返回 job_id，结果经 GET /api/jobs/{job_id} 或 /api/jobs/{job_id}/events 获取。
     """
-    api_key = request.headers.get("X-API-Key", "").strip()
-    if not api_key:
-        api_key = os.environ.get("OPENAI_API_KEY", "")
+    api_key = _resolve_api_key(request)
     if not api_key:
         return {"success": False, "error": "请先配置 API Key"}
 
     filename = file.filename or "unknown"
     suffix = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-    allowed = ("mp3", "wav", "m4a", "mp4", "mov", "webm", "ogg", "flac")
-    if suffix not in allowed:
-        return {"success": False, "error": f"不支持的媒体类型: .{suffix}。支持 {', '.join(allowed)}"}
-
-    file_bytes = await file.read()
-    if len(file_bytes) == 0:
-        return {"success": False, "error": "文件内容为空"}
-
-    # Step 1: Whisper 转录（需要 OpenAI Key）
-    import tempfile
-    whisper_key = api_key
-    if api_key.startswith("sk-ant-"):
-        # Anthropic Key 不能用 Whisper，尝试从环境变量获取 OpenAI Key
-        whisper_key = os.environ.get("OPENAI_API_KEY", "")
-        if not whisper_key or whisper_key.startswith("sk-ant-"):
-            return {"success": False, "error": "音频转录需要 OpenAI API Key（Whisper 服务）。请设置环境变量 OPENAI_API_KEY，或使用 OpenAI 密钥。"}
-    try:
-        from openai import OpenAI as _OpenAI_media
-        client = _OpenAI_media(api_key=whisper_key)
-
-        # 写入临时文件（Whisper API 需要文件对象）
-        with tempfile.NamedTemporaryFile(suffix=f".{suffix}", delete=False) as tmp:
-            tmp.write(file_bytes)
-            tmp_path = tmp.name
-
-        with open(tmp_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="zh",
-            )
-        transcribed_text = transcript.text
-        os.unlink(tmp_path)
-    except Exception as e:
-        return {"success": False, "error": f"音频转录失败: {str(e)}"}
-
-    if not transcribed_text.strip():
-        return {"success": False, "error": "转录结果为空，未识别到有效语音内容"}
-
-    # Step 2: AI 解析转录文本
-    try:
-        from llm_service import parse_visit_log
-        parsed_json_str = parse_visit_log(api_key, transcribed_text[:4000])
-    except Exception as e:
-        parsed_json_str = f"转录成功但 AI 解析失败: {str(e)}"
-
-    # Step 3: 存入数据库
-    try:
-        from database import save_intelligence
-        save_intelligence(project_id, transcribed_text[:2000], parsed_json_str)
-    except Exception as e:
-        print(f"⚠️ 数据库存储失败: {e}")
-
-    # 解析返回
-    try:
-        intelligence = json.loads(parsed_json_str)
-    except (json.JSONDecodeError, TypeError):
-        intelligence = {"raw_response": parsed_json_str}
+    if suffix not in MEDIA_SUFFIXES:
+        return {"success": False, "error": f"不支持的媒体类型: .{suffix}。支持 {', '.join(MEDIA_SUFFIXES)}"}
+    if not whisper_key(api_key):
+        return {"success": False, "error": "音频转录需要 OpenAI API Key（Whisper 服务）。请设置环境变量 OPENAI_API_KEY，或使用 OpenAI 密钥。"}
 
-    return {
-        "success": True,
-        "filename": filename,
-        "transcribed_text": transcribed_text,
-        "intelligence": intelligence,
-        "message": f"✅ 音频/视频转录完成（{len(transcribed_text)}字），情报已入库！",
-    }
+    return await _enqueue_upload("media", file, project_id, api_key)
 
 # ── 战役立项基座 (原版 app.py L745-800) ──
 
@@ -894,7 +819,6 @@ async def save_baseline(request: Request):
     """
     保存项目战役立项基座(硬性背景指标)，作为高权重情报注入数据库。
     """
-    from database import save_intelligence
     body = await request.json()
     project_id = body.get("project_id")
     info_source = body.get("info_source", "")
@@ -916,7 +840,7 @@ async def save_baseline(request: Request):
     )
 
     try:
-        save_intelligence(project_id, "[立项背景基座更新]", baseline_intel)
+        await run_db(save_intelligence, project_id, "[立项背景基座更新]", baseline_intel)
         position_tag = position.split(" ")[0] if position else "未知"
         return {"success": True, "message": f"战役基座已锁定！AI 已感知我方当前处于【{position_tag}】状态。"}
     except Exception as e:
@@ -930,125 +854,100 @@ async def upload_and_analyze(
     project_id: int = Form(1),
 ):
     """
-    接收文件上传，提取文本，调用 LLM 解析为结构化情报，存入数据库。
+    接收文件上传，入队后台提取文本 + LLM 解析为 4+1 结构化情报并入库。
 
     - 支持: .pdf / .docx / .txt
     - API Key 通过 X-API-Key header 传入
-    - 返回 4+1 JSON 结构化情报
+    - 立即返回 job_id（HTTP 202）；同一项目重复上传同一文件复用已有任务，
+      其他项目上传过的同一文件直接复用解析结果（status 即为 succeeded，cached=true）
     """
-    import sys
-    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-
-    # --- 1. 获取 API Key ---
-    api_key = request.headers.get("x-api-key", "") or ""
-    if not api_key:
-        api_key = os.environ.get("OPENAI_API_KEY", "")
+    api_key = _resolve_api_key(request)
 
-    # --- 2. 文件类型校验 ---
     filename = file.filename or "unknown"
     suffix = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-
-    if suffix not in ("pdf", "docx", "txt"):
+    if suffix not in DOCUMENT_SUFFIXES:
         return {
             "success": False,
             "error": f"不支持的文件类型: .{suffix}。仅支持 PDF / DOCX / TXT",
         }
+    if not api_key:
+        return {
+            "success": False,
+            "error": "未提供 API Key。请在设置中输入 OpenAI API Key",
+        }
 
-    # --- 3. 读取文件内容 ---
-    file_bytes = await file.read()
-    if len(file_bytes) == 0:
-        return {"success": False, "error": "文件内容为空"}
-
-    # --- 4. 提取文本 ---
-    extracted_text = ""
-
-    if suffix == "pdf":
-        try:
-            import io
-            import PyPDF2
-
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_bytes))
-            pages_text = []
-            for page in pdf_reader.pages:
-                text = page.extract_text()
-                if text:
-                    pages_text.append(text)
-            extracted_text = "\n".join(pages_text)
-        except Exception as e:
-            return {"success": False, "error": f"PDF 解析失败: {str(e)}"}
-
-    elif suffix == "docx":
-        try:
-            import io
-            from docx import Document
-
-            doc = Document(io.BytesIO(file_bytes))
-            paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-            extracted_text = "\n".join(paragraphs)
-        except Exception as e:
-            return {"success": False, "error": f"DOCX 解析失败: {str(e)}"}
-
-    elif suffix == "txt":
-        try:
-            extracted_text = file_bytes.decode("utf-8")
-        except UnicodeDecodeError:
-            try:
-                extracted_text = file_bytes.decode("gbk")
-            except UnicodeDecodeError:
-                return {"success": False, "error": "TXT 文件编码无法识别"}
-
-    if not extracted_text.strip():
-        return {"success": False, "error": "文件中未提取到有效文本内容"}
-
-    # --- 5. 调用 LLM 解析 ---
-    try:
-        from llm_service import parse_visit_log
-
-        if not api_key:
-            return {
-                "success": False,
-                "error": "未提供 API Key。请在设置中输入 OpenAI API Key",
-            }
-
-        parsed_json_str = parse_visit_log(api_key, extracted_text[:4000])
-    except Exception as e:
-        return {"success": False, "error": f"AI 解析失败: {str(e)}"}
+    return await _enqueue_upload("document", file, project_id, api_key)
 
-    # --- 6. 存入数据库 ---
-    try:
-        from database import save_intelligence
 
-        save_intelligence(project_id, extracted_text[:2000], parsed_json_str)
-    except Exception as e:
-        # 存储失败不影响返回解析结果
-        print(f"⚠️ 数据库存储失败: {e}")
+# ── 上传任务查询 (job_queue) ──
 
-    # --- 7. 返回结果 ---
-    try:
-        intelligence = json.loads(parsed_json_str)
-    except (json.JSONDecodeError, TypeError):
-        intelligence = {"raw_response": parsed_json_str}
 
-    return {
-        "success": True,
-        "filename": filename,
-        "extracted_text_length": len(extracted_text),
-        "intelligence": intelligence,
+def _job_payload(job: dict) -> dict:
+    """对外的任务快照（不含幂等键 / 认领进程等内部字段）。"""
+    payload = {
+        "job_id": job["job_id"], "kind": job["kind"], "project_id": job["project_id"],
+        "filename": job["filename"], "status": job["status"], "progress": round(job["progress"] or 0, 3),
+        "stage": job["stage"], "attempts": job["attempts"], "error": job["error"],
+        "result": job["result"], "created_at": job["created_at"], "finished_at": job["finished_at"],
     }
-
-
-
+    if job["partial_text"]:                     # 长音频转写中：已完成各段拼接出的部分文本
+        payload["partial"] = job["partial_text"]
+    for flag in ("deduplicated", "cached"):     # 仅提交响应携带
+        if flag in job:
+            payload[flag] = job[flag]
+    return payload
+
+
+@app.get("/api/jobs")
+def list_jobs(project_id: int | None = None, status: str = "", limit: int = 50):
+    """按项目 / 状态列出最近的上传任务。"""
+    if status and status not in JOB_STATUSES:
+        return JSONResponse(content={"error": f"未知状态: {status}"}, status_code=400)
+    jobs = get_job_queue().list_jobs(project_id=project_id, status=status or None, limit=max(1, min(limit, 200)))
+    return [_job_payload(job) for job in jobs]
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    """查询单个上传任务的状态、进度与结果。"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "任务不存在"}, status_code=404)
+    return _job_payload(job)
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """SSE 订阅任务进度：状态 / 进度 / 部分转写文本变化时推送一条，到达终态后推送结果并结束。"""
+    queue = get_job_queue()
+    if await run_db(queue.get, job_id) is None:
+        return JSONResponse(content={"error": "任务不存在"}, status_code=404)
+
+    async def events():
+        last = None
+        while True:
+            job = await run_db(queue.get, job_id)
+            if job is None:
+                return
+            state = (job["status"], job["progress"], job["stage"], job["partial_text"])
+            if state != last:
+                last = state
+                yield f"data: {json.dumps(_job_payload(job), ensure_ascii=False)}\n\n"
+            if job["status"] in JOB_TERMINAL:
+                return
+            await asyncio.sleep(_JOB_EVENT_INTERVAL)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # ── 沙盘推演 ──
 
 
-@app.get("/api/sandbox/projects/{project_id}")
-async def get_sandbox_data(project_id: int):
-    """
-    返回指定项目的沙盘推演数据。
-    从 4+1 情报中聚合推导出 bidAnalysis + intelSummary。
-    """
+def _sandbox_data(project_id: int) -> dict:
+    """从 4+1 情报中聚合推导出 bidAnalysis + intelSummary（同步，经 run_db 调用）。"""
     with get_db() as conn:
         cursor = conn.cursor()
 
@@ -1098,56 +997,11 @@ async def get_sandbox_data(project_id: int):
             for r in stakeholder_rows
         ]
 
-        # 3. 拉取该项目所有 visit_logs 的 AI 解析数据
-        cursor.execute(
-            "SELECT ai_parsed_data, created_at FROM visit_logs "
-            "WHERE project_id = ? ORDER BY log_id DESC",
-            (project_id,),
-        )
-        logs = cursor.fetchall()
-
-    # 4. 聚合 4+1 情报
-    all_gap_alerts: list[str] = []
-    all_competitors: list[dict] = []
-    all_statuses: list[str] = []
-    all_next_steps: list[str] = []
-    latest_log_time = None
-
-    for ai_json_str, created_at in logs:
-        if latest_log_time is None:
-            latest_log_time = created_at
-
-        try:
-            parsed = json.loads(ai_json_str) if ai_json_str else {}
-        except (json.JSONDecodeError, TypeError):
-            parsed = {}
-
-        # gap_alerts
-        for alert in parsed.get("gap_alerts", []):
-            if alert and alert not in all_gap_alerts:
-                all_gap_alerts.append(alert)
-
-        # competitor_info
-        for comp in parsed.get("competitor_info", []):
-            name = comp.get("name", "").strip()
-            if name and not any(c.get("name") == name for c in all_competitors):
-                all_competitors.append({
-                    "name": name,
-                    "quote": comp.get("quote"),
-                    "strengths": comp.get("strengths", ""),
-                    "weaknesses": comp.get("weaknesses", ""),
-                    "recentActions": comp.get("recent_actions", ""),
-                })
-
-        # current_status
-        status = parsed.get("current_status", "")
-        if status and status != "未提供项目现状、预算与进度信息":
-            all_statuses.append(status)
-
-        # next_steps
-        ns = parsed.get("next_steps", "")
-        if ns and ns != "未提供下一步行动计划":
-            all_next_steps.append(ns)
+    # 3-4. 情报聚合：读取物化汇总（单行），由 save_intelligence / insert_visit_log 增量维护
+    summary = get_sandbox_summary(project_id)
+    all_gap_alerts: list[str] = summary["gap_alerts"]
+    all_competitors: list[dict] = summary["competitors"]
+    log_count = summary["log_count"]
 
     # 5. 推导控标点 (control points)
     control_points: list[dict] = []
@@ -1187,14 +1041,14 @@ async def get_sandbox_data(project_id: int):
         })
 
     # 5d. 从情报记录量推导
-    if len(logs) == 0:
+    if log_count == 0:
         control_points.append({
             "text": "该项目无任何情报记录，沙盘数据为空白状态",
             "risk": "high",
         })
-    elif len(logs) < 3:
+    elif log_count < 3:
         control_points.append({
-            "text": f"情报积累不足（仅 {len(logs)} 条记录），研判置信度低",
+            "text": f"情报积累不足（仅 {log_count} 条记录），研判置信度低",
             "risk": "low",
         })
 
@@ -1207,36 +1061,33 @@ async def get_sandbox_data(project_id: int):
             "severity": severity,
         })
 
-    # 7. 从 current_status 中尝试提取最高限价 / 预算
-    import re
-    max_price = None
-    for status in all_statuses:
-        # 匹配中文金额格式：数字+万 或 数字+亿
-        price_match = re.search(r"(\d+(?:\.\d+)?)\s*[万亿]", status)
-        if price_match:
-            val = float(price_match.group(1))
-            unit = "亿" if "亿" in status[price_match.start():price_match.end()+1] else "万"
-            max_price = val * 10000 if unit == "亿" else val
-            break
-
     # 8. 组装返回
     return {
         "project": project_info,
         "bidAnalysis": {
             "controlPoints": control_points,
             "rejectionRisks": rejection_risks,
-            "maxPrice": max_price,
+            "maxPrice": summary["max_price"],
             "competitors": all_competitors,
         },
         "intelSummary": {
-            "currentStatus": all_statuses[0] if all_statuses else "暂无项目现状情报",
-            "nextSteps": all_next_steps[0] if all_next_steps else "暂无下一步计划",
-            "logCount": len(logs),
-            "latestLogTime": latest_log_time,
+            "currentStatus": summary["current_status"] or "暂无项目现状情报",
+            "nextSteps": summary["next_steps"] or "暂无下一步计划",
+            "logCount": log_count,
+            "latestLogTime": summary["latest_log_time"],
         },
         "stakeholders": stakeholder_list,
     }
 
+
+@app.get("/api/sandbox/projects/{project_id}")
+async def get_sandbox_data(project_id: int):
+    """
+    返回指定项目的沙盘推演数据。
+    从 4+1 情报中聚合推导出 bidAnalysis + intelSummary。
+    """
+    return await run_db(_sandbox_data, project_id)
+
 # ── AI 统帅部：赢率诊断 & NBA 报告 ──
 
 
@@ -1258,42 +1109,20 @@ async def generate_nba(request: Request):
     赢率诊断与 NBA (Next Best Action) 报告生成。
     聚合该项目全量 visit_logs → MEDDIC 7 维加权打分 → 赢率 + 盲区 + 杠杆 + NBA。
     """
-    from llm_service import build_llm_router
-    import base64
-
     body = await request.json()
     project_id = body.get("project_id")
     api_key = request.headers.get("X-API-Key", "").strip()
-
-    # 解析 LLM 配置
-    llm_configs: dict = {}
-    llm_config_raw = request.headers.get("X-LLM-Config", "").strip()
-    if llm_config_raw:
-        try:
-            llm_configs = json.loads(base64.b64decode(llm_config_raw).decode("utf-8"))
-        except Exception:
-            llm_configs = {}
+    llm_configs = _parse_llm_configs(request)
 
     if not api_key and not llm_configs:
         return JSONResponse(content={"error": "请先配置 API Key"}, status_code=401)
 
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT project_name FROM projects WHERE project_id = ?", (project_id,))
-        proj = cursor.fetchone()
-        if not proj:
-            return JSONResponse(content={"error": "项目不存在"}, status_code=404)
-        project_name = proj[0]
+    project_name = await run_db(_project_name, project_id)
+    if project_name is None:
+        return JSONResponse(content={"error": "项目不存在"}, status_code=404)
 
-        cursor.execute(
-            "SELECT ai_parsed_data FROM visit_logs WHERE project_id = ? ORDER BY log_id DESC",
-            (project_id,),
-        )
-        logs = cursor.fetchall()
-
-    # 聚合情报
-    intel_parts = [str(row[0]) for row in logs if row[0]]
-    current_data = "\n".join(intel_parts)
+    # 聚合情报（按 HEAVY_STRATEGY 预算装箱）
+    current_data, packed = await run_db(_pack_project_intel, project_id, AITask.HEAVY_STRATEGY)
     if not current_data.strip():
         current_data = f"【系统提示】：项目 {project_name} 暂无情报记录，请基于空白状态给出通用建议。"
 
@@ -1329,12 +1158,11 @@ async def generate_nba(request: Request):
 """
 
     try:
-        router = build_llm_router(primary_api_key=api_key, llm_configs=llm_configs)
-        report = router.chat(
-            messages=[{"role": "user", "content": nba_prompt}],
-            temperature=0.5,
-        )
-        return {"report": report, "projectName": project_name}
+        report = await run_llm(_router_chat, api_key, llm_configs, [{"role": "user", "content": nba_prompt}], 0.5)
+        return {
+            "report": report, "projectName": project_name,
+            "contextTokens": packed.tokens_used, "contextTokensSaved": packed.tokens_saved,
+        }
     except Exception as e:
         return JSONResponse(content={"error": f"AI 诊断失败: {str(e)}"}, status_code=500)
 
@@ -1355,7 +1183,12 @@ async def save_stakeholders(request: Request):
     if not project_id:
         return JSONResponse(content={"error": "缺少 project_id"}, status_code=400)
 
-    with get_db() as conn:
+    await run_db(_replace_stakeholders, project_id, stakeholders)
+    return {"saved": len([s for s in stakeholders if s.get("name", "").strip()])}
+
+
+def _replace_stakeholders(project_id: int, stakeholders: list[dict]):
+    with get_write_db() as conn:
         cursor = conn.cursor()
         # 全量替换策略
         cursor.execute("DELETE FROM stakeholders WHERE project_id = ?", (project_id,))
@@ -1375,25 +1208,46 @@ async def save_stakeholders(request: Request):
                 "INSERT INTO stakeholders (name, project_id, hard_profile, soft_persona) VALUES (?, ?, ?, ?)",
                 (name, project_id, hard_profile, soft_persona),
             )
-        conn.commit()
-
-    return {"saved": len([s for s in stakeholders if s.get("name", "").strip()])}
+    invalidate_dashboard_stats()
 
 # ── 火力支援系统 (原版 app.py L1422-1737) ──
 
 
+def _parse_log_time(value) -> datetime | None:
+    try:
+        return datetime.fromisoformat(str(value)) if value else None
+    except ValueError:
+        return None
+
+
+def _pack_project_intel(project_id: int, task: AITask) -> tuple[str, PackResult]:
+    """
+    按场景 token 预算组装项目情报：全周期滚动摘要固定装入，原文（ai_parsed_data）
+    只取摘要水位之后尚未折叠的与最近 RAW_LOGS 条，新→旧装箱、近似重复去重。
+    """
+    summary, watermark = get_intel_summary(project_id)
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT ai_parsed_data, created_at FROM visit_logs "
+            "WHERE project_id = ? AND COALESCE(ai_parsed_data, '') != '' "
+            "AND (log_id > ? OR log_id IN ("
+            "    SELECT log_id FROM visit_logs WHERE project_id = ? ORDER BY log_id DESC LIMIT ?)) "
+            "ORDER BY log_id DESC LIMIT ?",
+            (project_id, watermark, project_id, RAW_LOGS, MAX_LOG_CANDIDATES),
+        ).fetchall()
+    items = [ContextItem(str(parsed), timestamp=_parse_log_time(created_at)) for parsed, created_at in rows]
+    if not summary:
+        packed = pack(items, task)
+        return packed.text, packed
+    section = "\n\n【近期情报】\n"
+    model = task_model(task)
+    packed = pack(items, task, reserved=count_tokens(summary + section, model), model=model)
+    return (summary + section + packed.text if packed.items else summary), packed
+
+
 def _get_project_intel_context(project_id: int) -> str:
-    """聚合指定项目的全量情报文本，供 AI 生成使用。"""
-    import sqlite3
-    conn = sqlite3.connect("intel_system.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT ai_parsed_data FROM visit_logs WHERE project_id = ? ORDER BY log_id DESC",
-        (project_id,),
-    )
-    rows = cursor.fetchall()
-    conn.close()
-    return "\n".join([r[0] for r in rows if r[0]])
+    """聚合指定项目的情报文本（滚动摘要 + 近期原文，GENERAL_CHAT 预算内），供 AI 生成使用。"""
+    return _pack_project_intel(project_id, AITask.GENERAL_CHAT)[0]
 
 
 @app.post("/api/ai/generate_followup")
@@ -1405,11 +1259,11 @@ async def generate_followup(request: Request):
         return JSONResponse(content={"error": "未配置 API Key"}, status_code=400)
 
     project_id = body.get("project_id")
-    context = _get_project_intel_context(project_id) if project_id else ""
+    context = await run_db(_get_project_intel_context, project_id) if project_id else ""
 
     try:
-        from llm_service import generate_followup_email
-        result = generate_followup_email(
+        result = await run_llm(
+            generate_followup_email,
             api_key=api_key,
             context_data=context or "暂无情报数据",
             channel=body.get("channel", "email"),
@@ -1434,11 +1288,11 @@ async def generate_tech_summary_endpoint(request: Request):
         return JSONResponse(content={"error": "未配置 API Key"}, status_code=400)
 
     project_id = body.get("project_id")
-    context = _get_project_intel_context(project_id) if project_id else ""
+    context = await run_db(_get_project_intel_context, project_id) if project_id else ""
 
     try:
-        from llm_service import generate_tech_summary
-        result = generate_tech_summary(
+        result = await run_llm(
+            generate_tech_summary,
             api_key=api_key,
             context_data=context or "暂无情报数据",
             channel=body.get("channel", "email"),
@@ -1461,11 +1315,11 @@ async def generate_insider_ammo_endpoint(request: Request):
         return JSONResponse(content={"error": "未配置 API Key"}, status_code=400)
 
     project_id = body.get("project_id")
-    context = _get_project_intel_context(project_id) if project_id else ""
+    context = await run_db(_get_project_intel_context, project_id) if project_id else ""
 
     try:
-        from llm_service import generate_insider_ammo
-        result = generate_insider_ammo(
+        result = await run_llm(
+            generate_insider_ammo,
             api_key=api_key,
             context_data=context or "暂无情报数据",
             channel=body.get("channel", "wechat"),
@@ -1496,11 +1350,11 @@ async def ai_chat(request: Request):
     if not user_query.strip():
         return JSONResponse(content={"error": "请输入您的问题"}, status_code=400)
 
-    context = _get_project_intel_context(project_id) if project_id else ""
+    context = await run_db(_get_project_intel_context, project_id) if project_id else ""
 
     try:
-        from llm_service import chat_with_project
-        result = chat_with_project(
+        result = await run_llm(
+            chat_with_project,
             api_key=api_key,
             context_data=context or "暂无情报数据",
             user_query=user_query,
@@ -1521,16 +1375,28 @@ async def generate_quiz_endpoint(request: Request):
         return JSONResponse(content={"error": "未配置 API Key"}, status_code=400)
 
     project_id = body.get("project_id")
-    context = _get_project_intel_context(project_id) if project_id else ""
+    context = await run_db(_get_project_intel_context, project_id) if project_id else ""
 
     try:
-        from llm_service import generate_quiz
-        quiz = generate_quiz(api_key=api_key, context_data=context or "暂无情报数据")
+        quiz = await run_llm(generate_quiz, api_key=api_key, context_data=context or "暂无情报数据")
         return {"success": True, "quiz": quiz}
     except Exception as e:
         return JSONResponse(content={"error": f"出题失败: {str(e)}"}, status_code=500)
 
 
+def _coach_feedback(api_key: str, coach_prompt: str) -> str:
+    client = get_openai_client(api_key)
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "你是一位极其严苛的 B2B 大客户销售教头。"},
+            {"role": "user", "content": coach_prompt},
+        ],
+        temperature=0.7,
+    )
+    return response.choices[0].message.content
+
+
 @app.post("/api/ai/coach_evaluate")
 async def coach_evaluate(request: Request):
     """AI销售教头点评用户的实战应对话术。"""
@@ -1545,7 +1411,7 @@ async def coach_evaluate(request: Request):
     if not user_answer.strip():
         return JSONResponse(content={"error": "请先输入您的应对话术"}, status_code=400)
 
-    context = _get_project_intel_context(project_id) if project_id else "暂无情报"
+    context = await run_db(_get_project_intel_context, project_id) if project_id else "暂无情报"
 
     coach_prompt = f"""你是一位年薪千万的 B2B 大客户销售总监兼无情的演练教头（精通 Miller Heiman 体系）。
 
@@ -1574,17 +1440,7 @@ async def coach_evaluate(request: Request):
 [写一段可以直接发送的满分话术]"""
 
     try:
-        from openai import OpenAI as _OpenAI
-        _client = _OpenAI(api_key=api_key)
-        response = _client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "你是一位极其严苛的 B2B 大客户销售教头。"},
-                {"role": "user", "content": coach_prompt},
-            ],
-            temperature=0.7,
-        )
-        feedback = response.choices[0].message.content
+        feedback = await run_llm(_coach_feedback, api_key, coach_prompt)
         return {"success": True, "feedback": feedback}
     except Exception as e:
         return JSONResponse(content={"error": f"点评引擎故障: {str(e)}"}, status_code=500)
@@ -1599,21 +1455,11 @@ async def generate_power_map(request: Request):
     生成 Mermaid 关系图谱 + 定点爆破策略。
     Body: { project_id, project_name, stakeholders_csv }
     """
-    from llm_service import build_llm_router
-    import base64
-
     body = await request.json()
     project_name = body.get("project_name", "")
     stakeholders_csv = body.get("stakeholders_csv", "")
     api_key = request.headers.get("X-API-Key", "").strip()
-
-    llm_configs: dict = {}
-    llm_config_raw = request.headers.get("X-LLM-Config", "").strip()
-    if llm_config_raw:
-        try:
-            llm_configs = json.loads(base64.b64decode(llm_config_raw).decode("utf-8"))
-        except Exception:
-            llm_configs = {}
+    llm_configs = _parse_llm_configs(request)
 
     if not api_key and not llm_configs:
         return JSONResponse(content={"error": "请先配置 API Key"}, status_code=401)
@@ -1633,10 +1479,8 @@ async def generate_power_map(request: Request):
 """
 
     try:
-        router = build_llm_router(primary_api_key=api_key, llm_configs=llm_configs)
-        analysis = router.chat(
-            messages=[{"role": "user", "content": power_prompt}],
-            temperature=0.6,
+        analysis = await run_llm(
+            _router_chat, api_key, llm_configs, [{"role": "user", "content": power_prompt}], 0.6,
         )
 
         # 尝试提取 Mermaid 代码块
@@ -1661,39 +1505,14 @@ _EXTRACT_ROLE_OPTIONS = [
 ]
 
 
-@app.post("/api/ai/extract_stakeholders")
-async def extract_stakeholders(request: Request):
-    """
-    AI 鹰眼提取：从项目历史情报中自动提取关键干系人。
-    聚合 visit_logs → LLM 强制 JSON → 返回 people[]。
-    """
-    from llm_service import build_llm_router
-    import base64
-    import re
-
-    body = await request.json()
-    project_id = body.get("project_id")
-    api_key = request.headers.get("X-API-Key", "").strip()
-
-    llm_configs: dict = {}
-    llm_config_raw = request.headers.get("X-LLM-Config", "").strip()
-    if llm_config_raw:
-        try:
-            llm_configs = json.loads(base64.b64decode(llm_config_raw).decode("utf-8"))
-        except Exception:
-            llm_configs = {}
-
-    if not api_key and not llm_configs:
-        return JSONResponse(content={"error": "请先配置 API Key"}, status_code=401)
-
+def _project_full_text(project_id) -> tuple[str, str] | None:
+    """项目名 + 全部情报（原文与解析结果）拼接文本；项目不存在返回 None。"""
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT project_name FROM projects WHERE project_id = ?", (project_id,))
         proj = cursor.fetchone()
         if not proj:
-            return JSONResponse(content={"error": "项目不存在"}, status_code=404)
-        project_name = proj[0]
-
+            return None
         cursor.execute(
             "SELECT raw_input, ai_parsed_data FROM visit_logs WHERE project_id = ? ORDER BY log_id DESC",
             (project_id,),
@@ -1701,11 +1520,34 @@ async def extract_stakeholders(request: Request):
         logs = cursor.fetchall()
 
     # 聚合全量文本
-    full_text = ""
+    parts = []
     for log_entry in logs:
         raw_input = str(log_entry[0]) if log_entry[0] else ""
         ai_parsed = str(log_entry[1]) if log_entry[1] else ""
-        full_text += raw_input + "\n" + ai_parsed + "\n"
+        parts.append(raw_input + "\n" + ai_parsed + "\n")
+    return proj[0], "".join(parts)
+
+
+@app.post("/api/ai/extract_stakeholders")
+async def extract_stakeholders(request: Request):
+    """
+    AI 鹰眼提取：从项目历史情报中自动提取关键干系人。
+    聚合 visit_logs → LLM 强制 JSON → 返回 people[]。
+    """
+    import re
+
+    body = await request.json()
+    project_id = body.get("project_id")
+    api_key = request.headers.get("X-API-Key", "").strip()
+    llm_configs = _parse_llm_configs(request)
+
+    if not api_key and not llm_configs:
+        return JSONResponse(content={"error": "请先配置 API Key"}, status_code=401)
+
+    loaded = await run_db(_project_full_text, project_id)
+    if loaded is None:
+        return JSONResponse(content={"error": "项目不存在"}, status_code=404)
+    project_name, full_text = loaded
 
     if len(full_text.strip()) < 10:
         return JSONResponse(content={"error": "该项目情报库为空，请先提交拜访纪要"}, status_code=400)
@@ -1730,10 +1572,8 @@ async def extract_stakeholders(request: Request):
 """
 
     try:
-        router = build_llm_router(primary_api_key=api_key, llm_configs=llm_configs)
-        result = router.chat(
-            messages=[{"role": "user", "content": extract_prompt}],
-            temperature=0.3,
+        result = await run_llm(
+            _router_chat, api_key, llm_configs, [{"role": "user", "content": extract_prompt}], 0.3,
         )
 
         # 剥离 markdown 代码块包裹
@@ -1754,35 +1594,28 @@ async def extract_stakeholders(request: Request):
 # ── 知识库 ──
 
 
-@app.get("/api/kb/documents")
-async def get_kb_documents(category: str = "", search: str = ""):
-    """
-    返回知识库文档列表。
-    - category: 按分类筛选（产品参数/竞品打单卡/历史中标库/资质文件）
-    - search: 模糊搜索 title + description
-    """
+def _list_kb_documents(category: str) -> list:
     with get_db() as conn:
-        cursor = conn.cursor()
-
         sql = "SELECT doc_id, title, category, icon, file_type, file_size, description, updated_at FROM knowledge_base"
-        conditions: list[str] = []
         params: list[str] = []
-
         if category:
-            conditions.append("category = ?")
+            sql += " WHERE category = ?"
             params.append(category)
-
-        if search:
-            conditions.append("(title LIKE ? OR description LIKE ?)")
-            params.extend([f"%{search}%", f"%{search}%"])
-
-        if conditions:
-            sql += " WHERE " + " AND ".join(conditions)
-
         sql += " ORDER BY updated_at DESC"
+        return conn.execute(sql, params).fetchall()
 
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
+
+@app.get("/api/kb/documents")
+async def get_kb_documents(category: str = "", search: str = ""):
+    """
+    返回知识库文档列表。
+    - category: 按分类筛选（产品参数/竞品打单卡/历史中标库/资质文件）
+    - search: 全文检索 title + category + description（FTS5，按相关度排序）
+    """
+    if search:
+        rows = await run_db(search_kb_documents, search, category)
+    else:
+        rows = await run_db(_list_kb_documents, category)
 
     docs = []
     for row in rows:
@@ -1803,43 +1636,12 @@ async def get_kb_documents(category: str = "", search: str = ""):
 # ── AI 话术生成 ──
 
 
-@app.post("/api/ai/generate_pitch")
-async def generate_pitch(request: Request):
-    """
-    基于沙盘真实情报，动态生成实战话术。
-    Body: {"project_id": 1, "pitch_type": "wechat_msg"}
-    Header: X-API-Key: sk-xxx
-    """
-    from llm_service import generate_sales_pitch
-
-    # 1. 解析请求
-    body = await request.json()
-    project_id = body.get("project_id")
-    pitch_type = body.get("pitch_type", "wechat_msg")
-    target_role = body.get("target_role", "")        # 决策者|使用者|影响者|教练/内线
-    custom_input = body.get("custom_input", "")      # 销售前线最新情报
-    project_stage = body.get("project_stage", "")    # 项目阶段
-    use_history = body.get("use_history", False)      # 调取历史价值
-    competitor = body.get("competitor", "")            # 明确对比友商
-    current_status_input = body.get("current_status", "")  # 客户当前系统现状
-    pain_points = body.get("pain_points", "")         # 客户核心痛点
-    api_key = request.headers.get("X-API-Key", "").strip()
-
-    # 解析前端动态 LLM 路由配置（Base64 JSON）
-    llm_configs: dict = {}
-    llm_config_raw = request.headers.get("X-LLM-Config", "").strip()
-    if llm_config_raw:
-        try:
-            import base64
-            llm_configs = json.loads(base64.b64decode(llm_config_raw).decode("utf-8"))
-        except Exception:
-            llm_configs = {}  # 解析失败，降级为单 Key 模式
-
-    if not api_key and not llm_configs:
-        return JSONResponse(content={"error": "请在系统设置中配置 API Key（Header: X-API-Key）"}, status_code=401)
-
-    if pitch_type not in ("wechat_msg", "email", "internal_strategy", "tech_solution"):
-        return JSONResponse(content={"error": f"不支持的 pitch_type: {pitch_type}"}, status_code=400)
+def _build_pitch_context(
+    project_id, *, target_role: str, custom_input: str, use_history: bool, competitor: str,
+    current_status_input: str, pain_points: str,
+) -> tuple[str, str] | None:
+    """从 DB 聚合沙盘情报并按优先级链序列化为话术上下文 → (项目名, context_data)；项目不存在返回 None。"""
+    import re
 
     # 2. 从 DB 聚合沙盘情报（复用 sandbox 逻辑）
     with get_db() as conn:
@@ -1852,7 +1654,7 @@ async def generate_pitch(request: Request):
         )
         proj = cursor.fetchone()
         if not proj:
-            return JSONResponse(content={"error": f"项目 ID {project_id} 不存在"}, status_code=404)
+            return None
 
         project_name = proj["project_name"]
         project_stage = proj["current_stage"]
@@ -1870,7 +1672,6 @@ async def generate_pitch(request: Request):
         logs = cursor.fetchall()
 
     # 3. 聚合情报维度
-    import re
     all_gap_alerts: list[str] = []
     all_competitors: list[dict] = []
     all_statuses: list[str] = []
@@ -2038,11 +1839,51 @@ async def generate_pitch(request: Request):
         context_lines.append(custom_input)
         context_lines.append("⚠️ 此情报刚获取，所有话术必须无条件紧扣此信息展开！")
 
-    context_data = "\n".join(context_lines)
+    return project_name, "\n".join(context_lines)
+
+
+@app.post("/api/ai/generate_pitch")
+async def generate_pitch(request: Request):
+    """
+    基于沙盘真实情报，动态生成实战话术。
+    Body: {"project_id": 1, "pitch_type": "wechat_msg"}
+    Header: X-API-Key: sk-xxx
+    """
+    # 1. 解析请求
+    body = await request.json()
+    project_id = body.get("project_id")
+    pitch_type = body.get("pitch_type", "wechat_msg")
+    target_role = body.get("target_role", "")        # 决策者|使用者|影响者|教练/内线
+    custom_input = body.get("custom_input", "")      # 销售前线最新情报
+    project_stage = body.get("project_stage", "")    # 项目阶段
+    use_history = body.get("use_history", False)      # 调取历史价值
+    competitor = body.get("competitor", "")            # 明确对比友商
+    current_status_input = body.get("current_status", "")  # 客户当前系统现状
+    pain_points = body.get("pain_points", "")         # 客户核心痛点
+    api_key = request.headers.get("X-API-Key", "").strip()
+
+    llm_configs = _parse_llm_configs(request)
+
+    if not api_key and not llm_configs:
+        return JSONResponse(content={"error": "请在系统设置中配置 API Key（Header: X-API-Key）"}, status_code=401)
+
+    if pitch_type not in ("wechat_msg", "email", "internal_strategy", "tech_solution"):
+        return JSONResponse(content={"error": f"不支持的 pitch_type: {pitch_type}"}, status_code=400)
+
+    # 2-4. 聚合沙盘情报并序列化为 context_data（DB + 文本聚合，经 run_db 执行）
+    loaded = await run_db(
+        _build_pitch_context, project_id,
+        target_role=target_role, custom_input=custom_input, use_history=use_history,
+        competitor=competitor, current_status_input=current_status_input, pain_points=pain_points,
+    )
+    if loaded is None:
+        return JSONResponse(content={"error": f"项目 ID {project_id} 不存在"}, status_code=404)
+    project_name, context_data = loaded
 
     # 5. 调用 LLM
     try:
-        pitch_text = generate_sales_pitch(
+        pitch_text = await run_llm(
+            generate_sales_pitch,
             api_key=api_key,
             context_data=context_data,
             pitch_type=pitch_type,
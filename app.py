@@ -3,6 +3,8 @@ import re
 import io
 import base64
 import difflib
+import hashlib
+import os
 import datetime
 import PyPDF2
 
@@ -270,8 +272,8 @@ def _voice_stt_block(label, key):
                     audio_file = io.BytesIO(audio_bytes)
                     audio_file.name = "audio.wav"
 
-                    from openai import OpenAI as _OpenAI
-                    _client = _OpenAI(api_key=_api_key)
+                    from llm_service import get_openai_client
+                    _client = get_openai_client(_api_key)
                     transcript_text = _client.audio.transcriptions.create(
                         model="whisper-1",
                         file=audio_file,
@@ -846,8 +848,8 @@ with tab_intel:
                         parsed_intel = ""
                         file_extension = uploaded_file.name.split('.')[-1].lower()
 
-                        from openai import OpenAI as _OpenAI
-                        _client = _OpenAI(api_key=api_key)
+                        from llm_service import get_openai_client
+                        _client = get_openai_client(api_key)
 
                         # --- 调用解析引擎 ---
                         if file_extension == 'pdf':
@@ -1114,8 +1116,8 @@ with tab_sandbox:
                         {current_data}
                         """
 
-                            from openai import OpenAI as _OpenAI
-                            _client = _OpenAI(api_key=api_key)
+                            from llm_service import get_openai_client
+                            _client = get_openai_client(api_key)
                             response = _client.chat.completions.create(
                                 model="gpt-4o-mini",
                                 messages=[{"role": "user", "content": nba_prompt}]
@@ -1219,8 +1221,8 @@ with tab_sandbox:
     {full_text}
     """
                             try:
-                                from openai import OpenAI as _OpenAI_pm1
-                                _client_pm1 = _OpenAI_pm1(api_key=api_key)
+                                from llm_service import get_openai_client
+                                _client_pm1 = get_openai_client(api_key)
                                 resp = _client_pm1.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": extract_prompt}])
                                 json_str = resp.choices[0].message.content.strip()
                                 if json_str.startswith("```"):
@@ -1289,8 +1291,8 @@ with tab_sandbox:
     """
 
                             try:
-                                from openai import OpenAI as _OpenAI_pm2
-                                _client_pm2 = _OpenAI_pm2(api_key=api_key)
+                                from llm_service import get_openai_client
+                                _client_pm2 = get_openai_client(api_key)
                                 response = _client_pm2.chat.completions.create(
                                     model="gpt-4o",
                                     messages=[{"role": "user", "content": power_prompt}]
@@ -1580,8 +1582,8 @@ with tab_sandbox:
                                     is_director, subordinate_name
                                 )
                             else:
-                                from openai import OpenAI as _OAI_email
-                                _cli = _OAI_email(api_key=api_key)
+                                from llm_service import get_openai_client
+                                _cli = get_openai_client(api_key)
                                 prompt = f"""你是一位身经百战的顶尖B2B大客户销售。请根据以下参数，写一段发给客户的{label}跟进话术。
     【项目】：{target_proj}
     【竞品情报】：{comp or '未知'}
@@ -1621,8 +1623,8 @@ with tab_sandbox:
                                     tech_pain_points, tech_role
                                 )
                             else:
-                                from openai import OpenAI as _OAI_tech
-                                _cli = _OAI_tech(api_key=api_key)
+                                from llm_service import get_openai_client
+                                _cli = get_openai_client(api_key)
                                 prompt = f"""你是一位资深的技术售前专家。请根据以下参数，生成一段用于方案PPT或汇报开头的【技术方案摘要】。
     【项目】：{target_proj}
     【竞品情报】：{comp or '未知'}
@@ -1887,8 +1889,8 @@ with tab_academy:
 """
 
                         try:
-                            from openai import OpenAI as _OpenAI
-                            _client = _OpenAI(api_key=api_key)
+                            from llm_service import get_openai_client
+                            _client = get_openai_client(api_key)
                             response = _client.chat.completions.create(
                                 model="gpt-4o-mini",
                                 messages=[
@@ -1944,23 +1946,32 @@ with tab_knowledge:
             st.markdown("<br>", unsafe_allow_html=True)
             if st.button("🚀 一键向量化并传输至私有武器库 (API 对接)", type="primary", use_container_width=True):
                 if uploaded_assets or notebooklm_url:
-                    with st.spinner("🔗 正在通过私密 API 通道，将弹药传输至企业级知识库 (如 Dify/FastGPT)..."):
-                        import time
-                        time.sleep(1.5) # 模拟网络请求延迟
-                        
-                        # ==========================================================
-                        # ⚠️ 企业级知识库 API 预留槽位 ⚠️
-                        # 老板：未来在这里接入您的私有服务器接口。
-                        # 例如:
-                        # import requests
-                        # headers = {"Authorization": "Bearer YOUR_DIFY_API_KEY"}
-                        # data = {"url": notebooklm_url}
-                        # response = requests.post("https://your-server.com/v1/datasets", headers=headers, json=data)
-                        # ==========================================================
-                        
-                        # 暂时用全局缓存模拟私有知识库已接收数据的状态
+                    with st.spinner("🔗 正在切块、向量化并写入本地私有武器库..."):
+                        from database import add_kb_document
+                        from vector_store import get_vector_store
+
+                        kb_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kb_files")
+                        os.makedirs(kb_dir, exist_ok=True)
+                        for asset in uploaded_assets or []:
+                            # 文件名前缀内容哈希：同名不同内容的文件互不覆盖已入库的文档
+                            data = asset.getvalue()
+                            stored_name = f"{hashlib.sha256(data).hexdigest()[:12]}_{os.path.basename(asset.name)}"
+                            saved_path = os.path.join(kb_dir, stored_name)
+                            if not os.path.exists(saved_path):
+                                with open(saved_path, "wb") as f:
+                                    f.write(data)
+                            add_kb_document(
+                                title=asset.name, category=asset_type,
+                                file_type=asset.name.rsplit(".", 1)[-1].upper(),
+                                file_size=f"{asset.size / 1024 / 1024:.1f} MB",
+                                file_path=os.path.join("kb_files", stored_name),
+                            )
+                        if notebooklm_url:
+                            add_kb_document(title=notebooklm_url, category=asset_type, file_type="URL",
+                                            description=notebooklm_url)
+                        get_vector_store().sync()
                         st.session_state.private_kb_ready = True
-                        
+
                         st.success(f"✅ 弹药已成功传输至私有向量库！前线【第一现场】的 AI 检索中枢已就绪。")
                 else:
                     st.error("⚠️ 指挥官，弹药舱为空，请先上传文件或输入有效链接！")
@@ -2042,8 +2053,8 @@ with tab_live_pitch:
                 else:
                     with st.spinner("AI 正在结合项目情报进行推演..."):
                         try:
-                            from openai import OpenAI as _OpenAI_sim
-                            _client_sim = _OpenAI_sim(api_key=api_key)
+                            from llm_service import get_openai_client
+                            _client_sim = get_openai_client(api_key)
                             sim_prompt = f"你是顶尖的技术售前。当前正在向客户展示项目：【{current_live_project}】。客户要求进行【{sim_type}】。请结合行业常识和该项目潜在的痛点，直接输出一段大约 200 字、极具专业度和说服力的方案推演结论，必须包含具体数据预测，且可以直接展示给客户看。"
                             
                             resp_sim = _client_sim.chat.completions.create(
@@ -2091,8 +2102,8 @@ with tab_live_pitch:
             else:
                 with st.spinner("🧠 护目镜正在疯狂调取资料库，计算反击话术..."):
                     try:
-                        from openai import OpenAI as _OAI_pitch
-                        _client_pitch = _OAI_pitch(api_key=api_key)
+                        from llm_service import get_openai_client
+                        _client_pitch = get_openai_client(api_key)
                         dify_knowledge = st.session_state.get("global_knowledge", "暂无挂载知识库。")
                         
                         pitch_prompt = f"""你是一位年薪千万的 B2B 大客户售前总监。现在路演现场客户突然发难。
@@ -2127,25 +2138,20 @@ with tab_live_pitch:
                 else:
                     with st.spinner("🧠 真实 AI 大脑正在分析工况并生成专业解答..."):
                         try:
-                            from openai import OpenAI as _OpenAI_live
-                            _client_live = _OpenAI_live(api_key=api_key)
+                            from llm_service import get_openai_client
+                            _client_live = get_openai_client(api_key)
                             
                             # 将历史记录拼接到 Prompt 中，让 AI 有上下文记忆
                             history_context = "\n".join([f"{m['role']}: {m['content']}" for m in st.session_state[chat_history_key][-5:]])
                             
-                            # ==========================================================
-                            # ⚠️ 企业级知识库检索 API 预留槽位 ⚠️
-                            # 老板：未来在这里接入您的私有知识库查询接口，用 client_query 去查资料。
-                            # 例如:
-                            # response = requests.post("https://your-server.com/v1/chat-messages", json={"query": client_query, ...})
-                            # retrieved_knowledge = response.json().get("answer")
-                            # ==========================================================
-                            
-                            # 模拟从私有知识库检索到的精确片段
-                            if st.session_state.get("private_kb_ready"):
-                                retrieved_knowledge = f"【系统提示：已成功从企业私有知识库 (API) 中检索到关于 '{pitch_query[:10]}...' 的绝密数据，请结合此数据作答。】"
-                            else:
-                                retrieved_knowledge = "暂未挂载企业私有知识库。"
+                            # 从本地向量库检索：知识库 + 仅限当前项目的拜访情报（回答直接展示给客户，不能混入其他客户的情报）
+                            from rag_qa_module import build_context_str, retrieve_docs
+                            retrieved_docs = retrieve_docs(pitch_query, top_k=5, source="kb")
+                            live_db_id = st.session_state.get("projects", {}).get(current_live_project, {}).get("db_id")
+                            if live_db_id:
+                                retrieved_docs += retrieve_docs(pitch_query, top_k=5, source="intel", project_id=live_db_id)
+                                retrieved_docs = sorted(retrieved_docs, key=lambda d: d["similarity"], reverse=True)[:5]
+                            retrieved_knowledge = build_context_str(retrieved_docs, query=pitch_query) or "私有知识库中暂无相关资料。"
                             
                             live_prompt = f"""你是一位在第一现场的高级技术售前专家。
 当前关联项目：【{current_live_project}】
@@ -2183,8 +2189,8 @@ with tab_live_pitch:
             else:
                 with st.spinner("🥽 护目镜实时透视客户意图..."):
                     try:
-                        from openai import OpenAI as _OpenAI_goggles
-                        _client_goggles = _OpenAI_goggles(api_key=api_key)
+                        from llm_service import get_openai_client
+                        _client_goggles = get_openai_client(api_key)
                         
                         goggles_prompt = f"""你是隐藏在销售耳机里的顶尖战术大师。
 当前关联项目：【{current_live_project}】
@@ -2216,8 +2222,8 @@ with tab_live_pitch:
                     else:
                         with st.spinner("📡 AI 正在提炼现场火力需求，加密呼叫后方专家群..."):
                             try:
-                                from openai import OpenAI as _OpenAI_sos
-                                _client_sos = _OpenAI_sos(api_key=api_key)
+                                from llm_service import get_openai_client
+                                _client_sos = get_openai_client(api_key)
                                 
                                 sos_prompt = f"""你是前线销售的 AI 战术助理。客户刚刚在现场提出了以下棘手问题：
 "{client_q}"
@@ -2944,8 +2950,8 @@ with tab_deal_desk:
                                 file_content = "客户本次项目需要采购：消弧选线装置A型 8套，以及智能防腐涂层组件 150套。请尽快回复报价。"
 
                             # 3. 呼叫大模型进行 JSON 结构化提取
-                            from openai import OpenAI as _OAI_deal
-                            _client_deal = _OAI_deal(api_key=api_key)
+                            from llm_service import get_openai_client
+                            _client_deal = get_openai_client(api_key)
                             
                             deal_prompt = f"""你是一个资深的电气成套设备报价总工。请从以下客户的询价资料中，提取出两部分核心信息：
 1. 客户的联系方式（如果有邮箱优先提取邮箱，其次是手机号、微信号。如果完全没有，请输出空字符串 ""）。
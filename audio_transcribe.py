@@ -0,0 +1,301 @@
+"""
+长音频分段并行转写 — audio_transcribe.py
+========================================
+一小时的会议录音整段交给 Whisper 要么超时、要么串行等几分钟（且单次请求上限 25MB）。改为本地切分后并发转写：
+  1. 归一化 + 静音检测 → ffmpeg 单遍解码为 16kHz 单声道 WAV（视频只取音轨），同时 silencedetect 找出停顿
+  2. 静音对齐切分     → 每段目标 SRI_WHISPER_CHUNK_SECONDS 秒，在 [0.6×目标, 目标] 内挑靠后的较长静音从中间切开；
+                        找不到静音（连续讲话 / 背景音乐）则硬切，相邻两段重叠 SRI_WHISPER_OVERLAP_SECONDS 秒
+  3. 有界并发         → 各段按需导出为 FLAC，最多 SRI_WHISPER_CONCURRENCY 个请求同时在途
+  4. 拼接去重         → 按时间顺序拼接；硬切处在前段结尾 / 后段开头的文本里找最长公共片段，去掉重叠部分
+  5. 部分结果         → 每完成一段，已连续完成的前缀立即拼接后经 on_partial 回调推给调用方（上传任务写入 partial_text）
+  6. 内容哈希缓存     → 音轨哈希 = 解码后 PCM 的 SHA-256（会议视频与从中直接导出、未重新编码的录音也能命中），
+                        整轨与单段结果都写入 blob_store 解析缓存：重复上传直接返回，重试时已完成的段不再计费
+
+服务器未安装 ffmpeg 时退化为整文件单次请求（超过 25MB 直接报错）。
+
+用法：
+    text = transcribe(path, openai_whisper(client), on_partial=lambda text, done, total: ...)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import BinaryIO
+
+import blob_store
+
+logger = logging.getLogger("audio_transcribe")
+
+# ── 参数（可通过环境变量覆盖）──
+_FFMPEG = os.environ.get("SRI_FFMPEG", "ffmpeg")
+_CHUNK_SECONDS = float(os.environ.get("SRI_WHISPER_CHUNK_SECONDS", "300"))
+_OVERLAP_SECONDS = float(os.environ.get("SRI_WHISPER_OVERLAP_SECONDS", "1.5"))
+_CONCURRENCY = int(os.environ.get("SRI_WHISPER_CONCURRENCY", "4"))
+_SILENCE_DB = os.environ.get("SRI_WHISPER_SILENCE_DB", "-35")
+_SILENCE_MIN_SECONDS = 0.4
+_MIN_CHUNK_RATIO = 0.6                  # 静音切点不早于目标时长的 60%，避免切出过短的段
+_SAMPLE_RATE = 16000
+_WHISPER_LIMIT_BYTES = 25 * 1024 * 1024
+_DEDUP_WINDOW = 60                      # 硬切处比较前段末尾 / 后段开头各多少字
+_DEDUP_MIN = 4                          # 公共片段至少几个字才认定为重叠
+_DEDUP_SLACK = 6                        # 公共片段距前段末尾 / 后段开头允许的偏差（标点、识别差异）
+
+WHISPER_PARAMS = {"model": "whisper-1", "language": "zh"}
+# 影响转写结果的参数摘要：变化即缓存版本变化
+VERSION = hashlib.sha256(json.dumps(
+    [WHISPER_PARAMS, _CHUNK_SECONDS, _OVERLAP_SECONDS, _SILENCE_DB], sort_keys=True,
+).encode()).hexdigest()[:16]
+
+_SILENCE_RE = re.compile(r"silence_(start|end):\s*(-?[\d.]+)")
+
+Whisper = Callable[[str, BinaryIO], str]
+
+
+class TranscribeError(Exception):
+    """音频无法转写（无音轨 / 解码失败 / 超过单次请求上限且无法切分），消息直接展示给用户。"""
+
+
+@dataclass
+class Chunk:
+    index: int
+    start: float
+    end: float
+    overlap: bool = False               # 与前一段重叠（硬切），拼接时需去重
+
+
+@dataclass
+class TranscribeStats:
+    track_hash: str = ""
+    duration_s: float = 0.0
+    chunks: int = 0
+    cached_chunks: int = 0
+    hard_cuts: int = 0
+    track_cached: bool = False
+    prepare_ms: float = 0.0             # 解码 + 静音检测 + 哈希
+    elapsed_ms: float = 0.0
+    chunk_ms: list[float] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def openai_whisper(client) -> Whisper:
+    """绑定 OpenAI 客户端的单次转写函数。"""
+    def whisper(name: str, f: BinaryIO) -> str:
+        return client.audio.transcriptions.create(file=(name, f), **WHISPER_PARAMS).text
+    return whisper
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(_FFMPEG) is not None
+
+
+# ═══════════════════════════════════════════
+# 1. 归一化 + 静音检测 + 切分
+# ═══════════════════════════════════════════
+
+def _normalize(src: Path, wav: Path) -> list[tuple[float, float]]:
+    """解码为 16kHz 单声道 WAV，顺带返回静音区间 [(开始, 结束)]；无音轨 / 解码失败抛 TranscribeError。"""
+    proc = subprocess.run(
+        [_FFMPEG, "-hide_banner", "-nostdin", "-y", "-i", str(src), "-vn", "-ac", "1", "-ar", str(_SAMPLE_RATE),
+         "-af", f"silencedetect=noise={_SILENCE_DB}dB:d={_SILENCE_MIN_SECONDS}",
+         "-c:a", "pcm_s16le", "-f", "wav", str(wav)],
+        capture_output=True, text=True, errors="replace",
+    )
+    if proc.returncode != 0 or not wav.exists():
+        detail = (proc.stderr.strip().splitlines() or ["未知错误"])[-1]
+        raise TranscribeError(f"音频解码失败（文件无音轨或已损坏）: {detail}")
+
+    silences, start = [], None
+    for kind, value in _SILENCE_RE.findall(proc.stderr):
+        if kind == "start":
+            start = max(0.0, float(value))
+        elif start is not None:
+            silences.append((start, float(value)))
+            start = None
+    return silences
+
+
+def _track_hash(wav: Path) -> tuple[str, float]:
+    """PCM 数据的 SHA-256 与时长（秒）。"""
+    digest = hashlib.sha256()
+    with wave.open(str(wav), "rb") as w:
+        frames, rate = w.getnframes(), w.getframerate()
+        while block := w.readframes(rate * 30):
+            digest.update(block)
+    return digest.hexdigest(), frames / rate
+
+
+def plan_chunks(duration: float, silences: list[tuple[float, float]],
+                target: float = _CHUNK_SECONDS, overlap: float = _OVERLAP_SECONDS) -> list[Chunk]:
+    """按目标时长切分：优先切在窗口内较长静音（不短于最长者一半）中最靠后一段的中点，否则硬切并与下一段重叠。"""
+    chunks, start, overlapped = [], 0.0, False
+    while duration - start > target:
+        lo, hi = start + target * _MIN_CHUNK_RATIO, start + target
+        candidates = [(e - s, (s + e) / 2) for s, e in silences if lo <= (s + e) / 2 <= hi]
+        if candidates:
+            longest = max(length for length, _ in candidates)
+            cut = max(mid for length, mid in candidates if length >= longest / 2)
+            chunks.append(Chunk(len(chunks), start, cut, overlapped))
+            start, overlapped = cut, False
+        else:
+            chunks.append(Chunk(len(chunks), start, hi, overlapped))
+            start, overlapped = hi - overlap, True
+    chunks.append(Chunk(len(chunks), start, duration, overlapped))
+    return chunks
+
+
+def _export(wav: Path, chunk: Chunk, out: Path):
+    proc = subprocess.run(
+        [_FFMPEG, "-hide_banner", "-nostdin", "-y", "-ss", f"{chunk.start:.3f}", "-t", f"{chunk.end - chunk.start:.3f}",
+         "-i", str(wav), "-c:a", "flac", str(out)],
+        capture_output=True, text=True, errors="replace",
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导出第 {chunk.index + 1} 段失败: {proc.stderr.strip()[-200:]}")
+
+
+# ═══════════════════════════════════════════
+# 2. 拼接去重
+# ═══════════════════════════════════════════
+
+def _join(left: str, right: str) -> str:
+    if not left or not right:
+        return left + right
+    if left[-1].isascii() and left[-1].isalnum() and right[0].isascii() and right[0].isalnum():
+        return f"{left} {right}"
+    return left + right
+
+
+def merge_overlap(prev: str, nxt: str) -> str:
+    """拼接硬切处的相邻两段：前段末尾与后段开头的最长公共片段只保留一份。"""
+    nxt = nxt.strip()
+    tail, head = prev[-_DEDUP_WINDOW:], nxt[:_DEDUP_WINDOW]
+    m = SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+    if m.size >= _DEDUP_MIN and len(tail) - (m.a + m.size) <= _DEDUP_SLACK and m.b <= _DEDUP_SLACK:
+        return _join(prev[:len(prev) - len(tail) + m.a + m.size], nxt[m.b + m.size:].lstrip())
+    return _join(prev, nxt)
+
+
+def stitch(chunks: list[Chunk], texts: list[str]) -> str:
+    out = ""
+    for chunk, text in zip(chunks, texts):
+        out = merge_overlap(out, text) if chunk.overlap else _join(out, text.strip())
+    return out
+
+
+# ═══════════════════════════════════════════
+# 3. 入口
+# ═══════════════════════════════════════════
+
+def _chunk_key(track_hash: str, chunk: Chunk) -> str:
+    return hashlib.sha256(f"{track_hash}:{chunk.start:.3f}:{chunk.end:.3f}".encode()).hexdigest()
+
+
+def _transcribe_whole(path: Path, whisper: Whisper, stats: TranscribeStats) -> str:
+    size = path.stat().st_size
+    if size > _WHISPER_LIMIT_BYTES:
+        raise TranscribeError(
+            f"音频 {size / 1024 / 1024:.0f}MB 超过 Whisper 单次 25MB 上限，服务器未安装 ffmpeg，无法分段转写"
+        )
+    logger.warning("未找到 ffmpeg（SRI_FFMPEG=%s），整文件单次转写", _FFMPEG)
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        text = whisper(path.name, f)
+    stats.chunks = 1
+    stats.chunk_ms = [round((time.perf_counter() - started) * 1000, 1)]
+    return text.strip()
+
+
+def transcribe(path: str | Path, whisper: Whisper, *,
+               on_partial: Callable[[str, int, int], None] | None = None,
+               concurrency: int | None = None, stats: TranscribeStats | None = None) -> str:
+    """
+    转写音频 / 视频文件，返回拼接后的全文。whisper(file_name, file_obj) 负责单次 API 请求（异常原样上抛）。
+    on_partial(已拼接文本, 已完成段数, 总段数) 在每段完成后调用（只含连续完成的前缀）。
+    """
+    stats = stats if stats is not None else TranscribeStats()
+    path = Path(path)
+    started = time.perf_counter()
+    try:
+        if not ffmpeg_available():
+            return _transcribe_whole(path, whisper, stats)
+
+        with tempfile.TemporaryDirectory(prefix="sri_whisper_") as tmp:
+            wav = Path(tmp) / "track.wav"
+            silences = _normalize(path, wav)
+            track_hash, duration = _track_hash(wav)
+            stats.track_hash, stats.duration_s = track_hash, round(duration, 2)
+            stats.prepare_ms = round((time.perf_counter() - started) * 1000, 1)
+            if duration <= 0:
+                raise TranscribeError("音频时长为 0，未识别到有效语音内容")
+
+            cached = blob_store.cache_get(track_hash, "transcript", VERSION)
+            if cached is not None:
+                stats.track_cached = True
+                if on_partial:
+                    on_partial(cached["text"], 1, 1)
+                return cached["text"]
+
+            chunks = plan_chunks(duration, silences)
+            stats.chunks = len(chunks)
+            stats.hard_cuts = sum(c.overlap for c in chunks)
+            stats.chunk_ms = [0.0] * len(chunks)
+            texts: list[str | None] = [None] * len(chunks)
+            lock = threading.Lock()
+
+            def run(chunk: Chunk) -> str:
+                key = _chunk_key(track_hash, chunk)
+                hit = blob_store.cache_get(key, "transcript_chunk", VERSION)
+                if hit is not None:
+                    with lock:
+                        stats.cached_chunks += 1
+                    return hit["text"]
+                t0 = time.perf_counter()
+                out = Path(tmp) / f"chunk_{chunk.index:04d}.flac"
+                _export(wav, chunk, out)
+                try:
+                    with open(out, "rb") as f:
+                        text = whisper(f"{path.stem}_{chunk.index:04d}.flac", f)
+                finally:
+                    out.unlink(missing_ok=True)
+                blob_store.cache_put(key, "transcript_chunk", VERSION, {"text": text})
+                stats.chunk_ms[chunk.index] = round((time.perf_counter() - t0) * 1000, 1)
+                return text
+
+            workers = max(1, min(_CONCURRENCY if concurrency is None else concurrency, len(chunks)))
+            emitted = 0
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="whisper") as pool:
+                futures = {pool.submit(run, c): c for c in chunks}
+                try:
+                    for future in as_completed(futures):
+                        texts[futures[future].index] = future.result()
+                        ready = emitted
+                        while ready < len(texts) and texts[ready] is not None:
+                            ready += 1
+                        if on_partial and ready > emitted:
+                            on_partial(stitch(chunks[:ready], texts[:ready]), ready, len(chunks))
+                        emitted = ready
+                except BaseException:
+                    for f in futures:           # 任一段失败：未开始的段不再请求（已完成的段已进缓存）
+                        f.cancel()
+                    raise
+
+            text = stitch(chunks, texts)
+            blob_store.cache_put(track_hash, "transcript", VERSION, {"text": text, "duration_s": stats.duration_s})
+            return text
+    finally:
+        stats.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+异步 DB 层压测 — benchmarks/bench_async_db.py
+==============================================
+对比两条 GET /api/projects 链路在高并发下的吞吐与延迟：
+  • sync  — 旧版 def 端点 + Depends(get_db)，每个请求占用一个线程池 worker
+  • async — 新版 async def 端点 + Depends(get_async_db)，全程 await
+
+模拟远端数据库：每次查询注入 --db-latency 毫秒往返延迟
+（同步链路 time.sleep 阻塞线程，异步链路 asyncio.sleep 让出事件循环），
+线程池大小固定为 --threads，等价于单个 uvicorn worker。
+
+用法:
+    python benchmarks/bench_async_db.py --projects 2000 --concurrency 50 200 500
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+_TMP = tempfile.mkdtemp(prefix="sri_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/bench.db"
+
+
+def _seed(n_projects: int):
+    from db import SessionLocal, init_db
+    from models import Project, ProjectApproval, User, UserRole
+
+    init_db()
+    db = SessionLocal()
+    admin = User(name="bench", phone="bench", role=UserRole.ADMIN, dept="总部")
+    db.add(admin)
+    db.flush()
+    db.bulk_save_objects([
+        Project(
+            name=f"客户{i} - 项目{i}", client=f"客户{i}", project_title=f"项目{i}",
+            owner_id=admin.id, dept="总部", approval_status=ProjectApproval.APPROVED,
+        )
+        for i in range(n_projects)
+    ])
+    db.commit()
+    db.close()
+
+
+def _build_app(db_latency_s: float, page_size: int):
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import Session
+
+    from models import Project
+    from utils.dependencies import get_async_db, get_db
+
+    app = FastAPI()
+
+    @app.get("/sync")
+    def list_sync(db: Session = Depends(get_db)):
+        time.sleep(db_latency_s)
+        rows = db.query(Project).order_by(Project.updated_at.desc()).limit(page_size).all()
+        return [{"id": p.id, "name": p.name} for p in rows]
+
+    @app.get("/async")
+    async def list_async(db: AsyncSession = Depends(get_async_db)):
+        await asyncio.sleep(db_latency_s)
+        result = await db.execute(
+            select(Project).order_by(Project.updated_at.desc()).limit(page_size)
+        )
+        return [{"id": p.id, "name": p.name} for p in result.scalars().all()]
+
+    return app
+
+
+async def _run(app, path: str, concurrency: int, requests_total: int) -> dict:
+    import httpx
+
+    latencies: list[float] = []
+    sem = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with sem:
+                t0 = time.perf_counter()
+                resp = await client.get(path)
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - t0)
+
+        t_start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests_total)))
+        elapsed = time.perf_counter() - t_start
+
+    latencies.sort()
+    return {
+        "rps": requests_total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def _main(args):
+    import anyio.to_thread
+
+    _seed(args.projects)
+    app = _build_app(args.db_latency / 1000, args.page_size)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = args.threads
+
+    print(f"projects={args.projects} threads={args.threads} db_latency={args.db_latency}ms")
+    print(f"{'mode':<6} {'conc':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for conc in args.concurrency:
+        total = max(conc * 4, 200)
+        sync_stats = await _run(app, "/sync", conc, total)
+        async_stats = await _run(app, "/async", conc, total)
+        for mode, st in (("sync", sync_stats), ("async", async_stats)):
+            print(f"{mode:<6} {conc:>5} {st['rps']:>9.1f} {st['p50_ms']:>9.1f} {st['p95_ms']:>9.1f}")
+        print(f"{'':<6} {'':>5} speedup x{async_stats['rps'] / sync_stats['rps']:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=40, help="线程池 worker 数 (Starlette 默认 40)")
+    parser.add_argument("--db-latency", type=float, default=20, help="模拟数据库往返延迟 (ms)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200, 500])
+    asyncio.run(_main(parser.parse_args()))
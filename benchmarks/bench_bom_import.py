@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+BOM 批量导入 / 导出压测 — benchmarks/bench_bom_import.py
+========================================================
+合成一张大 BOM（默认 50000 行），分别测：
+  • parse-csv / parse-xlsx — services/bom_io.load_bom 流式解析 + 整列校验（行/秒）
+  • 首次写入   legacy：逐行 ORM add（原 create_deal_desk）  vs  bulk：sync_items 批量 INSERT
+  • 改单 1%    legacy：整单 DELETE + 逐行 ORM 重插（原 update_bom）  vs  diff：sync_items 只写变化行
+  • 原样重导   diff：与库内完全一致时零写入
+  • export-csv / export-xlsx — iter_rows 分批查库 + 流式输出
+
+每轮写入后回读校验库内明细与预期一致。
+
+用法:
+    python benchmarks/bench_bom_import.py [--rows 50000] [--changed 0.01]
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+_TMP = tempfile.mkdtemp(prefix="sri_bench_bom_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/bench.db"
+os.environ["SRI_AI_CACHE_DB"] = f"{_TMP}/ai_cache.db"
+
+
+def _csv(rows: int, rng: random.Random) -> bytes:
+    models = [f"SCB{rng.randint(10, 13)}-{rng.randint(100, 2500)}/{rng.choice(['10', '20', '35'])}kV"
+              for _ in range(rows * 3 // 4)]
+    lines = ["产品型号,AI 提取数量,销售核定数量,单价(元),备注"]
+    for i in range(rows):
+        lines.append(f"{rng.choice(models)},{rng.randint(0, 50)},{rng.randint(1, 50)},"
+                     f"\"{rng.randint(800, 90000):,}\",{'' if i % 3 else '含安装'}")
+    return "\n".join(lines).encode("utf-8")
+
+
+def _xlsx(records: list[dict]) -> bytes:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("BOM")
+    ws.append(["产品型号", "AI 提取数量", "销售核定数量", "单价(元)", "备注"])
+    for r in records:
+        ws.append([r["product_model"], r["ai_extracted_qty"], r["sales_qty"], r["unit_price"], r["remark"]])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t0, result
+
+
+def _legacy_insert(db, deal_id: int, records: list[dict]):
+    from models import BOMItem
+
+    for r in records:
+        db.add(BOMItem(deal_desk_id=deal_id, subtotal=r["sales_qty"] * r["unit_price"], **r))
+    db.commit()
+
+
+def _legacy_replace(db, deal_id: int, records: list[dict]):
+    from models import BOMItem
+
+    db.query(BOMItem).filter(BOMItem.deal_desk_id == deal_id).delete()
+    _legacy_insert(db, deal_id, records)
+
+
+def _bulk(db, deal_id: int, records: list[dict]):
+    from models import BOMItem
+    from services.bom_io import sync_items
+
+    stats = sync_items(db, BOMItem, "deal_desk_id", deal_id, records,
+                       derive=lambda r: {"subtotal": r["sales_qty"] * r["unit_price"]})
+    db.commit()
+    return stats
+
+
+def _stored(db, deal_id: int) -> list[tuple]:
+    from models import BOMItem
+
+    return sorted(
+        db.query(BOMItem.product_model, BOMItem.sales_qty, BOMItem.unit_price, BOMItem.remark)
+        .filter(BOMItem.deal_desk_id == deal_id).all()
+    )
+
+
+def _expected(records: list[dict]) -> list[tuple]:
+    return sorted((r["product_model"], r["sales_qty"], r["unit_price"], r["remark"]) for r in records)
+
+
+def main(args) -> int:
+    from db import SessionLocal, init_db
+    from models import BOMItem, DealDesk, Project
+    from services.bom_io import DEAL_EXPORT_COLUMNS, iter_csv, iter_rows, load_bom, write_xlsx
+
+    init_db()
+    rng = random.Random(7)
+    raw_csv = _csv(args.rows, rng)
+    print(f"BOM: {args.rows} 行，CSV {len(raw_csv) / 1e6:.1f}MB")
+
+    elapsed, sheet = _timed(lambda: load_bom(io.BytesIO(raw_csv), "bom.csv"))
+    assert not sheet.errors and len(sheet.records) == args.rows, sheet.errors[:3]
+    records = sheet.records
+    raw_xlsx = _xlsx(records)
+    print(f"\n{'环节':<22} {'耗时 s':>8} {'行/秒':>10}")
+    print(f"{'parse-csv':<22} {elapsed:>8.2f} {args.rows / elapsed:>10,.0f}")
+    elapsed, xsheet = _timed(lambda: load_bom(io.BytesIO(raw_xlsx), "bom.xlsx"))
+    assert xsheet.records == records
+    print(f"{'parse-xlsx':<22} {elapsed:>8.2f} {args.rows / elapsed:>10,.0f}")
+
+    changed = [dict(r) for r in records]
+    for i in rng.sample(range(len(changed)), int(len(changed) * args.changed)):
+        changed[i]["sales_qty"] += 1
+
+    failures = 0
+    with SessionLocal() as db:
+        project = Project(name="压测项目", client="压测客户", project_title="BOM 导入")
+        db.add(project)
+        db.flush()
+        legacy, bulk = DealDesk(project_id=project.id), DealDesk(project_id=project.id)
+        db.add_all([legacy, bulk])
+        db.commit()
+        legacy_id, deal_id = legacy.id, bulk.id
+
+        def report(name, fn, deal_id, expect):
+            nonlocal failures
+            elapsed, stats = _timed(fn)
+            ok = _stored(db, deal_id) == _expected(expect)
+            failures += not ok
+            detail = f"  {stats.to_dict()}" if stats else ""
+            print(f"{name:<22} {elapsed:>8.2f} {len(expect) / elapsed:>10,.0f}{'' if ok else '  ✗ 回读不一致'}{detail}")
+
+        report("首次写入 legacy", lambda: _legacy_insert(db, legacy_id, records), legacy_id, records)
+        db.expunge_all()
+        report("首次写入 bulk", lambda: _bulk(db, deal_id, records), deal_id, records)
+        report(f"改单 {args.changed:.0%} legacy", lambda: _legacy_replace(db, legacy_id, changed), legacy_id, changed)
+        db.expunge_all()
+        report(f"改单 {args.changed:.0%} diff", lambda: _bulk(db, deal_id, changed), deal_id, changed)
+        report("原样重导 diff", lambda: _bulk(db, deal_id, changed), deal_id, changed)
+
+    elapsed, size = _timed(lambda: sum(map(len, iter_csv(
+        iter_rows(BOMItem, "deal_desk_id", deal_id, DEAL_EXPORT_COLUMNS), DEAL_EXPORT_COLUMNS))))
+    print(f"{'export-csv':<22} {elapsed:>8.2f} {args.rows / elapsed:>10,.0f}  {size / 1e6:.1f}MB")
+    elapsed, out = _timed(lambda: write_xlsx(
+        iter_rows(BOMItem, "deal_desk_id", deal_id, DEAL_EXPORT_COLUMNS), DEAL_EXPORT_COLUMNS))
+    print(f"{'export-xlsx':<22} {elapsed:>8.2f} {args.rows / elapsed:>10,.0f}  {len(out.read()) / 1e6:.1f}MB")
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--changed", type=float, default=0.01, help="改单时变更的行占比")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+BOM 防篡改哈希压测 — benchmarks/bench_bom_merkle.py
+==================================================
+合成一张大 BOM（默认 2000 行，含同型号多行），对比天眼引擎各环节耗时：
+  • legacy-hash   — 原实现 compute_bom_hash：整单排序 + JSON 序列化 + SHA-256
+  • merkle-build  — BOMMerkle.from_items：逐行叶子 + 建树
+  • update-1      — 改一行数量，update() 只重算叶子到根的路径
+  • apply-1       — 整单替换（只改一行），apply() 逐行比对后增量更新
+  • verify-1      — 提交时校验：载入快照 + 当前明细建树 + diff() 定位变更行
+
+另做正确性校验：随机改数量 / 单价、增删行若干次，diff() 给出的变更行必须与实际改动逐一对应，
+增量更新后的根必须与整树重建一致。
+
+用法:
+    python benchmarks/bench_bom_merkle.py [--lines 2000] [--repeat 50]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+
+def _bom(lines: int, rng: random.Random) -> list[dict]:
+    models = [f"SCB{rng.randint(10, 13)}-{rng.randint(100, 2500)}/{rng.choice(['10', '20', '35'])}kV"
+              for _ in range(lines * 3 // 4)]
+    return [{"model": rng.choice(models), "qty": rng.randint(1, 50), "price": float(rng.randint(800, 90000))}
+            for _ in range(lines)]
+
+
+def _ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def _check(bom: list[dict], rng: random.Random, rounds: int) -> int:
+    """随机改动后比对 diff() 与实际改动；返回不一致的轮数。"""
+    from utils.bom_merkle import BOMMerkle, lines_from_items
+
+    failures = 0
+    for _ in range(rounds):
+        edited = [dict(item) for item in bom]
+        for _ in range(rng.randint(1, 5)):
+            op = rng.random()
+            if op < 0.6:
+                edited[rng.randrange(len(edited))]["qty"] += rng.randint(1, 9)
+            elif op < 0.8:
+                edited[rng.randrange(len(edited))]["price"] += 100
+            elif op < 0.9:
+                edited.append({"model": f"NEW-{rng.randint(1, 99)}", "qty": 1, "price": 1.0})
+            else:
+                edited.pop(rng.randrange(len(edited)))
+
+        old, new = lines_from_items(bom), lines_from_items(edited)
+        expected = ({l.key: l for l in old}.items() ^ {l.key: l for l in new}.items())
+        expected_keys = {key for key, _ in expected}
+
+        base = BOMMerkle.from_items(bom)
+        changes = base.diff(BOMMerkle.from_items(edited))
+        got_keys = {(c.new or c.old).key for c in changes}
+        incremental = BOMMerkle.from_items(bom)
+        incremental.apply(edited)
+        if got_keys != expected_keys or incremental.root != BOMMerkle.from_items(edited).root:
+            failures += 1
+    return failures
+
+
+def main(args) -> int:
+    from utils.bom_merkle import BOMLine, BOMMerkle
+    from utils.security import compute_bom_hash, diff_bom_integrity
+
+    rng = random.Random(7)
+    bom = _bom(args.lines, rng)
+    tree = BOMMerkle.from_items(bom)
+    snapshot = tree.snapshot()
+    print(f"BOM: {len(bom)} 行，{len({i['model'] for i in bom})} 个型号，快照 {len(snapshot) / 1024:.0f}KB")
+
+    edited = [dict(item) for item in bom]
+    edited[len(edited) // 2]["qty"] += 3
+    target = tree.lines[len(tree.lines) // 2]
+
+    def update_one():
+        tree.update(BOMLine(target.model, target.seq, target.qty + 1, target.price))
+
+    def verify_one():
+        current = BOMMerkle.from_items(edited)
+        ok, summary, changes = diff_bom_integrity(current, tree.root, snapshot)
+        assert not ok and len(changes) == 1, summary
+
+    timings = {
+        "legacy-hash": lambda: compute_bom_hash(bom),
+        "merkle-build": lambda: BOMMerkle.from_items(bom),
+        "update-1": update_one,
+        "apply-1": lambda: BOMMerkle.load(snapshot).apply(edited),
+        "verify-1": verify_one,
+    }
+    print(f"\n{'环节':<14} {'耗时 ms':>9}")
+    for name, fn in timings.items():
+        if name == "verify-1":
+            tree = BOMMerkle.load(snapshot)
+        print(f"{name:<14} {_ms(fn, args.repeat):>9.3f}")
+
+    current = BOMMerkle.from_items(edited)
+    print(f"\n校验摘要: {diff_bom_integrity(current, BOMMerkle.load(snapshot).root, snapshot)[1]}")
+
+    failures = _check(bom, rng, args.rounds)
+    print(f"随机改动 {args.rounds} 轮，diff / 增量根与重建比对: {args.rounds - failures}/{args.rounds} 一致")
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=200)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+撞单查重压测 — benchmarks/bench_collision.py
+============================================
+对比两种查重引擎在大规模项目库下的单次查重延迟：
+  • legacy — 旧版 _check_collision：加载全部在审 / 已批项目，Python 逐个双向包含比对
+  • index  — services/collision.find_collision：gram 倒排 + 子串键取候选，回表复核
+
+查询混合四类：库内完全重复、库内客户名的子串、库内客户名加后缀（超串）、随机不存在客户。
+index 的结果逐条与 legacy 的全部命中集合校验（legacy 只在 --verify 条查询上运行，规模大时很慢）。
+
+用法:
+    python benchmarks/bench_collision.py --projects 1000000 --queries 2000 --verify 5
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+_TMP = tempfile.mkdtemp(prefix="sri_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/bench.db"
+os.environ["SRI_AI_CACHE_DB"] = f"{_TMP}/ai_cache.db"
+
+_CITIES = "北京 上海 广州 深圳 天津 重庆 杭州 宁波 南京 苏州 无锡 青岛 烟台 大连 沈阳 武汉 成都 西安 郑州 长沙".split()
+_CHARS = "万华恒瑞安泰鑫源宏达永盛中联汇通金科信和远航嘉隆博润德昌新元天工瑞丰海川同创正泰宝龙"
+_INDUSTRY = "化学 化工 电力 能源 钢铁 制药 港务 水务 建工 机械 电子 物流 置业 环保 新材料".split()
+_SUFFIX = ["集团", "有限公司", "股份有限公司", "集团有限公司", "科技有限公司", ""]
+
+
+def _client(rng: random.Random) -> str:
+    core = "".join(rng.choice(_CHARS) for _ in range(rng.randint(2, 3)))
+    return f"{rng.choice(_CITIES)}{core}{rng.choice(_INDUSTRY)}{rng.choice(_SUFFIX)}"
+
+
+def _seed(n_projects: int, rng: random.Random) -> list[tuple[str, str]]:
+    from sqlalchemy import insert
+
+    from db import engine, init_db
+    from models import Project, ProjectApproval
+    from services.collision import rebuild_index
+
+    init_db()
+    statuses = [ProjectApproval.PENDING, ProjectApproval.APPROVED, ProjectApproval.REJECTED]
+    seeded = []
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        batch = []
+        for i in range(n_projects):
+            client, title = _client(rng), f"{rng.randint(1, 99)}号厂房暖通工程"
+            seeded.append((client, title))
+            batch.append({"name": f"{client} - {title}", "client": client, "project_title": title,
+                          "approval_status": rng.choice(statuses)})
+            if len(batch) == 20000:
+                conn.execute(insert(Project), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Project), batch)
+        # Core 批量写入不触发 mapper 事件，统一补建索引（与迁移回填同一路径）
+        rebuild_index(conn)
+    print(f"seeded {n_projects} projects + 查重索引 in {time.perf_counter() - t0:.1f}s")
+    return seeded
+
+
+def _queries(seeded: list[tuple[str, str]], n: int, rng: random.Random) -> list[tuple[str, str]]:
+    out = []
+    for i in range(n):
+        client, title = rng.choice(seeded)
+        kind = i % 4
+        if kind == 0:
+            out.append((client, title))                                    # 完全重复
+        elif kind == 1:
+            out.append((client[:max(3, len(client) - 4)], "二期改造"))      # 子串
+        elif kind == 2:
+            out.append((client + "华东分公司", title))                      # 超串
+        else:
+            out.append((_client(rng) + "筹备组", "新建项目"))               # 多半不存在
+    return out
+
+
+def _legacy_matches(db, client: str, title: str) -> set[int]:
+    """旧引擎判定下的全部命中（用于校验 index 结果落在其中）。"""
+    from models import Project, ProjectApproval
+
+    client_clean, title_clean = client.strip().lower(), title.strip().lower()
+    hits = set()
+    for p in db.query(Project).filter(
+        Project.approval_status.in_([ProjectApproval.PENDING, ProjectApproval.APPROVED])
+    ).all():
+        p_client = (p.client or "").strip().lower()
+        p_title = (p.project_title or "").strip().lower()
+        client_match = (client_clean in p_client) or (p_client in client_clean)
+        title_match = (title_clean in p_title) or (p_title in title_clean)
+        if (client_match and title_match) or client_clean == p_client:
+            hits.add(p.id)
+    return hits
+
+
+def _pct(samples: list[float], q: float) -> float:
+    return sorted(samples)[max(0, int(len(samples) * q) - 1)] * 1000
+
+
+def main(args):
+    from db import SessionLocal
+    from services.collision import find_collision
+
+    rng = random.Random(42)
+    seeded = _seed(args.projects, rng)
+    queries = _queries(seeded, args.queries, rng)
+    db = SessionLocal()
+
+    samples, found = [], 0
+    for client, title in queries:
+        t0 = time.perf_counter()
+        hit = find_collision(db, client, title)
+        samples.append(time.perf_counter() - t0)
+        found += hit is not None
+        db.expunge_all()
+    print(f"index   queries={len(queries)} hits={found} "
+          f"p50={statistics.median(samples) * 1000:.3f}ms p95={_pct(samples, 0.95):.3f}ms "
+          f"p99={_pct(samples, 0.99):.3f}ms")
+
+    legacy = []
+    for client, title in queries[: args.verify]:
+        t0 = time.perf_counter()
+        expected = _legacy_matches(db, client, title)
+        legacy.append(time.perf_counter() - t0)
+        hit = find_collision(db, client, title)
+        assert (hit is None) == (not expected), f"命中不一致: {client!r} {title!r}"
+        assert hit is None or hit.id in expected, f"命中项目不在旧引擎结果中: {client!r}"
+        db.expunge_all()
+    if legacy:
+        print(f"legacy  queries={len(legacy)} p50={statistics.median(legacy) * 1000:.1f}ms  结果一致 ✅")
+    db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--verify", type=int, default=5, help="同时跑旧引擎并校验结果的查询条数")
+    main(parser.parse_args())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+文档提取压测 — benchmarks/bench_doc_extract.py
+==============================================
+合成一份带图片占位流的大 PDF（默认 400 页 × 64KB ≈ 28MB，接近种子数据"2025年度中标项目汇编"），
+每种方式在独立子进程中运行，测量首块耗时、LLM 输入就绪耗时与峰值内存：
+  • baseline  — 原实现：整文件读入内存 → PdfReader(BytesIO) → 单线程逐页提取 → 拼接后取前 4000 字
+  • parallel  — doc_extract 页级并行，不设预算（全文）
+  • streaming — doc_extract 页级并行 + token 预算早停（上传解析的实际路径）
+
+parallel / streaming 的进程池先预热（job_queue 工作进程内常驻），预热耗时单独列出；
+峰值内存分调度进程与页解析子进程（子进程取最大者）。
+
+用法:
+    python benchmarks/bench_doc_extract.py [--pages 400] [--image-kb 64] [--budget 3000] [--pdf 现有文件.pdf]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+_VARIANTS = ("baseline", "parallel", "streaming")
+
+
+def _write_pdf(path: str, pages: int, image_kb: int, lines: int = 48):
+    """逐对象写出最小 PDF：每页一段 Helvetica 文本 + 一个未压缩的图片占位流（模拟扫描插图的体积）。"""
+    rng = os.urandom
+    offsets = []
+    with open(path, "wb") as f:
+        def obj(body: bytes, stream: bytes | None = None):
+            offsets.append(f.tell())
+            f.write(f"{len(offsets)} 0 obj\n".encode() + body)
+            if stream is not None:
+                f.write(b"\nstream\n" + stream + b"\nendstream")
+            f.write(b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n")
+        kids = " ".join(f"{4 + 3 * i} 0 R" for i in range(pages))
+        obj(b"<< /Type /Catalog /Pages 2 0 R >>")
+        obj(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+        obj(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        side = max(1, int((image_kb * 1024 / 3) ** 0.5))
+        for i in range(pages):
+            content_no, image_no = 5 + 3 * i, 6 + 3 * i
+            obj(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                f"/Resources << /Font << /F1 3 0 R >> /XObject << /Im1 {image_no} 0 R >> >> "
+                f"/Contents {content_no} 0 R >>".encode())
+            text = " T* ".join(
+                f"(Bid {i + 1}-{j + 1}: 2500kVA dry-type transformer, temperature rise 65K, "
+                f"delivery {8 + j % 6} weeks, price {310 + j} kCNY) Tj" for j in range(lines)
+            )
+            content = f"q 200 0 0 150 350 40 cm /Im1 Do Q BT /F1 8 Tf 11 TL 36 806 Td {text} ET".encode()
+            obj(f"<< /Length {len(content)} >>".encode(), content)
+            image = rng(side * side * 3)
+            obj(f"<< /Type /XObject /Subtype /Image /Width {side} /Height {side} /ColorSpace /DeviceRGB "
+                f"/BitsPerComponent 8 /Length {len(image)} >>".encode(), image)
+        xref = f.tell()
+        f.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+        for off in offsets:
+            f.write(f"{off:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def _run_variant(variant: str, pdf: str, budget: int) -> dict:
+    import doc_extract
+
+    if variant == "baseline":
+        import io
+
+        import PyPDF2
+
+        t0 = time.perf_counter()
+        file_bytes = Path(pdf).read_bytes()
+        reader = PyPDF2.PdfReader(io.BytesIO(file_bytes))
+        pages_text, first = [], None
+        for page in reader.pages:
+            text = page.extract_text()
+            if text:
+                pages_text.append(text)
+                first = first or time.perf_counter()
+        llm_input = "\n".join(pages_text)[:4000]
+        done = time.perf_counter()
+        return {
+            "warmup_ms": 0.0, "first_chunk_ms": round((first - t0) * 1000, 1),
+            "ready_ms": round((done - t0) * 1000, 1), "pages_read": len(reader.pages),
+            "chars": len(llm_input), "peak_mb": doc_extract.peak_rss_mb(), "child_peak_mb": 0.0,
+        }
+
+    t0 = time.perf_counter()
+    pool = doc_extract._get_pool()
+    warm = [pool.submit(doc_extract._extract_pages, pdf, 0, 1) for _ in range(doc_extract._WORKERS)]
+    for future in warm:
+        future.result()
+    warmup_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    text, stats = doc_extract.extract_text(pdf, "pdf", token_budget=budget if variant == "streaming" else None)
+    doc_extract.shutdown_pool()
+    return {
+        "warmup_ms": warmup_ms, "first_chunk_ms": stats.first_chunk_ms, "ready_ms": stats.elapsed_ms,
+        "pages_read": stats.pages_read, "chars": len(text), "peak_mb": stats.peak_rss_mb,
+        "child_peak_mb": doc_extract.peak_rss_mb("children"),
+    }
+
+
+def main(args) -> int:
+    if args.variant:
+        print(json.dumps(_run_variant(args.variant, args.pdf, args.budget)))
+        return 0
+
+    pdf = args.pdf
+    if not pdf:
+        pdf = os.path.join(tempfile.mkdtemp(prefix="sri_bench_"), "bid_book.pdf")
+        t0 = time.perf_counter()
+        _write_pdf(pdf, args.pages, args.image_kb)
+        print(f"合成 PDF: {args.pages} 页，{os.path.getsize(pdf) / 1e6:.1f}MB（{time.perf_counter() - t0:.1f}s）")
+
+    print(f"\n{'方式':<10} {'预热ms':>8} {'首块ms':>9} {'就绪ms':>9} {'已读页':>6} {'字符':>8} "
+          f"{'峰值MB':>7} {'子进程MB':>8}")
+    for variant in _VARIANTS:
+        out = subprocess.run(
+            [sys.executable, __file__, "--variant", variant, "--pdf", pdf, "--budget", str(args.budget)],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        print(f"{variant:<10} {r['warmup_ms']:>8.0f} {r['first_chunk_ms']:>9.1f} {r['ready_ms']:>9.1f} "
+              f"{r['pages_read']:>6} {r['chars']:>8} {r['peak_mb']:>7.1f} {r['child_peak_mb']:>8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--image-kb", type=int, default=64)
+    parser.add_argument("--budget", type=int, default=3000)
+    parser.add_argument("--pdf", default="")
+    parser.add_argument("--variant", choices=_VARIANTS, help=argparse.SUPPRESS)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+看板聚合压测 — benchmarks/bench_kpi.py
+======================================
+对比 /api/kpi + /api/pipeline 一次大屏刷新的三种取数方式：
+  • legacy — 旧实现：4 条独立查询 + 两次全表拉取 current_stage，Python 逐行 classify_stage
+  • sql    — 单条聚合 SQL，经 stage_buckets 查找表在库内归桶（不走缓存）
+  • cached — get_dashboard_stats() 命中进程内 TTL 缓存
+
+同时校验 sql 与 legacy 的结果逐项一致。
+
+用法:
+    python benchmarks/bench_kpi.py --projects 100000 --rounds 20
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+_TMP = tempfile.mkdtemp(prefix="sri_bench_")
+os.environ["SRI_DB_PATH"] = f"{_TMP}/bench_intel.db"
+
+# 覆盖全部桶、兜底与空值的阶段取值
+_STAGES = [
+    "线索", "初期接触", "线索获取", "方案报价", "技术僵持", "商务谈判",
+    "逼单/签约", "逼单", "合同签约", "已签约", "立项", "丢单归档", "", None,
+]
+
+
+def _seed(n_projects: int):
+    from database import init_db
+    from db_pool import get_pool
+
+    init_db()
+    rng = random.Random(42)
+    with get_pool().write() as conn:
+        conn.executemany(
+            "INSERT INTO projects (project_name, current_stage) VALUES (?, ?)",
+            ((f"项目{i}", rng.choice(_STAGES)) for i in range(n_projects)),
+        )
+        conn.executemany(
+            "INSERT INTO stakeholders (name, project_id) VALUES (?, ?)",
+            ((f"联系人{i}", rng.randint(1, n_projects)) for i in range(n_projects // 2)),
+        )
+        conn.executemany(
+            "INSERT INTO visit_logs (project_id, raw_input, ai_parsed_data) VALUES (?, ?, '{}')",
+            ((rng.randint(1, n_projects), f"拜访{i}") for i in range(n_projects)),
+        )
+
+
+def _legacy_stats() -> dict:
+    """旧版 get_kpi + get_pipeline 的取数逻辑（一次大屏刷新两者各调一次）。"""
+    from database import STAGE_ORDER, classify_stage
+    from db_pool import get_pool
+
+    with get_pool().read() as conn:
+        cursor = conn.cursor()
+        total_projects = cursor.execute("SELECT COUNT(*) FROM projects").fetchone()[0]
+        with_stakeholders = cursor.execute(
+            "SELECT COUNT(DISTINCT project_id) FROM stakeholders"
+        ).fetchone()[0]
+        total_logs = cursor.execute("SELECT COUNT(*) FROM visit_logs").fetchone()[0]
+        stages = [row[0] for row in cursor.execute("SELECT current_stage FROM projects").fetchall()]
+        sum(1 for s in stages if classify_stage(s or "") == "线索获取")
+
+        stages = [row[0] or "" for row in cursor.execute("SELECT current_stage FROM projects").fetchall()]
+    stage_counts = {s: 0 for s in STAGE_ORDER}
+    for raw in stages:
+        stage_counts[classify_stage(raw)] += 1
+    return {
+        "total_projects": total_projects,
+        "projects_with_stakeholders": with_stakeholders,
+        "total_logs": total_logs,
+        "stage_counts": stage_counts,
+    }
+
+
+def _time(fn, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main(args):
+    import database
+
+    _seed(args.projects)
+    legacy = _legacy_stats()
+    fresh = database._query_dashboard_stats()
+    assert fresh == legacy, f"结果不一致:\nlegacy={legacy}\nsql={fresh}"
+    print(f"projects={args.projects} 结果一致 ✅ {fresh['stage_counts']}")
+
+    def cached():
+        database.get_dashboard_stats()   # /api/kpi
+        database.get_dashboard_stats()   # /api/pipeline
+
+    def sql():
+        database.invalidate_dashboard_stats()
+        cached()
+
+    results = {
+        "legacy": _time(_legacy_stats, args.rounds),
+        "sql": _time(sql, args.rounds),
+        "cached": _time(cached, args.rounds),
+    }
+    print(f"{'mode':<8} {'p50 ms':>10} {'speedup':>9}")
+    for mode, ms in results.items():
+        print(f"{mode:<8} {ms:>10.3f} {results['legacy'] / ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    main(parser.parse_args())
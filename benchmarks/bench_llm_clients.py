@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+LLM 客户端复用压测 — benchmarks/bench_llm_clients.py
+======================================================
+对比短小 FAST_EXTRACT 调用在两种客户端策略下的延迟：
+  • fresh    — 每次调用新建 OpenAI(...)（旧实现），每次都要新建连接
+  • registry — llm_clients 注册表复用客户端与 keep-alive 连接池
+
+上游为本地 OpenAI 兼容 mock 服务（--upstream-latency 模拟推理耗时）。
+本地 HTTP 不含 TLS 握手，真实环境下 registry 的收益会更大。
+
+用法:
+    python benchmarks/bench_llm_clients.py --calls 300
+    python benchmarks/bench_llm_clients.py --base-url https://api.openai.com/v1 --api-key sk-...
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import openai  # noqa: E402
+
+from llm_clients import get_client_registry  # noqa: E402
+
+_COMPLETION = json.dumps({
+    "id": "bench", "object": "chat.completion", "created": 0, "model": "bench",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": '{"current_status": "ok"}'}}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode("utf-8")
+
+
+def _start_mock(latency_s: float) -> str:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # 支持 keep-alive
+        wbufsize = 64 * 1024            # 头与正文合并发送，避免 Nagle 延迟干扰测量
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency_s)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(_COMPLETION)))
+            self.end_headers()
+            self.wfile.write(_COMPLETION)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def _call(client, model: str):
+    client.chat.completions.create(
+        model=model, messages=[{"role": "user", "content": "拜访纪要：客户确认预算"}], temperature=0.1,
+    )
+
+
+def _measure(make_client, calls: int, model: str) -> dict:
+    latencies = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        _call(make_client(), model)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main(args):
+    base_url = args.base_url or _start_mock(args.upstream_latency / 1000)
+    registry = get_client_registry()
+
+    def fresh():
+        return openai.OpenAI(api_key=args.api_key, base_url=base_url, timeout=30)
+
+    def pooled():
+        return registry.openai("bench", args.api_key, base_url, timeout=30)
+
+    _measure(pooled, 5, args.model)   # 预热
+    results = {"fresh": _measure(fresh, args.calls, args.model),
+               "registry": _measure(pooled, args.calls, args.model)}
+
+    print(f"base_url={base_url} calls={args.calls}")
+    print(f"{'mode':<9} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode, r in results.items():
+        print(f"{mode:<9} {r['p50']:>8.2f} {r['p95']:>8.2f}")
+    print(f"p50 saved: {results['fresh']['p50'] - results['registry']['p50']:.2f} ms")
+    print("registry stats:", registry.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--upstream-latency", type=float, default=5, help="mock 推理耗时 (ms)")
+    parser.add_argument("--base-url", default="", help="真实 OpenAI 兼容端点（留空则启动本地 mock）")
+    parser.add_argument("--api-key", default="sk-bench")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    main(parser.parse_args())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+脱敏吞吐压测 — benchmarks/bench_masking.py
+==========================================
+合成中文拜访记录语料（默认 8MB：手机号 / 金额 / 身份证 / 银行卡 / 邮箱 / 订单号混排），分两种形态：
+  • notes — 切成 ~2KB 的短笔记逐条脱敏（daily-log / AI 接口的热路径，单次调用开销占比高）
+  • bulk  — 整段一次脱敏（长文档）
+
+对比：
+  • legacy        — 原实现：手机号、金额两遍 re.sub（每次调用按模式字符串查 re 缓存）
+  • engine-legacy — utils/masking 单遍引擎，只启用 phone + money（输出须与 legacy 逐字一致）
+  • engine        — 默认规则集（身份证 / 银行卡 / 手机号 / 邮箱 / 金额）
+  • tokenize      — 默认规则集，可逆令牌
+  • stream        — 默认规则集，stream() 按 64KB 分片逐块脱敏（上传文档 / 转写稿路径）
+
+另把语料按随机位置切成小块（约 5000 处切口，必然切开手机号 / 卡号）走 stream()，校验与整段 mask() 逐字一致。
+
+用法:
+    python benchmarks/bench_masking.py [--mb 8] [--repeat 3]
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+_FILLER = (
+    "今天拜访了设计院电气所，对方表示这批干式变压器的温升要求按六十五K执行，"
+    "竞品报价偏低但交期不稳定，业主倾向于国产品牌，下周二约了总包方现场踏勘。"
+    "关键人态度中立，需要进一步确认预算口径和招标时间节点，技术参数基本满足要求。"
+)
+
+
+def _luhn_complete(prefix: str) -> str:
+    total = 0
+    for i, c in enumerate(reversed(prefix + "0")):
+        d = int(c)
+        if i % 2:
+            d = d * 2 - 9 if d > 4 else d * 2
+        total += d
+    return prefix + str((10 - total % 10) % 10)
+
+
+def _id_card(rng: random.Random) -> str:
+    from utils.masking import _ID_WEIGHTS
+    body = f"{rng.randint(110000, 659000)}{rng.randint(1960, 2000)}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}" \
+           f"{rng.randint(0, 999):03d}"
+    return body + "10X98765432"[sum(int(c) * w for c, w in zip(body, _ID_WEIGHTS)) % 11]
+
+
+def _corpus(mb: float, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    facts = [
+        lambda: f"张工电话{rng.choice('3456789')}{rng.randint(0, 9)}{rng.randint(10 ** 8, 10 ** 9 - 1)}",
+        lambda: f"1{rng.choice('3456789')}{rng.randint(10 ** 8, 10 ** 9 - 1)}",
+        lambda: f"预算约{rng.randint(50, 3000)}万",
+        lambda: f"报价{rng.randint(1, 999)}.{rng.randint(0, 99)} 元",
+        lambda: f"身份证{_id_card(rng)}",
+        lambda: f"回款账户{_luhn_complete('6222' + str(rng.randint(10 ** 11, 10 ** 12 - 1)))}",
+        lambda: f"订单号{rng.randint(10 ** 17, 10 ** 18 - 1)}",
+        lambda: f"邮箱 user{rng.randint(1, 9999)}@sgcc.com.cn",
+        lambda: f"物料号 SCB{rng.randint(10, 13)}-{rng.randint(100, 2500)}",
+    ]
+    parts, size, target = [], 0, int(mb * 1024 * 1024)
+    while size < target:
+        start = rng.randrange(len(_FILLER) // 2)
+        piece = _FILLER[start:start + rng.randint(20, 80)] + rng.choice(facts)() + "，"
+        parts.append(piece)
+        size += len(piece.encode())
+    return "".join(parts)
+
+
+def _legacy(text: str) -> str:
+    if not text:
+        return text
+    text = re.sub(r"(?<!\d)1[3-9]\d{9}(?!\d)", "[PHONE_MASK]", text)
+    text = re.sub(r"\d+(\.\d+)?\s*[万元]", "[MONEY_MASK]", text)
+    return text
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(args) -> int:
+    from utils.masking import MaskingEngine, get_engine, iter_slices, registered_rules
+
+    t0 = time.perf_counter()
+    corpus = _corpus(args.mb)
+    mb = len(corpus.encode()) / 1024 / 1024
+    notes = [corpus[i:i + 700] for i in range(0, len(corpus), 700)]      # ~2KB UTF-8
+    print(f"语料: {mb:.1f}MB，{len(notes)} 条短笔记（{time.perf_counter() - t0:.1f}s）")
+
+    legacy_engine = MaskingEngine([r for r in registered_rules() if r.name in ("phone", "money")])
+    engine = get_engine()
+    variants = {
+        "legacy": _legacy,
+        "engine-legacy": legacy_engine.mask,
+        "engine": engine.mask,
+        "tokenize": lambda text: engine.tokenize(text)[0],
+        "stream": lambda text: "".join(engine.stream(iter_slices(text))),
+    }
+
+    expected = [_legacy(n) for n in notes]
+    mismatched = sum(legacy_engine.mask(n) != e for n, e in zip(notes, expected))
+    print(f"engine-legacy 与原实现逐条比对: {len(notes) - mismatched}/{len(notes)} 一致")
+
+    rng = random.Random(11)
+    cuts = sorted(rng.sample(range(1, len(corpus)), min(5000, len(corpus) - 1)))
+    pieces = [corpus[a:b] for a, b in zip([0] + cuts, cuts + [len(corpus)])]
+    streamed = "".join(engine.stream(pieces)) == engine.mask(corpus)
+    print(f"stream 随机切 {len(pieces)} 块与整段 mask 比对: {'一致' if streamed else '不一致'}")
+
+    print(f"\n{'方式':<14} {'notes MB/s':>11} {'bulk MB/s':>10} {'命中数':>8}")
+    for name, fn in variants.items():
+        notes_s = _best(lambda: [fn(n) for n in notes], args.repeat)
+        bulk_s = _best(lambda: fn(corpus), args.repeat)
+        hits = len(re.findall(r"\[[A-Z_]+_(?:MASK|\d+)\]", fn(corpus)))
+        print(f"{name:<14} {mb / notes_s:>11.1f} {mb / bulk_s:>10.1f} {hits:>8}")
+    return 0 if not mismatched and streamed else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    sys.exit(main(parser.parse_args()))
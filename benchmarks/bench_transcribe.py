@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+长音频转写压测 — benchmarks/bench_transcribe.py
+================================================
+合成一段会议录音（默认 60 分钟粉红噪声：每 23 秒停顿 1.5 秒模拟换气，第 10~17 分钟连续无停顿，逼出硬切），
+用按音频时长计费的 Whisper 桩（耗时 = base + rtf × 音频秒数，不联网）对比：
+  • whole       — 原实现：整文件单次请求（超过 25MB 时线上会被直接拒绝，这里仍按时长模拟）
+  • serial      — audio_transcribe 分段，并发 1
+  • concurrent  — audio_transcribe 分段，并发 SRI_WHISPER_CONCURRENCY（默认 4）
+  • cached      — 同一音轨封装进会议视频（MP4，音频不重新编码）再次上传，命中整轨缓存
+
+需要 ffmpeg（或 SRI_FFMPEG 指向可执行文件）。
+
+用法:
+    python benchmarks/bench_transcribe.py [--minutes 60] [--rtf 0.01] [--base 0.5] [--concurrency 4]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+_TMP = tempfile.mkdtemp(prefix="sri_bench_whisper_")
+os.environ["SRI_DB_PATH"] = f"{_TMP}/sri_intel.db"
+os.environ["SRI_BLOB_DIR"] = f"{_TMP}/blob_store"
+
+
+def _synthesize(ffmpeg: str, out: str, minutes: float):
+    gate = "if(between(t,600,1020),1,lt(mod(t,23),21.5))"
+    subprocess.run(
+        [ffmpeg, "-hide_banner", "-nostdin", "-y", "-f", "lavfi",
+         "-i", f"anoisesrc=d={minutes * 60}:c=pink:a=0.3:r=16000",
+         "-af", f"volume='{gate}':eval=frame", "-ac", "1", "-c:a", "aac", "-b:a", "64k", out],
+        check=True, capture_output=True,
+    )
+
+
+def _flac_seconds(data: bytes) -> float:
+    """从 FLAC STREAMINFO 读取时长。"""
+    packed = int.from_bytes(data[18:26], "big")
+    return (packed & ((1 << 36) - 1)) / (packed >> 44)
+
+
+def _stub(rtf: float, base: float, whole_seconds: float):
+    calls = []
+
+    def whisper(name, f):
+        data = f.read()
+        seconds = _flac_seconds(data) if data[:4] == b"fLaC" else whole_seconds
+        calls.append(seconds)
+        time.sleep(base + rtf * seconds)
+        return "各位好，今天讨论变压器招标的技术参数。" * max(1, int(seconds / 6))
+
+    return whisper, calls
+
+
+def main(args) -> int:
+    import audio_transcribe
+    import database
+    from db_pool import get_pool
+
+    if not audio_transcribe.ffmpeg_available():
+        print("未找到 ffmpeg，请安装或设置 SRI_FFMPEG")
+        return 1
+    database.init_db()
+    ffmpeg = audio_transcribe._FFMPEG
+
+    m4a = os.path.join(_TMP, "meeting.m4a")
+    t0 = time.perf_counter()
+    _synthesize(ffmpeg, m4a, args.minutes)
+    print(f"合成录音: {args.minutes:.0f} 分钟，{os.path.getsize(m4a) / 1e6:.1f}MB（{time.perf_counter() - t0:.1f}s）")
+
+    print(f"\n{'方式':<11} {'段数':>4} {'硬切':>4} {'请求':>4} {'准备ms':>8} {'首段ms':>8} {'总耗时ms':>9} {'字符':>7}")
+
+    def report(name, fn):
+        first = []
+        started = time.perf_counter()
+        stats = audio_transcribe.TranscribeStats()
+        whisper, calls = _stub(args.rtf, args.base, args.minutes * 60)
+        text = fn(whisper, stats, lambda *_: first or first.append(time.perf_counter() - started))
+        first_ms = first[0] * 1000 if first else stats.elapsed_ms
+        print(f"{name:<11} {stats.chunks:>4} {stats.hard_cuts:>4} {len(calls):>4} {stats.prepare_ms:>8.0f} "
+              f"{first_ms:>8.0f} {stats.elapsed_ms:>9.0f} {len(text):>7}")
+
+    def reset_cache():
+        with get_pool().write() as conn:
+            conn.execute("DELETE FROM parse_cache")
+
+    report("whole", lambda w, s, p: _whole(m4a, w, s))
+    for name, workers in (("serial", 1), ("concurrent", args.concurrency)):
+        reset_cache()
+        report(name, lambda w, s, p, n=workers: audio_transcribe.transcribe(
+            m4a, w, on_partial=p, concurrency=n, stats=s))
+
+    mp4 = os.path.join(_TMP, "meeting.mp4")
+    subprocess.run([ffmpeg, "-hide_banner", "-nostdin", "-y", "-f", "lavfi", "-i", "color=c=black:s=160x120:r=2",
+                    "-i", m4a, "-shortest", "-c:a", "copy", mp4], check=True, capture_output=True)
+    report("cached", lambda w, s, p: audio_transcribe.transcribe(mp4, w, on_partial=p, stats=s))
+    return 0
+
+
+def _whole(path, whisper, stats) -> str:
+    """原实现：整文件一次请求（绕过 25MB 检查，仅用于对比耗时）。"""
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        text = whisper(os.path.basename(path), f)
+    stats.chunks = 1
+    stats.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    return text
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--rtf", type=float, default=0.01, help="桩耗时 / 音频时长（Whisper 实测约 0.05~0.1，此处缩小）")
+    parser.add_argument("--base", type=float, default=0.5, help="桩单次请求固定耗时（秒）")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("SRI_WHISPER_CONCURRENCY", "4")))
+    sys.exit(main(parser.parse_args()))
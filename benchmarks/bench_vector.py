@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+向量检索压测 — benchmarks/bench_vector.py
+==========================================
+以合成的聚簇向量直接构建 vector_store 主段（跳过嵌入），测量单次 top-k 延迟与召回：
+  • ivf      — 无过滤，探测 nprobe 个簇
+  • source   — 按来源过滤（kb / intel）
+  • category — 按资产类别过滤（低选择度，触发扩大探测）
+  • project  — 按项目过滤（走元数据精确扫描）
+
+召回 recall@k 以全量精确扫描（float32 矩阵乘）为基准，在 --verify 条查询上计算。
+
+用法:
+    python benchmarks/bench_vector.py --chunks 1000000 --dim 384 --queries 500 --verify 50
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+_TMP = tempfile.mkdtemp(prefix="sri_bench_")
+os.environ["SRI_VECTOR_DIR"] = f"{_TMP}/vector_index"
+
+_N_CATEGORIES = 16
+
+
+def _synthesize(n: int, dim: int, n_topics: int, rng: np.random.Generator):
+    """主题中心 + 噪声的单位向量（模拟真实语料的聚簇结构），以 float16 落盘到临时 memmap。"""
+    from vector_store import META_DTYPE, _normalize
+
+    topics = _normalize(rng.standard_normal((n_topics, dim)).astype(np.float32))
+    vecs = np.memmap(f"{_TMP}/src.f16", dtype=np.float16, mode="w+", shape=(n, dim))
+    meta = np.zeros(n, dtype=META_DTYPE)
+    step = 65536
+    for i in range(0, n, step):
+        m = min(step, n - i)
+        t = rng.integers(0, n_topics, m)
+        block = topics[t] + 0.6 * rng.standard_normal((m, dim)).astype(np.float32) / np.sqrt(dim)
+        vecs[i:i + m] = _normalize(block)
+    meta["chunk_id"] = np.arange(1, n + 1)
+    meta["source"] = rng.choice([1, 2], n, p=[0.2, 0.8])
+    meta["project_id"] = np.where(meta["source"] == 2, rng.integers(1, max(2, n // 200), n), 0)
+    meta["category"] = rng.integers(0, _N_CATEGORIES, n)
+    vecs.flush()
+    return topics, vecs, meta
+
+
+def _queries(topics, dim: int, count: int, rng: np.random.Generator) -> np.ndarray:
+    from vector_store import _normalize
+
+    t = rng.integers(0, len(topics), count)
+    return _normalize(topics[t] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32) / np.sqrt(dim))
+
+
+def _exact(vecs, meta, q: np.ndarray, k: int, mask=None) -> set[int]:
+    scores = np.empty(len(vecs), dtype=np.float32)
+    for i in range(0, len(vecs), 131072):
+        scores[i:i + 131072] = np.asarray(vecs[i:i + 131072], dtype=np.float32) @ q
+    if mask is not None:
+        scores[~mask] = -np.inf
+    top = np.argpartition(-scores, k - 1)[:k]
+    return {int(meta["chunk_id"][i]) for i in top if np.isfinite(scores[i])}
+
+
+def _percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50 {p50:7.2f} ms   p99 {p99:7.2f} ms   max {samples[-1]:7.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--verify", type=int, default=50)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from vector_store import _NPROBE, HashingEmbedder, SOURCES, VectorStore
+
+    rng = np.random.default_rng(args.seed)
+    t0 = time.perf_counter()
+    topics, vecs, meta = _synthesize(args.chunks, args.dim, args.topics, rng)
+    print(f"合成 {args.chunks:,} × {args.dim} 向量: {time.perf_counter() - t0:.1f}s")
+
+    store = VectorStore(os.environ["SRI_VECTOR_DIR"], embedder=HashingEmbedder(args.dim))
+    t0 = time.perf_counter()
+    store.build_from_arrays(vecs, meta)
+    print(f"构建 IVF 主段: {time.perf_counter() - t0:.1f}s   {store.stats()['nlist']} 簇, nprobe={_NPROBE}")
+
+    # 资产类别名写进 manifest，search_vector 按名称过滤
+    with store._writer():
+        m = store._read_manifest()
+        m["categories"] = [f"cat-{i}" for i in range(_N_CATEGORIES)]
+        store._write_manifest(m)
+
+    queries = _queries(topics, args.dim, args.queries, rng)
+    sample_pid = int(meta["project_id"][meta["project_id"] > 0][0])
+    cases = {
+        "ivf": ({}, None),
+        "source": ({"source": "kb"}, meta["source"] == SOURCES["kb"]),
+        "category": ({"category": "cat-3"}, meta["category"] == 3),
+        "project": ({"project_id": sample_pid}, meta["project_id"] == sample_pid),
+    }
+
+    store.search_vector(queries[0], args.k)                 # 预热：映射文件 + 加载质心
+    print(f"\n{'case':<10} {'latency':<52} recall@{args.k}")
+    for name, (kwargs, mask) in cases.items():
+        latencies = []
+        for q in queries:
+            t0 = time.perf_counter()
+            store.search_vector(q, args.k, **kwargs)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        hits = total = 0
+        for q in queries[:args.verify]:
+            truth = _exact(vecs, meta, q, args.k, mask)
+            got = {cid for cid, _ in store.search_vector(q, args.k, **kwargs)}
+            hits += len(truth & got)
+            total += len(truth)
+        recall = hits / total if total else 1.0
+        print(f"{name:<10} {_percentiles(latencies):<52} {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+事件循环阻塞回归检查 — benchmarks/check_loop_lag.py
+====================================================
+在临时 sri_intel.db 上并发调用 api.py 的全部 async 端点，LLM 请求指向本地一个
+按 --llm-delay 延迟应答的 OpenAI 兼容桩服务（模拟慢模型），期间：
+  • asyncio debug 模式记录每个执行超过阈值的回调（定位到具体端点）
+  • LoopLagMonitor 以 10ms 间隔采样事件循环延迟
+
+任一回调阻塞超过 --threshold-ms（默认 50ms）、或存在未纳入检查的 async 端点即判失败。
+循环延迟采样仅供参考：每轮并发发起时几十个请求的首段回调在同一轮循环里依次执行，
+单个都很短，但合计会体现为一次较大的唤醒偏差。
+新增 async 端点时在 _cases() 中补一条用例；阻塞调用改用 offload.run_db / run_cpu / run_llm。
+
+用法:
+    python benchmarks/check_loop_lag.py [--rounds 3] [--llm-delay 0.3] [-v]
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+_TMP = tempfile.mkdtemp(prefix="sri_lag_")
+os.environ["SRI_DB_PATH"] = f"{_TMP}/sri_intel.db"
+os.environ["SRI_BLOB_DIR"] = f"{_TMP}/blob_store"
+
+_SLOW_RE = re.compile(r"Executing (.*) took ([\d.]+) seconds")
+_TASK_NAME_RE = re.compile(r"name='([^']+)'")
+
+
+# ═══════════════════════════════════════════
+# 慢模型桩服务
+# ═══════════════════════════════════════════
+
+def _start_llm_stub(delay: float) -> str:
+    content = '{"people": [], "current_status": "检查", "gap_alerts": []}'
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            time.sleep(delay)
+            body = json.dumps({
+                "id": "chatcmpl-check", "object": "chat.completion", "created": 0, "model": "stub",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/v1"
+
+
+def _seed():
+    import database
+
+    database.init_db()
+    pid = database.add_project("检查项目", "方案报价", client="华东某数据中心")
+    for i in range(40):
+        database.save_intelligence(pid, f"第{i}次拜访：客户关注温升与交期，ABB 报价低 10%", json.dumps({
+            "current_status": f"技术评估第{i}轮，预算约 {300 + i} 万",
+            "decision_chain": [{"name": f"张{i % 5}", "title": "总工", "attitude": "中立", "soft_tags": []}],
+            "competitor_info": [{"name": "ABB", "quote": "低10%", "strengths": "品牌", "weaknesses": "交期"}],
+            "next_steps": f"第{i + 1}轮技术交流",
+            "gap_alerts": ["⚠️ 未确认最终预算"],
+        }, ensure_ascii=False))
+    return pid
+
+
+# ═══════════════════════════════════════════
+# 用例：(方法, 路由模板, 实际路径, 请求参数)
+# ═══════════════════════════════════════════
+
+def _cases(pid: int, base_url: str) -> list[tuple[str, str, str, dict]]:
+    llm_configs = {"openai": {"enabled": True, "apiKey": "sk-check", "baseUrl": base_url},
+                   "local": {"enabled": False}}
+    headers = {
+        "X-API-Key": "sk-check",
+        "X-LLM-Config": base64.b64encode(json.dumps(llm_configs).encode()).decode(),
+    }
+    counter = iter(range(1_000_000))
+
+    def post(template, body=None, **kw):
+        return ("POST", template, template, {"json": body or {}, "headers": headers, **kw})
+
+    def get(template, path=None):
+        return ("GET", template, path or template, {"headers": headers})
+
+    return [
+        get("/api/sandbox/projects/{project_id}", f"/api/sandbox/projects/{pid}"),
+        get("/api/kb/documents"),
+        get("/api/kb/documents", "/api/kb/documents?search=温升"),
+        get("/api/jobs/{job_id}/events", "/api/jobs/missing/events"),
+        ("POST", "/api/projects/create", "/api/projects/create",
+         {"json": {"name": f"检查新建{next(counter)}"}, "headers": headers}),
+        post("/api/projects/submit", {"name": "检查提报", "client": "华东某数据中心"}),
+        post("/api/projects/appeal", {"reason": "先报备"}),
+        post("/api/projects/approve", {"id": -1}),
+        post("/api/projects/reject", {"id": -1}),
+        post("/api/intel/daily_log", {"project_id": pid, "text": "今天拜访了总工", "llm_configs": llm_configs}),
+        post("/api/intel/save_baseline", {"project_id": pid, "position": "领先 有技术优势"}),
+        ("POST", "/api/upload_and_analyze", "/api/upload_and_analyze",
+         {"files": {"file": ("纪要.txt", "客户关注温升".encode())}, "data": {"project_id": str(pid)}, "headers": headers}),
+        ("POST", "/api/intel/upload_image", "/api/intel/upload_image",
+         {"files": {"file": ("现场.png", b"\x89PNG\r\n")}, "data": {"project_id": str(pid)}, "headers": headers}),
+        ("POST", "/api/intel/upload_media", "/api/intel/upload_media",
+         {"files": {"file": ("录音.mp3", b"ID3")}, "data": {"project_id": str(pid)}, "headers": headers}),
+        post("/api/ai/generate_nba", {"project_id": pid}),
+        post("/api/sandbox/stakeholders/save", {"project_id": pid, "stakeholders": [{"name": "张总", "title": "总工"}]}),
+        post("/api/ai/generate_followup", {"project_id": pid}),
+        post("/api/ai/generate_tech_summary", {"project_id": pid}),
+        post("/api/ai/generate_insider_ammo", {"project_id": pid}),
+        post("/api/ai/chat", {"project_id": pid, "messages": [{"role": "user", "content": "怎么推进？"}]}),
+        post("/api/ai/generate_quiz", {"project_id": pid}),
+        post("/api/ai/coach_evaluate", {"project_id": pid, "quiz": "题目", "answer": "我的话术"}),
+        post("/api/ai/generate_power_map", {"project_name": "检查项目", "stakeholders_csv": "张总,总工,支持"}),
+        post("/api/ai/extract_stakeholders", {"project_id": pid}),
+        post("/api/ai/generate_pitch", {"project_id": pid, "pitch_type": "wechat_msg", "target_role": "张总|总工|中立"}),
+    ]
+
+
+def _uncovered(app, cases) -> list[str]:
+    """api.py 中未纳入用例的 async 端点（sync 端点由框架放进线程池，不占事件循环）。"""
+    import inspect
+
+    from fastapi.routing import APIRoute
+
+    covered = {(method, template) for method, template, _, _ in cases}
+    missing = []
+    for route in app.routes:
+        if isinstance(route, APIRoute) and inspect.iscoroutinefunction(route.endpoint):
+            for method in route.methods:
+                if (method, route.path) not in covered:
+                    missing.append(f"{method} {route.path}")
+    return sorted(missing)
+
+
+class _SlowCallbacks(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.records: list[tuple[str, float]] = []
+
+    def emit(self, record):
+        m = _SLOW_RE.search(record.getMessage())
+        if m:
+            name = _TASK_NAME_RE.search(m.group(1))
+            self.records.append((name.group(1) if name else m.group(1)[:120], float(m.group(2)) * 1000))
+
+
+async def _run(args, cases) -> tuple[list, dict, list]:
+    import httpx
+
+    import api
+    from offload import LoopLagMonitor
+
+    loop = asyncio.get_running_loop()
+    transport = httpx.ASGITransport(app=api.app)
+    statuses = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=60) as client:
+        async def call(case):
+            method, template, path, kw = case
+            r = await client.request(method, path, **kw)
+            statuses.append((f"{method} {template}", r.status_code))
+
+        # 预热：首次导入 / 建连接 / 编码表加载不计入
+        for case in cases:
+            await call(case)
+        statuses.clear()
+
+        slow = _SlowCallbacks()
+        asyncio_logger = logging.getLogger("asyncio")
+        asyncio_logger.addHandler(slow)
+        asyncio_logger.setLevel(logging.WARNING)
+        asyncio_logger.propagate = False
+        loop.set_debug(True)
+        loop.slow_callback_duration = args.threshold_ms / 1000
+        monitor = LoopLagMonitor(interval=0.01, warn=float("inf"))
+        monitor.start()
+        try:
+            for _ in range(args.rounds):
+                await asyncio.gather(*(
+                    asyncio.create_task(call(case), name=f"{case[0]} {case[1]}") for case in cases
+                ))
+            await asyncio.sleep(0.05)
+        finally:
+            monitor.stop()
+            loop.set_debug(False)
+            asyncio_logger.removeHandler(slow)
+    return slow.records, monitor.stats(), statuses
+
+
+def main(args) -> int:
+    logging.basicConfig(level=logging.ERROR)
+    base_url = _start_llm_stub(args.llm_delay)
+    os.environ["OPENAI_BASE_URL"] = base_url        # llm_service 单 Key 模式的客户端走 SDK 默认 base_url
+    pid = _seed()
+
+    import api
+
+    cases = _cases(pid, base_url)
+    missing = _uncovered(api.app, cases)
+    if missing:
+        print("以下 async 端点未纳入检查，请在 _cases() 中补充用例：")
+        for m in missing:
+            print(f"  {m}")
+        return 1
+
+    t0 = time.perf_counter()
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stderr(io.StringIO())
+    with quiet:                                     # LLM 路由的逐次调用日志写 stderr
+        slow, lag, statuses = asyncio.run(_run(args, cases))
+    elapsed = time.perf_counter() - t0
+    if args.verbose:
+        for name, code in sorted(set(statuses)):
+            print(f"  {code}  {name}")
+    print(f"{len(cases)} 个端点 × {args.rounds} 轮并发，LLM 延迟 {args.llm_delay * 1000:.0f}ms，"
+          f"耗时 {elapsed:.1f}s")
+    print(f"事件循环延迟: p50 {lag['p50_ms']}ms  p99 {lag['p99_ms']}ms  max {lag['max_ms']}ms")
+    if slow:
+        print(f"\n✗ {len(slow)} 个回调阻塞事件循环超过 {args.threshold_ms:.0f}ms：")
+        for name, ms in sorted(slow, key=lambda x: -x[1]):
+            print(f"  {ms:7.1f}ms  {name}")
+        return 1
+    print(f"✓ 无回调阻塞超过 {args.threshold_ms:.0f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--llm-delay", type=float, default=0.3)
+    parser.add_argument("--threshold-ms", type=float, default=50)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    sys.exit(main(parser.parse_args()))
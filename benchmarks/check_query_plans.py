@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+查询计划回归检查 — benchmarks/check_query_plans.py
+===================================================
+在临时 SQLite 库上以各角色调用 routers/* 端点，捕获期间执行的全部 SQL，
+逐条 EXPLAIN QUERY PLAN：任何业务表出现无索引的全表扫描 (SCAN <table>) 即判失败。
+
+新增路由或改动 WHERE / ORDER BY 后运行；退出码非 0 说明需要补索引迁移
+（models.py 的 __table_args__ + migrations/versions/ 新版本）。
+
+用法:
+    python benchmarks/check_query_plans.py [-v]
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+_TMP = tempfile.mkdtemp(prefix="sri_plans_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/plans.db"
+os.environ["SRI_AI_CACHE_DB"] = f"{_TMP}/ai_cache.db"
+
+# 有意的全表操作（白名单需附理由）
+_ALLOWED_SCANS: set[tuple[str, str]] = set()
+
+_SCAN_RE = re.compile(r"^SCAN (\w+)$")
+
+
+def _seed():
+    from db import SessionLocal, init_db
+    from models import (
+        Appeal, AppealStatus, IntelLog, Project, ProjectApproval, SOSStatus,
+        SOSTicket, Stakeholder, User, UserRole,
+    )
+    from utils.security import hash_password
+
+    init_db()
+    db = SessionLocal()
+    users = {
+        role: User(name=f"{role.value}用户", phone=f"1380000{i:04d}", role=role,
+                   dept="华东战区", password_hash=hash_password("pass1234"))
+        for i, role in enumerate(UserRole)
+    }
+    db.add_all(users.values())
+    db.flush()
+    sales = users[UserRole.SALES]
+    for i in range(30):
+        p = Project(
+            name=f"客户{i} - 项目{i}", client=f"客户{i}", project_title=f"项目{i}",
+            owner_id=sales.id, dept="华东战区", applicant_name=sales.name,
+            approval_status=ProjectApproval.PENDING if i % 3 else ProjectApproval.APPROVED,
+        )
+        db.add(p)
+        db.flush()
+        db.add(Stakeholder(project_id=p.id, name=f"关键人{i}"))
+        db.add(IntelLog(project_id=p.id, author_id=sales.id, raw_input=f"情报{i}"))
+        db.add(SOSTicket(ticket_no=f"T-2026-{i:04d}", project_id=p.id, requester_id=sales.id,
+                         client_query="求援", status=SOSStatus.RESOLVED if i % 2 else SOSStatus.URGENT))
+        db.add(Appeal(project_id=p.id, new_project_name=f"新项目{i}", conflict_with=p.name,
+                      applicant=sales.name, original_owner="原归属人", reason="先报备",
+                      status=AppealStatus.PENDING))
+    db.commit()
+    tokens = {role: _token(u) for role, u in users.items()}
+    db.close()
+    return tokens
+
+
+def _token(user) -> str:
+    from utils.dependencies import create_access_token
+    return create_access_token(user.id, user.role.value, user.dept)
+
+
+def _capture(statements: list):
+    from sqlalchemy import event
+
+    from db import engine, get_async_engine
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(get_async_engine().sync_engine, "before_cursor_execute", before)
+
+
+def _exercise(tokens: dict):
+    """按角色覆盖各路由的查询形态（含筛选、翻页游标、稀疏字段与典型写操作）。"""
+    from fastapi.testclient import TestClient
+
+    import main
+    from models import UserRole
+
+    client = TestClient(main.app)
+
+    def call(method, path, role, **kw):
+        headers = {"Authorization": f"Bearer {tokens[role]}"}
+        return client.request(method, path, headers=headers, **kw)
+
+    client.post("/api/auth/login", json={"phone": "13800000000", "password": "pass1234"})
+    for role in UserRole:
+        call("GET", "/api/auth/me", role)
+        r = call("GET", "/api/projects", role, params={"limit": 5})
+        cursor = r.headers.get("X-Next-Cursor")
+        if cursor:
+            call("GET", "/api/projects", role, params={"limit": 5, "after": cursor})
+        call("GET", "/api/projects", role, params={"stage": "lead", "fields": "id,name"})
+        call("GET", "/api/projects", role, params={"approval": "pending"})
+        call("GET", "/api/search", role, params={"q": "情报 关键人"})
+
+    vp, director, sales, admin = UserRole.VP, UserRole.DIRECTOR, UserRole.SALES, UserRole.ADMIN
+    for role in (vp, director):
+        call("GET", "/api/projects/pending", role)
+        call("GET", "/api/appeals/pending", role, params={"limit": 5})
+        call("GET", "/api/sos", role, params={"status": "urgent"})
+        call("GET", "/api/sos", role)
+        call("GET", "/api/users/org-chart", role)
+    call("GET", "/api/users", admin, params={"limit": 3})
+    call("GET", "/api/projects/1", sales)
+    call("GET", "/api/projects/1/intel", sales, params={"limit": 5})
+    call("GET", "/api/projects/1/stakeholders", sales)
+
+    # 写路径中的查询：撞单查重、申诉裁决、BOM 整单替换、批量清理
+    call("POST", "/api/projects", sales, json={"client": "客户1", "project_title": "项目1"})
+    call("POST", "/api/appeals/1/grant", vp, json={"verdict_note": "证据充分"})
+    deal = call("POST", "/api/dealdesk", sales, json={
+        "project_id": 2, "bom_items": [{"product_model": "X-1", "sales_qty": 1, "unit_price": 10}],
+    })
+    if deal.status_code == 201:
+        call("PATCH", f"/api/dealdesk/{deal.json()['id']}/bom", sales,
+             json=[{"product_model": "X-2", "sales_qty": 2, "unit_price": 10}])
+    call("POST", "/api/projects/2/stakeholders/batch", sales, json=[{"name": "新关键人"}])
+    call("DELETE", "/api/sos/resolved", director)
+
+
+def _full_scans(statements: list, verbose: bool) -> list[tuple[str, str]]:
+    from db import engine
+    from models import Base
+
+    tables = set(Base.metadata.tables)
+    failures, seen = [], set()
+    with engine.connect() as conn:
+        raw = conn.connection.dbapi_connection
+        for statement, params in statements:
+            if statement in seen:
+                continue
+            seen.add(statement)
+            plan = [row[3] for row in raw.execute(f"EXPLAIN QUERY PLAN {statement}", params)]
+            if verbose:
+                print(f"\n{' '.join(statement.split())[:160]}")
+                for line in plan:
+                    print(f"    {line}")
+            for line in plan:
+                m = _SCAN_RE.match(line)
+                if m and m.group(1) in tables and (m.group(1), statement) not in _ALLOWED_SCANS:
+                    failures.append((m.group(1), statement))
+    return failures
+
+
+def main(args) -> int:
+    tokens = _seed()
+    statements: list = []
+    _capture(statements)
+    _exercise(tokens)
+
+    failures = _full_scans(statements, args.verbose)
+    print(f"\n检查 SQL {len({s for s, _ in statements})} 条（执行 {len(statements)} 次）")
+    if failures:
+        print(f"❌ 发现 {len(failures)} 处全表扫描:")
+        for table, statement in failures:
+            print(f"   - {table}: {' '.join(statement.split())[:200]}")
+        return 1
+    print("✅ 无全表扫描")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-v", "--verbose", action="store_true", help="打印每条 SQL 的查询计划")
+    sys.exit(main(parser.parse_args()))
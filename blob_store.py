@@ -0,0 +1,170 @@
+"""
+内容寻址附件存储 — blob_store.py
+================================
+上传附件（标书 PDF / 现场照片 / 录音）按内容只存一份，解析结果按内容缓存：
+  1. 内容寻址       → blobs/ab/cd/<sha256>（两级分片，单目录文件数可控）；分块边哈希边写临时文件，
+                      同内容已存在则丢弃临时文件，否则原子改名入库
+  2. 硬链接引用     → 情报入库时在 attachments/<项目>/ 下为附件建硬链接（保留原文件名，不占额外空间）；
+                      blob 的链接数 - 1 即引用数，无引用且超过 SRI_BLOB_TTL_DAYS 的 blob 由 prune() 清理；
+                      文件系统不支持硬链接时退化为复制
+  3. 解析缓存       → sri_intel.db 的 parse_cache 表按 (内容哈希, 任务类型, 提示词版本) 缓存提取文本与
+                      LLM 解析结果：同一文件再次上传（任意项目）直接复用，不再解析、不再计费；
+                      提示词 / 模型 / 截断预算变化即版本变化，旧缓存自然失效
+
+用法：
+    file_hash, size = put_stream(upload.file, max_bytes=MAX_UPLOAD_BYTES)
+    url = attach(file_hash, project_id, "招标文件.pdf")      # → "attachments/3/9f86d081884c_招标文件.pdf"
+    cache_put(file_hash, "document", version, {"text": ..., "parsed": ...})
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO
+
+from db_pool import get_pool
+
+logger = logging.getLogger("blob_store")
+
+_PROJECT_ROOT = Path(__file__).resolve().parent
+
+# ── 参数（可通过环境变量覆盖）──
+BLOB_DIR = Path(os.environ.get("SRI_BLOB_DIR", str(_PROJECT_ROOT / "blob_store")))
+_TTL_DAYS = float(os.environ.get("SRI_BLOB_TTL_DAYS", "7"))     # 无引用 blob（解析失败的上传）保留天数
+_CHUNK = 1024 * 1024
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+_UNSAFE_NAME = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+class BlobTooLarge(ValueError):
+    """写入内容超过 max_bytes。"""
+
+
+def install(cursor):
+    """建表（幂等），由 database._create_schema 调用。"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS parse_cache (
+            file_hash    TEXT NOT NULL,
+            kind         TEXT NOT NULL,
+            version      TEXT NOT NULL,
+            payload_json TEXT NOT NULL,
+            hits         INTEGER DEFAULT 0,
+            created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_hit_at  TIMESTAMP,
+            PRIMARY KEY (file_hash, kind, version)
+        )
+    """)
+
+
+# ═══════════════════════════════════════════
+# 1. 内容寻址存储
+# ═══════════════════════════════════════════
+
+def path(file_hash: str) -> Path:
+    """blob 的存储路径（不保证存在）。"""
+    if not _HASH_RE.match(file_hash):
+        raise ValueError(f"非法内容哈希: {file_hash!r}")
+    return BLOB_DIR / "blobs" / file_hash[:2] / file_hash[2:4] / file_hash
+
+
+def exists(file_hash: str) -> bool:
+    return path(file_hash).is_file()
+
+
+def put_stream(src: BinaryIO, *, max_bytes: int | None = None) -> tuple[str, int]:
+    """分块写入并计算 SHA-256，返回 (哈希, 字节数)；同内容已存在时不重复存储。超限抛 BlobTooLarge。"""
+    tmp_dir = BLOB_DIR / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp = tmp_dir / f"{uuid.uuid4().hex}.tmp"
+    digest, size = hashlib.sha256(), 0
+    try:
+        with open(tmp, "wb") as out:
+            while chunk := src.read(_CHUNK):
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise BlobTooLarge(f"内容超过 {max_bytes} 字节上限")
+                digest.update(chunk)
+                out.write(chunk)
+        file_hash = digest.hexdigest()
+        target = path(file_hash)
+        if target.exists():
+            tmp.unlink()
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, target)
+        return file_hash, size
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def attach(file_hash: str, project_id: int | None, filename: str) -> str:
+    """
+    在 attachments/<项目>/ 下为 blob 建硬链接（幂等），返回相对 BLOB_DIR 的路径，作为情报的附件地址。
+    同一项目同名同内容只建一次；文件名前缀内容哈希，不同内容的同名文件互不覆盖。
+    """
+    name = _UNSAFE_NAME.sub("_", Path(filename or "unknown").name)[-120:] or "unknown"
+    rel = Path("attachments") / str(project_id or 0) / f"{file_hash[:12]}_{name}"
+    dest = BLOB_DIR / rel
+    if not dest.exists():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f".{uuid.uuid4().hex}.tmp")
+        try:
+            os.link(path(file_hash), tmp)
+        except OSError:                 # 跨设备 / 不支持硬链接：退化为复制
+            shutil.copyfile(path(file_hash), tmp)
+        os.replace(tmp, dest)
+    return rel.as_posix()
+
+
+def prune(keep: set[str], ttl_days: float = _TTL_DAYS) -> int:
+    """删除无附件引用（链接数为 1）、不在 keep 中且超过保留期的 blob 及残留临时文件，返回删除数。"""
+    cutoff = time.time() - ttl_days * 86400
+    removed = 0
+    for p in (BLOB_DIR / "tmp").glob("*.tmp"):
+        if p.stat().st_mtime < cutoff:
+            p.unlink(missing_ok=True)
+    for p in (BLOB_DIR / "blobs").glob("*/*/*"):
+        st = p.stat()
+        if st.st_nlink == 1 and p.name not in keep and st.st_mtime < cutoff:
+            p.unlink(missing_ok=True)
+            removed += 1
+    if removed:
+        logger.info("清理 %d 个无引用附件 blob", removed)
+    return removed
+
+
+# ═══════════════════════════════════════════
+# 2. 解析缓存
+# ═══════════════════════════════════════════
+
+def cache_get(file_hash: str, kind: str, version: str) -> dict | None:
+    """命中返回缓存的解析结果并累计命中次数，未命中返回 None。"""
+    with get_pool().read() as conn:
+        row = conn.execute(
+            "SELECT payload_json FROM parse_cache WHERE file_hash = ? AND kind = ? AND version = ?",
+            (file_hash, kind, version),
+        ).fetchone()
+    if row is None:
+        return None
+    with get_pool().write() as conn:
+        conn.execute(
+            "UPDATE parse_cache SET hits = hits + 1, last_hit_at = CURRENT_TIMESTAMP "
+            "WHERE file_hash = ? AND kind = ? AND version = ?",
+            (file_hash, kind, version),
+        )
+    return json.loads(row[0])
+
+
+def cache_put(file_hash: str, kind: str, version: str, payload: dict):
+    with get_pool().write() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO parse_cache (file_hash, kind, version, payload_json) VALUES (?, ?, ?, ?)",
+            (file_hash, kind, version, json.dumps(payload, ensure_ascii=False)),
+        )
@@ -1,10 +1,83 @@
-import sqlite3
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import blob_store
+import job_queue
+from db_pool import get_pool
+from services import intel_summary, search
+
+logger = logging.getLogger("database")
+
+
+# ── 阶段映射：将自由文本的 current_stage 归集到 4 大漏斗桶 ──
+# 同步到 stage_buckets 查找表，供看板聚合在 SQL 内完成归集
+
+STAGE_BUCKETS = {
+    "线索获取": ["线索", "初期接触", "线索获取"],
+    "方案报价": ["方案报价", "技术僵持"],
+    "商务谈判": ["商务谈判", "逼单/签约", "逼单"],
+    "合同签约": ["合同签约", "签约", "立项", "已签约"],
+}
+
+STAGE_ORDER = ["线索获取", "方案报价", "商务谈判", "合同签约"]
+DEFAULT_STAGE_BUCKET = "线索获取"
+
+# 看板聚合缓存 TTL（秒）；写路径会主动失效，TTL 只兜底进程外写入
+_DASHBOARD_CACHE_TTL_S = float(os.environ.get("SRI_DASHBOARD_CACHE_TTL_S", "30"))
+
+
+# 知识库种子文档 (title, category, icon, file_type, file_size, description)
+KB_SEED_DOCS = [
+    ("暖通空调产品选型手册 v3.2", "产品参数", "📄", "PDF", "12.4 MB",
+     "全系列产品技术参数、选型公式与安装规范"),
+    ("中央空调能效对标表", "产品参数", "📊", "XLSX", "3.8 MB",
+     "COP/EER 能效等级全品牌横向对比"),
+    ("变频多联机技术白皮书", "产品参数", "📑", "PDF", "7.6 MB",
+     "新一代变频技术原理与节能数据"),
+    ("格力 vs 美的 竞品打单卡", "竞品打单卡", "⚔️", "PDF", "5.2 MB",
+     "核心技术差异、报价策略、客户痛点话术"),
+    ("大金 VRV 系列攻防手册", "竞品打单卡", "🛡️", "PDF", "4.1 MB",
+     "大金产品弱点分析及我方优势话术"),
+    ("海尔磁悬浮竞品对抗指南", "竞品打单卡", "🎯", "DOCX", "2.9 MB",
+     "磁悬浮机组技术对比与商务策略"),
+    ("2025年度中标项目汇编", "历史中标库", "🏆", "PDF", "28.6 MB",
+     "全年 47 个中标项目复盘，含报价与中标策略"),
+    ("医院系统中标案例集", "历史中标库", "🏥", "PDF", "15.3 MB",
+     "三甲医院暖通项目中标方案与经验总结"),
+    ("数据中心制冷中标案例", "历史中标库", "🖥️", "PDF", "18.7 MB",
+     "大型数据中心精密空调中标复盘"),
+    ("企业三证合一资质包", "资质文件", "📋", "ZIP", "45.2 MB",
+     "营业执照、安全许可证、ISO 认证全套"),
+    ("ISO9001/14001 认证证书", "资质文件", "🏅", "PDF", "8.4 MB",
+     "质量管理与环境管理体系认证"),
+    ("特种设备安装改造许可证", "资质文件", "🔧", "PDF", "2.1 MB",
+     "A2 级压力容器安装许可"),
+]
+
+
+def classify_stage(raw_stage: str) -> str:
+    """将数据库中的自由文本阶段归集到标准桶"""
+    if not raw_stage:
+        return DEFAULT_STAGE_BUCKET
+    for bucket, keywords in STAGE_BUCKETS.items():
+        for kw in keywords:
+            if kw in raw_stage:
+                return bucket
+    return DEFAULT_STAGE_BUCKET  # fallback
 
 
 def init_db():
     """初始化 SRI 情报系统数据库，创建核心表结构。"""
-    conn = sqlite3.connect("sri_intel.db")
-    cursor = conn.cursor()
+    with get_pool().write() as conn:
+        _create_schema(conn.cursor())
+
+
+def _create_schema(cursor):
+    """建表 + 兼容升级 + 种子数据（在写连接事务内执行）。"""
 
     # 项目表
     cursor.execute("""
@@ -39,13 +112,17 @@ def init_db():
         )
     """)
 
-    # ── 兼容升级：为旧表补充 created_at 列 ──
+    # ── 兼容升级：为旧表补充 created_at 列、上传附件列（对应 models.IntelLog.attachment_*）──
     cursor.execute("PRAGMA table_info(visit_logs)")
     columns = [row[1] for row in cursor.fetchall()]
     if "created_at" not in columns:
         cursor.execute(
             "ALTER TABLE visit_logs ADD COLUMN created_at TIMESTAMP"
         )
+    if "attachment_hash" not in columns:
+        cursor.execute("ALTER TABLE visit_logs ADD COLUMN attachment_hash TEXT")
+    if "attachment_url" not in columns:
+        cursor.execute("ALTER TABLE visit_logs ADD COLUMN attachment_url TEXT")
 
     # 测验记录表
     cursor.execute("""
@@ -62,8 +139,6 @@ def init_db():
         )
     """)
 
-    conn.commit()
-
     # ── Entity-First 架构升级：为 projects 表追加实体字段 ──
     cursor.execute("PRAGMA table_info(projects)")
     existing_cols = {row[1] for row in cursor.fetchall()}
@@ -77,7 +152,6 @@ def init_db():
     for col_name, col_type in entity_columns.items():
         if col_name not in existing_cols:
             cursor.execute(f"ALTER TABLE projects ADD COLUMN {col_name} {col_type}")
-    conn.commit()
 
     # ── 知识库表 ──
     cursor.execute("""
@@ -94,45 +168,79 @@ def init_db():
             updated_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
-    conn.commit()
+
+    # ── 沙盘汇总物化表（每项目一行，随情报写入增量更新）──
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sandbox_summary (
+            project_id      INTEGER PRIMARY KEY,
+            gap_alerts      TEXT DEFAULT '[]',
+            competitors     TEXT DEFAULT '[]',
+            current_status  TEXT,
+            next_steps      TEXT,
+            max_price       REAL,
+            log_count       INTEGER DEFAULT 0,
+            last_log_id     INTEGER DEFAULT 0,
+            latest_log_time TIMESTAMP,
+            updated_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # ── 情报分层滚动摘要（周 / 月 / 全周期，随情报写入增量折叠，见 services/intel_summary.py）──
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS intel_summaries (
+            summary_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id    INTEGER NOT NULL,
+            level         TEXT NOT NULL,
+            period_key    TEXT NOT NULL,
+            period_start  TIMESTAMP,
+            log_count     INTEGER DEFAULT 0,
+            last_log_id   INTEGER DEFAULT 0,
+            state_json    TEXT NOT NULL,
+            summary_text  TEXT NOT NULL,
+            updated_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (project_id, level, period_key)
+        )
+    """)
+
+    # ── 上传任务队列 / 附件解析缓存（见 job_queue.py、blob_store.py）──
+    job_queue.install(cursor)
+    blob_store.install(cursor)
+
+    # ── 阶段归集查找表（每次启动按 STAGE_BUCKETS 重建，priority 越小越优先）──
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stage_buckets (
+            keyword  TEXT PRIMARY KEY,
+            bucket   TEXT NOT NULL,
+            priority INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("DELETE FROM stage_buckets")
+    cursor.executemany(
+        # 同一关键词出现在多个桶时保留先出现的桶，与 classify_stage 一致
+        "INSERT OR IGNORE INTO stage_buckets (keyword, bucket, priority) VALUES (?, ?, ?)",
+        [
+            (kw, bucket, priority)
+            for priority, (bucket, keywords) in enumerate(STAGE_BUCKETS.items())
+            for kw in keywords
+        ],
+    )
+
+    # ── 看板聚合索引：阶段分组走覆盖索引，关键人去重免排序 ──
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_projects_current_stage ON projects(current_stage)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stakeholders_project ON stakeholders(project_id)")
 
     # ── 种子数据（幂等：仅空表时插入）──
     cursor.execute("SELECT COUNT(*) FROM knowledge_base")
     if cursor.fetchone()[0] == 0:
-        seed_docs = [
-            ("暖通空调产品选型手册 v3.2", "产品参数", "📄", "PDF", "12.4 MB",
-             "全系列产品技术参数、选型公式与安装规范"),
-            ("中央空调能效对标表", "产品参数", "📊", "XLSX", "3.8 MB",
-             "COP/EER 能效等级全品牌横向对比"),
-            ("变频多联机技术白皮书", "产品参数", "📑", "PDF", "7.6 MB",
-             "新一代变频技术原理与节能数据"),
-            ("格力 vs 美的 竞品打单卡", "竞品打单卡", "⚔️", "PDF", "5.2 MB",
-             "核心技术差异、报价策略、客户痛点话术"),
-            ("大金 VRV 系列攻防手册", "竞品打单卡", "🛡️", "PDF", "4.1 MB",
-             "大金产品弱点分析及我方优势话术"),
-            ("海尔磁悬浮竞品对抗指南", "竞品打单卡", "🎯", "DOCX", "2.9 MB",
-             "磁悬浮机组技术对比与商务策略"),
-            ("2025年度中标项目汇编", "历史中标库", "🏆", "PDF", "28.6 MB",
-             "全年 47 个中标项目复盘，含报价与中标策略"),
-            ("医院系统中标案例集", "历史中标库", "🏥", "PDF", "15.3 MB",
-             "三甲医院暖通项目中标方案与经验总结"),
-            ("数据中心制冷中标案例", "历史中标库", "🖥️", "PDF", "18.7 MB",
-             "大型数据中心精密空调中标复盘"),
-            ("企业三证合一资质包", "资质文件", "📋", "ZIP", "45.2 MB",
-             "营业执照、安全许可证、ISO 认证全套"),
-            ("ISO9001/14001 认证证书", "资质文件", "🏅", "PDF", "8.4 MB",
-             "质量管理与环境管理体系认证"),
-            ("特种设备安装改造许可证", "资质文件", "🔧", "PDF", "2.1 MB",
-             "A2 级压力容器安装许可"),
-        ]
         cursor.executemany(
             "INSERT INTO knowledge_base (title, category, icon, file_type, file_size, description) "
             "VALUES (?, ?, ?, ?, ?, ?)",
-            seed_docs,
+            KB_SEED_DOCS,
         )
-        conn.commit()
 
-    conn.close()
+    # ── 知识库全文检索（FTS5 + 触发器增量队列，见 services/search.py）──
+    search.install(cursor.execute, search.LEGACY_SOURCES)
+    search.sync_pending(cursor.execute, search.LEGACY_SOURCES)
 
 
 # ── 项目管理 ──
@@ -142,102 +250,83 @@ def add_project(project_name: str, current_stage: str,
                 general_contractor: str = "", applicant: str = "",
                 dept: str = ""):
     """新建作战项目 (Entity-First：含完整实体元数据)。"""
-    conn = sqlite3.connect("sri_intel.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO projects (project_name, current_stage, client, "
-        "design_institute, general_contractor, applicant, dept) "
-        "VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (project_name, current_stage, client, design_institute,
-         general_contractor, applicant, dept),
-    )
-    new_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with get_pool().write() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO projects (project_name, current_stage, client, "
+            "design_institute, general_contractor, applicant, dept) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (project_name, current_stage, client, design_institute,
+             general_contractor, applicant, dept),
+        )
+        new_id = cursor.lastrowid
+    invalidate_dashboard_stats()
     return new_id
 
 
 def get_projects():
     """获取所有项目列表，返回 [(id, name), ...]。"""
-    conn = sqlite3.connect("sri_intel.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT project_id, project_name FROM projects")
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    with get_pool().read() as conn:
+        return conn.execute("SELECT project_id, project_name FROM projects").fetchall()
 
 
 # ── 拜访日志 ──
 
 def insert_visit_log(project_id: int, raw_input: str, ai_parsed_data: str):
-    """将原始口述和 AI 提炼结果写入 visit_logs 表。"""
-    conn = sqlite3.connect("sri_intel.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO visit_logs (project_id, raw_input, ai_parsed_data) VALUES (?, ?, ?)",
-        (project_id, raw_input, ai_parsed_data),
-    )
-    conn.commit()
-    conn.close()
+    """将原始口述和 AI 提炼结果写入 visit_logs 表（同事务增量更新沙盘汇总与情报摘要）。"""
+    parsed = _parse_intel_json(ai_parsed_data)
+    with get_pool().write() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO visit_logs (project_id, raw_input, ai_parsed_data) VALUES (?, ?, ?)",
+            (project_id, raw_input, ai_parsed_data),
+        )
+        log_id = cursor.lastrowid
+        _fold_summaries(cursor, project_id, log_id, raw_input, parsed)
+    invalidate_dashboard_stats()
 
 
 def get_all_logs(project_id: int | None = None):
     """查询拜访日志，可按项目筛选，按 ID 倒序返回。"""
-    conn = sqlite3.connect("sri_intel.db")
-    cursor = conn.cursor()
-    if project_id:
-        cursor.execute(
-            "SELECT log_id, created_at, raw_input, ai_parsed_data "
-            "FROM visit_logs WHERE project_id = ? ORDER BY log_id DESC",
-            (project_id,),
-        )
-    else:
-        cursor.execute(
-            "SELECT log_id, created_at, raw_input, ai_parsed_data "
-            "FROM visit_logs ORDER BY log_id DESC"
-        )
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    with get_pool().read() as conn:
+        if project_id:
+            cursor = conn.execute(
+                "SELECT log_id, created_at, raw_input, ai_parsed_data "
+                "FROM visit_logs WHERE project_id = ? ORDER BY log_id DESC",
+                (project_id,),
+            )
+        else:
+            cursor = conn.execute(
+                "SELECT log_id, created_at, raw_input, ai_parsed_data "
+                "FROM visit_logs ORDER BY log_id DESC"
+            )
+        return cursor.fetchall()
 
 
 def get_logs_by_project(project_id: int):
     """查询指定项目的拜访日志，按 ID 倒序返回。"""
-    conn = sqlite3.connect("sri_intel.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT log_id, created_at, raw_input, ai_parsed_data "
-        "FROM visit_logs WHERE project_id = ? ORDER BY log_id DESC",
-        (project_id,),
-    )
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    with get_pool().read() as conn:
+        return conn.execute(
+            "SELECT log_id, created_at, raw_input, ai_parsed_data "
+            "FROM visit_logs WHERE project_id = ? ORDER BY log_id DESC",
+            (project_id,),
+        ).fetchall()
 
 
 # ── 综合情报存储 ──
 
-def save_intelligence(project_id: int, raw_text: str, parsed_json_str: str):
-    """将拜访日志 + 关键人档案一起入库。"""
-    import json
-
-    conn = sqlite3.connect("sri_intel.db")
-    cursor = conn.cursor()
-
-    # 1. 存拜访日志
-    cursor.execute(
-        "INSERT INTO visit_logs (project_id, raw_input, ai_parsed_data) VALUES (?, ?, ?)",
-        (project_id, raw_text, parsed_json_str),
-    )
-
-    # 2. 提取并存关键人
-    try:
-        parsed = json.loads(parsed_json_str)
-    except (json.JSONDecodeError, TypeError):
-        parsed = {}
+def save_intelligence(project_id: int, raw_text: str, parsed_json_str: str, *,
+                      attachment_hash: str | None = None, attachment_url: str | None = None):
+    """
+    将拜访日志 + 关键人档案一起入库（同事务增量更新沙盘汇总与情报摘要）。
+    上传解析产生的情报同时记录附件内容哈希与 blob_store 中的附件路径。
+    """
+    # 先在锁外解析 JSON，缩短写锁持有时间
+    parsed = _parse_intel_json(parsed_json_str)
 
     # 兼容旧格式 stakeholders 和新格式 decision_chain
     people = parsed.get("decision_chain", parsed.get("stakeholders", []))
+    stakeholder_rows = []
     for person in people:
         name = person.get("name", "").strip()
         if not name:
@@ -246,14 +335,28 @@ def save_intelligence(project_id: int, raw_text: str, parsed_json_str: str):
         phone = person.get("phone")
         soft_tags = ", ".join(person.get("soft_tags", []))
         hard_profile = f"职务: {role} | 电话: {phone or '未获取'}"
+        stakeholder_rows.append((name, project_id, hard_profile, soft_tags))
+
+    with get_pool().write() as conn:
+        cursor = conn.cursor()
+
+        # 1. 存拜访日志 + 折叠进沙盘汇总
         cursor.execute(
-            "INSERT INTO stakeholders (name, project_id, hard_profile, soft_persona) "
-            "VALUES (?, ?, ?, ?)",
-            (name, project_id, hard_profile, soft_tags),
+            "INSERT INTO visit_logs (project_id, raw_input, ai_parsed_data, attachment_hash, attachment_url) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (project_id, raw_text, parsed_json_str, attachment_hash, attachment_url),
         )
+        log_id = cursor.lastrowid
+        _fold_summaries(cursor, project_id, log_id, raw_text, parsed)
 
-    conn.commit()
-    conn.close()
+        # 2. 存关键人
+        if stakeholder_rows:
+            cursor.executemany(
+                "INSERT INTO stakeholders (name, project_id, hard_profile, soft_persona) "
+                "VALUES (?, ?, ?, ?)",
+                stakeholder_rows,
+            )
+    invalidate_dashboard_stats()
 
 
 def get_all_projects():
@@ -261,53 +364,41 @@ def get_all_projects():
     返回 [(project_id, project_name, client, design_institute,
            general_contractor, applicant, dept), ...]
     """
-    conn = sqlite3.connect("sri_intel.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT DISTINCT project_id, project_name, "
-        "COALESCE(client, ''), COALESCE(design_institute, ''), "
-        "COALESCE(general_contractor, ''), COALESCE(applicant, ''), "
-        "COALESCE(dept, '') "
-        "FROM projects ORDER BY project_id"
-    )
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    with get_pool().read() as conn:
+        return conn.execute(
+            "SELECT DISTINCT project_id, project_name, "
+            "COALESCE(client, ''), COALESCE(design_institute, ''), "
+            "COALESCE(general_contractor, ''), COALESCE(applicant, ''), "
+            "COALESCE(dept, '') "
+            "FROM projects ORDER BY project_id"
+        ).fetchall()
 
 
 def get_project_data(project_id: int):
     """获取指定项目的关键人列表和历史拜访记录。"""
-    conn = sqlite3.connect("sri_intel.db")
-    cursor = conn.cursor()
-
-    # 关键人列表
-    cursor.execute(
-        "SELECT name, hard_profile, soft_persona FROM stakeholders WHERE project_id = ?",
-        (project_id,),
-    )
-    stakeholders = cursor.fetchall()
+    with get_pool().read() as conn:
+        # 关键人列表
+        stakeholders = conn.execute(
+            "SELECT name, hard_profile, soft_persona FROM stakeholders WHERE project_id = ?",
+            (project_id,),
+        ).fetchall()
 
-    # 历史拜访记录
-    cursor.execute(
-        "SELECT log_id, created_at, raw_input, ai_parsed_data "
-        "FROM visit_logs WHERE project_id = ? ORDER BY log_id DESC",
-        (project_id,),
-    )
-    logs = cursor.fetchall()
+        # 历史拜访记录
+        logs = conn.execute(
+            "SELECT log_id, created_at, raw_input, ai_parsed_data "
+            "FROM visit_logs WHERE project_id = ? ORDER BY log_id DESC",
+            (project_id,),
+        ).fetchall()
 
-    conn.close()
     return stakeholders, logs
 
 
 def get_user_blind_spots(user: str = "default") -> str:
     """获取用户的历史知识盲点（从所有项目的 gap_alerts 聚合）。"""
-    import json
-
-    conn = sqlite3.connect("sri_intel.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT ai_parsed_data FROM visit_logs ORDER BY log_id DESC LIMIT 20")
-    rows = cursor.fetchall()
-    conn.close()
+    with get_pool().read() as conn:
+        rows = conn.execute(
+            "SELECT ai_parsed_data FROM visit_logs ORDER BY log_id DESC LIMIT 20"
+        ).fetchall()
 
     blind_spots = []
     for row in rows:
@@ -326,32 +417,441 @@ def save_test_record(user: str, project_id: int, quiz: str,
                     user_answer: str, score: int, critique: str,
                     blind_spots_json: str):
     """将测验记录持久化入库。"""
-    conn = sqlite3.connect("sri_intel.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO test_records (user, project_id, quiz, user_answer, "
-        "score, critique, blind_spots) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (user, project_id, quiz, user_answer, score, critique, blind_spots_json),
-    )
-    conn.commit()
-    conn.close()
+    with get_pool().write() as conn:
+        conn.execute(
+            "INSERT INTO test_records (user, project_id, quiz, user_answer, "
+            "score, critique, blind_spots) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user, project_id, quiz, user_answer, score, critique, blind_spots_json),
+        )
 
 
 def get_all_test_records():
     """获取全员测验记录（关联项目名称）。"""
-    conn = sqlite3.connect("sri_intel.db")
-    cursor = conn.cursor()
+    with get_pool().read() as conn:
+        return conn.execute(
+            "SELECT t.user, p.project_name, t.score, t.blind_spots, t.created_at "
+            "FROM test_records t LEFT JOIN projects p ON t.project_id = p.project_id "
+            "ORDER BY t.created_at DESC"
+        ).fetchall()
+
+
+# ── 知识库 ──
+
+def add_kb_document(title: str, category: str, file_type: str = "PDF", file_size: str = "",
+                    description: str = "", file_path: str = "", icon: str = "📄") -> int:
+    """
+    登记知识库文档（全文检索由触发器入队，向量库由 vector_store.sync() 增量切块）。
+    向量库按 doc_id 游标只追加：文档被修改 / 删除后须执行 python vector_store.py rebuild，否则旧内容仍可检索。
+    """
+    with get_pool().write() as conn:
+        cursor = conn.execute(
+            "INSERT INTO knowledge_base (title, category, icon, file_type, file_size, description, file_path) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (title, category, icon, file_type, file_size, description, file_path),
+        )
+        return cursor.lastrowid
+
+
+def search_kb_documents(query: str, category: str = "") -> list[tuple]:
+    """
+    知识库全文检索（FTS5 MATCH + bm25，标题权重高于摘要）。
+    返回 (doc_id, title, category, icon, file_type, file_size, description, updated_at)，按相关度排序。
+    """
+    expr = search.match_query(query)
+    if expr is None:
+        return []
+    pool = get_pool()
+    with pool.read() as conn:
+        dirty = search.has_pending(conn.execute)
+    if dirty:
+        with pool.write() as conn:
+            search.sync_pending(conn.execute, search.LEGACY_SOURCES)
+
+    sql = (
+        "SELECT k.doc_id, k.title, k.category, k.icon, k.file_type, k.file_size, "
+        "k.description, k.updated_at "
+        "FROM search_index s JOIN knowledge_base k ON k.doc_id = s.ref_id "
+        "WHERE search_index MATCH ? AND s.source = 'kb'"
+    )
+    params = [expr]
+    if category:
+        sql += " AND k.category = ?"
+        params.append(category)
+    sql += f" ORDER BY {search.BM25}, k.doc_id"
+    with pool.read() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+# ── 沙盘汇总（物化聚合）──
+#
+# 语义与逐条重算完全一致（日志按 log_id 倒序、新者优先）：
+#   gap_alerts / competitors  去重保序，新日志的条目排在最前，同名竞品以最新为准
+#   current_status / next_steps / max_price  取最新一条有效值
+# 新日志到达时只需把它"折叠"进旧汇总：O(该日志条目数 + 已有条目数)，无需重读历史。
+
+_NO_STATUS = "未提供项目现状、预算与进度信息"
+_NO_NEXT_STEPS = "未提供下一步行动计划"
+_PRICE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*[万亿]")
+
+
+def _parse_intel_json(ai_json_str) -> dict:
+    try:
+        parsed = json.loads(ai_json_str) if ai_json_str else {}
+    except (json.JSONDecodeError, TypeError):
+        parsed = {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def _extract_max_price(status: str):
+    """从现状描述中提取最高限价 / 预算（单位：万）。"""
+    price_match = _PRICE_RE.search(status)
+    if not price_match:
+        return None
+    val = float(price_match.group(1))
+    unit = "亿" if "亿" in status[price_match.start():price_match.end() + 1] else "万"
+    return val * 10000 if unit == "亿" else val
+
+
+def _next_steps_text(ns) -> str:
+    """next_steps 归一化为文本：LLM 偶尔返回列表（["约张总", "报价"]），逐条以「；」拼接，其他类型忽略。"""
+    if isinstance(ns, str):
+        return ns.strip()
+    if isinstance(ns, (list, tuple)):
+        return "；".join(s.strip() for s in ns if isinstance(s, str) and s.strip())
+    return ""
+
+
+def _empty_sandbox_summary() -> dict:
+    return {
+        "gap_alerts": [], "competitors": [], "current_status": None,
+        "next_steps": None, "max_price": None, "log_count": 0,
+        "last_log_id": 0, "latest_log_time": None,
+    }
+
+
+def _merge_sandbox_log(summary: dict, parsed: dict, log_id: int, created_at) -> dict:
+    """把一条（比汇总中所有日志都新的）情报折叠进汇总。"""
+    # gap_alerts：新日志条目在前，集合去重
+    seen: set[str] = set()
+    alerts: list[str] = []
+    for alert in [*(parsed.get("gap_alerts") or []), *summary["gap_alerts"]]:
+        if alert and isinstance(alert, str) and alert not in seen:
+            seen.add(alert)
+            alerts.append(alert)
+
+    # competitors：按名称集合去重，同名以新日志为准
+    names: set[str] = set()
+    competitors: list[dict] = []
+    for comp in parsed.get("competitor_info") or []:
+        if not isinstance(comp, dict):
+            continue
+        name = (comp.get("name") or "").strip()
+        if name and name not in names:
+            names.add(name)
+            competitors.append({
+                "name": name,
+                "quote": comp.get("quote"),
+                "strengths": comp.get("strengths", ""),
+                "weaknesses": comp.get("weaknesses", ""),
+                "recentActions": comp.get("recent_actions", ""),
+            })
+    for comp in summary["competitors"]:
+        if comp["name"] not in names:
+            names.add(comp["name"])
+            competitors.append(comp)
+
+    merged = dict(summary)
+    merged.update(gap_alerts=alerts, competitors=competitors)
+
+    status = parsed.get("current_status", "")
+    if status and isinstance(status, str) and status != _NO_STATUS:
+        merged["current_status"] = status
+        price = _extract_max_price(status)
+        if price is not None:
+            merged["max_price"] = price
+
+    ns = _next_steps_text(parsed.get("next_steps"))
+    if ns and ns != _NO_NEXT_STEPS:
+        merged["next_steps"] = ns
+
+    merged["log_count"] = summary["log_count"] + 1
+    merged["last_log_id"] = log_id
+    merged["latest_log_time"] = created_at
+    return merged
+
+
+def _load_sandbox_summary(cursor, project_id: int) -> dict | None:
+    row = cursor.execute(
+        "SELECT gap_alerts, competitors, current_status, next_steps, max_price, "
+        "log_count, last_log_id, latest_log_time FROM sandbox_summary WHERE project_id = ?",
+        (project_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "gap_alerts": json.loads(row[0] or "[]"),
+        "competitors": json.loads(row[1] or "[]"),
+        "current_status": row[2],
+        "next_steps": row[3],
+        "max_price": row[4],
+        "log_count": row[5] or 0,
+        "last_log_id": row[6] or 0,
+        "latest_log_time": row[7],
+    }
+
+
+def _store_sandbox_summary(cursor, project_id: int, summary: dict):
     cursor.execute(
-        "SELECT t.user, p.project_name, t.score, t.blind_spots, t.created_at "
-        "FROM test_records t LEFT JOIN projects p ON t.project_id = p.project_id "
-        "ORDER BY t.created_at DESC"
+        "INSERT OR REPLACE INTO sandbox_summary (project_id, gap_alerts, competitors, "
+        "current_status, next_steps, max_price, log_count, last_log_id, latest_log_time, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+        (
+            project_id,
+            json.dumps(summary["gap_alerts"], ensure_ascii=False),
+            json.dumps(summary["competitors"], ensure_ascii=False),
+            summary["current_status"], summary["next_steps"], summary["max_price"],
+            summary["log_count"], summary["last_log_id"], summary["latest_log_time"],
+        ),
     )
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+
+
+def _rebuild_sandbox_summary(cursor, project_id: int) -> dict:
+    """从 visit_logs 全量重建单个项目的汇总（在写事务内执行）。"""
+    summary = _empty_sandbox_summary()
+    rows = cursor.execute(
+        "SELECT log_id, ai_parsed_data, created_at FROM visit_logs "
+        "WHERE project_id = ? ORDER BY log_id ASC",
+        (project_id,),
+    )
+    for log_id, ai_json_str, created_at in rows.fetchall():
+        summary = _merge_sandbox_log(summary, _parse_intel_json(ai_json_str), log_id, created_at)
+    _store_sandbox_summary(cursor, project_id, summary)
+    return summary
+
+
+def _fold_into_sandbox_summary(cursor, project_id: int, log_id: int, parsed: dict):
+    """新日志写入后增量更新汇总（与 INSERT 同一事务）。"""
+    summary = _load_sandbox_summary(cursor, project_id)
+    if summary is None:
+        # 首次物化（含历史数据的老项目）→ 全量重建，已包含本条日志
+        _rebuild_sandbox_summary(cursor, project_id)
+        return
+    created_at = cursor.execute(
+        "SELECT created_at FROM visit_logs WHERE log_id = ?", (log_id,)
+    ).fetchone()[0]
+    _store_sandbox_summary(cursor, project_id, _merge_sandbox_log(summary, parsed, log_id, created_at))
+
+
+def _fold_summaries(cursor, project_id: int, log_id: int, raw_input: str, parsed: dict):
+    """
+    把新日志折叠进沙盘汇总与情报摘要。汇总只是派生数据：折叠失败时回滚到保存点、
+    删掉该项目的汇总行（下次读取时懒重建），绝不连累同一事务里的日志写入。
+    """
+    cursor.execute("SAVEPOINT fold_summaries")
+    try:
+        _fold_into_sandbox_summary(cursor, project_id, log_id, parsed)
+        _fold_into_intel_summaries(cursor, project_id, log_id, raw_input, parsed)
+    except Exception:
+        logger.warning("项目 %s 汇总折叠失败（log_id=%s），已清除待重建", project_id, log_id, exc_info=True)
+        cursor.execute("ROLLBACK TO fold_summaries")
+        cursor.execute("DELETE FROM sandbox_summary WHERE project_id = ?", (project_id,))
+        cursor.execute("DELETE FROM intel_summaries WHERE project_id = ?", (project_id,))
+    cursor.execute("RELEASE fold_summaries")
+
+
+def get_sandbox_summary(project_id: int) -> dict:
+    """读取项目沙盘汇总（单行查询）；尚未物化的项目自动补建一次。"""
+    with get_pool().read() as conn:
+        summary = _load_sandbox_summary(conn.cursor(), project_id)
+    if summary is not None:
+        return summary
+    with get_pool().write() as conn:
+        return _rebuild_sandbox_summary(conn.cursor(), project_id)
+
+
+def rebuild_sandbox_summaries(project_id: int | None = None) -> int:
+    """回填：重建全部（或指定）项目的沙盘汇总，返回处理项目数。"""
+    with get_pool().read() as conn:
+        if project_id is not None:
+            project_ids = [project_id]
+        else:
+            project_ids = [r[0] for r in conn.execute("SELECT project_id FROM projects").fetchall()]
+    for pid in project_ids:
+        # 每个项目独立事务，避免长时间持有写锁
+        with get_pool().write() as conn:
+            _rebuild_sandbox_summary(conn.cursor(), pid)
+    return len(project_ids)
+
+
+# ── 情报分层滚动摘要（周 / 月 / 全周期）──
+
+def _load_intel_summary_states(cursor, project_id: int, keys=None) -> dict:
+    """读取摘要折叠状态 {(level, period_key): {"state", "period_start"}}，keys 为空时读全部。"""
+    rows = cursor.execute(
+        "SELECT level, period_key, period_start, state_json FROM intel_summaries WHERE project_id = ?",
+        (project_id,),
+    ).fetchall()
+    return {
+        (level, key): {"state": json.loads(state_json), "period_start": start}
+        for level, key, start, state_json in rows
+        if keys is None or (level, key) in keys
+    }
+
+
+def _store_intel_summary_states(cursor, project_id: int, states: dict, touched):
+    rows = []
+    for level, key in touched:
+        entry = states[(level, key)]
+        state, start = entry["state"], intel_summary.to_datetime(entry["period_start"])
+        rows.append((
+            project_id, level, key, intel_summary.stamp(start) or None,
+            state["log_count"], state["last_log_id"],
+            json.dumps(state, ensure_ascii=False), intel_summary.render(state, level, key),
+        ))
+    cursor.executemany(
+        "INSERT INTO intel_summaries (project_id, level, period_key, period_start, log_count, "
+        "last_log_id, state_json, summary_text, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP) "
+        "ON CONFLICT (project_id, level, period_key) DO UPDATE SET "
+        "log_count = excluded.log_count, last_log_id = excluded.last_log_id, "
+        "state_json = excluded.state_json, summary_text = excluded.summary_text, "
+        "updated_at = excluded.updated_at",
+        rows,
+    )
+
+
+def _rebuild_intel_summaries(cursor, project_id: int) -> dict:
+    """从 visit_logs 全量重建单个项目的周 / 月 / 全周期摘要（在写事务内执行）。"""
+    cursor.execute("DELETE FROM intel_summaries WHERE project_id = ?", (project_id,))
+    logs = cursor.execute(
+        "SELECT log_id, raw_input, ai_parsed_data, created_at FROM visit_logs "
+        "WHERE project_id = ? ORDER BY log_id ASC",
+        (project_id,),
+    ).fetchall()
+    states: dict = {}
+    touched = intel_summary.fold_logs(states, logs)
+    _store_intel_summary_states(cursor, project_id, states, touched)
+    return states
+
+
+def _fold_into_intel_summaries(cursor, project_id: int, log_id: int, raw_input: str, parsed: dict):
+    """新日志写入后增量折叠进所属周 / 月 / 全周期摘要（与 INSERT 同一事务）。"""
+    created_at = cursor.execute(
+        "SELECT created_at FROM visit_logs WHERE log_id = ?", (log_id,)
+    ).fetchone()[0]
+    keys = {(level, key) for level, key, _ in intel_summary.period_keys(created_at)}
+    states = _load_intel_summary_states(cursor, project_id, keys)
+    if ("project", intel_summary.PROJECT_KEY) not in states:
+        # 首次物化（含历史数据的老项目）→ 全量重建，已包含本条日志
+        _rebuild_intel_summaries(cursor, project_id)
+        return
+    touched = intel_summary.fold_logs(states, [(log_id, raw_input, parsed, created_at)])
+    _store_intel_summary_states(cursor, project_id, states, touched)
+
+
+def get_intel_summary(project_id: int) -> tuple[str, int]:
+    """
+    读取项目全周期情报摘要 → (摘要文本, 已折叠的最大 log_id)；项目无情报时返回 ("", 0)。
+    尚未物化的老项目自动补建一次。
+    """
+    with get_pool().read() as conn:
+        row = conn.execute(
+            "SELECT summary_text, last_log_id FROM intel_summaries "
+            "WHERE project_id = ? AND level = 'project' AND period_key = ?",
+            (project_id, intel_summary.PROJECT_KEY),
+        ).fetchone()
+        if row is not None:
+            return row[0], row[1]
+        if conn.execute("SELECT 1 FROM visit_logs WHERE project_id = ? LIMIT 1", (project_id,)).fetchone() is None:
+            return "", 0
+    with get_pool().write() as conn:
+        states = _rebuild_intel_summaries(conn.cursor(), project_id)
+    entry = states[("project", intel_summary.PROJECT_KEY)]
+    return intel_summary.render(entry["state"]), entry["state"]["last_log_id"]
+
+
+# ── 看板聚合（/api/kpi 与 /api/pipeline 共享）──
+
+_DASHBOARD_SQL = """
+    WITH stage_counts AS (
+        SELECT current_stage, COUNT(*) AS n FROM projects GROUP BY current_stage
+    ),
+    bucket_counts AS (
+        SELECT COALESCE(
+                   (SELECT b.bucket FROM stage_buckets b
+                    WHERE instr(s.current_stage, b.keyword) > 0
+                    ORDER BY b.priority LIMIT 1),
+                   ?
+               ) AS bucket,
+               SUM(n) AS n
+        FROM stage_counts s
+        GROUP BY 1
+    )
+    SELECT
+        (SELECT COUNT(DISTINCT project_id) FROM stakeholders),
+        (SELECT COUNT(*) FROM visit_logs),
+        (SELECT json_group_object(bucket, n) FROM bucket_counts)
+"""
+
+_dashboard_lock = threading.Lock()
+_dashboard_cache: tuple[float, dict] | None = None
+_dashboard_generation = 0
+
+
+def _query_dashboard_stats() -> dict:
+    """单条聚合 SQL：先按原始阶段分组，再对少量不同取值查表归桶。"""
+    with get_pool().read() as conn:
+        with_stakeholders, total_logs, buckets_json = conn.execute(
+            _DASHBOARD_SQL, (DEFAULT_STAGE_BUCKET,)
+        ).fetchone()
+    buckets = json.loads(buckets_json or "{}")
+    stage_counts = {stage: int(buckets.get(stage, 0)) for stage in STAGE_ORDER}
+    return {
+        "total_projects": sum(stage_counts.values()),
+        "projects_with_stakeholders": with_stakeholders,
+        "total_logs": total_logs,
+        "stage_counts": stage_counts,
+    }
+
+
+def get_dashboard_stats() -> dict:
+    """
+    看板聚合数据（进程内短 TTL 缓存）。
+    返回 {total_projects, projects_with_stakeholders, total_logs, stage_counts{桶: 项目数}}。
+    """
+    global _dashboard_cache
+    with _dashboard_lock:
+        cached = _dashboard_cache
+        generation = _dashboard_generation
+    if cached is not None and time.monotonic() - cached[0] < _DASHBOARD_CACHE_TTL_S:
+        stats = cached[1]
+    else:
+        stats = _query_dashboard_stats()
+        with _dashboard_lock:
+            # 查询期间发生过写入则不回填，避免旧结果覆盖失效
+            if generation == _dashboard_generation:
+                _dashboard_cache = (time.monotonic(), stats)
+    return {**stats, "stage_counts": dict(stats["stage_counts"])}
+
+
+def invalidate_dashboard_stats():
+    """写路径提交后调用：丢弃看板聚合缓存。"""
+    global _dashboard_cache, _dashboard_generation
+    with _dashboard_lock:
+        _dashboard_generation += 1
+        _dashboard_cache = None
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SRI 情报系统数据库维护")
+    parser.add_argument("--rebuild-sandbox", action="store_true", help="回填/重建沙盘汇总物化表")
+    parser.add_argument("--project", type=int, default=None, help="仅重建指定项目")
+    args = parser.parse_args()
+
     init_db()
     print("✅ 数据库初始化完成！")
-
+    if args.rebuild_sandbox:
+        n = rebuild_sandbox_summaries(args.project)
+        print(f"✅ 沙盘汇总已重建：{n} 个项目")
@@ -2,6 +2,7 @@
 SQLAlchemy 引擎 & Session 工厂
 ================================
 企业级连接管理：单例引擎 + 请求级 Session。
+同时提供异步引擎 (aiosqlite / asyncpg)，供高频只读端点免占线程池。
 """
 
 import os
@@ -35,7 +36,61 @@ else:
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+# ── 异步引擎（懒加载：未安装 aiosqlite/asyncpg 时不影响同步链路）──
+
+def _to_async_url(url: str) -> str:
+    """同步 URL → 异步驱动 URL。"""
+    if url.startswith("sqlite:///"):
+        return "sqlite+aiosqlite:///" + url[len("sqlite:///"):]
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL", _to_async_url(DATABASE_URL))
+
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_engine():
+    """获取异步引擎单例（首次调用时创建）。"""
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        if ASYNC_DATABASE_URL.startswith("sqlite"):
+            _async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
+
+            @event.listens_for(_async_engine.sync_engine, "connect")
+            def _set_async_sqlite_pragma(dbapi_conn, connection_record):
+                cursor = dbapi_conn.cursor()
+                cursor.execute("PRAGMA foreign_keys=ON")
+                cursor.close()
+        else:
+            _async_engine = create_async_engine(
+                ASYNC_DATABASE_URL, pool_pre_ping=True, pool_size=20, max_overflow=20, echo=False,
+            )
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    """创建请求级 AsyncSession（与 SessionLocal 对称）。"""
+    global _async_session_factory
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_session_factory = async_sessionmaker(
+            bind=get_async_engine(), autoflush=False, expire_on_commit=False,
+        )
+    return _async_session_factory()
+
+
 def init_db():
-    """创建所有表（幂等操作，已存在的表不会被重建）。"""
+    """创建所有表（幂等操作，已存在的表不会被重建），再把既有库迁移到最新版本。"""
+    import migrations
     from models import Base
     Base.metadata.create_all(bind=engine)
+    # create_all 不会改动已存在的表（如补索引），增量演进交给版本化迁移
+    migrations.upgrade(engine)
@@ -0,0 +1,196 @@
+"""
+SQLite 连接池 — db_pool.py
+============================
+旧版数据通路 (database.py / api.py) 共享的 sri_intel.db 连接管理：
+  1. WAL 日志模式        → 读写并发，写者不阻塞读者
+  2. 调优 PRAGMA          → synchronous / cache_size / mmap_size
+  3. 线程级只读连接       → 每个线程复用一条连接，不再每次 connect
+  4. 单一串行写连接       → 全进程一把写锁，事务自动 commit / rollback
+  5. 命中统计             → hits / misses 计数，供 /api/health 上报
+
+用法：
+    from db_pool import get_pool
+
+    with get_pool().read() as conn:
+        conn.execute("SELECT ...")
+
+    with get_pool().write() as conn:
+        conn.execute("INSERT ...")
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from config import DATABASE_PATH
+
+# 使用绝对路径，确保 streamlit / uvicorn / 脚本无论 CWD 在哪都读写同一个文件
+_PROJECT_ROOT = Path(__file__).resolve().parent
+
+
+def resolve_db_path(path: str = DATABASE_PATH) -> str:
+    """相对路径一律按项目根目录解析。"""
+    p = Path(path)
+    if not p.is_absolute():
+        p = _PROJECT_ROOT / p
+    return str(p)
+
+
+# ── PRAGMA 调优（可通过环境变量覆盖）──
+_SYNCHRONOUS = os.environ.get("SRI_DB_SYNCHRONOUS", "NORMAL")      # WAL 下 NORMAL 即可保证一致性
+_CACHE_SIZE_KB = int(os.environ.get("SRI_DB_CACHE_KB", "20000"))     # 页缓存 ~20MB
+_MMAP_SIZE = int(os.environ.get("SRI_DB_MMAP_BYTES", str(256 * 1024 * 1024)))
+_BUSY_TIMEOUT_MS = int(os.environ.get("SRI_DB_BUSY_TIMEOUT_MS", "5000"))
+
+
+class SQLitePool:
+    """
+    线程级读连接 + 单写者连接池。
+    ─────────────────────────────
+    - read():  当前线程已有连接 → hit；否则新建 → miss
+    - write(): 全局写锁串行化，退出时自动 commit，异常自动 rollback
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._writer: sqlite3.Connection | None = None
+        self._stats_lock = threading.Lock()
+        # close() 后递增，其他线程的旧连接在下次使用时作废重建
+        self._generation = 0
+        self._stats = {"hits": 0, "misses": 0, "reads": 0, "writes": 0, "write_errors": 0}
+
+    # ─────────────────────────────────────
+    # 内部：连接创建
+    # ─────────────────────────────────────
+
+    def _connect(self, readonly: bool) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=readonly,  # 写连接跨线程共享，由写锁保护
+        )
+        cursor = conn.cursor()
+        if not readonly:
+            # journal_mode 持久化在库文件中，只需写连接设置一次
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size=-{_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if readonly:
+            # 读连接禁止写入，避免绕过写锁
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+        return conn
+
+    def _bump(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _ensure_writer(self) -> sqlite3.Connection:
+        """写连接懒加载（调用方须持有写锁）。"""
+        if self._writer is None:
+            self._bump("misses")
+            self._writer = self._connect(readonly=False)
+        return self._writer
+
+    # ─────────────────────────────────────
+    # 读：线程级连接复用
+    # ─────────────────────────────────────
+
+    @contextmanager
+    def read(self, row_factory=None):
+        """
+        获取当前线程的只读连接。
+        row_factory 仅在本次 with 块内生效，退出后恢复为默认元组行。
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation != self._generation:
+            conn.close()
+            conn = None
+        if conn is None:
+            # 首次读前确保写连接已将库切换为 WAL
+            if self._writer is None:
+                with self._write_lock:
+                    self._ensure_writer()
+            conn = self._connect(readonly=True)
+            self._local.conn = conn
+            self._local.generation = self._generation
+            self._bump("misses")
+        else:
+            self._bump("hits")
+        self._bump("reads")
+
+        conn.row_factory = row_factory
+        try:
+            yield conn
+        finally:
+            conn.row_factory = None
+
+    # ─────────────────────────────────────
+    # 写：单写者串行化
+    # ─────────────────────────────────────
+
+    @contextmanager
+    def write(self, row_factory=None):
+        """获取全局写连接（持锁），正常退出 commit，异常 rollback。"""
+        with self._write_lock:
+            if self._writer is not None:
+                self._bump("hits")
+            conn = self._ensure_writer()
+            conn.row_factory = row_factory
+            self._bump("writes")
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                self._bump("write_errors")
+                raise
+            finally:
+                conn.row_factory = None
+
+    # ─────────────────────────────────────
+    # 运维
+    # ─────────────────────────────────────
+
+    def stats(self) -> dict:
+        """连接池命中统计。"""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = f"{snapshot['hits'] / lookups * 100:.1f}%" if lookups else "N/A"
+        snapshot["path"] = self.path
+        return snapshot
+
+    def close(self):
+        """关闭写连接与当前线程读连接；其他线程的读连接下次使用时自动重建。"""
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._generation += 1
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# ── 进程级单例 ──
+_pool: SQLitePool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SQLitePool:
+    """获取 sri_intel.db 的进程级连接池。"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SQLitePool(resolve_db_path())
+    return _pool
@@ -0,0 +1,331 @@
+"""
+流式文档文本提取 — doc_extract.py
+==================================
+上传文档（PDF / DOCX / TXT）按阅读顺序流式产出文本块，替代"整文件读进内存 → 单线程逐页解析 →
+拼接后只取前 4000 字"：
+  1. 按路径读取     → 入参是已落盘文件（job_queue 流式落盘），PdfReader 绑定文件句柄按需读取，
+                      不再把整个文件复制进内存
+  2. 页级并行       → PDF 首批页在本进程直接解析（首块最快），其余按 SRI_DOC_PAGE_BATCH 页一批交给进程池，
+                      各工作进程只打开一次 PdfReader；按页序产出，最多 workers×2 批在途（背压）
+  3. 预算早停       → 累计 token 达到 token_budget 即停止，未开始的批次直接取消；
+                      LLM 只看前几千 token，28MB 的中标汇编无需解析到最后一页
+  4. OCR 兜底钩子   → 无文本层的页（扫描件）交给 SRI_OCR_HOOK="模块:函数"，签名 fn(path, page_index) -> str；
+                      未配置时跳过该页
+  5. DOCX 表格      → 段落与表格按文档顺序输出，表格逐行以 " | " 连接（报价表 / 参数表不再丢失）
+  6. 页数上限       → 超过 SRI_DOC_MAX_PAGES 的部分不解析（文件大小上限由 job_queue 落盘时把关）
+  7. 统计           → ExtractStats：总页数 / 已读页数 / OCR 页数 / token / 是否截止 / 首块耗时 / 总耗时 / 峰值内存
+
+TXT 以首个 64KB 判定编码（UTF-8，否则 GBK）；之后出现的非法字节按替换字符处理，不再整文件回退重解。
+
+用法：
+    stats = ExtractStats()
+    for chunk in iter_chunks(path, "pdf", token_budget=3000, stats=stats):
+        ...
+    text, stats = extract_text(path, "docx", token_budget=3000)
+"""
+
+import codecs
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:         # Windows
+    resource = None
+
+logger = logging.getLogger("doc_extract")
+
+# ── 参数（可通过环境变量覆盖）──
+_WORKERS = int(os.environ.get("SRI_DOC_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+_PAGE_BATCH = int(os.environ.get("SRI_DOC_PAGE_BATCH", "8"))
+MAX_PAGES = int(os.environ.get("SRI_DOC_MAX_PAGES", "2000"))
+_OCR_HOOK = os.environ.get("SRI_OCR_HOOK", "")
+_TXT_BLOCK = 64 * 1024
+
+SUFFIXES = ("pdf", "docx", "txt")
+
+
+class ExtractError(Exception):
+    """文档无法解析（损坏 / 加密 / 编码无法识别 / 类型不支持），消息直接展示给用户。"""
+
+
+@dataclass
+class ExtractStats:
+    pages_total: int = 0
+    pages_read: int = 0
+    ocr_pages: int = 0
+    tokens: int = 0
+    truncated: bool = False             # 因 token 预算或页数上限提前停止
+    first_chunk_ms: float | None = None
+    elapsed_ms: float = 0.0
+    peak_rss_mb: float = 0.0            # 本进程峰值常驻内存（页解析进程池另计）
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def peak_rss_mb(who: str = "self") -> float:
+    """峰值常驻内存（MB）；who="children" 为已退出并回收的子进程中的最大值。"""
+    if resource is None:
+        return 0.0
+    target = resource.RUSAGE_CHILDREN if who == "children" else resource.RUSAGE_SELF
+    return round(resource.getrusage(target).ru_maxrss / 1024, 1)
+
+
+# ═══════════════════════════════════════════
+# 1. PDF：工作进程侧
+# ═══════════════════════════════════════════
+
+@lru_cache(maxsize=1)
+def _ocr_hook():
+    if not _OCR_HOOK:
+        return None
+    module_name, func_name = _OCR_HOOK.split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+_reader: tuple[str, float, object, object] | None = None    # (路径, mtime, 文件句柄, PdfReader)
+
+
+def _open_pdf(path: str):
+    """打开 PdfReader（绑定文件句柄，按需读取），同一进程内对同一文件复用。"""
+    global _reader
+    mtime = os.path.getmtime(path)
+    if _reader is not None and _reader[0] == path and _reader[1] == mtime:
+        return _reader[3]
+    import PyPDF2
+
+    _close_pdf()
+    fh = open(path, "rb")
+    try:
+        reader = PyPDF2.PdfReader(fh)
+        if reader.is_encrypted and not reader.decrypt(""):
+            raise ExtractError("PDF 已加密，无法提取文本")
+    except ExtractError:
+        fh.close()
+        raise
+    except Exception as e:
+        fh.close()
+        raise ExtractError(f"PDF 解析失败: {e}") from e
+    _reader = (path, mtime, fh, reader)
+    return reader
+
+
+def _extract_pages(path: str, start: int, stop: int) -> list[tuple[str, bool]]:
+    """提取 [start, stop) 页文本，返回 [(文本, 是否走了 OCR)]；单页失败记日志后按空页处理。"""
+    reader = _open_pdf(path)
+    hook = _ocr_hook()
+    pages = []
+    for i in range(start, stop):
+        try:
+            text = reader.pages[i].extract_text() or ""
+        except Exception as e:
+            logger.warning("PDF 第 %d 页提取失败: %s", i + 1, e)
+            text = ""
+        ocr = False
+        if not text.strip() and hook is not None:
+            try:
+                text, ocr = hook(path, i) or "", True
+            except Exception as e:
+                logger.warning("PDF 第 %d 页 OCR 失败: %s", i + 1, e)
+        pages.append((text, ocr))
+    return pages
+
+
+# ═══════════════════════════════════════════
+# 2. PDF：调度侧（页级并行 + 有序产出 + 早停）
+# ═══════════════════════════════════════════
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """页解析进程池（进程级单例，常驻于 job_queue 工作进程内，摊薄 spawn 开销）。"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=max(1, _WORKERS), mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def shutdown_pool(wait: bool = True):
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def _close_pdf():
+    global _reader
+    if _reader is not None:
+        _reader[2].close()
+        _reader = None
+
+
+def _iter_pdf(path: str, stats: ExtractStats, workers: int) -> Iterator[str]:
+    try:
+        total = len(_open_pdf(path).pages)
+        stats.pages_total = total
+        limit = min(total, MAX_PAGES)
+        if limit < total:
+            stats.truncated = True
+        batches = [(s, min(s + _PAGE_BATCH, limit)) for s in range(0, limit, _PAGE_BATCH)]
+
+        def emit(pages):
+            for text, ocr in pages:
+                stats.pages_read += 1
+                stats.ocr_pages += ocr
+                if text.strip():
+                    yield text
+
+        if workers <= 1 or len(batches) <= 1:
+            for start, stop in batches:
+                yield from emit(_extract_pages(path, start, stop))
+            return
+
+        # 首批在调度进程内直接解析：token 预算多半在前几页就已满足，此时完全不动用进程池
+        yield from emit(_extract_pages(path, *batches[0]))
+        pool = _get_pool()
+        queue = iter(batches[1:])
+        pending = deque(pool.submit(_extract_pages, path, *b) for _, b in zip(range(workers * 2), queue))
+        try:
+            while pending:
+                pages = pending.popleft().result()
+                nxt = next(queue, None)
+                if nxt is not None:
+                    pending.append(pool.submit(_extract_pages, path, *nxt))
+                yield from emit(pages)
+        finally:
+            for future in pending:      # 早停 / 异常：未开始的批次不再执行
+                future.cancel()
+    finally:
+        _close_pdf()                    # 调度进程不留句柄（落盘文件随后可能被清理）
+
+
+# ═══════════════════════════════════════════
+# 3. DOCX / TXT
+# ═══════════════════════════════════════════
+
+def _table_rows(table) -> Iterator[str]:
+    for row in table.rows:
+        cells, seen = [], set()
+        for cell in row.cells:
+            if id(cell._tc) in seen:    # 合并单元格在每个跨越位置重复出现
+                continue
+            seen.add(id(cell._tc))
+            cells.append(" ".join(cell.text.split()))
+        if any(cells):
+            yield " | ".join(cells)
+
+
+def _iter_docx(path: str, stats: ExtractStats) -> Iterator[str]:
+    try:
+        from docx import Document
+        from docx.oxml.ns import qn
+        from docx.table import Table
+        from docx.text.paragraph import Paragraph
+
+        doc = Document(path)
+    except Exception as e:
+        raise ExtractError(f"DOCX 解析失败: {e}") from e
+
+    for child in doc.element.body.iterchildren():
+        if child.tag == qn("w:p"):
+            text = Paragraph(child, doc).text
+            if text.strip():
+                yield text
+        elif child.tag == qn("w:tbl"):
+            rows = list(_table_rows(Table(child, doc)))
+            if rows:
+                yield "\n".join(rows)
+
+
+def _iter_txt(path: str, stats: ExtractStats) -> Iterator[str]:
+    with open(path, "rb") as f:
+        block = f.read(_TXT_BLOCK)
+        decoder = None
+        for encoding in ("utf-8", "gbk"):
+            candidate = codecs.getincrementaldecoder(encoding)(errors="strict")
+            try:
+                candidate.decode(block, final=False)
+            except UnicodeDecodeError:
+                continue
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+            break
+        if decoder is None:
+            raise ExtractError("TXT 文件编码无法识别")
+        while block:
+            text = decoder.decode(block, final=False)
+            if text:
+                yield text
+            block = f.read(_TXT_BLOCK)
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+# ═══════════════════════════════════════════
+# 4. 入口
+# ═══════════════════════════════════════════
+
+def iter_chunks(path: str | Path, suffix: str, *, token_budget: int | None = None,
+                workers: int | None = None, stats: ExtractStats | None = None) -> Iterator[str]:
+    """
+    按阅读顺序产出文本块（PDF 为页、DOCX 为段落 / 表格、TXT 为 64KB 块）。
+    累计 token 达到 token_budget 后停止（最后一块可能越过预算，由调用方截断）；stats 随产出实时更新。
+    """
+    from services.context_packer import count_tokens
+
+    stats = stats if stats is not None else ExtractStats()
+    path = str(path)
+    suffix = suffix.lower().lstrip(".")
+    if suffix == "pdf":
+        source = _iter_pdf(path, stats, _WORKERS if workers is None else workers)
+    elif suffix == "docx":
+        source = _iter_docx(path, stats)
+    elif suffix == "txt":
+        source = _iter_txt(path, stats)
+    else:
+        raise ExtractError(f"不支持的文件类型: .{suffix}。仅支持 PDF / DOCX / TXT")
+
+    started = time.perf_counter()
+    try:
+        for chunk in source:
+            if stats.first_chunk_ms is None:
+                stats.first_chunk_ms = round((time.perf_counter() - started) * 1000, 1)
+            stats.tokens += count_tokens(chunk)
+            yield chunk
+            if token_budget is not None and stats.tokens >= token_budget:
+                stats.truncated = True
+                break
+    finally:
+        source.close()
+        stats.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        stats.peak_rss_mb = peak_rss_mb()
+
+
+def extract_text(path: str | Path, suffix: str, *, token_budget: int | None = None,
+                 workers: int | None = None) -> tuple[str, ExtractStats]:
+    """提取并拼接文本（达到 token_budget 即停止，结果截断到预算内）。"""
+    from services.context_packer import truncate_to_tokens
+
+    stats = ExtractStats()
+    text = "\n".join(iter_chunks(path, suffix, token_budget=token_budget, workers=workers, stats=stats))
+    if token_budget is not None and stats.truncated:
+        text = truncate_to_tokens(text, token_budget)
+    return text, stats
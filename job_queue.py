@@ -0,0 +1,476 @@
+"""
+上传任务队列 — job_queue.py
+============================
+把文件解析 / 视觉识别 / 语音转写 + LLM 提炼这类慢流水线移出请求：
+  1. 持久队列       → sri_intel.db 的 upload_jobs 表；上传接口把文件分块写入 blob_store（内容寻址，
+                      SRI_UPLOAD_MAX_MB 上限）、入队后毫秒级返回 job_id
+  2. 进程池执行     → 派发线程认领任务交给 ProcessPoolExecutor（spawn），CPU 密集的解析
+                      不占用事件循环，也不和 API 进程抢 GIL
+  3. 进度上报       → 子进程在各阶段写回 progress / stage（长音频转写另写回已完成部分的文本 partial_text），
+                      客户端轮询 GET /api/jobs/{id} 或订阅 SSE /api/jobs/{id}/events
+  4. 幂等           → 幂等键 = 任务类型 + 项目 + 文件 SHA-256：同一文件重复上传直接复用已有任务，
+                      失败的任务重新上传即原地重试
+  5. 解析缓存       → 其他项目上传过的同一文件（blob_store 解析缓存命中）在提交时直接回放结果入库，
+                      任务即刻成功，不进进程池、不调用 LLM
+  6. 自动重试       → 网络 / 限流等临时错误按指数退避重试 SRI_JOB_MAX_ATTEMPTS 次；
+                      JobError（格式不支持、内容为空、缺 Key）直接失败
+  7. 崩溃恢复       → 启动时把认领进程已退出的 running 任务放回队列
+
+API Key 只保存在提交进程内存中随任务传给子进程，不落库；服务重启后恢复的任务回退到
+环境变量 OPENAI_API_KEY，仍没有则以"请重新上传"失败。
+
+用法：
+    job = get_job_queue().submit("document", upload.file, filename="报告.pdf", project_id=3, api_key=key)
+    get_job_queue().get(job["job_id"])
+"""
+
+import hashlib
+import importlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import BinaryIO
+
+import blob_store
+from db_pool import get_pool
+
+logger = logging.getLogger("job_queue")
+
+# ── 参数（可通过环境变量覆盖）──
+_WORKERS = int(os.environ.get("SRI_JOB_WORKERS", str(min(4, os.cpu_count() or 1))))
+_MAX_ATTEMPTS = int(os.environ.get("SRI_JOB_MAX_ATTEMPTS", "3"))
+_RETRY_BASE_SECONDS = float(os.environ.get("SRI_JOB_RETRY_BASE_SECONDS", "5"))
+_POLL_SECONDS = float(os.environ.get("SRI_JOB_POLL_SECONDS", "2"))      # 派发线程兜底轮询（到期的重试）
+MAX_UPLOAD_BYTES = int(float(os.environ.get("SRI_UPLOAD_MAX_MB", "100")) * 1024 * 1024)
+
+# 任务类型 → 处理函数（"模块:函数"，子进程按名导入，spawn 下无需 pickle 函数对象）
+HANDLERS = {
+    "document": "upload_pipeline:process_document",
+    "image": "upload_pipeline:process_image",
+    "media": "upload_pipeline:process_media",
+}
+# 解析缓存：查询 fn(kind, file_hash) -> payload | None；回放 fn(JobContext, payload) -> 任务结果
+_CACHE_LOOKUP = "upload_pipeline:cached_payload"
+_CACHE_REPLAY = "upload_pipeline:replay"
+
+STATUSES = ("queued", "running", "succeeded", "failed")
+TERMINAL = frozenset({"succeeded", "failed"})
+
+_COLUMNS = (
+    "job_id, kind, project_id, filename, file_hash, status, progress, stage, partial_text, "
+    "attempts, max_attempts, result_json, error, created_at, started_at, finished_at, updated_at"
+)
+
+
+class JobError(Exception):
+    """不可重试的任务错误（输入本身有问题），消息直接展示给用户。"""
+
+
+def install(cursor):
+    """建表（幂等），由 database._create_schema 调用。"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS upload_jobs (
+            job_id          TEXT PRIMARY KEY,
+            kind            TEXT NOT NULL,
+            project_id      INTEGER,
+            filename        TEXT,
+            file_hash       TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            status          TEXT NOT NULL DEFAULT 'queued',
+            progress        REAL DEFAULT 0,
+            stage           TEXT DEFAULT '',
+            partial_text    TEXT,
+            attempts        INTEGER DEFAULT 0,
+            max_attempts    INTEGER DEFAULT 3,
+            not_before      REAL DEFAULT 0,
+            owner_pid       INTEGER,
+            result_json     TEXT,
+            error           TEXT,
+            created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at      TIMESTAMP,
+            finished_at     TIMESTAMP,
+            updated_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("PRAGMA table_info(upload_jobs)")
+    if "partial_text" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE upload_jobs ADD COLUMN partial_text TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_upload_jobs_queue ON upload_jobs(status, not_before)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_upload_jobs_project ON upload_jobs(project_id, created_at)")
+
+
+def _row_to_job(row) -> dict:
+    job = dict(zip([c.strip() for c in _COLUMNS.split(",")], row))
+    job["result"] = json.loads(job.pop("result_json")) if job["result_json"] else None
+    return job
+
+
+def _resolve(spec: str):
+    module_name, func_name = spec.split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def _store_upload(data: bytes | BinaryIO) -> str:
+    """上传内容写入 blob_store，返回内容哈希；超限 / 为空抛 JobError。"""
+    src = io.BytesIO(data) if isinstance(data, bytes) else data
+    try:
+        file_hash, size = blob_store.put_stream(src, max_bytes=MAX_UPLOAD_BYTES)
+    except blob_store.BlobTooLarge as e:
+        raise JobError(f"文件超过 {MAX_UPLOAD_BYTES // (1024 * 1024)}MB 上限") from e
+    if size == 0:
+        raise JobError("文件内容为空")
+    return file_hash
+
+
+# ═══════════════════════════════════════════
+# 1. 子进程侧：执行单个任务
+# ═══════════════════════════════════════════
+
+class JobContext:
+    """交给处理函数的任务上下文。"""
+
+    def __init__(self, job: dict, path: Path, api_key: str):
+        self.job_id = job["job_id"]
+        self.kind = job["kind"]
+        self.project_id = job["project_id"]
+        self.filename = job["filename"] or "unknown"
+        self.file_hash = job["file_hash"]
+        self.suffix = self.filename.rsplit(".", 1)[-1].lower() if "." in self.filename else ""
+        self.path = path
+        self.api_key = api_key
+
+    def read_bytes(self) -> bytes:
+        return self.path.read_bytes()
+
+    def progress(self, fraction: float, stage: str = "", *, partial: str | None = None):
+        """上报进度（0~1）与当前阶段说明；partial 为已产出的部分结果文本（不传则保留上次的值）。"""
+        with get_pool().write() as conn:
+            conn.execute(
+                "UPDATE upload_jobs SET progress = ?, stage = ?, partial_text = COALESCE(?, partial_text), "
+                "updated_at = CURRENT_TIMESTAMP WHERE job_id = ? AND status = 'running'",
+                (max(0.0, min(1.0, fraction)), stage, partial, self.job_id),
+            )
+
+
+def _run_job(job_id: str, api_key: str) -> dict:
+    """子进程入口：加载任务 → 调处理函数 → 返回结果（终态由派发进程写库）。"""
+    with get_pool().read() as conn:
+        row = conn.execute(f"SELECT {_COLUMNS} FROM upload_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if row is None:
+        raise JobError(f"任务 {job_id} 不存在")
+    job = _row_to_job(row)
+    path = blob_store.path(job["file_hash"])
+    if not path.exists():
+        raise JobError("上传文件已清理，请重新上传")
+    handler = _resolve(HANDLERS[job["kind"]])
+    return handler(JobContext(job, path, api_key or os.environ.get("OPENAI_API_KEY", "")))
+
+
+# ═══════════════════════════════════════════
+# 2. 提交进程侧：入队 / 派发 / 终态
+# ═══════════════════════════════════════════
+
+class JobQueue:
+    """
+    单派发线程 + 进程池。
+    ─────────────────────
+    - submit(): 落盘 + 入队（幂等），唤醒派发线程
+    - 派发线程: 按空闲槽位认领 queued 任务（UPDATE ... RETURNING，多进程部署也不会重复认领）
+    - 完成回调: 写终态；临时错误按退避重新入队
+    """
+
+    def __init__(self, workers: int = _WORKERS):
+        self._workers = max(1, workers)
+        self._executor: ProcessPoolExecutor | None = None
+        self._secrets: dict[str, str] = {}        # job_id → API Key（仅内存）
+        self._running: dict[str, Future] = {}
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+
+    # ── 入队 ──
+
+    def submit(self, kind: str, data: bytes | BinaryIO, *, filename: str, project_id: int | None,
+               api_key: str = "") -> dict:
+        """
+        提交任务，返回任务快照（含 deduplicated：是否复用了已有任务；cached：是否由解析缓存直接完成）。
+        data 可为 bytes 或二进制文件对象（分块边哈希边写入 blob_store，不整体读入内存）；
+        超过 MAX_UPLOAD_BYTES 或内容为空抛 JobError。
+        同一项目同一文件同一类型：排队中 / 执行中 / 已成功 → 原样返回；已失败 → 重置为排队（重试）。
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"未知任务类型: {kind}")
+        file_hash = _store_upload(data)
+        key = hashlib.sha256(f"{kind}:{project_id}:{file_hash}".encode()).hexdigest()
+        with get_pool().read() as conn:
+            existing = conn.execute(
+                "SELECT status FROM upload_jobs WHERE idempotency_key = ?", (key,),
+            ).fetchone()
+        payload = None
+        if existing is None or existing[0] == "failed":
+            payload = _resolve(_CACHE_LOOKUP)(kind, file_hash)
+        # 缓存命中的任务由本进程当场回放，直接以 running 入库，派发线程不会认领
+        status, owner = ("running", os.getpid()) if payload is not None else ("queued", None)
+
+        with get_pool().write() as conn:
+            row = conn.execute(
+                "SELECT job_id, status FROM upload_jobs WHERE idempotency_key = ?", (key,),
+            ).fetchone()
+            if row is None:
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO upload_jobs (job_id, kind, project_id, filename, file_hash, "
+                    "idempotency_key, max_attempts, status, owner_pid) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, project_id, filename, file_hash, key, _MAX_ATTEMPTS, status, owner),
+                )
+                deduplicated = False
+            else:
+                job_id, previous = row
+                deduplicated = previous != "failed"
+                if previous == "failed":
+                    conn.execute(
+                        "UPDATE upload_jobs SET status = ?, owner_pid = ?, attempts = 0, not_before = 0, "
+                        "progress = 0, stage = '', partial_text = NULL, error = NULL, finished_at = NULL, "
+                        "filename = ?, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+                        (status, owner, filename, job_id),
+                    )
+        job = self.get(job_id)
+        cached = payload is not None and not deduplicated
+        if cached:
+            cached = self._replay(job, payload, api_key)
+            job = self.get(job_id)
+        if api_key and job["status"] != "succeeded":
+            self._secrets[job_id] = api_key       # 重启后恢复的任务靠重新上传补回 Key
+        self._wake()
+        job["deduplicated"] = deduplicated
+        job["cached"] = cached
+        return job
+
+    def _replay(self, job: dict, payload: dict, api_key: str) -> bool:
+        """解析缓存命中：当场回放结果入库并标记成功；回放失败则放回队列走完整解析。"""
+        job_id = job["job_id"]
+        try:
+            result = _resolve(_CACHE_REPLAY)(JobContext(job, blob_store.path(job["file_hash"]), api_key), payload)
+            with get_pool().write() as conn:
+                self._mark_succeeded(conn, job_id, result)
+            return True
+        except Exception:
+            logger.exception("上传任务 %s 缓存回放失败，改为完整解析", job_id)
+            with get_pool().write() as conn:
+                conn.execute(
+                    "UPDATE upload_jobs SET status = 'queued', owner_pid = NULL, "
+                    "updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+                    (job_id,),
+                )
+            return False
+
+    # ── 查询 ──
+
+    def get(self, job_id: str) -> dict | None:
+        with get_pool().read() as conn:
+            row = conn.execute(f"SELECT {_COLUMNS} FROM upload_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def list_jobs(self, project_id: int | None = None, status: str | None = None, limit: int = 50) -> list[dict]:
+        sql = f"SELECT {_COLUMNS} FROM upload_jobs"
+        where, params = [], []
+        if project_id is not None:
+            where.append("project_id = ?")
+            params.append(project_id)
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, rowid DESC LIMIT ?"
+        params.append(limit)
+        with get_pool().read() as conn:
+            return [_row_to_job(r) for r in conn.execute(sql, params).fetchall()]
+
+    # ── 生命周期 ──
+
+    def start(self):
+        """恢复中断任务、清理过期落盘文件并启动派发线程（幂等）。"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._recover()
+            self._prune_blobs()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._workers, mp_context=multiprocessing.get_context("spawn"),
+            )
+            self._thread = threading.Thread(target=self._dispatch_loop, name="job-dispatch", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, wait: bool = False):
+        """停止派发；执行中的任务在 wait=False 时由下次启动的崩溃恢复重新排队。"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def drain(self, timeout: float = 60.0) -> bool:
+        """等待队列中现有任务全部结束（CLI / 测试用），超时返回 False。"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with get_pool().read() as conn:
+                pending = conn.execute(
+                    "SELECT COUNT(*) FROM upload_jobs WHERE status IN ('queued', 'running')"
+                ).fetchone()[0]
+            if not pending:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def _recover(self):
+        """认领进程已不在的 running 任务放回队列（本进程刚启动，自身不可能持有任务）。"""
+        with get_pool().write() as conn:
+            rows = conn.execute(
+                "SELECT job_id, owner_pid FROM upload_jobs WHERE status = 'running'"
+            ).fetchall()
+            orphans = [job_id for job_id, pid in rows if pid == os.getpid() or not _pid_alive(pid)]
+            conn.executemany(
+                "UPDATE upload_jobs SET status = 'queued', owner_pid = NULL, "
+                "updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+                [(job_id,) for job_id in orphans],
+            )
+        if orphans:
+            logger.warning("恢复 %d 个中断的上传任务", len(orphans))
+
+    def _prune_blobs(self):
+        """清理无附件引用、也不被未完成任务使用的过期 blob（解析失败 / 被放弃的上传）。"""
+        with get_pool().read() as conn:
+            live = {h for (h,) in conn.execute(
+                "SELECT DISTINCT file_hash FROM upload_jobs WHERE status IN ('queued', 'running')"
+            )}
+        blob_store.prune(keep=live)
+
+    # ── 派发 ──
+
+    def _claim(self, limit: int) -> list[str]:
+        with get_pool().write() as conn:
+            rows = conn.execute(
+                "UPDATE upload_jobs SET status = 'running', attempts = attempts + 1, owner_pid = ?, "
+                "partial_text = NULL, started_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP "
+                "WHERE job_id IN (SELECT job_id FROM upload_jobs WHERE status = 'queued' AND not_before <= ? "
+                "                 ORDER BY created_at, rowid LIMIT ?) "
+                "RETURNING job_id",
+                (os.getpid(), time.time(), limit),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                free = self._workers - len(self._running)
+            claimed = []
+            if free > 0:
+                try:
+                    claimed = self._claim(free)
+                except sqlite3.Error:
+                    logger.exception("认领上传任务失败")
+            for job_id in claimed:
+                with self._cond:
+                    executor = self._executor
+                    if executor is None:
+                        return
+                    future = executor.submit(_run_job, job_id, self._secrets.get(job_id, ""))
+                    self._running[job_id] = future
+                future.add_done_callback(lambda f, jid=job_id: self._finish(jid, f))
+            with self._cond:
+                if not self._stopping and (not claimed or len(self._running) >= self._workers):
+                    self._cond.wait(_POLL_SECONDS)
+
+    def _finish(self, job_id: str, future: Future):
+        if future.cancelled():
+            with self._cond:
+                self._running.pop(job_id, None)
+            return                                  # 关停时取消，下次启动恢复
+        error = future.exception()
+        try:
+            with get_pool().write() as conn:
+                if error is None:
+                    self._mark_succeeded(conn, job_id, future.result())
+                else:
+                    attempts, max_attempts = conn.execute(
+                        "SELECT attempts, max_attempts FROM upload_jobs WHERE job_id = ?", (job_id,),
+                    ).fetchone()
+                    retry = not isinstance(error, JobError) and attempts < max_attempts
+                    if retry:
+                        delay = _RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+                        conn.execute(
+                            "UPDATE upload_jobs SET status = 'queued', not_before = ?, error = ?, "
+                            "owner_pid = NULL, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+                            (time.time() + delay, str(error), job_id),
+                        )
+                    else:
+                        conn.execute(
+                            "UPDATE upload_jobs SET status = 'failed', error = ?, owner_pid = NULL, "
+                            "finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+                            (str(error), job_id),
+                        )
+                    log = logger.warning if retry else logger.error
+                    log("上传任务 %s 第 %d 次执行失败%s: %s", job_id, attempts, "，稍后重试" if retry else "", error)
+                    if not retry:
+                        self._secrets.pop(job_id, None)
+            if error is None:
+                self._secrets.pop(job_id, None)
+        except Exception:
+            logger.exception("写入上传任务 %s 终态失败", job_id)
+        finally:
+            with self._cond:
+                self._running.pop(job_id, None)
+                self._cond.notify_all()
+
+    @staticmethod
+    def _mark_succeeded(conn, job_id: str, result: dict):
+        conn.execute(
+            "UPDATE upload_jobs SET status = 'succeeded', progress = 1, stage = '完成', partial_text = NULL, "
+            "result_json = ?, error = NULL, owner_pid = NULL, finished_at = CURRENT_TIMESTAMP, "
+            "updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+            (json.dumps(result, ensure_ascii=False), job_id),
+        )
+
+
+def _pid_alive(pid: int | None) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# ── 进程级单例 ──
+_queue: JobQueue | None = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """获取上传任务队列单例（首次调用时并不启动派发，由 API lifespan 调 start()）。"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
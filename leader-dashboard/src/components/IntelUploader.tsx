@@ -67,6 +67,32 @@ const SCAN_LINES = [
     "✅ 解析完毕 — 情报已就位",
 ]
 
+// ── Upload Jobs ──
+// 上传接口只入队并返回 job_id，这里轮询 /api/jobs/{id} 直到终态，返回任务结果（与原同步响应体一致）
+
+interface UploadJob {
+    job_id: string
+    status: "queued" | "running" | "succeeded" | "failed"
+    progress: number
+    stage: string
+    error: string | null
+    result: any
+    partial?: string
+}
+
+async function waitForJob(submitted: any, onProgress: (job: UploadJob) => void): Promise<any> {
+    if (!submitted?.job_id) return submitted
+    let job: UploadJob = submitted
+    while (job.status === "queued" || job.status === "running") {
+        onProgress(job)
+        await new Promise((r) => setTimeout(r, 1000))
+        const res = await fetch(`http://localhost:8000/api/jobs/${job.job_id}`)
+        job = await res.json()
+    }
+    if (job.status === "failed") return { success: false, error: job.error || "解析失败" }
+    return job.result
+}
+
 // ── Component ──
 
 export function IntelUploader() {
@@ -440,6 +466,10 @@ export function IntelUploader() {
                                         const imageExts = ["jpg", "jpeg", "png"]
                                         const docExts = ["pdf", "docx", "txt"]
                                         const mediaExts = ["mp3", "wav", "m4a", "mp4", "mov", "webm", "ogg", "flac"]
+                                        const onJobProgress = (job: UploadJob) => {
+                                            setImageMsg(`⏳ ${job.stage || (job.status === "queued" ? "排队中" : "解析中")} ${Math.round(job.progress * 100)}%`)
+                                            if (job.partial) setImageResult(`【转录中…】\n${job.partial}`)
+                                        }
 
                                         try {
                                             if (imageExts.includes(ext)) {
@@ -450,7 +480,7 @@ export function IntelUploader() {
                                                 const res = await fetch("http://localhost:8000/api/intel/upload_image", {
                                                     method: "POST", headers: { "X-API-Key": apiKey }, body: formData,
                                                 })
-                                                const data = await res.json()
+                                                const data = await waitForJob(await res.json(), onJobProgress)
                                                 if (data.success) {
                                                     setImageMsg(`✅ ${data.message}`)
                                                     setImageResult(data.parsed_intel)
@@ -463,7 +493,7 @@ export function IntelUploader() {
                                                 const res = await fetch("http://localhost:8000/api/upload_and_analyze", {
                                                     method: "POST", headers: { "X-API-Key": apiKey }, body: formData,
                                                 })
-                                                const data = await res.json()
+                                                const data = await waitForJob(await res.json(), onJobProgress)
                                                 if (data.success) {
                                                     setImageMsg(`✅ 文档解析成功！提取 ${data.extracted_text_length} 字符`)
                                                     setImageResult(JSON.stringify(data.intelligence, null, 2))
@@ -476,7 +506,7 @@ export function IntelUploader() {
                                                 const res = await fetch("http://localhost:8000/api/intel/upload_media", {
                                                     method: "POST", headers: { "X-API-Key": apiKey }, body: formData,
                                                 })
-                                                const data = await res.json()
+                                                const data = await waitForJob(await res.json(), onJobProgress)
                                                 if (data.success) {
                                                     setImageMsg(`✅ ${data.message}`)
                                                     setImageResult(`【转录文本】\n${data.transcribed_text}\n\n【AI 情报分析】\n${JSON.stringify(data.intelligence, null, 2)}`)
@@ -494,7 +524,7 @@ export function IntelUploader() {
                             )}
 
                             {imageMsg && (
-                                <p className={cn("text-xs", imageMsg.startsWith("✅") ? "text-emerald-400" : "text-red-400")}>{imageMsg}</p>
+                                <p className={cn("text-xs", imageMsg.startsWith("✅") ? "text-emerald-400" : imageMsg.startsWith("⏳") ? "text-[hsl(var(--muted-foreground))]" : "text-red-400")}>{imageMsg}</p>
                             )}
                             {imageResult && (
                                 <div className="bg-[hsl(var(--background))]/50 rounded-md p-3 text-xs text-[hsl(var(--foreground))] whitespace-pre-wrap max-h-60 overflow-y-auto">
@@ -0,0 +1,300 @@
+"""
+LLM 客户端注册表 — llm_clients.py
+===================================
+旧版 llm_service.py / api.py 与新版 services/llm_service.py 共享的 SDK 客户端池：
+  1. 进程级复用          → 按 (SDK 类型, provider, base_url, api_key 摘要) 缓存客户端
+  2. Keep-Alive 连接池   → httpx 长连接，省掉每次调用的 TCP + TLS 握手
+  3. HTTP/2              → 安装 h2 时自动启用（SRI_LLM_HTTP2=0 可关闭）
+  4. 空闲淘汰            → 超过空闲时长或超出容量 (LRU) 的客户端移出注册表；
+                            每次取用发放一个 with_options() 句柄并计数，句柄被回收（请求 / 流式响应结束、
+                            调用方不再引用）时减计数，已淘汰且计数归零的客户端关闭连接池
+  5. 复用统计            → 请求数 / 新建连接数 / 连接复用率，供 /api/health 上报
+
+用法：
+    from llm_clients import get_client_registry
+
+    client = get_client_registry().openai("OpenAI", api_key, base_url, timeout=30)
+    client.chat.completions.create(...)
+
+注意：注册表中的客户端为共享对象，调用方不得 close()。
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+
+def _http2_available() -> bool:
+    if os.environ.get("SRI_LLM_HTTP2", "1") == "0":
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+# ── 连接池参数（可通过环境变量覆盖）──
+_HTTP2 = _http2_available()
+_MAX_CONNECTIONS = int(os.environ.get("SRI_LLM_MAX_CONNECTIONS", "100"))
+_MAX_KEEPALIVE = int(os.environ.get("SRI_LLM_MAX_KEEPALIVE", "20"))
+_KEEPALIVE_EXPIRY_S = float(os.environ.get("SRI_LLM_KEEPALIVE_S", "120"))
+_CLIENT_IDLE_S = float(os.environ.get("SRI_LLM_CLIENT_IDLE_S", "600"))    # 客户端空闲淘汰
+_MAX_CLIENTS = int(os.environ.get("SRI_LLM_MAX_CLIENTS", "32"))           # 每个池的客户端上限
+
+
+def _key_digest(api_key: str) -> str:
+    """API Key 只以摘要参与缓存键，不在内存索引中保留明文。"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class _Entry:
+    client: Any
+    http_client: httpx.Client | httpx.AsyncClient
+    loop: asyncio.AbstractEventLoop | None = None     # 异步客户端所属事件循环
+    last_used: float = field(default_factory=time.monotonic)
+    leases: int = 0                                   # 尚未回收的句柄数（含在途请求 / 流式响应）
+    evicted: bool = False
+    closed: bool = False
+
+
+class LLMClientRegistry:
+    """
+    进程级 LLM SDK 客户端注册表。
+    ─────────────────────────────
+    - openai() / anthropic():             同步客户端，全进程共享
+    - async_openai() / async_anthropic(): 异步客户端，按事件循环隔离（httpx 异步连接不能跨 loop）
+    - 超时通过 with_options() 按调用覆盖，不参与缓存键，共享同一连接池
+    """
+
+    def __init__(self):
+        # 可重入：句柄的 finalize 回调可能在持锁线程内由 GC 触发
+        self._lock = threading.RLock()
+        self._sync: dict[tuple, _Entry] = {}
+        self._async: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._stats = {
+            "client_hits": 0, "client_misses": 0, "evictions": 0, "closed": 0,
+            "requests": 0, "connections": 0,
+        }
+
+    # ─────────────────────────────────────
+    # 对外：按 SDK 类型取客户端
+    # ─────────────────────────────────────
+
+    def openai(self, provider: str, api_key: str, base_url: str | None = None,
+               timeout: float = 30) -> OpenAI:
+        def build(http_client):
+            return OpenAI(api_key=api_key, base_url=base_url or None, http_client=http_client)
+        return self._get_sync(("openai", provider, base_url or "", _key_digest(api_key)),
+                              build, DefaultHttpxClient, timeout)
+
+    def anthropic(self, provider: str, api_key: str, base_url: str | None = None,
+                  timeout: float = 45):
+        import anthropic
+
+        def build(http_client):
+            return anthropic.Anthropic(api_key=api_key, base_url=base_url or None, http_client=http_client)
+        return self._get_sync(("anthropic", provider, base_url or "", _key_digest(api_key)),
+                              build, anthropic.DefaultHttpxClient, timeout)
+
+    def async_openai(self, provider: str, api_key: str, base_url: str | None = None,
+                     timeout: float = 30) -> AsyncOpenAI:
+        def build(http_client):
+            return AsyncOpenAI(api_key=api_key, base_url=base_url or None, http_client=http_client)
+        return self._get_async(("openai", provider, base_url or "", _key_digest(api_key)),
+                               build, DefaultAsyncHttpxClient, timeout)
+
+    def async_anthropic(self, provider: str, api_key: str, base_url: str | None = None,
+                        timeout: float = 45):
+        import anthropic
+
+        def build(http_client):
+            return anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url or None, http_client=http_client)
+        return self._get_async(("anthropic", provider, base_url or "", _key_digest(api_key)),
+                               build, anthropic.DefaultAsyncHttpxClient, timeout)
+
+    # ─────────────────────────────────────
+    # 内部：缓存查找 / 构建
+    # ─────────────────────────────────────
+
+    def _http_kwargs(self, is_async: bool) -> dict:
+        def on_request(request: httpx.Request):
+            self._bump("requests")
+            request.extensions["trace"] = trace
+
+        def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                self._bump("connections")
+
+        async def aon_request(request: httpx.Request):
+            self._bump("requests")
+            request.extensions["trace"] = atrace
+
+        async def atrace(event_name: str, info: dict):
+            trace(event_name, info)
+
+        return {
+            "http2": _HTTP2,
+            "limits": httpx.Limits(
+                max_connections=_MAX_CONNECTIONS,
+                max_keepalive_connections=_MAX_KEEPALIVE,
+                keepalive_expiry=_KEEPALIVE_EXPIRY_S,
+            ),
+            "event_hooks": {"request": [aon_request if is_async else on_request]},
+        }
+
+    def _get_sync(self, key: tuple, build, http_cls, timeout: float):
+        with self._lock:
+            idle = self._sweep(self._sync)
+            entry = self._sync.get(key)
+            if entry is None:
+                self._stats["client_misses"] += 1
+                http_client = http_cls(**self._http_kwargs(is_async=False))
+                entry = _Entry(client=build(http_client), http_client=http_client)
+                self._sync[key] = entry
+                idle += self._trim(self._sync)
+            else:
+                self._stats["client_hits"] += 1
+                entry.last_used = time.monotonic()
+            handle = self._lease(entry, timeout)
+        self._close_entries(idle)
+        return handle
+
+    def _get_async(self, key: tuple, build, http_cls, timeout: float):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._async.setdefault(loop, {})
+            idle = self._sweep(pool)
+            entry = pool.get(key)
+            if entry is None:
+                self._stats["client_misses"] += 1
+                http_client = http_cls(**self._http_kwargs(is_async=True))
+                entry = _Entry(client=build(http_client), http_client=http_client, loop=loop)
+                pool[key] = entry
+                idle += self._trim(pool)
+            else:
+                self._stats["client_hits"] += 1
+                entry.last_used = time.monotonic()
+            handle = self._lease(entry, timeout)
+        self._close_entries(idle)
+        return handle
+
+    # ─────────────────────────────────────
+    # 内部：租用计数 / 淘汰 / 关闭
+    # ─────────────────────────────────────
+    # 调用方拿到的是 with_options() 副本（句柄），在途请求与流式响应都持有它；
+    # 句柄被回收即视为归还。淘汰只移出注册表，仍有句柄未归还的客户端等最后一个归还时再关闭，
+    # 不会打断正在进行的长请求 / 流式响应。
+
+    def _lease(self, entry: _Entry, timeout: float):
+        """发放一个句柄并计数（调用方须持有锁）。"""
+        handle = entry.client.with_options(timeout=timeout)
+        entry.leases += 1
+        weakref.finalize(handle, self._release, entry)
+        return handle
+
+    def _release(self, entry: _Entry):
+        with self._lock:
+            entry.leases -= 1
+            idle = self._closable(entry)
+        if idle:
+            self._close_entries([entry])
+
+    def _closable(self, entry: _Entry) -> bool:
+        """已淘汰且无未归还句柄时返回 True，每个客户端只返回一次（调用方须持有锁）。"""
+        if entry.evicted and entry.leases == 0 and not entry.closed:
+            entry.closed = True
+            self._stats["closed"] += 1
+            return True
+        return False
+
+    def _evict(self, pool: dict, keys) -> list[_Entry]:
+        """移出注册表，返回可立即关闭的客户端（调用方须持有锁，关闭在锁外进行）。"""
+        idle = []
+        for k in keys:
+            entry = pool.pop(k)
+            entry.evicted = True
+            if self._closable(entry):
+                idle.append(entry)
+        self._stats["evictions"] += len(keys)
+        return idle
+
+    def _sweep(self, pool: dict) -> list[_Entry]:
+        """移出空闲超时的客户端（调用方须持有锁）。"""
+        now = time.monotonic()
+        return self._evict(pool, [k for k, e in pool.items() if now - e.last_used > _CLIENT_IDLE_S])
+
+    def _trim(self, pool: dict) -> list[_Entry]:
+        """超出容量时按最久未用淘汰（调用方须持有锁）。"""
+        if len(pool) <= _MAX_CLIENTS:
+            return []
+        return self._evict(pool, sorted(pool, key=lambda k: pool[k].last_used)[: len(pool) - _MAX_CLIENTS])
+
+    @staticmethod
+    def _close_entries(entries: list[_Entry]):
+        for e in entries:
+            if e.loop is None:
+                e.http_client.close()
+            elif not e.loop.is_closed():
+                # 异步客户端须在所属事件循环上 aclose；事件循环已关闭时连接已随之释放
+                coro = e.http_client.aclose()
+                try:
+                    e.loop.call_soon_threadsafe(e.loop.create_task, coro)
+                except RuntimeError:
+                    coro.close()
+
+    def _bump(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    # ─────────────────────────────────────
+    # 运维
+    # ─────────────────────────────────────
+
+    def stats(self) -> dict:
+        """客户端命中与连接复用统计。"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["sync_clients"] = len(self._sync)
+            snapshot["async_clients"] = sum(len(p) for p in self._async.values())
+        reqs = snapshot["requests"]
+        snapshot["connection_reuse_rate"] = (
+            f"{(1 - snapshot['connections'] / reqs) * 100:.1f}%" if reqs else "N/A"
+        )
+        snapshot["http2"] = _HTTP2
+        return snapshot
+
+    def close(self):
+        """关闭全部同步客户端；异步客户端随事件循环回收。"""
+        with self._lock:
+            entries = list(self._sync.values())
+            self._sync.clear()
+            self._async = weakref.WeakKeyDictionary()
+        for e in entries:
+            e.http_client.close()
+
+
+# ── 进程级单例 ──
+_registry: LLMClientRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_client_registry() -> LLMClientRegistry:
+    """获取进程级 LLM 客户端注册表。"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = LLMClientRegistry()
+    return _registry
@@ -3,7 +3,8 @@ import sys
 from dataclasses import dataclass
 
 import openai
-from openai import OpenAI
+
+from llm_clients import get_client_registry
 
 
 # ══════════════════════════════════════════════════
@@ -56,10 +57,8 @@ class GlobalLLMRouter:
 
                 if provider.name == "Anthropic":
                     # 使用原生 Anthropic SDK
-                    import anthropic
-                    client = anthropic.Anthropic(
-                        api_key=provider.api_key,
-                        timeout=provider.timeout,
+                    client = get_client_registry().anthropic(
+                        provider.name, provider.api_key, timeout=provider.timeout,
                     )
                     # 提取 system 消息和 user/assistant 消息
                     system_text = ""
@@ -84,10 +83,8 @@ class GlobalLLMRouter:
                     content = response.content[0].text
                 else:
                     # OpenAI 兼容 SDK（OpenAI / Gemini / xAI / Local）
-                    client = OpenAI(
-                        api_key=provider.api_key,
-                        base_url=provider.base_url,
-                        timeout=provider.timeout,
+                    client = get_client_registry().openai(
+                        provider.name, provider.api_key, provider.base_url, provider.timeout,
                     )
                     response = client.chat.completions.create(
                         model=provider.model,
@@ -282,6 +279,18 @@ SYSTEM_PROMPT = (
 )
 
 
+def get_openai_client(api_key: str):
+    """从进程级注册表取 OpenAI 客户端（复用连接池，保持 SDK 默认超时）。"""
+    return get_client_registry().openai("OpenAI", api_key, timeout=openai.DEFAULT_TIMEOUT)
+
+
+def get_anthropic_client(api_key: str):
+    """从进程级注册表取 Anthropic 客户端（复用连接池，保持 SDK 默认超时）。"""
+    import anthropic
+
+    return get_client_registry().anthropic("Anthropic", api_key, timeout=anthropic.DEFAULT_TIMEOUT)
+
+
 def encode_image(uploaded_file) -> str:
     """将上传的图片文件转换为 Base64 字符串。"""
     file_bytes = uploaded_file.read()
@@ -318,7 +327,7 @@ def _detect_llm_config(api_key: str) -> dict:
 
 def parse_visit_log_with_image(api_key: str, raw_text: str, image_base64: str) -> str:
     """调用多模态大模型，同时解析文字口述 + 图片情报，输出 4+1 JSON。"""
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
 
     user_content = [
         {
@@ -360,7 +369,7 @@ ADVISOR_PROMPT = (
 
 def chat_with_project(api_key: str, context_data: str, user_query: str) -> str:
     """基于项目情报上下文，与 AI 参谋对话（非流式）。"""
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
 
     user_message = (
         f"【项目历史情报上下文】\n{context_data}\n\n"
@@ -385,7 +394,7 @@ def chat_with_project_stream(api_key: str, context_data: str, messages: list):
     messages: 完整的对话历史 [{"role": "user"/"assistant", "content": "..."}]
     返回一个生成器，逐 chunk yield 文本。
     """
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
 
     # 将项目情报注入 system prompt
     system_msg = (
@@ -410,7 +419,7 @@ def chat_with_project_stream(api_key: str, context_data: str, messages: list):
 
 def generate_quiz(api_key: str, context_data: str, blind_spots: str = "无") -> str:
     """基于项目情报 + 历史盲点，生成一道三维实战情景模拟测验题。"""
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
 
     coach_prompt = (
         "你是一名顶级的工业电气销售教练兼技术总工。\n"
@@ -457,7 +466,7 @@ CRITIQUE_PROMPT = (
 
 def critique_answer(api_key: str, quiz: str, user_answer: str) -> str:
     """评估销售人员的应对策略，返回 JSON 格式的评分、点评和盲点。"""
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
 
     user_message = (
         f"【测验题目】\n{quiz}\n\n"
@@ -488,7 +497,7 @@ TEAM_REPORT_PROMPT = (
 
 def generate_team_report(api_key: str, blind_spots_summary: str) -> str:
     """基于团队盲点汇总数据，生成团队能力体检报告。"""
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
 
     response = client.chat.completions.create(
         model="gpt-4o-mini",
@@ -545,7 +554,7 @@ def generate_followup_email(api_key: str, context_data: str,
                             shared_history: str = "",
                             is_director: bool = False,
                             subordinate_name: str = "") -> str:
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
 
     if channel == "wechat":
         prompt = _build_wechat_followup_prompt(target_person)
@@ -632,7 +641,7 @@ def generate_tech_summary(api_key: str, context_data: str,
                           tech_pain_points: list = None,
                           tech_role: list = None) -> str:
     """基于项目情报 + 四维配置，生成 Miller Heiman 体系的技术与商务融合方案摘要。"""
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
 
     pain_points_str = "、".join(tech_pain_points) if tech_pain_points else "未明确具体痛点"
     role_str = "、".join(tech_role) if tech_role else "未指定"
@@ -685,7 +694,7 @@ def generate_insider_ammo(api_key: str, context_data: str,
                           leader_attitude: str = "",
                           leader_history: str = "") -> str:
     """为教练/内线一次性生成 3 种侧重点的向上管理话术。"""
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
 
     prompt = (
         f"你是一名深谙复杂销售博弈和职场向上管理的顶级军师。\n"
@@ -873,22 +882,17 @@ def generate_sales_pitch(api_key: str, context_data: str,
     return router.chat(messages=messages, temperature=temperature)
 
 
-def transcribe_audio(api_key: str, audio_bytes: bytes) -> str:
-    """使用 OpenAI Whisper API 将音频转为文字。"""
+def transcribe_audio(api_key: str, audio_bytes: bytes, suffix: str = ".wav") -> str:
+    """使用 OpenAI Whisper API 将音频转为文字（长音频按静音分段并发转写，见 audio_transcribe）。"""
     import tempfile, os
-    client = OpenAI(api_key=api_key)
+    from audio_transcribe import openai_whisper, transcribe
+    client = get_openai_client(api_key)
 
-    # 写入临时文件供 API 读取
-    tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
+    # 写入临时文件供 ffmpeg 切分 / API 读取
+    tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
     try:
         tmp.write(audio_bytes)
         tmp.close()
-        with open(tmp.name, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="zh",
-            )
-        return transcript.text
+        return transcribe(tmp.name, openai_whisper(client))
     finally:
         os.unlink(tmp.name)
@@ -1,7 +1,7 @@
 """
 FastAPI 应用入口 — main.py
 ============================
-挂载所有 10 个路由模块，初始化数据库。
+挂载所有 11 个路由模块，初始化数据库。
 """
 
 from contextlib import asynccontextmanager
@@ -9,7 +9,11 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from db import init_db
+from db import engine, init_db
+from llm_clients import get_client_registry
+from services.ai_cache import install_invalidation_hooks
+from services.intel_summary import get_summary_worker, install_summary_hooks
+from services.search import ensure_index
 from routers import (
     ai,
     appeals,
@@ -18,6 +22,7 @@ from routers import (
     deal_desks,
     intel,
     projects,
+    search,
     sos,
     stakeholders,
     users,
@@ -26,16 +31,24 @@ from routers import (
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """启动时初始化数据库。"""
+    """
+    启动时初始化数据库、全文检索索引，注册检索同步 / AI 缓存失效 / 情报摘要刷新钩子，
+    并在后台补扫摘要落后的项目；退出时释放 LLM 连接池。
+    """
     init_db()
+    ensure_index(engine)
+    install_invalidation_hooks()
+    install_summary_hooks()
+    get_summary_worker().schedule_stale()
     yield
+    get_client_registry().close()
 
 
 app = FastAPI(
     title="SRI 作战指挥室 — API",
     description=(
         "销售 AI 情报系统后端 API\n\n"
-        "• 10 个路由模块 • RBAC 权限锁 • 状态机引擎 • 天眼防篡改 • AI 网关"
+        "• 11 个路由模块 • RBAC 权限锁 • 状态机引擎 • 天眼防篡改 • AI 网关"
     ),
     version="2.0.0",
     lifespan=lifespan,
@@ -48,6 +61,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # keyset 分页下一页游标
 )
 
 # ── 挂载路由 ──
@@ -61,8 +75,12 @@ app.include_router(contracts.router)
 app.include_router(sos.router)
 app.include_router(appeals.router)
 app.include_router(ai.router)
+app.include_router(search.router)
 
 
 @app.get("/api/health")
 def health_check():
-    return {"status": "operational", "version": "2.0.0", "system": "SRI 作战指挥室"}
+    return {
+        "status": "operational", "version": "2.0.0", "system": "SRI 作战指挥室",
+        "llmClients": get_client_registry().stats(),
+    }
@@ -0,0 +1,196 @@
+"""
+版本化数据库迁移 — migrations/
+================================
+轻量 Alembic 风格迁移（无额外依赖），供 db.init_db() 与运维 CLI 共用：
+  1. 版本链          → migrations/versions/vNNNN_*.py，每个文件声明 revision / down_revision
+  2. 版本表          → schema_migrations 记录已应用的 revision
+  3. 逐版本事务      → 每个迁移独立 BEGIN/COMMIT，失败只回滚当前版本
+  4. 升级 / 回退     → upgrade(head) / downgrade(<revision>|base)
+  5. 漂移检查        → check()：models.py 声明的索引在库中缺失时列出
+
+约定：表结构仍由 create_all 负责建新表；迁移负责既有库的增量演进（索引、补列等），
+DDL 一律幂等（IF NOT EXISTS / IF EXISTS），全新库上重放亦安全。
+
+CLI:
+    python -m migrations current
+    python -m migrations upgrade [head|<revision>]
+    python -m migrations downgrade <revision>|base
+    python -m migrations history
+    python -m migrations check
+"""
+
+import importlib
+import pkgutil
+from dataclasses import dataclass
+from datetime import datetime
+from types import ModuleType
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+VERSION_TABLE = "schema_migrations"
+
+
+@dataclass
+class Migration:
+    revision: str
+    down_revision: str | None
+    description: str
+    module: ModuleType
+
+    def upgrade(self, conn: Connection):
+        self.module.upgrade(conn)
+
+    def downgrade(self, conn: Connection):
+        self.module.downgrade(conn)
+
+
+# ═══════════════════════════════════════════
+# 迁移脚本可用的 DDL 助手
+# ═══════════════════════════════════════════
+
+def create_indexes(conn: Connection, indexes: list[tuple[str, str, list[str]]]):
+    """批量建索引：[(索引名, 表名, [列...]), ...]，已存在则跳过。"""
+    for name, table, columns in indexes:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+
+def drop_indexes(conn: Connection, indexes: list[tuple[str, str, list[str]]]):
+    """create_indexes 的逆操作。"""
+    for name, _table, _columns in reversed(indexes):
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+# ═══════════════════════════════════════════
+# 版本链加载
+# ═══════════════════════════════════════════
+
+def load_migrations() -> list[Migration]:
+    """按 down_revision 链排序返回全部迁移；链断裂 / 分叉时报错。"""
+    from migrations import versions
+
+    found: dict[str, Migration] = {}
+    for info in pkgutil.iter_modules(versions.__path__):
+        module = importlib.import_module(f"{versions.__name__}.{info.name}")
+        doc = (module.__doc__ or "").strip().splitlines()
+        m = Migration(
+            revision=module.revision,
+            down_revision=module.down_revision,
+            description=doc[0] if doc else info.name,
+            module=module,
+        )
+        if m.revision in found:
+            raise RuntimeError(f"迁移 revision 重复: {m.revision}")
+        found[m.revision] = m
+
+    children: dict[str | None, list[Migration]] = {}
+    for m in found.values():
+        children.setdefault(m.down_revision, []).append(m)
+
+    chain, parent = [], None
+    while parent in children:
+        nxt = children.pop(parent)
+        if len(nxt) > 1:
+            raise RuntimeError(f"迁移链分叉于 {parent}: {[m.revision for m in nxt]}")
+        chain.append(nxt[0])
+        parent = nxt[0].revision
+    if len(chain) != len(found):
+        orphans = sorted(set(found) - {m.revision for m in chain})
+        raise RuntimeError(f"迁移链断裂，无法接入的 revision: {orphans}")
+    return chain
+
+
+# ═══════════════════════════════════════════
+# 版本表
+# ═══════════════════════════════════════════
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+        "revision VARCHAR(32) PRIMARY KEY, "
+        "description VARCHAR(200), "
+        "applied_at TIMESTAMP)"
+    ))
+
+
+def _applied(conn: Connection) -> set[str]:
+    return {r[0] for r in conn.execute(text(f"SELECT revision FROM {VERSION_TABLE}"))}
+
+
+def current(engine: Engine) -> str | None:
+    """当前库所处的最新 revision（未迁移过返回 None）。"""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        applied = _applied(conn)
+    head = None
+    for m in load_migrations():
+        if m.revision not in applied:
+            break
+        head = m.revision
+    return head
+
+
+# ═══════════════════════════════════════════
+# 升级 / 回退
+# ═══════════════════════════════════════════
+
+def upgrade(engine: Engine, target: str = "head") -> list[str]:
+    """升级到 target（默认最新），返回本次应用的 revision 列表。"""
+    chain = load_migrations()
+    if target != "head" and target not in {m.revision for m in chain}:
+        raise ValueError(f"未知 revision: {target}")
+
+    done = []
+    for m in chain:
+        try:
+            with engine.begin() as conn:
+                _ensure_version_table(conn)
+                # 事务内复查：多 worker 同时启动时只有一个真正执行
+                if m.revision not in _applied(conn):
+                    m.upgrade(conn)
+                    conn.execute(
+                        text(f"INSERT INTO {VERSION_TABLE} (revision, description, applied_at) "
+                             "VALUES (:r, :d, :t)"),
+                        {"r": m.revision, "d": m.description[:200], "t": datetime.utcnow()},
+                    )
+                    done.append(m.revision)
+        except IntegrityError:
+            pass  # 另一进程已抢先记录该版本
+        if m.revision == target:
+            break
+    return done
+
+
+def downgrade(engine: Engine, target: str) -> list[str]:
+    """回退到 target（'base' 表示撤销全部），返回本次撤销的 revision 列表。"""
+    chain = load_migrations()
+    revisions = [m.revision for m in chain]
+    if target != "base" and target not in revisions:
+        raise ValueError(f"未知 revision: {target}")
+    keep = 0 if target == "base" else revisions.index(target) + 1
+
+    undone = []
+    for m in reversed(chain[keep:]):
+        with engine.begin() as conn:
+            _ensure_version_table(conn)
+            if m.revision in _applied(conn):
+                m.downgrade(conn)
+                conn.execute(text(f"DELETE FROM {VERSION_TABLE} WHERE revision = :r"), {"r": m.revision})
+                undone.append(m.revision)
+    return undone
+
+
+def check(engine: Engine) -> list[str]:
+    """models.py 声明但库中不存在的索引（非空说明缺少迁移或尚未升级）。"""
+    from models import Base
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        missing += [f"{table.name}.{ix.name}" for ix in table.indexes if ix.name not in present]
+    return missing
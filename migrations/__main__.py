@@ -0,0 +1,53 @@
+"""
+迁移 CLI — python -m migrations <command>
+"""
+
+import argparse
+import sys
+
+import migrations
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="SRI SaaS 数据库版本化迁移")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("current", help="显示当前 revision")
+    sub.add_parser("history", help="列出迁移链及应用状态")
+    up = sub.add_parser("upgrade", help="升级（默认到 head）")
+    up.add_argument("target", nargs="?", default="head")
+    down = sub.add_parser("downgrade", help="回退到指定 revision 或 base")
+    down.add_argument("target")
+    sub.add_parser("check", help="检查 models.py 声明的索引是否都已落库")
+    args = parser.parse_args(argv)
+
+    from db import engine
+    from models import Base
+
+    if args.command == "current":
+        print(migrations.current(engine) or "base")
+    elif args.command == "history":
+        head = migrations.current(engine)
+        chain = migrations.load_migrations()
+        applied = [m.revision for m in chain].index(head) + 1 if head else 0
+        for i, m in enumerate(chain):
+            print(f"{'✅' if i < applied else '⬜'} {m.revision}  {m.description}")
+    elif args.command == "upgrade":
+        Base.metadata.create_all(bind=engine)
+        done = migrations.upgrade(engine, args.target)
+        print(f"✅ 已升级: {', '.join(done)}" if done else "已是最新，无需升级")
+    elif args.command == "downgrade":
+        undone = migrations.downgrade(engine, args.target)
+        print(f"✅ 已回退: {', '.join(undone)}" if undone else "无需回退")
+    elif args.command == "check":
+        missing = migrations.check(engine)
+        if missing:
+            print("❌ 以下索引在 models.py 中声明但库中缺失（请补迁移或执行 upgrade）:")
+            for name in missing:
+                print(f"   - {name}")
+            return 1
+        print("✅ 索引与 models.py 一致")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""迁移脚本目录：文件名 vNNNN_<说明>.py，按 down_revision 串成单链。"""
@@ -0,0 +1,29 @@
+"""keyset 分页复合索引（与 routers 列表排序键一致）
+
+既有库补建 models.py 中为列表端点声明的 (过滤列, 排序列..., id) 索引。
+"""
+
+from migrations import create_indexes, drop_indexes
+
+revision = "0001"
+down_revision = None
+
+INDEXES = [
+    ("ix_users_dept_name_id", "users", ["dept", "name", "id"]),
+    ("ix_projects_updated_id", "projects", ["updated_at", "id"]),
+    ("ix_projects_owner_updated_id", "projects", ["owner_id", "updated_at", "id"]),
+    ("ix_projects_dept_updated_id", "projects", ["dept", "updated_at", "id"]),
+    ("ix_stakeholders_project_weight_id", "stakeholders", ["project_id", "influence_weight", "id"]),
+    ("ix_intel_logs_project_created_id", "intel_logs", ["project_id", "created_at", "id"]),
+    ("ix_sos_tickets_created_id", "sos_tickets", ["created_at", "id"]),
+    ("ix_sos_tickets_status_created_id", "sos_tickets", ["status", "created_at", "id"]),
+    ("ix_appeals_status_created_id", "appeals", ["status", "created_at", "id"]),
+]
+
+
+def upgrade(conn):
+    create_indexes(conn, INDEXES)
+
+
+def downgrade(conn):
+    drop_indexes(conn, INDEXES)
@@ -0,0 +1,30 @@
+"""热点过滤列索引（审批池 / 阶段筛选 / 组织架构 / 申诉裁决 / BOM 明细）
+
+对应 routers 中的 WHERE / ORDER BY：
+  - projects: approval_status [+ dept] + created_at → 待审核列表、撞单查重；stage + updated_at → 阶段筛选
+  - users:    is_active + dept → 组织架构树；name → 申诉裁决按申诉人回查用户
+  - bom_items.deal_desk_id / contract_bom_items.contract_id → 外键明细加载与整单替换
+"""
+
+from migrations import create_indexes, drop_indexes
+
+revision = "0002"
+down_revision = "0001"
+
+INDEXES = [
+    ("ix_projects_approval_created_id", "projects", ["approval_status", "created_at", "id"]),
+    ("ix_projects_approval_dept_created_id", "projects", ["approval_status", "dept", "created_at", "id"]),
+    ("ix_projects_stage_updated_id", "projects", ["stage", "updated_at", "id"]),
+    ("ix_users_active_dept", "users", ["is_active", "dept"]),
+    ("ix_users_name", "users", ["name"]),
+    ("ix_bom_items_deal_desk_id", "bom_items", ["deal_desk_id"]),
+    ("ix_contract_bom_items_contract_id", "contract_bom_items", ["contract_id"]),
+]
+
+
+def upgrade(conn):
+    create_indexes(conn, INDEXES)
+
+
+def downgrade(conn):
+    drop_indexes(conn, INDEXES)
@@ -0,0 +1,59 @@
+"""撞单查重索引表 + 存量项目回填
+
+project_collision_keys（归一化客户名）与 project_collision_grams（客户名二元组倒排），
+供 services/collision.py 以「索引取候选 → 回表复核」替代全量加载比对。
+DDL 与回填逻辑按本版本冻结在此（归一化 strip + lower、二元组切分），不随 models / services 演进。
+"""
+
+from sqlalchemy import text
+
+revision = "0003"
+down_revision = "0002"
+
+_BATCH = 5000
+
+DDL = [
+    "CREATE TABLE IF NOT EXISTS project_collision_keys ("
+    "project_id INTEGER NOT NULL, "
+    "client_key VARCHAR(200) NOT NULL, "
+    "PRIMARY KEY (project_id), "
+    "FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE)",
+    "CREATE INDEX IF NOT EXISTS ix_project_collision_keys_client_key ON project_collision_keys (client_key)",
+    "CREATE TABLE IF NOT EXISTS project_collision_grams ("
+    "gram VARCHAR(8) NOT NULL, "
+    "project_id INTEGER NOT NULL, "
+    "PRIMARY KEY (gram, project_id), "
+    "FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE)",
+    "CREATE INDEX IF NOT EXISTS ix_project_collision_grams_project_id ON project_collision_grams (project_id)",
+]
+
+
+def _grams(key: str) -> set[str]:
+    return {key[i:i + 2] for i in range(len(key) - 1)}
+
+
+def upgrade(conn):
+    for sql in DDL:
+        conn.execute(text(sql))
+
+    # 回填尚未建索引的存量项目，按主键分批物化后再写
+    last_id = 0
+    while rows := conn.execute(text(
+        "SELECT p.id, p.client FROM projects p WHERE p.id > :last AND NOT EXISTS "
+        "(SELECT 1 FROM project_collision_keys k WHERE k.project_id = p.id) "
+        "ORDER BY p.id LIMIT :n"
+    ), {"last": last_id, "n": _BATCH}).all():
+        keys, gram_rows = [], []
+        for pid, client in rows:
+            key = (client or "").strip().lower()
+            keys.append({"p": pid, "k": key})
+            gram_rows += [{"g": g, "p": pid} for g in _grams(key)]
+        conn.execute(text("INSERT INTO project_collision_keys (project_id, client_key) VALUES (:p, :k)"), keys)
+        if gram_rows:
+            conn.execute(text("INSERT INTO project_collision_grams (gram, project_id) VALUES (:g, :p)"), gram_rows)
+        last_id = rows[-1][0]
+
+
+def downgrade(conn):
+    conn.execute(text("DROP TABLE IF EXISTS project_collision_grams"))
+    conn.execute(text("DROP TABLE IF EXISTS project_collision_keys"))
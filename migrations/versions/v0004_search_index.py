@@ -0,0 +1,59 @@
+"""全文检索 FTS5 索引 + 增量同步触发器
+
+search_index（FTS5，分词后文本）、search_pending（触发器写入的待同步队列）、search_meta（分词器版本），
+覆盖 intel_logs / stakeholders / knowledge_docs；存量行排入队列，由 services/search.py 的后台同步线程回填。
+DDL 按本版本冻结在此；search_meta 不写分词器，启动时 ensure_index 按当前分词器登记。
+仅 SQLite 生效，其他方言跳过。
+"""
+
+from sqlalchemy import text
+
+revision = "0004"
+down_revision = "0003"
+
+# (来源名, 表, 主键, 触发 UPDATE 的列)
+SOURCES = [
+    ("intel", "intel_logs", "id", "project_id, raw_input, ai_parsed_json"),
+    ("stakeholder", "stakeholders", "id", "project_id, name, title, role_tags, reports_to, notes"),
+    ("kb", "knowledge_docs", "id", "title, category, description"),
+]
+
+
+def upgrade(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "source UNINDEXED, ref_id UNINDEXED, project_id UNINDEXED, title, body, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS search_pending ("
+        "source TEXT NOT NULL, ref_id INTEGER NOT NULL, PRIMARY KEY (source, ref_id)) WITHOUT ROWID"
+    ))
+    conn.execute(text("CREATE TABLE IF NOT EXISTS search_meta (key TEXT PRIMARY KEY, value TEXT)"))
+
+    for name, table, pk, watched in SOURCES:
+        enqueue = f"INSERT OR IGNORE INTO search_pending (source, ref_id) VALUES ('{name}', %s.{pk});"
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS trg_search_{table}_ins AFTER INSERT ON {table} "
+                          f"BEGIN {enqueue % 'NEW'} END"))
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS trg_search_{table}_upd AFTER UPDATE OF {watched} "
+                          f"ON {table} BEGIN {enqueue % 'NEW'} END"))
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS trg_search_{table}_del AFTER DELETE ON {table} "
+                          f"BEGIN {enqueue % 'OLD'} END"))
+
+    # 尚未建过索引（无分词器登记）时把存量行全部排入队列
+    if conn.execute(text("SELECT 1 FROM search_meta WHERE key = 'tokenizer'")).first() is None:
+        for name, table, pk, _watched in SOURCES:
+            conn.execute(text(f"INSERT OR IGNORE INTO search_pending (source, ref_id) "
+                              f"SELECT '{name}', {pk} FROM {table}"))
+
+
+def downgrade(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    for _name, table, _pk, _watched in SOURCES:
+        for suffix in ("ins", "upd", "del"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS trg_search_{table}_{suffix}"))
+    for table in ("search_meta", "search_pending", "search_index"):
+        conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
@@ -0,0 +1,36 @@
+"""情报分层滚动摘要表
+
+intel_summaries：每个 (项目, week / month / project, 周期) 一行，存 4+1 折叠状态与渲染文本，
+由 services/intel_summary.py 的后台线程随 IntelLog 写入增量维护。
+存量项目不在迁移内回填：应用启动时后台补扫（SummaryWorker.schedule_stale）。
+"""
+
+from sqlalchemy import text
+
+revision = "0005"
+down_revision = "0004"
+
+
+def upgrade(conn):
+    sqlite = conn.dialect.name == "sqlite"
+    ts = "DATETIME" if sqlite else "TIMESTAMP"
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS intel_summaries ("
+        f"id {'INTEGER' if sqlite else 'SERIAL'} NOT NULL, "
+        "project_id INTEGER NOT NULL, "
+        "level VARCHAR(10) NOT NULL, "
+        "period_key VARCHAR(10) NOT NULL, "
+        f"period_start {ts}, "
+        "log_count INTEGER, "
+        "last_log_id INTEGER, "
+        "state_json TEXT NOT NULL, "
+        "summary_text TEXT NOT NULL, "
+        f"updated_at {ts}, "
+        "PRIMARY KEY (id), "
+        "CONSTRAINT uq_intel_summary_period UNIQUE (project_id, level, period_key), "
+        "FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE)"
+    ))
+
+
+def downgrade(conn):
+    conn.execute(text("DROP TABLE IF EXISTS intel_summaries"))
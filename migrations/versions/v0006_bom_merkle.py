@@ -0,0 +1,24 @@
+"""报价底单 BOM 默克尔快照列
+
+deal_desks.bom_merkle：与 tamper_hash 并列存放默克尔叶子明细（utils/bom_merkle.py），
+供天眼校验给出逐行差异。存量底单该列为空，仍按旧版整体哈希比对，下次改单 / 提交 / 审批时自动补齐。
+"""
+
+from sqlalchemy import inspect, text
+
+revision = "0006"
+down_revision = "0005"
+
+
+def _has_column(conn) -> bool:
+    return "bom_merkle" in {c["name"] for c in inspect(conn).get_columns("deal_desks")}
+
+
+def upgrade(conn):
+    if not _has_column(conn):
+        conn.execute(text("ALTER TABLE deal_desks ADD COLUMN bom_merkle TEXT"))
+
+
+def downgrade(conn):
+    if _has_column(conn):
+        conn.execute(text("ALTER TABLE deal_desks DROP COLUMN bom_merkle"))
@@ -0,0 +1,63 @@
+"""keyset 排序列补齐 NOT NULL
+
+列表端点按 (排序列, id) 做 keyset 比较（utils/pagination.py），排序列为 NULL 时行值比较结果为 NULL，
+翻页会在该行处中断或跳过。存量库中这些列建表时可为空：
+  1. 回填      → NULL 回填为该表现有最早值（projects.updated_at 优先取 created_at），
+                 与 SQLite 降序排序时 NULL 排在最后一致，既有列表顺序不变；influence_weight 回填默认值 5
+  2. 约束      → PostgreSQL 直接 SET NOT NULL；SQLite 不支持改列约束，且在迁移事务内重建被外键引用的表
+                 不安全，改为 BEFORE INSERT / UPDATE 触发器拒绝写入 NULL（与 NOT NULL 同样报错）
+全新库由 create_all 直接建出 NOT NULL 列，本迁移只做回填、不建触发器。
+"""
+
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+revision = "0007"
+down_revision = "0006"
+
+# (表, 列, 回填表达式)
+COLUMNS = [
+    ("projects", "updated_at", "COALESCE(created_at, (SELECT MIN(updated_at) FROM projects), :now)"),
+    ("intel_logs", "created_at", "COALESCE((SELECT MIN(created_at) FROM intel_logs), :now)"),
+    ("sos_tickets", "created_at", "COALESCE((SELECT MIN(created_at) FROM sos_tickets), :now)"),
+    ("appeals", "created_at", "COALESCE((SELECT MIN(created_at) FROM appeals), :now)"),
+    ("stakeholders", "influence_weight", "5"),
+]
+
+
+def _nullable(conn, table: str, column: str) -> bool:
+    return next(c["nullable"] for c in inspect(conn).get_columns(table) if c["name"] == column)
+
+
+def _triggers(table: str, column: str) -> list[tuple[str, str]]:
+    """SQLite NOT NULL 触发器：[(触发器名, 触发时机), ...]。"""
+    return [(f"trg_{table}_{column}_nn_insert", f"BEFORE INSERT ON {table}"),
+            (f"trg_{table}_{column}_nn_update", f"BEFORE UPDATE OF {column} ON {table}")]
+
+
+def upgrade(conn):
+    now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+    sqlite = conn.dialect.name == "sqlite"
+    for table, column, fill in COLUMNS:
+        if not _nullable(conn, table, column):
+            continue
+        conn.execute(text(f"UPDATE {table} SET {column} = {fill} WHERE {column} IS NULL"), {"now": now})
+        if not sqlite:
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+            continue
+        for name, timing in _triggers(table, column):
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {name} {timing} WHEN NEW.{column} IS NULL "
+                f"BEGIN SELECT RAISE(ABORT, 'NOT NULL constraint failed: {table}.{column}'); END"
+            ))
+
+
+def downgrade(conn):
+    sqlite = conn.dialect.name == "sqlite"
+    for table, column, _fill in reversed(COLUMNS):
+        if sqlite:
+            for name, _timing in _triggers(table, column):
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        else:
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} DROP NOT NULL"))
@@ -15,6 +15,9 @@
   8. ContractBOMItem — 合同物料明细行
   9. SOSTicket     — 前线紧急求援工单
   10. Appeal        — 撞单申诉仲裁记录
+  11. ProjectCollisionKey / ProjectCollisionGram — 撞单查重索引
+  12. KnowledgeDoc  — 武器库知识库文档（全文检索源）
+  13. IntelSummary  — 情报周 / 月 / 全周期滚动摘要
 """
 
 import enum
@@ -23,9 +26,9 @@ import json
 from datetime import datetime
 
 from sqlalchemy import (
-    Boolean, Column, DateTime, Enum, Float, ForeignKey,
+    Boolean, Column, DateTime, Enum, Float, ForeignKey, Index,
     Integer, String, Text, UniqueConstraint, CheckConstraint,
-    event,
+    event, inspect,
 )
 from sqlalchemy.orm import declarative_base, relationship
 
@@ -137,6 +140,13 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # 索引须同步 migrations/versions（既有库靠迁移补建）
+    __table_args__ = (
+        Index("ix_users_dept_name_id", "dept", "name", "id"),
+        Index("ix_users_active_dept", "is_active", "dept"),
+        Index("ix_users_name", "name"),
+    )
+
     # 反向关联
     owned_projects = relationship("Project", back_populates="owner", foreign_keys="Project.owner_id")
     intel_logs = relationship("IntelLog", back_populates="author")
@@ -202,7 +212,17 @@ class Project(Base):
 
     # ── 时间戳 ──
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # keyset 分页：全量 / sales 按 owner / director 按战区 / 阶段筛选；审批池与撞单查重
+    __table_args__ = (
+        Index("ix_projects_updated_id", "updated_at", "id"),
+        Index("ix_projects_owner_updated_id", "owner_id", "updated_at", "id"),
+        Index("ix_projects_dept_updated_id", "dept", "updated_at", "id"),
+        Index("ix_projects_stage_updated_id", "stage", "updated_at", "id"),
+        Index("ix_projects_approval_created_id", "approval_status", "created_at", "id"),
+        Index("ix_projects_approval_dept_created_id", "approval_status", "dept", "created_at", "id"),
+    )
 
     # ── 关联 ──
     owner = relationship("User", back_populates="owned_projects", foreign_keys=[owner_id])
@@ -240,7 +260,7 @@ class Stakeholder(Base):
         Enum(StakeholderAttitude), default=StakeholderAttitude.NEUTRAL,
         comment="态度: support/neutral/oppose"
     )
-    influence_weight = Column(Integer, default=5,
+    influence_weight = Column(Integer, nullable=False, default=5,
                               comment="影响力权重 1-10")
     reports_to = Column(String(100), nullable=True, comment="上级/汇报给谁")
     phone = Column(String(50), nullable=True, comment="联系方式")
@@ -252,6 +272,7 @@ class Stakeholder(Base):
     # 约束
     __table_args__ = (
         CheckConstraint("influence_weight >= 1 AND influence_weight <= 10", name="ck_influence_range"),
+        Index("ix_stakeholders_project_weight_id", "project_id", "influence_weight", "id"),
     )
 
     project = relationship("Project", back_populates="stakeholders")
@@ -289,7 +310,11 @@ class IntelLog(Base):
                             comment="AI 结构化解析结果 (4+1 情报模型 JSON)")
     ai_model_used = Column(String(100), nullable=True, comment="使用的 AI 模型标识")
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_intel_logs_project_created_id", "project_id", "created_at", "id"),
+    )
 
     # 关联
     project = relationship("Project", back_populates="intel_logs")
@@ -332,7 +357,9 @@ class DealDesk(Base):
     # ── 财务数据 ──
     total_amount = Column(Float, default=0, comment="核定总金额(元)")
     tamper_hash = Column(String(64), nullable=True,
-                         comment="BOM 防篡改 SHA-256 校验哈希")
+                         comment="BOM 防篡改 SHA-256 校验哈希（默克尔根）")
+    bom_merkle = Column(Text, nullable=True,
+                        comment="BOM 默克尔叶子快照（天眼逐行差异基准）")
 
     # ── 变更侦测 ──
     diff_summary = Column(Text, nullable=True, comment="天眼变更侦测摘要")
@@ -363,7 +390,7 @@ class BOMItem(Base):
     __tablename__ = "bom_items"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    deal_desk_id = Column(Integer, ForeignKey("deal_desks.id", ondelete="CASCADE"), nullable=False)
+    deal_desk_id = Column(Integer, ForeignKey("deal_desks.id", ondelete="CASCADE"), nullable=False, index=True)
 
     product_model = Column(String(200), nullable=False, comment="产品型号")
     ai_extracted_qty = Column(Integer, default=0, comment="AI 提取数量")
@@ -450,7 +477,7 @@ class ContractBOMItem(Base):
     __tablename__ = "contract_bom_items"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    contract_id = Column(Integer, ForeignKey("contracts.id", ondelete="CASCADE"), nullable=False)
+    contract_id = Column(Integer, ForeignKey("contracts.id", ondelete="CASCADE"), nullable=False, index=True)
 
     product_model = Column(String(200), nullable=False, comment="产品型号")
     ai_extracted_qty = Column(Integer, default=0, comment="AI 提取数量")
@@ -499,7 +526,12 @@ class SOSTicket(Base):
     resolved_by = Column(String(100), nullable=True, comment="批示人")
     resolved_at = Column(DateTime, nullable=True, comment="批示时间")
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_sos_tickets_created_id", "created_at", "id"),
+        Index("ix_sos_tickets_status_created_id", "status", "created_at", "id"),
+    )
 
     # 关联
     project = relationship("Project", back_populates="sos_tickets")
@@ -544,7 +576,11 @@ class Appeal(Base):
     judged_by = Column(String(100), nullable=True, comment="裁决人")
     judged_at = Column(DateTime, nullable=True, comment="裁决时间")
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_appeals_status_created_id", "status", "created_at", "id"),
+    )
 
     # 关联
     project = relationship("Project", back_populates="appeals", foreign_keys=[project_id])
@@ -553,6 +589,106 @@ class Appeal(Base):
         return f"<Appeal {self.applicant} vs {self.original_owner} [{self.status.value}]>"
 
 
+# ═══════════════════════════════════════════
+# 9. 撞单查重索引 (services/collision.py)
+# ═══════════════════════════════════════════
+
+class ProjectCollisionKey(Base):
+    """每个项目一行：归一化客户名，供「已有客户名 ⊆ 新客户名」的子串精确查找。"""
+    __tablename__ = "project_collision_keys"
+
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    client_key = Column(String(200), nullable=False, index=True, comment="strip().lower() 后的客户名")
+
+
+class ProjectCollisionGram(Base):
+    """客户名二元组倒排，供「已有客户名 ⊇ 新客户名」取候选。"""
+    __tablename__ = "project_collision_grams"
+
+    gram = Column(String(8), primary_key=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+
+    # 级联删除按 project_id 定位
+    __table_args__ = (
+        Index("ix_project_collision_grams_project_id", "project_id"),
+    )
+
+
+# ═══════════════════════════════════════════
+# 10. KnowledgeDoc — 武器库知识库
+# ═══════════════════════════════════════════
+
+class KnowledgeDoc(Base):
+    """
+    知识库文档元数据（产品参数 / 竞品打单卡 / 历史中标库 / 资质文件）。
+    映射自 database.py knowledge_base；全文检索见 services/search.py。
+    """
+    __tablename__ = "knowledge_docs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    title = Column(String(200), nullable=False, comment="文档标题")
+    category = Column(String(50), nullable=False, index=True, comment="分类")
+    icon = Column(String(10), default="📄")
+    file_type = Column(String(20), default="PDF")
+    file_size = Column(String(20), default="")
+    description = Column(Text, default="", comment="摘要")
+    file_path = Column(String(500), default="", comment="文件存储路径")
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<KnowledgeDoc {self.title} [{self.category}]>"
+
+
+# ═══════════════════════════════════════════
+# 11. IntelSummary — 情报分层滚动摘要 (services/intel_summary.py)
+# ═══════════════════════════════════════════
+
+class IntelSummary(Base):
+    """
+    项目情报的周 / 月 / 全周期摘要，每个 (项目, 级别, 周期) 一行。
+    由后台线程随 IntelLog 写入增量折叠，last_log_id 为已折叠的最大情报 ID（水位）。
+    """
+    __tablename__ = "intel_summaries"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    level = Column(String(10), nullable=False, comment="week / month / project")
+    period_key = Column(String(10), nullable=False, comment="2025-W07 / 2025-02 / all")
+    period_start = Column(DateTime, nullable=True, comment="周期起点（全周期为空）")
+
+    log_count = Column(Integer, default=0)
+    last_log_id = Column(Integer, default=0, comment="已折叠的最大 IntelLog.id")
+    state_json = Column(Text, nullable=False, comment="4+1 折叠状态（增量合并用）")
+    summary_text = Column(Text, nullable=False, comment="渲染后的摘要文本（直接拼入 Prompt）")
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("project_id", "level", "period_key", name="uq_intel_summary_period"),
+    )
+
+    def __repr__(self):
+        return f"<IntelSummary project={self.project_id} {self.level}:{self.period_key}>"
+
+
+# ═══════════════════════════════════════════
+# SQLAlchemy Event: 撞单查重索引同步
+# ═══════════════════════════════════════════
+
+@event.listens_for(Project, "after_insert")
+def _index_project_collision(mapper, connection, target):
+    from services.collision import write_index
+    write_index(connection, target.id, target.client)
+
+
+@event.listens_for(Project, "after_update")
+def _reindex_project_collision(mapper, connection, target):
+    if inspect(target).attrs.client.history.has_changes():
+        from services.collision import write_index
+        write_index(connection, target.id, target.client, replace=True)
+
+
 # ═══════════════════════════════════════════
 # SQLAlchemy Event: BOMItem 小计自动计算
 # ═══════════════════════════════════════════
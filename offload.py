@@ -0,0 +1,214 @@
+"""
+阻塞调用卸载 — offload.py
+==========================
+api.py 的 async 端点里不允许直接调用同步阻塞代码（sqlite3、LLM SDK、哈希 / 解析），
+一律经本模块交给按负载类型划分的有界线程池，事件循环只做调度：
+  1. 分类线程池     → db（sqlite3 读写）/ cpu（哈希、文本聚合）/ llm（同步 SDK 网络 I/O），
+                      各自有界（SRI_OFFLOAD_*_WORKERS），慢 LLM 调用占满也不会饿死数据库查询
+  2. await 接口     → run_db / run_cpu / run_llm(fn, *args, **kwargs)，复制 contextvars；
+                      同步回调里不等待结果的写入用 submit_db
+  3. 池统计         → 各池在途 / 排队 / 完成数与最长排队等待，供 /api/health 上报
+  4. 循环延迟监控   → 后台协程周期性 sleep，实测唤醒偏差即事件循环被阻塞的时长；
+                      超过 SRI_LOOP_LAG_WARN_MS 记 warning，/api/health 上报 p50 / p99 / max
+
+回归检查见 benchmarks/check_loop_lag.py（任一端点阻塞事件循环超过 50ms 即失败）。
+
+用法：
+    rows = await run_db(_load_rows, project_id)
+    text = await run_llm(router.chat, messages=messages, temperature=0.5)
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("offload")
+
+# ── 参数（可通过环境变量覆盖）──
+_WORKERS = {
+    "db": int(os.environ.get("SRI_OFFLOAD_DB_WORKERS", "8")),
+    "cpu": int(os.environ.get("SRI_OFFLOAD_CPU_WORKERS", str(os.cpu_count() or 1))),
+    "llm": int(os.environ.get("SRI_OFFLOAD_LLM_WORKERS", "32")),
+}
+_LAG_INTERVAL = float(os.environ.get("SRI_LOOP_LAG_INTERVAL_MS", "100")) / 1000
+_LAG_WARN = float(os.environ.get("SRI_LOOP_LAG_WARN_MS", "100")) / 1000
+_LAG_WINDOW = int(os.environ.get("SRI_LOOP_LAG_WINDOW", "600"))    # 保留最近 N 个采样（默认约 1 分钟）
+
+
+# ═══════════════════════════════════════════
+# 1. 分类线程池
+# ═══════════════════════════════════════════
+
+class _Pool:
+    """一类负载的有界线程池 + 计数。"""
+
+    def __init__(self, kind: str, workers: int):
+        self.kind = kind
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"offload-{kind}")
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "running": 0, "completed": 0, "errors": 0, "max_wait_ms": 0.0}
+
+    def _call(self, enqueued: float, ctx: contextvars.Context, fn):
+        wait_ms = (time.perf_counter() - enqueued) * 1000
+        with self._lock:
+            self._stats["running"] += 1
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+        try:
+            return ctx.run(fn)
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._stats["running"] -= 1
+                self._stats["completed"] += 1
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._stats["submitted"] += 1
+        call = functools.partial(fn, *args, **kwargs)
+        return await loop.run_in_executor(
+            self._executor, self._call, time.perf_counter(), contextvars.copy_context(), call,
+        )
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            self._stats["submitted"] += 1
+        call = functools.partial(fn, *args, **kwargs)
+        return self._executor.submit(self._call, time.perf_counter(), contextvars.copy_context(), call)
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["workers"] = self.workers
+        snapshot["queued"] = snapshot["submitted"] - snapshot["completed"] - snapshot["running"]
+        snapshot["max_wait_ms"] = round(snapshot["max_wait_ms"], 1)
+        return snapshot
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pools: dict[str, _Pool] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(kind: str) -> _Pool:
+    pool = _pools.get(kind)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(kind)
+            if pool is None:
+                pool = _pools[kind] = _Pool(kind, _WORKERS[kind])
+    return pool
+
+
+async def run_db(fn, *args, **kwargs):
+    """在 db 池执行同步函数（sqlite3 查询 / 写事务）。"""
+    return await _pool("db").run(fn, *args, **kwargs)
+
+
+def submit_db(fn, *args, **kwargs):
+    """把同步函数投递到 db 池、不等待结果（供 Session 事件钩子等同步回调使用），返回 Future。"""
+    return _pool("db").submit(fn, *args, **kwargs)
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """在 cpu 池执行同步函数（哈希、大段文本聚合等 CPU 密集逻辑）。"""
+    return await _pool("cpu").run(fn, *args, **kwargs)
+
+
+async def run_llm(fn, *args, **kwargs):
+    """在 llm 池执行同步函数（同步 LLM / Whisper SDK 调用）。"""
+    return await _pool("llm").run(fn, *args, **kwargs)
+
+
+def pool_stats() -> dict:
+    return {kind: _pool(kind).stats() for kind in _WORKERS}
+
+
+def shutdown_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
+
+
+# ═══════════════════════════════════════════
+# 2. 事件循环延迟监控
+# ═══════════════════════════════════════════
+
+class LoopLagMonitor:
+    """
+    每 interval 秒 sleep 一次，实际唤醒时间与预期之差即这段时间内事件循环被阻塞的时长。
+    只能发现阻塞、不能定位；定位用 benchmarks/check_loop_lag.py（asyncio debug 模式慢回调日志）。
+    """
+
+    def __init__(self, interval: float = _LAG_INTERVAL, warn: float = _LAG_WARN, window: int = _LAG_WINDOW):
+        self.interval = interval
+        self.warn = warn
+        self._samples: deque[float] = deque(maxlen=window)
+        self._max = 0.0
+        self._over = 0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self._samples.append(lag)
+            self._max = max(self._max, lag)
+            if lag >= self.warn:
+                self._over += 1
+                logger.warning("事件循环阻塞 %.0fms（阈值 %.0fms）", lag * 1000, self.warn * 1000)
+
+    def start(self):
+        """在当前事件循环上启动（幂等）。"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="loop-lag-monitor")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"samples": 0, "p50_ms": None, "p99_ms": None, "window_max_ms": None,
+                    "max_ms": round(self._max * 1000, 1), "over_warn": self._over}
+
+        def pct(q: float) -> float:
+            return round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 1)
+
+        return {
+            "samples": len(samples), "p50_ms": pct(0.5), "p99_ms": pct(0.99),
+            "window_max_ms": round(samples[-1] * 1000, 1), "max_ms": round(self._max * 1000, 1),
+            "over_warn": self._over,
+        }
+
+
+_monitor: LoopLagMonitor | None = None
+_monitor_lock = threading.Lock()
+
+
+def get_lag_monitor() -> LoopLagMonitor:
+    """获取进程级事件循环延迟监控单例（由 API lifespan 启动）。"""
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                _monitor = LoopLagMonitor()
+    return _monitor
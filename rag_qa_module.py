@@ -7,6 +7,10 @@ import os
 from typing import List, Dict, Optional
 import openai
 
+from llm_clients import get_client_registry
+from services.context_packer import ContextItem, PackResult, pack
+from services.llm_service import AITask
+
 
 # ═══════════════════════════════════════════════════════════════
 # 行业专用 System Prompts
@@ -43,34 +47,70 @@ TACTICAL_SYSTEM_PROMPT = """你是顶级 B2B 工业品销售战术教练（Mille
 💰 **报价策略：** 定价/让利/增值策略"""
 
 
+# ═══════════════════════════════════════════════════════════════
+# 检索：本地向量库 (vector_store.py)
+# ═══════════════════════════════════════════════════════════════
+
+def retrieve_docs(
+    query: str,
+    top_k: int = 5,
+    source: Optional[str] = None,
+    project_id: Optional[int] = None,
+    category: Optional[str] = None,
+) -> List[Dict]:
+    """
+    从本地向量库检索 top_k 文档碎片（先增量同步新情报 / 新文档）。
+    同步只追加游标之后的新行：已修改 / 删除的知识库文档与情报在 rebuild 前仍会被检索到。
+    - source: "kb" 知识库 / "intel" 拜访情报
+    - project_id: 只检索该项目的情报
+    - category: 知识库分类（产品参数/竞品打单卡/历史中标库/资质文件）
+    返回值可直接传给 build_context_str / generate_rag_answer。
+    """
+    from vector_store import get_vector_store
+
+    store = get_vector_store()
+    store.sync()
+    return store.search(query, k=top_k, source=source, project_id=project_id, category=category)
+
+
 # ═══════════════════════════════════════════════════════════════
 # 上下文构建工具
 # ═══════════════════════════════════════════════════════════════
 
-def build_context_str(retrieved_docs: List[Dict], max_length: int = 3000) -> str:
-    """将检索到的文档碎片合并为上下文字符串"""
-    context_parts = []
+def pack_context_docs(
+    retrieved_docs: List[Dict],
+    query: str = "",
+    max_tokens: Optional[int] = None,
+    task: AITask = AITask.GENERAL_CHAT,
+) -> PackResult:
+    """
+    将检索到的文档碎片（前 5 个）按 token 预算装箱：
+    相似度 / 与问题的相关度排序、近似重复碎片去重、放不下的碎片截断，输出保持 [文档X] 编号。
+    max_tokens 为空时使用该场景的 context_budget。
+    """
+    items = []
     for i, doc in enumerate(retrieved_docs[:5], 1):
-        content = doc.get('content', '')
         filename = doc.get('filename', '未知')
         source_type = doc.get('metadata', {}).get('source_type', 'document')
-        
+
         # 标注来源类型
         type_label = ""
         if source_type == "video":
             type_label = "（🎬 视频转录）"
         elif source_type == "audio":
             type_label = "（🎙️ 音频转录）"
-        
-        if len(content) > 500:
-            content = content[:500] + "..."
-        
-        context_parts.append(f"[文档{i}] {filename}{type_label}\n{content}")
-    
-    context = "\n\n".join(context_parts)
-    if len(context) > max_length:
-        context = context[:max_length] + "..."
-    return context
+
+        items.append(ContextItem(
+            doc.get('content', ''),
+            relevance=doc.get('similarity'),
+            label=f"[文档{i}] {filename}{type_label}\n",
+        ))
+    return pack(items, task, budget=max_tokens, query=query, separator="\n\n")
+
+
+def build_context_str(retrieved_docs: List[Dict], max_tokens: Optional[int] = None, query: str = "") -> str:
+    """将检索到的文档碎片合并为上下文字符串（token 预算内）"""
+    return pack_context_docs(retrieved_docs, query, max_tokens).text
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -82,11 +122,12 @@ def generate_rag_answer(
     retrieved_docs: List[Dict],
     api_key: str,
     model: str = "gpt-4o-mini",
-    max_context_length: int = 3000
+    max_context_tokens: Optional[int] = None
 ) -> Dict:
     """非流式生成 RAG 答案（备用回退）"""
     try:
-        context = build_context_str(retrieved_docs, max_context_length)
+        packed = pack_context_docs(retrieved_docs, query, max_context_tokens)
+        context = packed.text
         
         user_prompt = f"""客户问题：
 {query}
@@ -96,7 +137,7 @@ def generate_rag_answer(
 
 请根据以上文档回答客户的问题。如果文档中没有相关信息，请诚实说明。"""
 
-        client = openai.OpenAI(api_key=api_key)
+        client = get_client_registry().openai("OpenAI", api_key, timeout=openai.DEFAULT_TIMEOUT)
         response = client.chat.completions.create(
             model=model,
             messages=[
@@ -120,6 +161,8 @@ def generate_rag_answer(
             "answer": answer,
             "sources": sources,
             "context_length": len(context),
+            "context_tokens": packed.tokens_used,
+            "context_tokens_saved": packed.tokens_saved,
             "model": model
         }
         
@@ -136,11 +179,11 @@ def generate_rag_answer_stream(
     retrieved_docs: List[Dict],
     api_key: str,
     model: str = "gpt-4o-mini",
-    max_context_length: int = 3000
+    max_context_tokens: Optional[int] = None
 ):
     """流式生成 RAG 答案（主力路径）"""
     try:
-        context = build_context_str(retrieved_docs, max_context_length)
+        context = build_context_str(retrieved_docs, max_context_tokens, query)
         
         user_prompt = f"""客户问题：
 {query}
@@ -150,7 +193,7 @@ def generate_rag_answer_stream(
 
 请根据以上文档回答客户的问题。"""
 
-        client = openai.OpenAI(api_key=api_key)
+        client = get_client_registry().openai("OpenAI", api_key, timeout=openai.DEFAULT_TIMEOUT)
         stream = client.chat.completions.create(
             model=model,
             messages=[
@@ -265,7 +308,7 @@ def generate_tactical_advice(
     # 有 API Key → LLM 生成
     if api_key and api_key.strip() and len(api_key) > 10:
         try:
-            client = openai.OpenAI(api_key=api_key)
+            client = get_client_registry().openai("OpenAI", api_key, timeout=openai.DEFAULT_TIMEOUT)
             response = client.chat.completions.create(
                 model=model,
                 messages=[
@@ -395,8 +438,8 @@ if __name__ == "__main__":
     ]
     
     # 测试 context 构建
-    ctx = build_context_str(test_docs)
-    print(f"\n上下文构建: {len(ctx)}字")
+    packed = pack_context_docs(test_docs, "温升性能如何？")
+    print(f"\n上下文构建: {len(packed.text)}字 / {packed.tokens_used} tokens（节省 {packed.tokens_saved}）")
     
     # 测试 mock 流式
     print("\n--- Mock 流式客户回复 ---")
@@ -3,21 +3,38 @@
 ==================================
 接入 AIGateway (services/llm_service.py)。
 7 个端点：全部走场景化路由 + 全部强制脱敏。
+全部 async def + AIGateway.achat()，等待模型期间不占用线程池；上下文装载完即关闭会话，生成期间不占数据库连接。
+项目类端点挂 project:{id} 缓存标签，项目情报未变更时直接复用上次结果。
+项目情报 = 全周期滚动摘要 (services/intel_summary.py) + 最近原文，
+按场景 token 预算装箱 (services/context_packer.py)，响应附带 context_tokens / context_tokens_saved。
+每个端点另有 POST .../stream 流式版本 (SSE)：
+    data: {"delta": "..."}                               逐段文本
+    event: done  / data: {"model_used", "first_token_ms"} 结束
+    event: error / data: {"error": "..."}                 失败
 
 ⚠️ 隐私安全红线：
    所有用户输入在发送给 GlobalLLMRouter 之前，
    必须通过 mask_sensitive_info() 脱敏清洗。
 """
 
+import json
+
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from models import IntelLog, Project, Stakeholder, User, UserRole
+from models import IntelLog, IntelSummary, Project, Stakeholder, User, UserRole
 from schemas import (
     AICritiqueRequest, AIGenerateRequest, AIParseRequest, AIResponse,
 )
+from services.ai_cache import project_tag
+from services.context_packer import (
+    MAX_LOG_CANDIDATES, ContextItem, PackResult, count_tokens, pack, task_model,
+)
+from services.intel_summary import PROJECT_KEY, RAW_LOGS
 from services.llm_service import AITask, build_ai_gateway
-from utils.dependencies import get_current_user, get_db, require_role
+from utils.dependencies import get_async_db, get_current_user_async, require_role_async
 from utils.security import mask_sensitive_info
 
 router = APIRouter(prefix="/api/ai", tags=["AI 能力层"])
@@ -31,24 +48,115 @@ def _build_gateway(llm_configs: dict | None = None):
     return build_ai_gateway(llm_configs=llm_configs)
 
 
-def _get_project_context(project_id: int, db: Session) -> str:
-    """聚合项目全量情报作为 AI 上下文。"""
-    project = db.query(Project).filter(Project.id == project_id).first()
+async def _complete(
+    llm_configs: dict | None,
+    messages: list[dict],
+    task: AITask,
+    cache_tags: list[str] | None = None,
+    packed: PackResult | None = None,
+) -> AIResponse:
+    """一次性生成 → AIResponse（失败不抛 HTTP 异常，写入 error 字段）。"""
+    gw = _build_gateway(llm_configs)
+    try:
+        result = await gw.achat(messages=messages, task=task, cache_tags=cache_tags)
+        model_used = gw.audit_log[-1].model if gw.audit_log else None
+        return AIResponse(result=result, model_used=model_used, **_context_stats(packed))
+    except Exception as e:
+        return AIResponse(error=str(e)[:300], **_context_stats(packed))
+
+
+def _context_stats(packed: PackResult | None) -> dict:
+    if packed is None:
+        return {}
+    return {"context_tokens": packed.tokens_used, "context_tokens_saved": packed.tokens_saved}
+
+
+async def _release(db: AsyncSession):
+    """
+    调用模型前关闭请求级会话、归还连接。get_async_db（含鉴权依赖共用的同一会话）要等响应
+    发送完才清理，SSE 流式响应会一直占着连接直到生成结束（20–40s），并发稍高就耗尽连接池。
+    """
+    await db.close()
+
+
+def _sse_event(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _stream(
+    llm_configs: dict | None,
+    messages: list[dict],
+    task: AITask,
+    cache_tags: list[str] | None = None,
+    packed: PackResult | None = None,
+) -> StreamingResponse:
+    """流式生成 → SSE。首 token 前的失败由网关回退，之后的失败以 error 事件结束。"""
+    gw = _build_gateway(llm_configs)
+
+    async def events():
+        try:
+            async for piece in gw.stream(messages=messages, task=task, cache_tags=cache_tags):
+                yield _sse_event({"delta": piece})
+            last = gw.audit_log[-1] if gw.audit_log else None
+            yield _sse_event({
+                "model_used": last.model if last else None,
+                "first_token_ms": last.first_token_ms if last else None,
+                **_context_stats(packed),
+            }, event="done")
+        except Exception as e:
+            yield _sse_event({"error": str(e)[:300]}, event="error")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _static_stream(text: str) -> StreamingResponse:
+    """无需调用模型的固定回复，同样以 SSE 格式返回。"""
+    async def events():
+        yield _sse_event({"delta": text})
+        yield _sse_event({"model_used": None, "first_token_ms": None}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+async def _get_project_context(
+    project_id: int, db: AsyncSession, task: AITask,
+) -> tuple[str, PackResult]:
+    """
+    聚合项目情报作为 AI 上下文：项目概况 + 关键人 + 全周期滚动摘要固定装入，
+    原文只取摘要水位之后尚未折叠的情报与最近 RAW_LOGS 条，按该场景 token 预算装箱
+    （时效优先、近似重复去重、超长截断）。Prompt 大小不随项目情报总量增长。
+    """
+    project = await db.get(Project, project_id)
     if not project:
         raise HTTPException(404, f"项目 #{project_id} 不存在")
 
-    logs = (
-        db.query(IntelLog)
-        .filter(IntelLog.project_id == project_id)
+    summary = (await db.execute(
+        select(IntelSummary.summary_text, IntelSummary.last_log_id)
+        .where(IntelSummary.project_id == project_id,
+               IntelSummary.level == "project", IntelSummary.period_key == PROJECT_KEY)
+    )).first()
+    watermark = summary.last_log_id if summary else 0
+    recent_ids = (
+        select(IntelLog.id)
+        .where(IntelLog.project_id == project_id)
         .order_by(IntelLog.created_at.desc())
-        .limit(20)
-        .all()
-    )
-    stakeholders = (
-        db.query(Stakeholder)
-        .filter(Stakeholder.project_id == project_id)
-        .all()
+        .limit(RAW_LOGS)
     )
+    logs = (await db.execute(
+        select(IntelLog.created_at, IntelLog.raw_input)
+        .where(IntelLog.project_id == project_id,
+               or_(IntelLog.id > watermark, IntelLog.id.in_(recent_ids)))
+        .order_by(IntelLog.created_at.desc())
+        .limit(MAX_LOG_CANDIDATES)
+    )).all()
+    stakeholders = (await db.execute(
+        select(Stakeholder).where(Stakeholder.project_id == project_id)
+    )).scalars().all()
 
     parts = [
         f"【项目】{project.name}",
@@ -62,72 +170,77 @@ def _get_project_context(project_id: int, db: Session) -> str:
             parts.append(
                 f"  - {s.name} ({s.title}) 态度={s.attitude.value} 影响力={s.influence_weight}"
             )
-    if logs:
-        parts.append("【近期情报】")
-        for log in logs[:10]:
-            parts.append(f"  [{log.created_at:%Y-%m-%d}] {(log.raw_input or '')[:300]}")
-
-    return "\n".join(parts)
+    if summary:
+        parts.append(summary.summary_text)
+    header = "\n".join(parts)
+
+    section = "\n【近期情报】\n"
+    items = [
+        ContextItem(raw_input or "", timestamp=created_at,
+                    label=f"  [{created_at:%Y-%m-%d}] " if created_at else "  ")
+        for created_at, raw_input in logs
+    ]
+    model = task_model(task)
+    packed = pack(items, task, reserved=count_tokens(header + section, model), model=model)
+    if packed.items:
+        return header + section + packed.text, packed
+    return header, packed
 
 
 # ═══════════════════════════════════════════
 # 1. POST /api/ai/parse-intel — 情报结构化
 # ═══════════════════════════════════════════
 
+def _parse_intel_messages(body: AIParseRequest) -> list[dict]:
+    sanitized = mask_sensitive_info(body.text)
+    system_prompt = (
+        "你是一名资深工业电气销售专家。请对销售拜访口述记录进行结构化情报提取。"
+        "严格返回 JSON 格式（4+1 情报模型）：\n"
+        '{"current_status": "...", "decision_chain": [...], '
+        '"competitor_info": [...], "next_steps": "...", "gap_alerts": [...]}\n'
+        "严禁输出 Markdown 标记，只返回合法 JSON。"
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": sanitized},
+    ]
+
+
 @router.post("/parse-intel", response_model=AIResponse)
-def parse_intel(
+async def parse_intel(
     body: AIParseRequest,
-    user: User = Depends(require_role(UserRole.SALES)),
+    user: User = Depends(require_role_async(UserRole.SALES)),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     文本 → 4+1 情报结构化。
     场景: FAST_EXTRACT
     🛡️ 强制脱敏
     """
-    sanitized = mask_sensitive_info(body.text)
-    gw = _build_gateway(body.llm_configs)
+    await _release(db)
+    return await _complete(body.llm_configs, _parse_intel_messages(body), AITask.FAST_EXTRACT)
 
-    system_prompt = (
-        "你是一名资深工业电气销售专家。请对销售拜访口述记录进行结构化情报提取。"
-        "严格返回 JSON 格式（4+1 情报模型）：\n"
-        '{"current_status": "...", "decision_chain": [...], '
-        '"competitor_info": [...], "next_steps": "...", "gap_alerts": [...]}\n'
-        "严禁输出 Markdown 标记，只返回合法 JSON。"
-    )
-    try:
-        result = gw.chat(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": sanitized},
-            ],
-            task=AITask.FAST_EXTRACT,
-        )
-        model_used = gw.audit_log[-1].model if gw.audit_log else None
-        return AIResponse(result=result, model_used=model_used)
-    except Exception as e:
-        return AIResponse(error=str(e)[:300])
+
+@router.post("/parse-intel/stream")
+async def parse_intel_stream(
+    body: AIParseRequest,
+    user: User = Depends(require_role_async(UserRole.SALES)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """情报结构化 (SSE 流式)。"""
+    await _release(db)
+    return _stream(body.llm_configs, _parse_intel_messages(body), AITask.FAST_EXTRACT)
 
 
 # ═══════════════════════════════════════════
 # 2. POST /api/ai/generate-nba — NBA 报告
 # ═══════════════════════════════════════════
 
-@router.post("/generate-nba", response_model=AIResponse)
-def generate_nba(
-    body: AIGenerateRequest,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    """
-    基于项目情报生成 NBA (Next Best Action) 报告。
-    场景: HEAVY_STRATEGY
-    🛡️ 强制脱敏
-    """
-    context = _get_project_context(body.project_id, db)
+async def _nba_messages(body: AIGenerateRequest, db: AsyncSession) -> tuple[list[dict], PackResult]:
+    context, packed = await _get_project_context(body.project_id, db, AITask.HEAVY_STRATEGY)
     sanitized_context = mask_sensitive_info(context)
     extra = mask_sensitive_info(body.context or "")
 
-    gw = _build_gateway(body.llm_configs)
     prompt = (
         "你是一名狠辣的工业销售军师。基于以下项目情报，生成一份 NBA 报告：\n"
         "1. 当前局势判断（一句话）\n"
@@ -137,73 +250,103 @@ def generate_nba(
         f"【项目情报】\n{sanitized_context}\n\n"
         f"【附加上下文】\n{extra}"
     )
-    try:
-        result = gw.chat(
-            messages=[{"role": "user", "content": prompt}],
-            task=AITask.HEAVY_STRATEGY,
-        )
-        model_used = gw.audit_log[-1].model if gw.audit_log else None
-        return AIResponse(result=result, model_used=model_used)
-    except Exception as e:
-        return AIResponse(error=str(e)[:300])
-
+    return [{"role": "user", "content": prompt}], packed
 
-# ═══════════════════════════════════════════
-# 3. POST /api/ai/generate-pitch — 话术生成
-# ═══════════════════════════════════════════
 
-@router.post("/generate-pitch", response_model=AIResponse)
-def generate_pitch(
+@router.post("/generate-nba", response_model=AIResponse)
+async def generate_nba(
     body: AIGenerateRequest,
-    user: User = Depends(require_role(UserRole.SALES)),
-    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
-    生成销售话术（微信/邮件/内部策略/技术方案）。
+    基于项目情报生成 NBA (Next Best Action) 报告。
     场景: HEAVY_STRATEGY
     🛡️ 强制脱敏
     """
-    context = _get_project_context(body.project_id, db)
+    messages, packed = await _nba_messages(body, db)
+    await _release(db)
+    return await _complete(
+        body.llm_configs, messages, AITask.HEAVY_STRATEGY,
+        cache_tags=[project_tag(body.project_id)], packed=packed,
+    )
+
+
+@router.post("/generate-nba/stream")
+async def generate_nba_stream(
+    body: AIGenerateRequest,
+    user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """NBA 报告 (SSE 流式)。"""
+    messages, packed = await _nba_messages(body, db)
+    await _release(db)
+    return _stream(
+        body.llm_configs, messages, AITask.HEAVY_STRATEGY,
+        cache_tags=[project_tag(body.project_id)], packed=packed,
+    )
+
+
+# ═══════════════════════════════════════════
+# 3. POST /api/ai/generate-pitch — 话术生成
+# ═══════════════════════════════════════════
+
+async def _pitch_messages(body: AIGenerateRequest, db: AsyncSession) -> tuple[list[dict], PackResult]:
+    context, packed = await _get_project_context(body.project_id, db, AITask.HEAVY_STRATEGY)
     sanitized_context = mask_sensitive_info(context)
     extra = mask_sensitive_info(body.context or "请生成一段跟进微信话术")
 
-    gw = _build_gateway(body.llm_configs)
     prompt = (
         "你是一名极其专业的工业大客户销售总监。\n"
         f"请根据以下项目情报，{extra}。\n"
         f"要求专业诚恳、不卑不亢，体现行业洞察力。\n\n"
         f"【项目情报】\n{sanitized_context}"
     )
-    try:
-        result = gw.chat(
-            messages=[{"role": "user", "content": prompt}],
-            task=AITask.HEAVY_STRATEGY,
-        )
-        model_used = gw.audit_log[-1].model if gw.audit_log else None
-        return AIResponse(result=result, model_used=model_used)
-    except Exception as e:
-        return AIResponse(error=str(e)[:300])
+    return [{"role": "user", "content": prompt}], packed
 
 
-# ═══════════════════════════════════════════
-# 4. POST /api/ai/generate-quiz — 伴学出题
-# ═══════════════════════════════════════════
-
-@router.post("/generate-quiz", response_model=AIResponse)
-def generate_quiz(
+@router.post("/generate-pitch", response_model=AIResponse)
+async def generate_pitch(
     body: AIGenerateRequest,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: User = Depends(require_role_async(UserRole.SALES)),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
-    基于项目情报生成实战测验题。
-    场景: QUIZ_CRITIQUE
+    生成销售话术（微信/邮件/内部策略/技术方案）。
+    场景: HEAVY_STRATEGY
     🛡️ 强制脱敏
     """
-    context = _get_project_context(body.project_id, db)
+    messages, packed = await _pitch_messages(body, db)
+    await _release(db)
+    return await _complete(
+        body.llm_configs, messages, AITask.HEAVY_STRATEGY,
+        cache_tags=[project_tag(body.project_id)], packed=packed,
+    )
+
+
+@router.post("/generate-pitch/stream")
+async def generate_pitch_stream(
+    body: AIGenerateRequest,
+    user: User = Depends(require_role_async(UserRole.SALES)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """销售话术 (SSE 流式)。"""
+    messages, packed = await _pitch_messages(body, db)
+    await _release(db)
+    return _stream(
+        body.llm_configs, messages, AITask.HEAVY_STRATEGY,
+        cache_tags=[project_tag(body.project_id)], packed=packed,
+    )
+
+
+# ═══════════════════════════════════════════
+# 4. POST /api/ai/generate-quiz — 伴学出题
+# ═══════════════════════════════════════════
+
+async def _quiz_messages(body: AIGenerateRequest, db: AsyncSession) -> tuple[list[dict], PackResult]:
+    context, packed = await _get_project_context(body.project_id, db, AITask.QUIZ_CRITIQUE)
     sanitized_context = mask_sensitive_info(context)
 
-    gw = _build_gateway(body.llm_configs)
     prompt = (
         "你是一名严苛的工业销售教官。基于以下项目情报，"
         "生成一道三维实战情景模拟题：\n"
@@ -212,35 +355,51 @@ def generate_quiz(
         "3. 要求受训者在 3 分钟内给出应对策略\n\n"
         f"【项目情报】\n{sanitized_context}"
     )
-    try:
-        result = gw.chat(
-            messages=[{"role": "user", "content": prompt}],
-            task=AITask.QUIZ_CRITIQUE,
-        )
-        model_used = gw.audit_log[-1].model if gw.audit_log else None
-        return AIResponse(result=result, model_used=model_used)
-    except Exception as e:
-        return AIResponse(error=str(e)[:300])
+    return [{"role": "user", "content": prompt}], packed
 
 
-# ═══════════════════════════════════════════
-# 5. POST /api/ai/critique — 回答评估
-# ═══════════════════════════════════════════
-
-@router.post("/critique", response_model=AIResponse)
-def critique_answer(
-    body: AICritiqueRequest,
-    user: User = Depends(get_current_user),
+@router.post("/generate-quiz", response_model=AIResponse)
+async def generate_quiz(
+    body: AIGenerateRequest,
+    user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
-    评估销售回答（评分/点评/盲点）。
+    基于项目情报生成实战测验题。
     场景: QUIZ_CRITIQUE
     🛡️ 强制脱敏
     """
+    messages, packed = await _quiz_messages(body, db)
+    await _release(db)
+    return await _complete(
+        body.llm_configs, messages, AITask.QUIZ_CRITIQUE,
+        cache_tags=[project_tag(body.project_id)], packed=packed,
+    )
+
+
+@router.post("/generate-quiz/stream")
+async def generate_quiz_stream(
+    body: AIGenerateRequest,
+    user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """伴学出题 (SSE 流式)。"""
+    messages, packed = await _quiz_messages(body, db)
+    await _release(db)
+    return _stream(
+        body.llm_configs, messages, AITask.QUIZ_CRITIQUE,
+        cache_tags=[project_tag(body.project_id)], packed=packed,
+    )
+
+
+# ═══════════════════════════════════════════
+# 5. POST /api/ai/critique — 回答评估
+# ═══════════════════════════════════════════
+
+def _critique_messages(body: AICritiqueRequest) -> list[dict]:
     sanitized_q = mask_sensitive_info(body.question)
     sanitized_a = mask_sensitive_info(body.answer)
 
-    gw = _build_gateway(body.llm_configs)
     prompt = (
         "你是一名极其严苛的工业销售总监。请评估以下回答。\n"
         "返回 JSON: {\"score\": 0-100, \"critique\": \"...\", "
@@ -249,36 +408,43 @@ def critique_answer(
         f"【题目】\n{sanitized_q}\n\n"
         f"【回答】\n{sanitized_a}"
     )
-    try:
-        result = gw.chat(
-            messages=[{"role": "user", "content": prompt}],
-            task=AITask.QUIZ_CRITIQUE,
-        )
-        model_used = gw.audit_log[-1].model if gw.audit_log else None
-        return AIResponse(result=result, model_used=model_used)
-    except Exception as e:
-        return AIResponse(error=str(e)[:300])
+    return [{"role": "user", "content": prompt}]
 
 
-# ═══════════════════════════════════════════
-# 6. POST /api/ai/extract-stakeholders — 关键人提取
-# ═══════════════════════════════════════════
-
-@router.post("/extract-stakeholders", response_model=AIResponse)
-def extract_stakeholders(
-    body: AIGenerateRequest,
-    user: User = Depends(require_role(UserRole.SALES)),
-    db: Session = Depends(get_db),
+@router.post("/critique", response_model=AIResponse)
+async def critique_answer(
+    body: AICritiqueRequest,
+    user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
-    从情报中批量提取关键人。
-    场景: FAST_EXTRACT
+    评估销售回答（评分/点评/盲点）。
+    场景: QUIZ_CRITIQUE
     🛡️ 强制脱敏
     """
-    context = _get_project_context(body.project_id, db)
+    await _release(db)
+    return await _complete(body.llm_configs, _critique_messages(body), AITask.QUIZ_CRITIQUE)
+
+
+@router.post("/critique/stream")
+async def critique_answer_stream(
+    body: AICritiqueRequest,
+    user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """回答评估 (SSE 流式)。"""
+    await _release(db)
+    return _stream(body.llm_configs, _critique_messages(body), AITask.QUIZ_CRITIQUE)
+
+
+# ═══════════════════════════════════════════
+# 6. POST /api/ai/extract-stakeholders — 关键人提取
+# ═══════════════════════════════════════════
+
+async def _extract_stakeholders_messages(body: AIGenerateRequest, db: AsyncSession) -> tuple[list[dict], PackResult]:
+    context, packed = await _get_project_context(body.project_id, db, AITask.FAST_EXTRACT)
     sanitized_context = mask_sensitive_info(context)
 
-    gw = _build_gateway(body.llm_configs)
     prompt = (
         "你是一名专业的大客户销售顾问。请从以下项目情报中提取关键人物信息。\n"
         "返回 JSON 数组: [{\"name\": \"...\", \"title\": \"...\", "
@@ -287,43 +453,61 @@ def extract_stakeholders(
         "严禁输出 Markdown，只返回 JSON 数组。\n\n"
         f"【项目情报】\n{sanitized_context}"
     )
-    try:
-        result = gw.chat(
-            messages=[{"role": "user", "content": prompt}],
-            task=AITask.FAST_EXTRACT,
-        )
-        model_used = gw.audit_log[-1].model if gw.audit_log else None
-        return AIResponse(result=result, model_used=model_used)
-    except Exception as e:
-        return AIResponse(error=str(e)[:300])
+    return [{"role": "user", "content": prompt}], packed
 
 
-# ═══════════════════════════════════════════
-# 7. POST /api/ai/power-map — 权力关系图谱
-# ═══════════════════════════════════════════
-
-@router.post("/power-map", response_model=AIResponse)
-def generate_power_map(
+@router.post("/extract-stakeholders", response_model=AIResponse)
+async def extract_stakeholders(
     body: AIGenerateRequest,
-    user: User = Depends(require_role(UserRole.SALES)),
-    db: Session = Depends(get_db),
+    user: User = Depends(require_role_async(UserRole.SALES)),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
-    生成 Mermaid 权力关系图谱 + 攻略策略。
-    场景: CODE_GEN (需要强逻辑推理生成 Mermaid)
+    从情报中批量提取关键人。
+    场景: FAST_EXTRACT
     🛡️ 强制脱敏
     """
-    project = db.query(Project).filter(Project.id == body.project_id).first()
+    messages, packed = await _extract_stakeholders_messages(body, db)
+    await _release(db)
+    return await _complete(
+        body.llm_configs, messages, AITask.FAST_EXTRACT,
+        cache_tags=[project_tag(body.project_id)], packed=packed,
+    )
+
+
+@router.post("/extract-stakeholders/stream")
+async def extract_stakeholders_stream(
+    body: AIGenerateRequest,
+    user: User = Depends(require_role_async(UserRole.SALES)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """关键人提取 (SSE 流式)。"""
+    messages, packed = await _extract_stakeholders_messages(body, db)
+    await _release(db)
+    return _stream(
+        body.llm_configs, messages, AITask.FAST_EXTRACT,
+        cache_tags=[project_tag(body.project_id)], packed=packed,
+    )
+
+
+# ═══════════════════════════════════════════
+# 7. POST /api/ai/power-map — 权力关系图谱
+# ═══════════════════════════════════════════
+
+_NO_STAKEHOLDERS = "暂无关键人数据，请先添加或 AI 提取。"
+
+
+async def _power_map_messages(body: AIGenerateRequest, db: AsyncSession) -> list[dict] | None:
+    """无关键人数据时返回 None。"""
+    project = await db.get(Project, body.project_id)
     if not project:
         raise HTTPException(404, f"项目 #{body.project_id} 不存在")
 
-    stakeholders = (
-        db.query(Stakeholder)
-        .filter(Stakeholder.project_id == body.project_id)
-        .all()
-    )
+    stakeholders = (await db.execute(
+        select(Stakeholder).where(Stakeholder.project_id == body.project_id)
+    )).scalars().all()
     if not stakeholders:
-        return AIResponse(result="暂无关键人数据，请先添加或 AI 提取。")
+        return None
 
     sh_csv = "\n".join(
         f"{s.name},{s.title},{s.attitude.value},{s.influence_weight},{s.reports_to or 'N/A'}"
@@ -331,7 +515,6 @@ def generate_power_map(
     )
     sanitized_csv = mask_sensitive_info(sh_csv)
 
-    gw = _build_gateway(body.llm_configs)
     prompt = (
         "你是一名大客户销售的权力关系分析专家。\n"
         "基于以下关键人数据，生成：\n"
@@ -339,12 +522,42 @@ def generate_power_map(
         "2. 攻略策略（谁是突破口、谁需要绕开、谁需要重点攻关）\n\n"
         f"【关键人数据 (姓名,职位,态度,影响力,汇报给)】\n{sanitized_csv}"
     )
-    try:
-        result = gw.chat(
-            messages=[{"role": "user", "content": prompt}],
-            task=AITask.CODE_GEN,
-        )
-        model_used = gw.audit_log[-1].model if gw.audit_log else None
-        return AIResponse(result=result, model_used=model_used)
-    except Exception as e:
-        return AIResponse(error=str(e)[:300])
+    return [{"role": "user", "content": prompt}]
+
+
+@router.post("/power-map", response_model=AIResponse)
+async def generate_power_map(
+    body: AIGenerateRequest,
+    user: User = Depends(require_role_async(UserRole.SALES)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    生成 Mermaid 权力关系图谱 + 攻略策略。
+    场景: CODE_GEN (需要强逻辑推理生成 Mermaid)
+    🛡️ 强制脱敏
+    """
+    messages = await _power_map_messages(body, db)
+    await _release(db)
+    if messages is None:
+        return AIResponse(result=_NO_STAKEHOLDERS)
+    return await _complete(
+        body.llm_configs, messages, AITask.CODE_GEN,
+        cache_tags=[project_tag(body.project_id)],
+    )
+
+
+@router.post("/power-map/stream")
+async def generate_power_map_stream(
+    body: AIGenerateRequest,
+    user: User = Depends(require_role_async(UserRole.SALES)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """权力关系图谱 (SSE 流式)。"""
+    messages = await _power_map_messages(body, db)
+    await _release(db)
+    if messages is None:
+        return _static_stream(_NO_STAKEHOLDERS)
+    return _stream(
+        body.llm_configs, messages, AITask.CODE_GEN,
+        cache_tags=[project_tag(body.project_id)],
+    )
@@ -7,15 +7,19 @@ VP 裁决 (grant) 时：同一事务中强制 UPDATE Project 的 owner/applicant
 
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from models import Appeal, AppealStatus, Project, User, UserRole
 from schemas import AppealCreate, AppealOut, AppealVerdict
 from utils.dependencies import get_current_user, get_db, require_role
+from utils.pagination import Keyset, PageParams, page_params, paginate
 
 router = APIRouter(prefix="/api/appeals", tags=["Appeal 撞单仲裁"])
 
+_LIST_KEYSET = Keyset(Appeal.created_at, Appeal.id, desc=True)
+
 
 @router.post("", response_model=AppealOut, status_code=201)
 def create_appeal(
@@ -42,15 +46,13 @@ def create_appeal(
 
 @router.get("/pending", response_model=list[AppealOut])
 def list_pending(
+    response: Response,
+    page: PageParams = Depends(page_params),
     user: User = Depends(require_role(UserRole.DIRECTOR, UserRole.VP)),
     db: Session = Depends(get_db),
 ):
-    return (
-        db.query(Appeal)
-        .filter(Appeal.status == AppealStatus.PENDING)
-        .order_by(Appeal.created_at.desc())
-        .all()
-    )
+    q = select(Appeal).where(Appeal.status == AppealStatus.PENDING)
+    return paginate(db, q, _LIST_KEYSET, page, AppealOut, response)
 
 
 @router.post("/{appeal_id}/grant", response_model=AppealOut)
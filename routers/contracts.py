@@ -4,11 +4,13 @@
 状态机: 1_sales_init → 2_tech_review → 3_sales_pricing
         → 4_vp_approval → 5_approved → 6_commission
 每一步严格锁定角色权限，绝不允许越权流转。
+BOM 明细批量写入 / CSV·XLSX 导入导出见 services/bom_io.py（导入仅限 ❶ 销售发起阶段）。
 """
 
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from models import (
@@ -16,11 +18,12 @@ from models import (
     Project, User, UserRole,
 )
 from schemas import (
-    CommissionCalcInput, CommissionItem,
+    BOMImportResult, CommissionCalcInput, CommissionItem,
     ContractBOMItemInput, ContractCreate, ContractOut,
     SalesPricingInput, SalesPricingItem,
     SuccessResponse, TechReviewInput, TechReviewItem,
 )
+from services.bom_io import CONTRACT_EXPORT_COLUMNS, BOMFileError, export_stream, load_bom, sync_items
 from utils.dependencies import get_current_user, get_db, require_role
 from utils.security import compute_bom_hash
 
@@ -48,6 +51,11 @@ def _assert_step(contract: Contract, expected: ContractStep, action_name: str):
         )
 
 
+def _init_quantities(record: dict) -> dict:
+    """❶ 阶段技术 / 最终数量初始值 = 销售数量。"""
+    return {"tech_qty": record["sales_qty"], "final_qty": record["sales_qty"]}
+
+
 # ═══════════════════════════════════════════
 # POST /api/contracts — 创建合同 (❶ 销售发起)
 # ═══════════════════════════════════════════
@@ -73,18 +81,9 @@ def create_contract(
     db.add(contract)
     db.flush()
 
-    for item in body.bom_items:
-        bom = ContractBOMItem(
-            contract_id=contract.id,
-            product_model=item.product_model,
-            ai_extracted_qty=item.ai_extracted_qty,
-            sales_qty=item.sales_qty,
-            unit_price=item.unit_price,
-            tech_qty=item.sales_qty,     # 初始值 = 销售数量
-            final_qty=item.sales_qty,    # 初始值 = 销售数量
-            remark=item.remark,
-        )
-        db.add(bom)
+    # 批量写入 BOM 明细（技术 / 最终数量初始值 = 销售数量）
+    sync_items(db, ContractBOMItem, "contract_id", contract.id,
+               [item.model_dump() for item in body.bom_items], derive=_init_quantities)
 
     db.commit()
     db.refresh(contract)
@@ -104,6 +103,64 @@ def get_contract(
     return _get_contract_or_404(contract_id, db)
 
 
+# ═══════════════════════════════════════════
+# POST /{id}/bom/import — ❶ BOM 表格批量导入
+# ═══════════════════════════════════════════
+
+@router.post("/{contract_id}/bom/import", response_model=BOMImportResult)
+def import_contract_bom(
+    contract_id: int,
+    file: UploadFile = File(..., description="BOM 表格：.csv / .xlsx，需含型号列"),
+    user: User = Depends(require_role(UserRole.SALES)),
+    db: Session = Depends(get_db),
+):
+    """
+    ❶ 销售发起阶段上传 CSV / XLSX 整单替换合同 BOM。
+    任一行不合格 → 422 并列出出错行，不落库；通过后只写有变化的行（技术 / 最终数量随销售数量重置）。
+    """
+    contract = _get_contract_or_404(contract_id, db)
+    _assert_step(contract, ContractStep.SALES_INIT, "导入 BOM")
+
+    try:
+        sheet = load_bom(file.file, file.filename)
+    except BOMFileError as e:
+        raise HTTPException(e.status_code, str(e))
+    if sheet.errors:
+        raise HTTPException(422, {
+            "message": f"BOM 校验未通过：{sheet.invalid} 行不合格，未导入",
+            "invalid": sheet.invalid,
+            "errors": sheet.errors,
+        })
+    if not sheet.records:
+        raise HTTPException(422, "⚠️ BOM 文件没有有效数据行")
+
+    stats = sync_items(db, ContractBOMItem, "contract_id", contract.id, sheet.records, derive=_init_quantities)
+    db.commit()
+    return BOMImportResult(rows=sheet.rows, **stats.to_dict())
+
+
+# ═══════════════════════════════════════════
+# GET /{id}/bom/export — BOM 表格导出
+# ═══════════════════════════════════════════
+
+@router.get("/{contract_id}/bom/export")
+def export_contract_bom(
+    contract_id: int,
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx)$", description="csv / xlsx"),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """按 id 顺序流式导出合同 BOM（含技术核定 / 最终报价 / 底价等全部列）。"""
+    contract = _get_contract_or_404(contract_id, db)
+    try:
+        body, media_type = export_stream(ContractBOMItem, "contract_id", contract.id, CONTRACT_EXPORT_COLUMNS, fmt)
+    except BOMFileError as e:
+        raise HTTPException(e.status_code, str(e))
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="contract_{contract.id}_bom.{fmt}"',
+    })
+
+
 # ═══════════════════════════════════════════
 # POST /{id}/submit-to-tech — ❶→❷ 提交至技术审查
 # ═══════════════════════════════════════════
@@ -2,23 +2,27 @@
 路由：智能报价与防篡改中心 — routers/deal_desks.py
 ====================================================
 状态机: draft → pending → approved / rejected
-天眼引擎: BOM SHA-256 防篡改校验
+天眼引擎: BOM 默克尔树防篡改校验（utils/bom_merkle.py，哈希异动时逐行列出 数量 / 单价 变更）
+BOM 写入: 按行键差异批量写（services/bom_io.py），支持 CSV / XLSX 批量导入导出
 """
 
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from models import (
     BOMItem, DealDesk, DealStatus, Project, User, UserRole,
 )
 from schemas import (
-    BOMItemInput, BOMVerifyRequest, BOMVerifyResponse,
+    BOMImportResult, BOMItemInput, BOMVerifyRequest, BOMVerifyResponse,
     DealDeskCreate, DealDeskOut, DealDeskReject, SuccessResponse,
 )
+from services.bom_io import DEAL_EXPORT_COLUMNS, BOMFileError, SyncStats, export_stream, load_bom, sync_items
+from utils.bom_merkle import BOMMerkle, describe_changes
 from utils.dependencies import get_current_user, get_db, require_role
-from utils.security import compute_bom_hash, verify_bom_integrity
+from utils.security import diff_bom_integrity, verify_bom_integrity
 
 router = APIRouter(prefix="/api/dealdesk", tags=["DealDesk 报价底单"])
 
@@ -38,6 +42,66 @@ def _calc_total(bom_items: list[BOMItem]) -> float:
     return sum((i.sales_qty or 0) * (i.unit_price or 0) for i in bom_items)
 
 
+def _bom_rows(bom_items: list[BOMItem] | list[BOMItemInput]) -> list[dict]:
+    return [{"model": i.product_model, "qty": i.sales_qty, "price": i.unit_price} for i in bom_items]
+
+
+def _baseline(deal: DealDesk) -> BOMMerkle | None:
+    """库中的默克尔快照（缺失、损坏或与 tamper_hash 不符时返回 None）。"""
+    if not deal.bom_merkle:
+        return None
+    try:
+        tree = BOMMerkle.load(deal.bom_merkle)
+    except ValueError:
+        return None
+    return tree if tree.root == deal.tamper_hash else None
+
+
+def _seal(deal: DealDesk, tree: BOMMerkle | None = None):
+    """以当前 BOM（或已算好的树）锁定 tamper_hash 与默克尔快照。"""
+    tree = tree or BOMMerkle.from_items(_bom_rows(deal.bom_items))
+    deal.tamper_hash = tree.root
+    deal.bom_merkle = tree.snapshot()
+
+
+def _subtotal(record: dict) -> dict:
+    return {"subtotal": (record["sales_qty"] or 0) * (record["unit_price"] or 0)}
+
+
+def _replace_bom(db: Session, deal: DealDesk, records: list[dict]) -> SyncStats:
+    """
+    把底单 BOM 整单替换为 records（字段同 BOMItemInput），只写有变化的行，并重算总价、重新锁定哈希。
+    ⚠️ pending 状态拒绝修改；approved 状态允许修改但自动降级为 draft。
+    """
+    # 状态锁定：只有草稿/被驳回才能改
+    if deal.status == DealStatus.PENDING:
+        raise HTTPException(
+            status.HTTP_423_LOCKED,
+            "🔒 报价单已提交审批中，锁定不可修改。请等待 VP 审批结果。"
+        )
+
+    # 在原快照上套用新明细：行键不变（只改数量 / 单价）时只重算改动行到根的路径
+    rows = [{"model": r["product_model"], "qty": r["sales_qty"], "price": r["unit_price"]} for r in records]
+    tree = _baseline(deal)
+    changes = tree.apply(rows) if tree else []
+
+    if deal.status == DealStatus.APPROVED:
+        # ⚠️ 天眼核心逻辑：已获批底单被偷改 → 自动降级为 draft
+        deal.status = DealStatus.DRAFT
+        deal.diff_summary = "🚨 天眼侦测：销售试图修改已获批底单，已自动剥夺绿灯！"
+        if changes:
+            deal.diff_summary += f"变更 {len(changes)} 行：{describe_changes(changes)}"
+        deal.approved_at = None
+        deal.approved_by = None
+        # 不 raise，允许修改但降级
+
+    stats = sync_items(db, BOMItem, "deal_desk_id", deal.id, records, derive=_subtotal)
+    db.expire(deal, ["bom_items"])      # 批量写绕过了 ORM 集合，下次访问重新加载
+    deal.total_amount = sum((r["sales_qty"] or 0) * (r["unit_price"] or 0) for r in records)
+    _seal(deal, tree or BOMMerkle.from_items(rows))
+    return stats
+
+
 # ═══════════════════════════════════════════
 # POST /api/dealdesk — 创建报价底单 (草稿)
 # ═══════════════════════════════════════════
@@ -71,27 +135,8 @@ def create_deal_desk(
     db.add(deal)
     db.flush()  # 获取 deal.id
 
-    # 创建 BOM 明细行
-    for item in body.bom_items:
-        subtotal = (item.sales_qty or 0) * (item.unit_price or 0)
-        bom = BOMItem(
-            deal_desk_id=deal.id,
-            product_model=item.product_model,
-            ai_extracted_qty=item.ai_extracted_qty,
-            sales_qty=item.sales_qty,
-            unit_price=item.unit_price,
-            subtotal=subtotal,
-            remark=item.remark,
-        )
-        db.add(bom)
-
-    # 计算总价 & 初始防篡改哈希
-    db.flush()
-    deal.total_amount = _calc_total(deal.bom_items)
-    deal.tamper_hash = compute_bom_hash([
-        {"model": i.product_model, "qty": i.sales_qty, "price": i.unit_price}
-        for i in deal.bom_items
-    ])
+    # 批量写入 BOM 明细行（小计随行计算）+ 总价 & 初始防篡改哈希
+    _replace_bom(db, deal, [item.model_dump() for item in body.bom_items])
 
     db.commit()
     db.refresh(deal)
@@ -124,51 +169,82 @@ def update_bom(
     db: Session = Depends(get_db),
 ):
     """
-    修改 BOM 明细。
+    修改 BOM 明细（按行键差异写入，只动新增 / 变更 / 删除的行）。
     ⚠️ 仅 draft / rejected 状态允许修改！
     approved 状态修改 → 天眼自动拦截并降级。
     """
     deal = _get_deal_or_404(deal_id, db)
+    _replace_bom(db, deal, [item.model_dump() for item in bom_items])
 
-    # 状态锁定：只有草稿/被驳回才能改
+    db.commit()
+    db.refresh(deal)
+    return deal
+
+
+# ═══════════════════════════════════════════
+# POST /api/dealdesk/{id}/bom/import — BOM 表格批量导入
+# ═══════════════════════════════════════════
+
+@router.post("/{deal_id}/bom/import", response_model=BOMImportResult)
+def import_bom(
+    deal_id: int,
+    file: UploadFile = File(..., description="BOM 表格：.csv / .xlsx，需含型号列"),
+    user: User = Depends(require_role(UserRole.SALES)),
+    db: Session = Depends(get_db),
+):
+    """
+    上传 CSV / XLSX 整单替换 BOM（与 PATCH /bom 同样的状态规则）。
+    流式解析 + 整列校验，任一行不合格 → 422 并列出出错行，不落库；
+    通过后按行键与现有明细比对，只写有变化的行。
+    """
+    deal = _get_deal_or_404(deal_id, db)
     if deal.status == DealStatus.PENDING:
         raise HTTPException(
             status.HTTP_423_LOCKED,
             "🔒 报价单已提交审批中，锁定不可修改。请等待 VP 审批结果。"
         )
-    if deal.status == DealStatus.APPROVED:
-        # ⚠️ 天眼核心逻辑：已获批底单被偷改 → 自动降级为 draft
-        deal.status = DealStatus.DRAFT
-        deal.diff_summary = "🚨 天眼侦测：销售试图修改已获批底单，已自动剥夺绿灯！"
-        deal.approved_at = None
-        deal.approved_by = None
-        # 不 raise，允许修改但降级
 
-    # 清空旧 BOM，写入新 BOM
-    db.query(BOMItem).filter(BOMItem.deal_desk_id == deal.id).delete()
-    for item in bom_items:
-        subtotal = (item.sales_qty or 0) * (item.unit_price or 0)
-        bom = BOMItem(
-            deal_desk_id=deal.id,
-            product_model=item.product_model,
-            ai_extracted_qty=item.ai_extracted_qty,
-            sales_qty=item.sales_qty,
-            unit_price=item.unit_price,
-            subtotal=subtotal,
-            remark=item.remark,
-        )
-        db.add(bom)
+    try:
+        sheet = load_bom(file.file, file.filename)
+    except BOMFileError as e:
+        raise HTTPException(e.status_code, str(e))
+    if sheet.errors:
+        raise HTTPException(422, {
+            "message": f"BOM 校验未通过：{sheet.invalid} 行不合格，未导入",
+            "invalid": sheet.invalid,
+            "errors": sheet.errors,
+        })
+    if not sheet.records:
+        raise HTTPException(422, "⚠️ BOM 文件没有有效数据行")
+
+    stats = _replace_bom(db, deal, sheet.records)
+    db.commit()
+    return BOMImportResult(
+        rows=sheet.rows, **stats.to_dict(),
+        total_amount=deal.total_amount, tamper_hash=deal.tamper_hash, diff_summary=deal.diff_summary,
+    )
 
-    db.flush()
-    deal.total_amount = _calc_total(deal.bom_items)
-    deal.tamper_hash = compute_bom_hash([
-        {"model": i.product_model, "qty": i.sales_qty, "price": i.unit_price}
-        for i in deal.bom_items
-    ])
 
-    db.commit()
-    db.refresh(deal)
-    return deal
+# ═══════════════════════════════════════════
+# GET /api/dealdesk/{id}/bom/export — BOM 表格导出
+# ═══════════════════════════════════════════
+
+@router.get("/{deal_id}/bom/export")
+def export_bom(
+    deal_id: int,
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx)$", description="csv / xlsx"),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """按 id 顺序流式导出 BOM 明细（导出文件可直接再导入）。"""
+    deal = _get_deal_or_404(deal_id, db)
+    try:
+        body, media_type = export_stream(BOMItem, "deal_desk_id", deal.id, DEAL_EXPORT_COLUMNS, fmt)
+    except BOMFileError as e:
+        raise HTTPException(e.status_code, str(e))
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="dealdesk_{deal.id}_bom.{fmt}"',
+    })
 
 
 # ═══════════════════════════════════════════
@@ -201,12 +277,9 @@ def submit_for_approval(
     # ═══════════════════════════════════════
     # 🔍 天眼防篡改校验 — 风控死命令
     # ═══════════════════════════════════════
+    current = BOMMerkle.from_items(_bom_rows(deal.bom_items))
     if deal.tamper_hash:
-        current_bom = [
-            {"model": i.product_model, "qty": i.sales_qty, "price": i.unit_price}
-            for i in deal.bom_items
-        ]
-        is_valid, diff_msg = verify_bom_integrity(current_bom, deal.tamper_hash)
+        is_valid, diff_msg, _ = diff_bom_integrity(current, deal.tamper_hash, deal.bom_merkle)
         if not is_valid:
             # 哈希异动 → 403 拦截 + 记录变更摘要 + 降级
             deal.diff_summary = diff_msg
@@ -228,12 +301,9 @@ def submit_for_approval(
     else:
         deal.diff_summary = ""
 
-    # 更新总价 & 重算哈希
+    # 更新总价 & 锁定哈希（复用上面校验时建好的树）
     deal.total_amount = current_total
-    deal.tamper_hash = compute_bom_hash([
-        {"model": i.product_model, "qty": i.sales_qty, "price": i.unit_price}
-        for i in deal.bom_items
-    ])
+    _seal(deal, current)
 
     # 状态流转: → pending
     deal.status = DealStatus.PENDING
@@ -270,10 +340,7 @@ def approve_deal(
         pass
 
     # 🔒 锁定哈希：此后任何 BOM 变动都会触发天眼
-    deal.tamper_hash = compute_bom_hash([
-        {"model": i.product_model, "qty": i.sales_qty, "price": i.unit_price}
-        for i in deal.bom_items
-    ])
+    _seal(deal)
 
     deal.status = DealStatus.APPROVED
     deal.approved_by = user.name
@@ -335,11 +402,7 @@ def verify_bom(
     if not deal.tamper_hash:
         return BOMVerifyResponse(is_valid=True, diff_summary="暂无基准哈希，跳过校验")
 
-    current_bom = [
-        {"model": i.product_model, "qty": i.sales_qty, "price": i.unit_price}
-        for i in body.bom_items
-    ]
-    is_valid, diff_msg = verify_bom_integrity(current_bom, deal.tamper_hash)
+    is_valid, diff_msg = verify_bom_integrity(_bom_rows(body.bom_items), deal.tamper_hash, deal.bom_merkle)
 
     if not is_valid:
         # 自动降级已获批的底单
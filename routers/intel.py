@@ -3,19 +3,42 @@
 ============================================
 原文保留原则：raw_input 存未脱敏原文（内网可见），
 发给 LLM 的版本一律经过 mask_sensitive_info 脱敏。
+
+批量同步（离线笔记一次上传几十条）：短笔记按 FAST_EXTRACT 上下文预算合并为一次 LLM 请求，
+各请求并发，全部结果单事务入库。
 """
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import asyncio
+import json
+import os
+import re
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from models import IntelLog, Project, User, UserRole
-from schemas import IntelLogCreate, IntelLogOut
-from services.llm_service import AITask, build_ai_gateway
-from utils.dependencies import get_current_user, get_db, require_role
+from models import IntelLog, IntelSummary, Project, User, UserRole
+from schemas import (
+    IntelLogBatchCreate, IntelLogBatchResult, IntelLogCreate, IntelLogOut, IntelSummaryOut, SummaryLevelEnum,
+)
+from services.context_packer import context_budget, count_tokens, task_model
+from services.llm_service import DEFAULT_MODEL_REGISTRY, AITask, build_ai_gateway
+from utils.dependencies import get_async_db, get_current_user_async, require_role_async
+from utils.pagination import Keyset, PageParams, apaginate, page_params
 from utils.security import mask_sensitive_info
 
 router = APIRouter(tags=["Intel 情报日志"])
 
+_LIST_KEYSET = Keyset(IntelLog.created_at, IntelLog.id, desc=True)
+
+# ── 批量同步参数（可通过环境变量覆盖）──
+_BATCH_MAX_ITEMS = int(os.environ.get("SRI_INTEL_BATCH_MAX", "100"))
+_BATCH_GROUP_MAX = int(os.environ.get("SRI_INTEL_BATCH_GROUP_MAX", "6"))        # 单次 LLM 请求最多合并几条
+_BATCH_CONCURRENCY = int(os.environ.get("SRI_INTEL_BATCH_CONCURRENCY", "4"))    # 单个批量请求同时在途的 LLM 请求数
+_OUTPUT_TOKENS_PER_LOG = 600                                                    # 每条 4+1 JSON 预留的输出 token
+_JSON_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
 # ── 4+1 情报解析 System Prompt ──
 INTEL_SYSTEM_PROMPT = (
     "你是一名资深工业电气销售专家。请对销售拜访口述记录进行结构化情报提取，"
@@ -42,23 +65,75 @@ INTEL_SYSTEM_PROMPT = (
     "严禁输出任何 Markdown 标记或多余的解释说明，只返回合法的 JSON 字符串。"
 )
 
+# 多条合并解析时追加：逐条输出、按编号对齐
+INTEL_BATCH_INSTRUCTION = (
+    "\n\n本次输入包含多条相互独立的拜访记录，每条以【#编号】开头。请逐条按上述格式提取，"
+    "不同记录之间的人物、竞品、预算等信息严禁混用。返回 JSON 对象：\n"
+    '{"results": [{"index": 编号, "current_status": "...", "decision_chain": [...], '
+    '"competitor_info": [...], "next_steps": "...", "gap_alerts": [...]}]}\n'
+    "results 必须覆盖全部编号，每个编号只出现一次。"
+)
+
+
+def _intel_messages(sanitized_text: str) -> list[dict]:
+    return [
+        {"role": "system", "content": INTEL_SYSTEM_PROMPT},
+        {"role": "user", "content": sanitized_text},
+    ]
+
+
+async def _extract(messages: list[dict]) -> tuple[str, str]:
+    """调用 AI 网关 (场景: FAST_EXTRACT)，返回 (解析结果, 实际使用的模型)；全部防线失败抛出。"""
+    gateway = build_ai_gateway(primary_api_key="")  # 由前端 llm_configs 驱动
+    content = await gateway.achat(messages=messages, task=AITask.FAST_EXTRACT)
+    # 从审计日志获取实际使用的模型（每次调用独立网关，并发时不会串号）
+    model_used = ""
+    if gateway.audit_log:
+        last = gateway.audit_log[-1]
+        model_used = f"{last.provider}/{last.model}"
+    return content, model_used
+
+
+def _error_json(e: Exception) -> str:
+    return json.dumps({"error": str(e)[:200]}, ensure_ascii=False)
+
 
 # ═══════════════════════════════════════════
 # GET /api/projects/{pid}/intel — 项目情报列表
 # ═══════════════════════════════════════════
 
 @router.get("/api/projects/{project_id}/intel", response_model=list[IntelLogOut])
-def list_intel(
+async def list_intel(
     project_id: int,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    response: Response,
+    page: PageParams = Depends(page_params),
+    user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    return (
-        db.query(IntelLog)
-        .filter(IntelLog.project_id == project_id)
-        .order_by(IntelLog.created_at.desc())
-        .all()
-    )
+    q = select(IntelLog).where(IntelLog.project_id == project_id)
+    return await apaginate(db, q, _LIST_KEYSET, page, IntelLogOut, response)
+
+
+# ═══════════════════════════════════════════
+# GET /api/projects/{pid}/intel/summaries — 情报滚动摘要
+# ═══════════════════════════════════════════
+
+@router.get("/api/projects/{project_id}/intel/summaries", response_model=list[IntelSummaryOut])
+async def list_intel_summaries(
+    project_id: int,
+    level: Optional[SummaryLevelEnum] = Query(None, description="只看某一级；默认全部"),
+    user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    周 / 月 / 全周期情报摘要（后台随情报写入增量更新），按级别、周期倒序。
+    最新情报可能尚未折叠，以 last_log_id 为准。
+    """
+    q = select(IntelSummary).where(IntelSummary.project_id == project_id)
+    if level:
+        q = q.where(IntelSummary.level == level.value)
+    q = q.order_by(IntelSummary.level, IntelSummary.period_key.desc())
+    return (await db.execute(q)).scalars().all()
 
 
 # ═══════════════════════════════════════════
@@ -66,16 +141,16 @@ def list_intel(
 # ═══════════════════════════════════════════
 
 @router.post("/api/intel/daily-log", response_model=IntelLogOut, status_code=201)
-def create_daily_log(
+async def create_daily_log(
     body: IntelLogCreate,
-    user: User = Depends(require_role(UserRole.SALES)),
-    db: Session = Depends(get_db),
+    user: User = Depends(require_role_async(UserRole.SALES)),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     文字情报 → AI 结构化解析 (4+1 模型) → 入库。
     🛡️ 原文保留 + 脱敏发送。
     """
-    project = db.query(Project).filter(Project.id == body.project_id).first()
+    project = await db.get(Project, body.project_id)
     if not project:
         raise HTTPException(404, f"项目 #{body.project_id} 不存在")
 
@@ -86,20 +161,9 @@ def create_daily_log(
     ai_parsed = ""
     model_used = ""
     try:
-        gateway = build_ai_gateway(primary_api_key="")  # 由前端 llm_configs 驱动
-        ai_parsed = gateway.chat(
-            messages=[
-                {"role": "system", "content": INTEL_SYSTEM_PROMPT},
-                {"role": "user", "content": sanitized_text},
-            ],
-            task=AITask.FAST_EXTRACT,
-        )
-        # 从审计日志获取实际使用的模型
-        if gateway.audit_log:
-            last = gateway.audit_log[-1]
-            model_used = f"{last.provider}/{last.model}"
+        ai_parsed, model_used = await _extract(_intel_messages(sanitized_text))
     except Exception as e:
-        ai_parsed = f'{{"error": "{str(e)[:200]}"}}'
+        ai_parsed = _error_json(e)
 
     # 入库：原文不脱敏（内网可见），AI 解析结果存储
     log = IntelLog(
@@ -111,6 +175,153 @@ def create_daily_log(
         ai_model_used=model_used,
     )
     db.add(log)
-    db.commit()
-    db.refresh(log)
+    await db.commit()
+    await db.refresh(log)
     return log
+
+
+# ═══════════════════════════════════════════
+# POST /api/intel/daily-log/batch — 离线笔记批量入库
+# ═══════════════════════════════════════════
+
+# 单条解析结果：(ai_parsed_json, ai_model_used, 失败原因)
+_Parsed = tuple[str, str, Optional[str]]
+
+
+def _pack_groups(texts: list[str]) -> list[list[int]]:
+    """
+    按原顺序装箱：每组输入合计不超过 FAST_EXTRACT 上下文预算，条数不超过输出预算（max_tokens）
+    与 SRI_INTEL_BATCH_GROUP_MAX 允许的上限；超过预算的长笔记单独成组。
+    """
+    config = DEFAULT_MODEL_REGISTRY[AITask.FAST_EXTRACT]
+    budget, model = context_budget(AITask.FAST_EXTRACT), task_model(AITask.FAST_EXTRACT)
+    max_items = max(1, min(_BATCH_GROUP_MAX, config["max_tokens"] // _OUTPUT_TOKENS_PER_LOG))
+    groups, current, used = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text, model)
+        if current and (used + tokens > budget or len(current) >= max_items):
+            groups.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _split_results(content: str, n: int) -> dict[int, str]:
+    """合并解析的返回 → {组内下标: 单条 4+1 JSON}；格式不对 / 编号越界 / 重复的条目丢弃（由调用方单条重试）。"""
+    try:
+        data = json.loads(_JSON_FENCE.sub("", content))
+    except (json.JSONDecodeError, TypeError):
+        return {}
+    results = data.get("results") if isinstance(data, dict) else data
+    if not isinstance(results, list):
+        return {}
+    out, duplicated = {}, set()
+    for item in results:
+        if not isinstance(item, dict):
+            continue
+        k = item.pop("index", None)
+        if not isinstance(k, int) or not 1 <= k <= n:
+            continue
+        if k - 1 in out:
+            duplicated.add(k - 1)
+        out[k - 1] = json.dumps(item, ensure_ascii=False)
+    for k in duplicated:
+        del out[k]
+    return out
+
+
+async def _extract_one(text: str, sem: asyncio.Semaphore) -> _Parsed:
+    async with sem:
+        try:
+            ai_parsed, model_used = await _extract(_intel_messages(text))
+            return ai_parsed, model_used, None
+        except Exception as e:
+            return _error_json(e), "", str(e)[:200]
+
+
+async def _extract_group(texts: list[str], sem: asyncio.Semaphore) -> tuple[list[_Parsed], int]:
+    """一组笔记合并为一次请求解析，返回 (逐条结果, LLM 请求数)；返回里缺失 / 无法对齐的条目单条重试。"""
+    if len(texts) == 1:
+        return [await _extract_one(texts[0], sem)], 1
+
+    numbered = "\n\n".join(f"【#{k}】\n{text}" for k, text in enumerate(texts, 1))
+    async with sem:
+        try:
+            content, model_used = await _extract([
+                {"role": "system", "content": INTEL_SYSTEM_PROMPT + INTEL_BATCH_INSTRUCTION},
+                {"role": "user", "content": numbered},
+            ])
+        except Exception as e:      # 全部防线失败：单条重试也不会成功
+            return [(_error_json(e), "", str(e)[:200])] * len(texts), 1
+
+    by_index = _split_results(content, len(texts))
+    missing = [k for k in range(len(texts)) if k not in by_index]
+    retried = dict(zip(missing, await asyncio.gather(*(_extract_one(texts[k], sem) for k in missing))))
+    results = [retried[k] if k in retried else (by_index[k], model_used, None) for k in range(len(texts))]
+    return results, 1 + len(missing)
+
+
+@router.post("/api/intel/daily-log/batch", response_model=IntelLogBatchResult, status_code=201)
+async def create_daily_logs_batch(
+    body: IntelLogBatchCreate,
+    user: User = Depends(require_role_async(UserRole.SALES)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    离线笔记批量同步 → AI 结构化解析 (4+1 模型) → 单事务入库，逐条返回状态。
+    🛡️ 原文保留 + 脱敏发送（同单条接口）。
+    项目不存在的条目不入库（invalid）；AI 解析失败的条目与单条接口一致，照常入库（parse_failed）。
+    """
+    if len(body.items) > _BATCH_MAX_ITEMS:
+        raise HTTPException(413, f"单次最多同步 {_BATCH_MAX_ITEMS} 条情报，请分批提交")
+
+    project_ids = {item.project_id for item in body.items}
+    existing = set((await db.execute(select(Project.id).where(Project.id.in_(project_ids)))).scalars())
+    valid = [i for i, item in enumerate(body.items) if item.project_id in existing]
+    author_id = user.id
+    # 等待 LLM（含单条重试）可能数十秒：先关闭会话归还连接，解析完成后再开新事务入库
+    await db.close()
+
+    # ═══ 隐私红线：脱敏后才能发给 LLM ═══
+    sanitized = [mask_sensitive_info(body.items[i].text) for i in valid]
+
+    sem = asyncio.Semaphore(max(1, _BATCH_CONCURRENCY))
+    groups = _pack_groups(sanitized)
+    outcomes = await asyncio.gather(*(_extract_group([sanitized[k] for k in g], sem) for g in groups))
+    parsed: dict[int, _Parsed] = {}
+    llm_calls = 0
+    for group, (results, calls) in zip(groups, outcomes):
+        llm_calls += calls
+        for k, result in zip(group, results):
+            parsed[valid[k]] = result
+
+    # 入库：原文不脱敏（内网可见），单事务提交
+    logs = {
+        i: IntelLog(
+            project_id=body.items[i].project_id,
+            author_id=author_id,
+            raw_input=body.items[i].text,     # ← 未脱敏原文
+            input_type="text",
+            ai_parsed_json=ai_parsed,
+            ai_model_used=model_used,
+        )
+        for i, (ai_parsed, model_used, _) in parsed.items()
+    }
+    db.add_all(logs.values())
+    await db.flush()
+
+    items, counts = [], {"created": 0, "parse_failed": 0, "invalid": 0}
+    for i, item in enumerate(body.items):
+        if i not in logs:
+            entry = {"status": "invalid", "error": f"项目 #{item.project_id} 不存在"}
+        else:
+            _, model_used, error = parsed[i]
+            entry = {"status": "parse_failed" if error else "created", "log_id": logs[i].id,
+                     "ai_model_used": model_used or None, "error": error}
+        counts[entry["status"]] += 1
+        items.append({"index": i, "project_id": item.project_id, **entry})
+    await db.commit()
+    return {"total": len(body.items), **counts, "llm_calls": llm_calls, "items": items}
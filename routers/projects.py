@@ -2,13 +2,18 @@
 路由：项目管理与撞单拦截 — routers/projects.py
 =================================================
 状态机: pending → approved / rejected / conflict
-内置 AI 模糊查重引擎：客户名互相包含即触发 conflict。
+内置模糊查重引擎 (services/collision.py)：客户名互相包含即触发 conflict。
 """
 
+import csv
+import io
+import os
 from datetime import datetime, timezone
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from models import (
@@ -16,13 +21,21 @@ from models import (
     User, UserRole,
 )
 from schemas import (
-    MEDDICUpdate, ProjectCreate, ProjectOut, ProjectUpdate,
+    CollisionBatchResult, MEDDICUpdate, ProjectCreate, ProjectOut, ProjectUpdate,
     SuccessResponse,
 )
-from utils.dependencies import get_current_user, get_db, require_role
+from services.collision import check_batch, find_collision, is_exact_duplicate
+from utils.dependencies import (
+    get_async_db, get_current_user, get_current_user_async, get_db, require_role,
+    visible_projects,
+)
+from utils.pagination import Keyset, PageParams, apaginate, page_params
 
 router = APIRouter(prefix="/api/projects", tags=["Project 项目管理"])
 
+# 列表排序键：最近更新在前，id 兜底保证翻页稳定
+_LIST_KEYSET = Keyset(Project.updated_at, Project.id, desc=True)
+
 
 # ─────────────────────────────────────────
 # 辅助函数
@@ -35,38 +48,6 @@ def _get_project_or_404(project_id: int, db: Session) -> Project:
     return p
 
 
-def _check_collision(client: str, title: str, db: Session) -> Optional[Project]:
-    """
-    撞单查重引擎：检查是否存在客户名互相包含的项目。
-    例如：新项目客户="万华化学"，已有项目客户="万华化学集团" → 触发。
-    """
-    existing = db.query(Project).filter(
-        Project.approval_status.in_([
-            ProjectApproval.PENDING,
-            ProjectApproval.APPROVED,
-        ])
-    ).all()
-
-    client_clean = client.strip().lower()
-    for p in existing:
-        p_client = (p.client or "").strip().lower()
-        p_title = (p.project_title or "").strip().lower()
-        title_clean = title.strip().lower()
-
-        # 双向包含检测
-        client_match = (client_clean in p_client) or (p_client in client_clean)
-        title_match = (title_clean in p_title) or (p_title in title_clean)
-
-        # 客户名匹配 + 项目名匹配 = 高度疑似撞单
-        if client_match and title_match:
-            return p
-        # 客户名完全一致 = 直接预警
-        if client_clean == p_client:
-            return p
-
-    return None
-
-
 def _calc_win_rate(project: Project) -> float:
     """根据 MEDDIC 七维评分加权计算综合赢率。"""
     weights = {
@@ -95,11 +76,13 @@ def _calc_win_rate(project: Project) -> float:
 # ═══════════════════════════════════════════
 
 @router.get("", response_model=list[ProjectOut])
-def list_projects(
+async def list_projects(
+    response: Response,
     stage: Optional[ProjectStage] = Query(None, description="按阶段筛选"),
     approval: Optional[ProjectApproval] = Query(None, description="按审批状态筛选"),
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    page: PageParams = Depends(page_params),
+    user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     项目列表 — 按角色数据隔离：
@@ -107,23 +90,23 @@ def list_projects(
     - tech:     同战区项目 (只读)
     - director: 本战区全部
     - vp/admin: 全部
+
+    Keyset 分页：下一页游标见响应头 X-Next-Cursor；?fields= 只返回指定字段。
     """
-    q = db.query(Project)
+    q = select(Project)
 
-    # 角色数据隔离
-    if user.role == UserRole.SALES:
-        q = q.filter(Project.owner_id == user.id)
-    elif user.role in (UserRole.TECH, UserRole.DIRECTOR):
-        q = q.filter(Project.dept == user.dept)
-    # VP / ADMIN / FINANCE: 不过滤
+    # 角色数据隔离（与 /api/search 共用）
+    scope = visible_projects(user)
+    if scope is not None:
+        q = q.where(scope)
 
     # 可选筛选条件
     if stage:
-        q = q.filter(Project.stage == stage)
+        q = q.where(Project.stage == stage)
     if approval:
-        q = q.filter(Project.approval_status == approval)
+        q = q.where(Project.approval_status == approval)
 
-    return q.order_by(Project.updated_at.desc()).all()
+    return await apaginate(db, q, _LIST_KEYSET, page, ProjectOut, response)
 
 
 # ═══════════════════════════════════════════
@@ -169,12 +152,10 @@ def create_project(
     # ═══════════════════════════════════════
     # 🔍 撞单查重引擎
     # ═══════════════════════════════════════
-    collision = _check_collision(body.client, body.project_title, db)
+    collision = find_collision(db, body.client, body.project_title)
     if collision:
         # 客户名完全一致 + 项目名也一致 → 直接拒绝
-        if (collision.client.strip().lower() == body.client.strip().lower()
-            and (collision.project_title or "").strip().lower()
-                == body.project_title.strip().lower()):
+        if is_exact_duplicate(collision, body.client, body.project_title):
             raise HTTPException(
                 status.HTTP_409_CONFLICT,
                 f"🚨 撞单拦截：与现有项目 [{collision.name}] "
@@ -224,6 +205,69 @@ def create_project(
     return project
 
 
+# ═══════════════════════════════════════════
+# POST /api/projects/collision-check — 批量撞单查重 (CSV 线索导入)
+# ═══════════════════════════════════════════
+
+_CSV_CLIENT_COLUMNS = ("client", "客户", "客户名称", "终端客户")
+_CSV_TITLE_COLUMNS = ("project_title", "项目", "项目名称", "项目简称")
+_BATCH_MAX_ROWS = int(os.environ.get("SRI_COLLISION_BATCH_MAX", "20000"))
+
+
+def _parse_leads_csv(raw: bytes) -> list[tuple[int, str, str]]:
+    """解析线索 CSV（UTF-8 / Excel 导出的 GBK 均可），返回 [(行号, 客户, 项目名), ...]。"""
+    for encoding in ("utf-8-sig", "gb18030"):
+        try:
+            text = raw.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise HTTPException(400, "CSV 编码无法识别，请另存为 UTF-8")
+
+    reader = csv.DictReader(io.StringIO(text))
+    headers = {(h or "").strip(): h for h in reader.fieldnames or []}
+    client_col = next((headers[c] for c in _CSV_CLIENT_COLUMNS if c in headers), None)
+    title_col = next((headers[c] for c in _CSV_TITLE_COLUMNS if c in headers), None)
+    if client_col is None or title_col is None:
+        raise HTTPException(
+            400, f"CSV 表头缺少客户列 {_CSV_CLIENT_COLUMNS} 或项目名列 {_CSV_TITLE_COLUMNS}"
+        )
+
+    leads = []
+    for row, record in enumerate(reader, start=1):
+        client = (record.get(client_col) or "").strip()
+        title = (record.get(title_col) or "").strip()
+        if client or title:
+            leads.append((row, client, title))
+        if len(leads) > _BATCH_MAX_ROWS:
+            raise HTTPException(413, f"单次最多查重 {_BATCH_MAX_ROWS} 条线索，请拆分文件")
+    return leads
+
+
+@router.post("/collision-check", response_model=CollisionBatchResult)
+def batch_collision_check(
+    file: UploadFile = File(..., description="线索 CSV：需含客户列与项目名列"),
+    user: User = Depends(require_role(UserRole.SALES, UserRole.DIRECTOR, UserRole.VP)),
+    db: Session = Depends(get_db),
+):
+    """
+    导入线索前的批量撞单预检（只读，不落库）。
+    每行与库内在审 / 已批项目比对，同时检查批内先后行互撞。
+    """
+    items = check_batch(db, _parse_leads_csv(file.file.read()))
+    counts = {s: 0 for s in ("clear", "conflict", "duplicate", "batch_duplicate", "invalid")}
+    for item in items:
+        counts[item["status"]] += 1
+    return {
+        "total": len(items),
+        "clear": counts["clear"],
+        "conflicts": counts["conflict"] + counts["duplicate"] + counts["batch_duplicate"],
+        "invalid": counts["invalid"],
+        "items": items,
+    }
+
+
 # ═══════════════════════════════════════════
 # GET /api/projects/{id} — 项目详情
 # ═══════════════════════════════════════════
@@ -0,0 +1,37 @@
+"""
+路由：全文检索 — routers/search.py
+====================================
+情报日志 / 关键人 / 知识库统一检索 (services/search.py, SQLite FTS5 + BM25)。
+可见性与项目列表一致：销售只搜自己的项目，技术 / 总监限本战区，知识库对所有人可见。
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from models import User
+from schemas import SearchHit, SearchSourceEnum
+from services.search import search as run_search
+from utils.dependencies import get_current_user, get_db, visible_projects
+
+router = APIRouter(prefix="/api/search", tags=["Search 全文检索"])
+
+
+@router.get("", response_model=list[SearchHit])
+def search(
+    q: str = Query(..., min_length=1, max_length=200, description="检索词，空格分隔多个词（AND）"),
+    source: Optional[list[SearchSourceEnum]] = Query(None, description="限定来源，可多选"),
+    limit: int = Query(20, ge=1, le=100),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """按 BM25 相关度返回前 limit 条命中，title / snippet 中命中词以 <mark> 包裹。"""
+    if db.get_bind().dialect.name != "sqlite":
+        raise HTTPException(501, "全文检索依赖 SQLite FTS5，当前数据库暂不支持")
+    return run_search(
+        db, q,
+        scope=visible_projects(user),
+        sources=[s.value for s in source] if source else None,
+        limit=limit,
+    )
@@ -8,38 +8,43 @@ AI 自动生成求援摘要，总监/专家批示后流转。
 import random
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from models import Project, SOSStatus, SOSTicket, User, UserRole
 from schemas import SOSCreate, SOSOut, SOSResolve
 from services.llm_service import AITask, build_ai_gateway
-from utils.dependencies import get_current_user, get_db, require_role
-from utils.security import mask_sensitive_info
+from utils.dependencies import get_async_db, get_db, require_role, require_role_async
+from utils.pagination import Keyset, PageParams, apaginate, page_params
+from utils.security import tokenize_sensitive_info
 
 router = APIRouter(prefix="/api/sos", tags=["SOS 求援工单"])
 
+_LIST_KEYSET = Keyset(SOSTicket.created_at, SOSTicket.id, desc=True)
+
 
 @router.post("", response_model=SOSOut, status_code=201)
-def create_sos(
+async def create_sos(
     body: SOSCreate,
-    user: User = Depends(require_role(UserRole.SALES)),
-    db: Session = Depends(get_db),
+    user: User = Depends(require_role_async(UserRole.SALES)),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     发起 SOS 求援。
     1. 保存客户原声
-    2. 🛡️ 脱敏后调用 AI 生成求援摘要 (AITask.SOS_BRIEF)
+    2. 🛡️ 脱敏后调用 AI 生成求援摘要 (AITask.SOS_BRIEF)，摘要中的令牌还原为原值（仅内网可见）
     3. 状态 → urgent
     """
-    project = db.query(Project).filter(Project.id == body.project_id).first()
+    project = await db.get(Project, body.project_id)
     if not project:
         raise HTTPException(404, f"项目 #{body.project_id} 不存在")
 
     ticket_no = f"T-{datetime.now().strftime('%Y')}-{random.randint(1000, 9999)}"
 
-    # ═══ 隐私红线：脱敏 ═══
-    sanitized_query = mask_sensitive_info(body.client_query)
+    # ═══ 隐私红线：脱敏（可逆令牌，专家看到的摘要保留客户给出的号码 / 金额）═══
+    sanitized_query, vault = tokenize_sensitive_info(body.client_query)
 
     # AI 生成求援摘要
     ai_brief = ""
@@ -51,10 +56,12 @@ def create_sos(
             f"当前关联项目：【{project.name}】\n\n"
             f"请帮销售向后方的【核心技术与商务专家群】写一段极其简短、专业的求援需求（3点以内）。"
         )
-        ai_brief = gw.chat(
+        # 现场紧急：前两道防线并发竞速，取最先返回者
+        ai_brief = vault.restore(await gw.achat(
             messages=[{"role": "user", "content": sos_prompt}],
             task=AITask.SOS_BRIEF,
-        )
+            race=2,
+        ))
     except Exception as e:
         ai_brief = f"(AI 摘要生成失败: {str(e)[:100]})"
 
@@ -67,22 +74,24 @@ def create_sos(
         status=SOSStatus.URGENT,
     )
     db.add(ticket)
-    db.commit()
-    db.refresh(ticket)
+    await db.commit()
+    await db.refresh(ticket)
     return ticket
 
 
 @router.get("", response_model=list[SOSOut])
-def list_sos(
+async def list_sos(
+    response: Response,
     status_filter: SOSStatus | None = Query(None, alias="status"),
-    user: User = Depends(require_role(UserRole.DIRECTOR, UserRole.VP, UserRole.TECH)),
-    db: Session = Depends(get_db),
+    page: PageParams = Depends(page_params),
+    user: User = Depends(require_role_async(UserRole.DIRECTOR, UserRole.VP, UserRole.TECH)),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """所有工单列表。可按状态筛选。"""
-    q = db.query(SOSTicket)
+    """所有工单列表。可按状态筛选，keyset 分页。"""
+    q = select(SOSTicket)
     if status_filter:
-        q = q.filter(SOSTicket.status == status_filter)
-    return q.order_by(SOSTicket.created_at.desc()).all()
+        q = q.where(SOSTicket.status == status_filter)
+    return await apaginate(db, q, _LIST_KEYSET, page, SOSOut, response)
 
 
 @router.post("/{ticket_id}/resolve", response_model=SOSOut)
@@ -4,15 +4,20 @@
 支持批量覆写和单点更新，紧密校验 Project 归属权。
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from models import Project, Stakeholder, StakeholderAttitude, User, UserRole
 from schemas import StakeholderCreate, StakeholderOut, StakeholderUpdate
-from utils.dependencies import get_current_user, get_db, require_role
+from utils.dependencies import get_async_db, get_current_user_async, get_db, require_role
+from utils.pagination import Keyset, PageParams, apaginate, page_params
 
 router = APIRouter(prefix="/api/projects/{project_id}/stakeholders", tags=["Stakeholder 权力地图"])
 
+_LIST_KEYSET = Keyset(Stakeholder.influence_weight, Stakeholder.id, desc=True)
+
 
 def _get_project_checked(project_id: int, user: User, db: Session) -> Project:
     """校验项目存在性 + 归属权限。"""
@@ -27,17 +32,15 @@ def _get_project_checked(project_id: int, user: User, db: Session) -> Project:
 
 
 @router.get("", response_model=list[StakeholderOut])
-def list_stakeholders(
+async def list_stakeholders(
     project_id: int,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    response: Response,
+    page: PageParams = Depends(page_params),
+    user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    return (
-        db.query(Stakeholder)
-        .filter(Stakeholder.project_id == project_id)
-        .order_by(Stakeholder.influence_weight.desc())
-        .all()
-    )
+    q = select(Stakeholder).where(Stakeholder.project_id == project_id)
+    return await apaginate(db, q, _LIST_KEYSET, page, StakeholderOut, response)
 
 
 @router.post("", response_model=StakeholderOut, status_code=201)
@@ -114,6 +117,8 @@ def update_stakeholder(
     if not sh:
         raise HTTPException(404, "关键人不存在")
     for field, value in body.model_dump(exclude_unset=True).items():
+        if value is None and not Stakeholder.__table__.c[field].nullable:
+            continue        # 非空列（如 influence_weight）显式传 null 视为不修改
         setattr(sh, field, value)
     db.commit()
     db.refresh(sh)
@@ -3,24 +3,30 @@
 ===================================
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from models import User, UserRole
 from schemas import UserCreate, UserOut
 from utils.dependencies import get_db, require_role
+from utils.pagination import Keyset, PageParams, page_params, paginate
 from utils.security import hash_password
 
 router = APIRouter(prefix="/api/users", tags=["Users 用户管理"])
 
+_LIST_KEYSET = Keyset(User.dept, User.name, User.id, desc=False)
+
 
 @router.get("", response_model=list[UserOut])
 def list_users(
+    response: Response,
+    page: PageParams = Depends(page_params),
     user: User = Depends(require_role(UserRole.ADMIN)),
     db: Session = Depends(get_db),
 ):
-    """用户列表。仅限 admin。"""
-    return db.query(User).order_by(User.dept, User.name).all()
+    """用户列表。仅限 admin，按战区 + 姓名 keyset 分页。"""
+    return paginate(db, select(User), _LIST_KEYSET, page, UserOut, response)
 
 
 @router.post("", response_model=UserOut, status_code=201)
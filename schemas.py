@@ -199,6 +199,26 @@ class ProjectOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class CollisionCheckItem(BaseModel):
+    """批量撞单查重单行结果。"""
+    row: int = Field(..., description="CSV 数据行号（从 1 起，不含表头）")
+    client: str
+    project_title: str
+    status: str = Field(..., description="clear / conflict / duplicate / batch_duplicate / invalid（空或超长）")
+    matched_project_id: Optional[int] = None
+    matched_name: Optional[str] = None
+    matched_owner: Optional[str] = None
+    matched_row: Optional[int] = Field(None, description="批内互撞时，与之冲突的先前行号")
+
+
+class CollisionBatchResult(BaseModel):
+    total: int
+    clear: int
+    conflicts: int = Field(..., description="conflict + duplicate + batch_duplicate")
+    invalid: int
+    items: list[CollisionCheckItem]
+
+
 # ═══════════════════════════════════════════
 # Stakeholder 权力地图
 # ═══════════════════════════════════════════
@@ -252,6 +272,30 @@ class IntelLogCreate(BaseModel):
     text: str = Field(..., min_length=1, max_length=8000, description="情报原文")
 
 
+class IntelLogBatchCreate(BaseModel):
+    """离线笔记批量同步：各条相互独立，可分属不同项目。"""
+    items: list[IntelLogCreate] = Field(..., min_length=1, description="按记录先后排列")
+
+
+class IntelLogBatchItem(BaseModel):
+    """批量入库单条结果。"""
+    index: int = Field(..., description="在请求 items 中的下标（从 0 起）")
+    project_id: int
+    status: str = Field(..., description="created / parse_failed / invalid")
+    log_id: Optional[int] = None
+    ai_model_used: Optional[str] = None
+    error: Optional[str] = None
+
+
+class IntelLogBatchResult(BaseModel):
+    total: int
+    created: int = Field(..., description="入库且 AI 解析成功")
+    parse_failed: int = Field(..., description="已入库，AI 解析失败（原文保留，可重新解析）")
+    invalid: int = Field(..., description="未入库（项目不存在）")
+    llm_calls: int = Field(..., description="实际发起的 LLM 请求数（短笔记合并为一次请求）")
+    items: list[IntelLogBatchItem]
+
+
 class IntelLogOut(BaseModel):
     id: int
     project_id: int
@@ -267,6 +311,25 @@ class IntelLogOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class SummaryLevelEnum(str, Enum):
+    week = "week"
+    month = "month"
+    project = "project"
+
+
+class IntelSummaryOut(BaseModel):
+    project_id: int
+    level: SummaryLevelEnum
+    period_key: str = Field(..., description="2025-W07 / 2025-02 / all")
+    period_start: Optional[datetime] = None
+    log_count: int
+    last_log_id: int = Field(..., description="已折叠的最大情报 ID")
+    summary_text: str
+    updated_at: Optional[datetime] = None
+
+    model_config = {"from_attributes": True}
+
+
 # ═══════════════════════════════════════════
 # DealDesk 报价底单 + BOM
 # ═══════════════════════════════════════════
@@ -333,6 +396,18 @@ class BOMVerifyResponse(BaseModel):
     diff_summary: str = ""
 
 
+class BOMImportResult(BaseModel):
+    """BOM 表格批量导入结果（按行键差异写入，未变行不动）。"""
+    rows: int = Field(..., description="文件中的有效数据行数")
+    inserted: int
+    updated: int
+    deleted: int
+    unchanged: int
+    total_amount: Optional[float] = Field(None, description="导入后总价（仅报价底单）")
+    tamper_hash: Optional[str] = Field(None, description="导入后的防篡改哈希（仅报价底单）")
+    diff_summary: Optional[str] = None
+
+
 # ═══════════════════════════════════════════
 # Contract 合同联审
 # ═══════════════════════════════════════════
@@ -547,6 +622,28 @@ class AIResponse(BaseModel):
     result: str = ""
     model_used: Optional[str] = None
     error: Optional[str] = None
+    context_tokens: Optional[int] = None          # 装入 Prompt 的项目情报 token 数
+    context_tokens_saved: Optional[int] = None    # 相比全量拼接节省的 token 数
+
+
+# ═══════════════════════════════════════════
+# Search 全文检索
+# ═══════════════════════════════════════════
+
+class SearchSourceEnum(str, Enum):
+    INTEL = "intel"
+    STAKEHOLDER = "stakeholder"
+    KB = "kb"
+
+
+class SearchHit(BaseModel):
+    source: SearchSourceEnum
+    id: int = Field(..., description="源表主键")
+    project_id: Optional[int] = None
+    project_name: Optional[str] = None
+    title: str = Field("", description="标题（命中词以 <mark> 高亮）")
+    snippet: str = Field("", description="正文片段（命中词以 <mark> 高亮）")
+    score: float = Field(..., description="BM25 相关度，越大越相关")
 
 
 # ═══════════════════════════════════════════
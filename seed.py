@@ -1,12 +1,14 @@
 """
 数据库初始化种子 — seed.py
 ============================
-注入 Demo 账号 + 作战项目 + 关键人到数据库，供前端联调使用。
+注入 Demo 账号 + 作战项目 + 关键人 + 知识库文档到数据库，供前端联调使用。
 用法: python3 seed.py
 """
 
+from database import KB_SEED_DOCS
 from db import SessionLocal, init_db
 from models import (
+    KnowledgeDoc,
     User, UserRole,
     Project, ProjectStage, ProjectApproval,
     BudgetStatus, CompetitivePosition,
@@ -343,11 +345,26 @@ def seed():
 
         db.commit()
         print(f"\n🎉 关键人 Seed 完成: 新增 {created_stakeholders} 人。")
+
+        # ── 4. 注入知识库文档（与旧版 knowledge_base 种子一致）──
+        created_docs = 0
+        for title, category, icon, file_type, file_size, description in KB_SEED_DOCS:
+            if db.query(KnowledgeDoc).filter(KnowledgeDoc.title == title).first():
+                continue
+            db.add(KnowledgeDoc(
+                title=title, category=category, icon=icon,
+                file_type=file_type, file_size=file_size, description=description,
+            ))
+            created_docs += 1
+
+        db.commit()
+        print(f"\n🎉 知识库 Seed 完成: 新增 {created_docs} 篇。")
         print(f"\n{'='*50}")
         print(f"📊 数据库总览：")
         print(f"   用户: {db.query(User).count()}")
         print(f"   项目: {db.query(Project).count()}")
         print(f"   关键人: {db.query(Stakeholder).count()}")
+        print(f"   知识库: {db.query(KnowledgeDoc).count()}")
         print(f"{'='*50}")
 
     finally:
@@ -59,7 +59,7 @@ fi
 echo ""
 echo -e "${YELLOW}[2/10] 安装基础软件...${NC}"
 if [[ $OS == *"Ubuntu"* ]] || [[ $OS == *"Debian"* ]]; then
-    apt install -y python3 python3-venv python3-pip git wget curl htop > /dev/null
+    apt install -y python3 python3-venv python3-pip git wget curl htop ffmpeg > /dev/null
 elif [[ $OS == *"CentOS"* ]] || [[ $OS == *"Red Hat"* ]]; then
     yum install -y python3 python3-pip git wget curl htop > /dev/null
 fi
@@ -0,0 +1,493 @@
+"""
+AI 响应缓存 — services/ai_cache.py
+====================================
+AIGateway 的可插拔缓存层：
+  1. 精确命中        → SHA-256(AITask, 模型链, 温度, 脱敏后 messages)
+  2. 近似命中 (可选) → 本地字符 n-gram 哈希向量 + 余弦相似度，只在同场景同模型、且缓存标签
+                       （project:{id}）完全相同的条目内查找，最多比对最近 SRI_AI_CACHE_SEMANTIC_SCAN 条
+  3. 场景级 TTL      → DEFAULT_MODEL_REGISTRY[task]["cache_ttl"]，0 = 不缓存
+  4. 内存 LRU        → 条目数 + 字节数双上限
+  5. SQLite 持久层   → 进程重启后仍可命中（复用 db_pool.SQLitePool）
+  6. 标签失效        → 条目挂 "project:{id}" 标签；IntelLog / Stakeholder / Project
+                       变更提交后自动失效该项目的全部缓存
+
+用法：
+    cache = get_response_cache()
+    hit = cache.get(task, signature, temperature, messages, tags=["project:1"])
+    cache.put(task, signature, temperature, messages, text, model, provider, ttl, tags=["project:1"])
+    cache.invalidate_tag("project:1")
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import math
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from db_pool import SQLitePool, resolve_db_path
+
+logger = logging.getLogger("ai_cache")
+
+# ── 缓存参数（可通过环境变量覆盖）──
+_ENABLED = os.environ.get("SRI_AI_CACHE", "1") != "0"
+_MAX_ENTRIES = int(os.environ.get("SRI_AI_CACHE_MAX_ENTRIES", "512"))
+_MAX_BYTES = int(float(os.environ.get("SRI_AI_CACHE_MAX_MB", "32")) * 1024 * 1024)
+_DB_PATH = os.environ.get("SRI_AI_CACHE_DB", "ai_cache.db")
+_SEMANTIC = os.environ.get("SRI_AI_CACHE_SEMANTIC", "0") == "1"
+_SEMANTIC_THRESHOLD = float(os.environ.get("SRI_AI_CACHE_SEMANTIC_THRESHOLD", "0.97"))
+_SEMANTIC_SCAN = int(os.environ.get("SRI_AI_CACHE_SEMANTIC_SCAN", "64"))   # 近似查找每次最多比对条数
+
+_EMBED_DIM = 512
+
+
+# ═══════════════════════════════════════════
+# 1. 本地向量 (近似命中用)
+# ═══════════════════════════════════════════
+
+def ngram_embedding(text: str, dim: int = _EMBED_DIM) -> list[float]:
+    """
+    字符 1-gram + 2-gram 特征哈希 → L2 归一化向量。
+    中文无需分词；对"同一项目上下文 + 措辞微调"的重复请求足够灵敏，零外部依赖。
+    """
+    vec = [0.0] * dim
+    for n in (1, 2):
+        for i in range(len(text) - n + 1):
+            h = int.from_bytes(hashlib.blake2b(text[i:i + n].encode("utf-8"), digest_size=4).digest(), "little")
+            vec[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec))
+    return [v / norm for v in vec] if norm else vec
+
+
+def _cosine(a: list[float], b: list[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+# ═══════════════════════════════════════════
+# 2. 缓存条目
+# ═══════════════════════════════════════════
+
+@dataclass
+class CacheHit:
+    """缓存命中结果。"""
+    text: str
+    model: str
+    provider: str
+    kind: str               # "exact" / "semantic"
+
+
+@dataclass
+class _Entry:
+    key: str
+    bucket: str             # 近似查找分桶：task + 模型链 + 温度
+    text: str
+    model: str
+    provider: str
+    expires_at: float
+    tags: tuple[str, ...] = ()
+    embedding: Optional[list[float]] = None
+    size: int = field(init=False)
+
+    def __post_init__(self):
+        self.size = len(self.text.encode("utf-8")) + 256
+
+
+# ═══════════════════════════════════════════
+# 3. 两级缓存
+# ═══════════════════════════════════════════
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_cache (
+    key TEXT PRIMARY KEY,
+    bucket TEXT NOT NULL,
+    response TEXT NOT NULL,
+    model TEXT,
+    provider TEXT,
+    expires_at REAL NOT NULL,
+    embedding BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_ai_cache_expires ON ai_cache(expires_at);
+CREATE TABLE IF NOT EXISTS ai_cache_tags (
+    tag TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (tag, key)
+);
+"""
+
+
+class AIResponseCache:
+    """
+    内存 LRU + SQLite 持久层的 AI 响应缓存。
+    ─────────────────────────────────────
+    - get(): 内存精确 → SQLite 精确 → (可选) 内存近似（同 bucket + 同标签集合）
+    - put(): 同时写入两级；SQLite 写入失败不影响主流程
+    - invalidate_tag() / invalidate_tags(): 两级失效（持久层可投递后台执行）
+    """
+
+    def __init__(
+        self,
+        db_path: str | None = None,
+        max_entries: int = _MAX_ENTRIES,
+        max_bytes: int = _MAX_BYTES,
+        embedder: Callable[[str], list[float]] | None = None,
+        semantic_threshold: float = _SEMANTIC_THRESHOLD,
+        semantic_scan: int = _SEMANTIC_SCAN,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.embedder = embedder
+        self.semantic_threshold = semantic_threshold
+        self.semantic_scan = semantic_scan
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # 近似查找索引：(bucket, 标签集合) → 该范围内的 key（按最近使用排序）
+        self._scopes: dict[tuple, "OrderedDict[str, None]"] = {}
+        self._bytes = 0
+        # 持久层 DELETE 尚在后台执行的标签 → 在途次数；期间持久层命中这些标签按未命中处理
+        self._invalidating: dict[str, int] = {}
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0,
+                       "puts": 0, "evictions": 0, "invalidations": 0}
+        self._store: SQLitePool | None = None
+        if db_path:
+            self._store = SQLitePool(db_path)
+            with self._store.write() as conn:
+                conn.executescript(_SCHEMA)
+
+    # ─────────────────────────────────────
+    # 键计算
+    # ─────────────────────────────────────
+
+    @staticmethod
+    def _bucket(task: str, signature: str, temperature: float) -> str:
+        return f"{task}|{signature}|{temperature:.3f}"
+
+    @staticmethod
+    def _scope(bucket: str, tags) -> tuple:
+        return bucket, frozenset(tags or ())
+
+    @staticmethod
+    def _key(bucket: str, messages: list[dict]) -> str:
+        payload = json.dumps(messages, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(f"{bucket}\n{payload}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _text_of(messages: list[dict]) -> str:
+        return "\n".join(
+            m["content"] if isinstance(m.get("content"), str) else json.dumps(m.get("content"), ensure_ascii=False)
+            for m in messages
+        )
+
+    # ─────────────────────────────────────
+    # 查找
+    # ─────────────────────────────────────
+
+    def get(self, task: str, signature: str, temperature: float,
+            messages: list[dict], tags: list[str] | None = None) -> CacheHit | None:
+        """
+        精确命中按完整 messages 匹配；近似命中只在 bucket 与标签集合都相同的条目中查找，
+        避免把 A 项目的回答返回给措辞相近的 B 项目请求。含 SQLite 读与向量计算，异步调用方应放到线程里执行。
+        """
+        bucket = self._bucket(task, signature, temperature)
+        key = self._key(bucket, messages)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._touch(key)
+                    self._stats["exact_hits"] += 1
+                    return CacheHit(entry.text, entry.model, entry.provider, "exact")
+                self._drop(key)
+
+        entry = self._load(key, now)
+        if entry is not None:
+            with self._lock:
+                self._insert(entry)
+                self._stats["exact_hits"] += 1
+            return CacheHit(entry.text, entry.model, entry.provider, "exact")
+
+        if self.embedder is not None:
+            hit = self._semantic_get(self._scope(bucket, tags), self._text_of(messages), now)
+            if hit is not None:
+                return hit
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def _semantic_get(self, scope: tuple, text: str, now: float) -> CacheHit | None:
+        """同范围内最近 semantic_scan 条候选里找余弦相似度最高者；锁内只取候选，锁外算相似度。"""
+        with self._lock:
+            keys = self._scopes.get(scope)
+            if not keys:
+                return None
+            candidates = [self._entries[k] for k in itertools.islice(reversed(keys), self.semantic_scan)]
+        query_vec = self.embedder(text)
+        best, best_score = None, self.semantic_threshold
+        for e in candidates:
+            if e.embedding is None or e.expires_at <= now:
+                continue
+            score = _cosine(query_vec, e.embedding)
+            if score >= best_score:
+                best, best_score = e, score
+        if best is None:
+            return None
+        with self._lock:
+            if best.key in self._entries:
+                self._touch(best.key)
+            self._stats["semantic_hits"] += 1
+        return CacheHit(best.text, best.model, best.provider, "semantic")
+
+    # ─────────────────────────────────────
+    # 写入
+    # ─────────────────────────────────────
+
+    def put(self, task: str, signature: str, temperature: float, messages: list[dict],
+            text: str, model: str, provider: str, ttl: int, tags: list[str] | None = None):
+        if ttl <= 0 or not text:
+            return
+        bucket = self._bucket(task, signature, temperature)
+        entry = _Entry(
+            key=self._key(bucket, messages), bucket=bucket, text=text,
+            model=model, provider=provider, expires_at=time.time() + ttl,
+            tags=tuple(tags or ()),
+            embedding=self.embedder(self._text_of(messages)) if self.embedder else None,
+        )
+        with self._lock:
+            self._insert(entry)
+            self._stats["puts"] += 1
+        self._persist(entry)
+
+    def _insert(self, entry: _Entry):
+        """写入内存层并按 LRU 淘汰（调用方须持有锁）。"""
+        if entry.key in self._entries:
+            self._drop(entry.key)
+        self._entries[entry.key] = entry
+        self._scopes.setdefault(self._scope(entry.bucket, entry.tags), OrderedDict())[entry.key] = None
+        self._bytes += entry.size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._stats["evictions"] += 1
+
+    def _touch(self, key: str):
+        """标记最近使用（调用方须持有锁）。"""
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        self._scopes[self._scope(entry.bucket, entry.tags)].move_to_end(key)
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+            scope = self._scope(entry.bucket, entry.tags)
+            keys = self._scopes[scope]
+            del keys[key]
+            if not keys:
+                del self._scopes[scope]
+
+    # ─────────────────────────────────────
+    # SQLite 持久层
+    # ─────────────────────────────────────
+
+    def _load(self, key: str, now: float) -> _Entry | None:
+        if self._store is None:
+            return None
+        try:
+            with self._store.read() as conn:
+                row = conn.execute(
+                    "SELECT bucket, response, model, provider, expires_at, embedding "
+                    "FROM ai_cache WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                tags = tuple(t for (t,) in conn.execute(
+                    "SELECT tag FROM ai_cache_tags WHERE key = ?", (key,)
+                ))
+        except Exception as e:
+            logger.warning("AI 缓存持久层读取失败，按未命中处理: %s", e)
+            return None
+        with self._lock:
+            if self._invalidating and not self._invalidating.keys().isdisjoint(tags):
+                return None
+        bucket, text, model, provider, expires_at, blob = row
+        embedding = list(array("f", blob)) if blob else None
+        return _Entry(key=key, bucket=bucket, text=text, model=model or "",
+                      provider=provider or "", expires_at=expires_at, tags=tags,
+                      embedding=embedding)
+
+    def _persist(self, entry: _Entry):
+        if self._store is None:
+            return
+        blob = array("f", entry.embedding).tobytes() if entry.embedding else None
+        try:
+            with self._store.write() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO ai_cache "
+                    "(key, bucket, response, model, provider, expires_at, embedding) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (entry.key, entry.bucket, entry.text, entry.model,
+                     entry.provider, entry.expires_at, blob),
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO ai_cache_tags (tag, key) VALUES (?, ?)",
+                    [(t, entry.key) for t in entry.tags],
+                )
+                # 顺带清理过期条目，持久层不无限增长
+                if self._stats["puts"] % 100 == 0:
+                    self._purge_expired(conn)
+        except Exception as e:
+            logger.warning("AI 缓存持久层写入失败（不影响主流程）: %s", e)
+
+    @staticmethod
+    def _purge_expired(conn):
+        conn.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (time.time(),))
+        conn.execute("DELETE FROM ai_cache_tags WHERE key NOT IN (SELECT key FROM ai_cache)")
+
+    # ─────────────────────────────────────
+    # 失效
+    # ─────────────────────────────────────
+
+    def invalidate_tag(self, tag: str) -> int:
+        """失效挂有该标签的全部条目，返回内存层删除条数。"""
+        return self.invalidate_tags((tag,))
+
+    def invalidate_tags(self, tags, background: bool = False) -> int:
+        """
+        失效挂有任一标签的全部条目，返回内存层删除条数。
+        background=True 时内存层立即删除，持久层 DELETE 投递到 offload 的 db 池执行（commit 钩子可能跑在
+        事件循环上）；删除完成前持久层中挂这些标签的条目按未命中处理，不会被读回内存。
+        """
+        tags = tuple(tags)
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if not set(e.tags).isdisjoint(tags)]
+            for k in keys:
+                self._drop(k)
+            self._stats["invalidations"] += len(tags)
+            if self._store is not None and background:
+                for tag in tags:
+                    self._invalidating[tag] = self._invalidating.get(tag, 0) + 1
+        if self._store is not None:
+            if background:
+                from offload import submit_db
+                submit_db(self._delete_tags, tags, release=True)
+            else:
+                self._delete_tags(tags)
+        return len(keys)
+
+    def _delete_tags(self, tags: tuple, release: bool = False):
+        try:
+            with self._store.write() as conn:
+                for tag in tags:
+                    conn.execute(
+                        "DELETE FROM ai_cache WHERE key IN (SELECT key FROM ai_cache_tags WHERE tag = ?)",
+                        (tag,),
+                    )
+                    conn.execute("DELETE FROM ai_cache_tags WHERE tag = ?", (tag,))
+        except Exception as e:
+            logger.warning("AI 缓存持久层失效失败: %s", e)
+        finally:
+            if release:
+                with self._lock:
+                    for tag in tags:
+                        if self._invalidating[tag] > 1:
+                            self._invalidating[tag] -= 1
+                        else:
+                            del self._invalidating[tag]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+            self._bytes = 0
+        if self._store is not None:
+            with self._store.write() as conn:
+                conn.execute("DELETE FROM ai_cache")
+                conn.execute("DELETE FROM ai_cache_tags")
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+            snapshot["bytes"] = self._bytes
+        lookups = snapshot["exact_hits"] + snapshot["semantic_hits"] + snapshot["misses"]
+        hits = snapshot["exact_hits"] + snapshot["semantic_hits"]
+        snapshot["hit_rate"] = f"{hits / lookups * 100:.1f}%" if lookups else "N/A"
+        snapshot["semantic"] = self.embedder is not None
+        return snapshot
+
+
+# ═══════════════════════════════════════════
+# 4. 数据变更 → 缓存失效
+# ═══════════════════════════════════════════
+
+def project_tag(project_id: int) -> str:
+    return f"project:{project_id}"
+
+
+_hooks_installed = False
+
+
+def install_invalidation_hooks():
+    """
+    注册 SQLAlchemy Session 事件：flush 时收集被改动的 IntelLog / Stakeholder / Project，
+    commit 成功后失效对应项目的缓存（内存层立即删除，持久层 DELETE 交给 offload db 池，
+    不在事件循环上执行 SQLite 写入）；rollback 丢弃。
+    覆盖同步 Session 与 AsyncSession（后者底层为同步 Session）。幂等。
+    """
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    from models import IntelLog, Project, Stakeholder
+
+    def _after_flush(session, flush_context):
+        pending = session.info.setdefault("ai_cache_tags", set())
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(obj, (IntelLog, Stakeholder)) and obj.project_id:
+                pending.add(project_tag(obj.project_id))
+            elif isinstance(obj, Project) and obj.id:
+                pending.add(project_tag(obj.id))
+
+    def _after_commit(session):
+        tags = session.info.pop("ai_cache_tags", None)
+        if tags and _ENABLED:
+            get_response_cache().invalidate_tags(tags, background=True)
+
+    def _after_rollback(session):
+        session.info.pop("ai_cache_tags", None)
+
+    event.listen(Session, "after_flush", _after_flush)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+    _hooks_installed = True
+
+
+# ── 进程级单例 ──
+_cache: AIResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> AIResponseCache | None:
+    """获取进程级 AI 响应缓存；SRI_AI_CACHE=0 时返回 None（关闭缓存）。"""
+    global _cache
+    if not _ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AIResponseCache(
+                    db_path=resolve_db_path(_DB_PATH),
+                    embedder=ngram_embedding if _SEMANTIC else None,
+                )
+    return _cache
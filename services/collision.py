@@ -0,0 +1,271 @@
+"""
+撞单查重引擎 — services/collision.py
+=====================================
+替代逐项目全量加载的 _check_collision，判定规则保持不变（客户名双向包含 + 项目名双向包含，
+或客户名完全一致），改为「索引取候选 → 回表复核」：
+  1. 归一化键      → client.strip().lower()，存 project_collision_keys.client_key (B-Tree)
+  2. 二元组倒排    → project_collision_grams(gram, project_id)，覆盖「已有客户名 ⊇ 新客户名」
+                     探测各 gram 文档频次（封顶计数），取最稀有的两个 gram 求交
+  3. 子串精确查    → 新客户名全部子串 IN client_key，覆盖「已有客户名 ⊆ 新客户名」
+  4. 候选复核      → 候选回表过滤审批状态（pending / approved），逐一套用原始判定
+  5. 批量查重      → check_batch()：导入线索一次遍历，同时比对库内项目与批内先前行
+
+索引随 Project 插入 / 改客户名由 models.py 的 mapper 事件同步维护；
+bulk_save_objects 等绕过事件的写入须调用 rebuild_index() 补建。
+"""
+
+import os
+from dataclasses import dataclass
+
+from sqlalchemy import delete, func, insert, select, union
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+_GRAM = 2                                                                  # 中文客户名以二元组切分
+_DF_PROBE_CAP = int(os.environ.get("SRI_COLLISION_DF_CAP", "512"))       # gram 频次探测封顶
+MAX_FIELD_CHARS = 200                                                      # 与 ProjectCreate.client / project_title 一致
+
+
+def normalize(text: str | None) -> str:
+    """归一化键：与原判定规则一致（strip + lower）。"""
+    return (text or "").strip().lower()
+
+
+def grams(key: str) -> set[str]:
+    """归一化键的二元组集合（长度不足 2 时为空）。"""
+    return {key[i:i + _GRAM] for i in range(len(key) - _GRAM + 1)}
+
+
+def _substrings(key: str) -> set[str]:
+    """全部连续子串（含空串：空客户名的项目与任何客户名互相包含）。"""
+    subs = {""}
+    for i in range(len(key)):
+        for j in range(i + 1, len(key) + 1):
+            subs.add(key[i:j])
+    return subs
+
+
+# ═══════════════════════════════════════════
+# 索引维护
+# ═══════════════════════════════════════════
+
+def write_index(conn: Connection, project_id: int, client: str | None, replace: bool = False):
+    """写入（或替换）单个项目的查重索引行；在调用方事务内执行。"""
+    from models import ProjectCollisionGram, ProjectCollisionKey
+
+    if replace:
+        conn.execute(delete(ProjectCollisionGram).where(ProjectCollisionGram.project_id == project_id))
+        conn.execute(delete(ProjectCollisionKey).where(ProjectCollisionKey.project_id == project_id))
+    key = normalize(client)
+    conn.execute(insert(ProjectCollisionKey), [{"project_id": project_id, "client_key": key}])
+    rows = [{"gram": g, "project_id": project_id} for g in grams(key)]
+    if rows:
+        conn.execute(insert(ProjectCollisionGram), rows)
+
+
+def rebuild_index(conn: Connection, batch_size: int = 5000) -> int:
+    """为尚未建索引的项目补建查重索引，返回补建数量。"""
+    from models import Project, ProjectCollisionGram, ProjectCollisionKey
+
+    indexed = (
+        select(ProjectCollisionKey.project_id)
+        .where(ProjectCollisionKey.project_id == Project.id)
+        .exists()
+    )
+    total, last_id = 0, 0
+    # 按主键分批物化后再写，避免边读边写同一游标
+    while rows := conn.execute(
+        select(Project.id, Project.client)
+        .where(Project.id > last_id, ~indexed)
+        .order_by(Project.id)
+        .limit(batch_size)
+    ).all():
+        keys, gram_rows = [], []
+        for pid, client in rows:
+            key = normalize(client)
+            keys.append({"project_id": pid, "client_key": key})
+            gram_rows += [{"gram": g, "project_id": pid} for g in grams(key)]
+        conn.execute(insert(ProjectCollisionKey), keys)
+        if gram_rows:
+            conn.execute(insert(ProjectCollisionGram), gram_rows)
+        total += len(rows)
+        last_id = rows[-1][0]
+    return total
+
+
+# ═══════════════════════════════════════════
+# 候选生成
+# ═══════════════════════════════════════════
+
+def _rarest_grams(conn: Connection, key: str) -> list[str] | None:
+    """
+    单条语句探测 key 各 gram 的文档频次（封顶计数），返回最稀有的两个；
+    任一 gram 从未出现则返回 None（不可能被任何已有客户名包含）。
+    """
+    from models import ProjectCollisionGram as G
+
+    ordered = sorted(grams(key))
+    probes = [
+        select(func.count()).select_from(
+            select(G.project_id).where(G.gram == g).limit(_DF_PROBE_CAP).subquery()
+        ).scalar_subquery()
+        for g in ordered
+    ]
+    df = dict(zip(ordered, conn.execute(select(*probes)).one()))
+    rarest = sorted(ordered, key=df.get)[:2]
+    return None if df[rarest[0]] == 0 else rarest
+
+
+def _candidate_ids(conn: Connection, key: str):
+    """
+    客户名双向包含的候选项目 ID 子查询：
+      - 已有客户名 ⊇ key：最稀有两个 gram 的倒排求交（gram 命中不等于真包含，复核阶段确认）
+      - 已有客户名 ⊆ key：key 的全部子串精确命中 client_key
+    """
+    from models import ProjectCollisionGram as G, ProjectCollisionKey as K
+
+    contained = select(K.project_id).where(K.client_key.in_(list(_substrings(key))))
+    if len(key) < _GRAM:
+        # 单字客户名无法走二元组索引，退化为 LIKE（极少见）
+        containing = select(K.project_id).where(K.client_key.contains(key, autoescape=True))
+        return union(containing, contained)
+
+    rarest = _rarest_grams(conn, key)
+    if rarest is None:
+        return contained
+    g1 = G.__table__.alias("g1")
+    containing = select(g1.c.project_id).where(g1.c.gram == rarest[0])
+    if len(rarest) > 1:
+        g2 = G.__table__.alias("g2")
+        containing = containing.join(g2, (g2.c.project_id == g1.c.project_id) & (g2.c.gram == rarest[1]))
+    return union(containing, contained)
+
+
+# ═══════════════════════════════════════════
+# 复核 & 对外接口
+# ═══════════════════════════════════════════
+
+def _is_collision(client_key: str, title_key: str, p_client: str, p_title: str) -> bool:
+    """原始判定：客户名双向包含 + 项目名双向包含，或客户名完全一致。"""
+    client_match = (client_key in p_client) or (p_client in client_key)
+    title_match = (title_key in p_title) or (p_title in title_key)
+    return (client_match and title_match) or client_key == p_client
+
+
+def _rank(client_key: str, title_key: str, p_client: str, p_title: str) -> int:
+    """多个命中时的优先级：完全重复 > 客户名一致 > 模糊包含。"""
+    if client_key == p_client and title_key == p_title:
+        return 0
+    return 1 if client_key == p_client else 2
+
+
+def find_collision(db: Session, client: str, title: str):
+    """
+    撞单查重：返回最相关的在审 / 已批项目，无撞单返回 None。
+    多个命中时按 完全重复 > 客户名一致 > 模糊包含 > 项目 ID 排序，结果稳定。
+    候选阶段只取 (id, client, project_title) 三列，命中后才加载完整 Project。
+    """
+    from models import Project, ProjectApproval
+
+    client_key, title_key = normalize(client), normalize(title)
+    active = {ProjectApproval.PENDING, ProjectApproval.APPROVED}
+    conn = db.connection()
+    stmt = select(Project.id, Project.client, Project.project_title, Project.approval_status)
+    if client_key:
+        # 审批状态放到 Python 过滤：SQL 里只留 id IN (候选)，规划器必走主键回表
+        stmt = stmt.where(Project.id.in_(_candidate_ids(conn, client_key)))
+    # 空客户名与所有项目互相包含，只能逐个比对项目名（极少见）
+
+    best_id, best_rank = None, None
+    for pid, p_client, p_title, approval in sorted(conn.execute(stmt)):
+        if approval not in active:
+            continue
+        p_client, p_title = normalize(p_client), normalize(p_title)
+        if not _is_collision(client_key, title_key, p_client, p_title):
+            continue
+        rank = _rank(client_key, title_key, p_client, p_title)
+        if best_id is None or rank < best_rank:
+            best_id, best_rank = pid, rank
+            if rank == 0:
+                break
+    return db.get(Project, best_id) if best_id is not None else None
+
+
+def is_exact_duplicate(project, client: str, title: str) -> bool:
+    """客户名 + 项目名完全一致（create_project 据此直接 409）。"""
+    return (normalize(project.client) == normalize(client)
+            and normalize(project.project_title) == normalize(title))
+
+
+# ═══════════════════════════════════════════
+# 批量查重（CSV 导入）
+# ═══════════════════════════════════════════
+
+@dataclass
+class _BatchRow:
+    row: int
+    client_key: str
+    title_key: str
+
+
+class _BatchIndex:
+    """批内互撞：对已处理行维护与库内相同结构的内存倒排。"""
+
+    def __init__(self):
+        self.rows: list[_BatchRow] = []
+        self.by_key: dict[str, list[int]] = {}
+        self.by_gram: dict[str, set[int]] = {}
+
+    def add(self, r: _BatchRow):
+        idx = len(self.rows)
+        self.rows.append(r)
+        self.by_key.setdefault(r.client_key, []).append(idx)
+        for g in grams(r.client_key):
+            self.by_gram.setdefault(g, set()).add(idx)
+
+    def find(self, client_key: str, title_key: str) -> _BatchRow | None:
+        if len(client_key) >= _GRAM:
+            postings = [self.by_gram.get(g, set()) for g in grams(client_key)]
+            cands = set.intersection(*postings) if postings else set()
+        else:
+            cands = {i for i, r in enumerate(self.rows) if client_key in r.client_key}
+        for sub in _substrings(client_key):
+            cands.update(self.by_key.get(sub, ()))
+        for i in sorted(cands):
+            r = self.rows[i]
+            if _is_collision(client_key, title_key, r.client_key, r.title_key):
+                return r
+        return None
+
+
+def check_batch(db: Session, leads: list[tuple[int, str, str]]) -> list[dict]:
+    """
+    一次遍历比对整批线索 [(行号, 客户, 项目名), ...]：先查库内在审 / 已批项目，再查批内先前行。
+    返回每行 {row, client, project_title, status, matched_*}，
+    status ∈ clear / conflict / duplicate / batch_duplicate / invalid（客户或项目名为空，或超过 MAX_FIELD_CHARS 字：
+    这样的线索无法立项，也避免超长客户名的全子串查询拖慢整批）。
+    """
+    batch = _BatchIndex()
+    results = []
+    for row, client, title in leads:
+        item = {"row": row, "client": client, "project_title": title, "status": "clear"}
+        if not normalize(client) or not normalize(title) or max(len(client), len(title)) > MAX_FIELD_CHARS:
+            item["status"] = "invalid"
+            results.append(item)
+            continue
+        hit = find_collision(db, client, title)
+        if hit is not None:
+            item.update(
+                status="duplicate" if is_exact_duplicate(hit, client, title) else "conflict",
+                matched_project_id=hit.id,
+                matched_name=hit.name,
+                matched_owner=hit.applicant_name,
+            )
+        else:
+            client_key, title_key = normalize(client), normalize(title)
+            prior = batch.find(client_key, title_key)
+            if prior is not None:
+                item.update(status="batch_duplicate", matched_row=prior.row)
+        batch.add(_BatchRow(row, normalize(client), normalize(title)))
+        results.append(item)
+    return results
@@ -0,0 +1,297 @@
+"""
+上下文装箱器 — services/context_packer.py
+==========================================
+按 token 预算为 LLM Prompt 装填上下文（替代各处按字符硬截断 / 不设上限的拼接）：
+  1. 真实 token 计数   → tiktoken 按模型选编码（非 OpenAI 模型用 cl100k_base 近似）；
+                         未安装或编码文件不可用时按字符类别估算
+  2. 相关度 × 时效排序 → 检索相似度（或与查询的字符二元组重合度）加权叠加时效分，
+                         时效以本批最新条目为基准按半衰期衰减，同一批数据排序稳定（不破坏响应缓存）
+  3. 近似去重          → 归一化后字符三元组 Jaccard ≥ 阈值视为重复（同一情报多次录入 / 反复粘贴）
+  4. 场景预算          → DEFAULT_MODEL_REGISTRY[task]["context_budget"]，随注册表一同可覆盖
+  5. 节省报告          → PackResult 记录原始 / 装填 / 节省 token，并逐请求写日志
+
+用法：
+    items = [ContextItem(log.raw_input, timestamp=log.created_at, label=f"[{log.created_at:%Y-%m-%d}] ")
+             for log in logs]
+    packed = pack(items, AITask.HEAVY_STRATEGY, reserved=count_tokens(header))
+    prompt = header + packed.text
+"""
+
+import logging
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+
+from services.llm_service import DEFAULT_MODEL_REGISTRY, AITask
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger("context_packer")
+
+# ── 参数（可通过环境变量覆盖）──
+_DEFAULT_ENCODING = os.environ.get("SRI_TOKEN_ENCODING", "cl100k_base")
+_HALF_LIFE_DAYS = float(os.environ.get("SRI_CONTEXT_HALF_LIFE_DAYS", "14"))
+_RELEVANCE_WEIGHT = float(os.environ.get("SRI_CONTEXT_RELEVANCE_WEIGHT", "0.6"))
+_DEDUP_THRESHOLD = float(os.environ.get("SRI_CONTEXT_DEDUP_THRESHOLD", "0.85"))
+MAX_LOG_CANDIDATES = int(os.environ.get("SRI_CONTEXT_MAX_LOGS", "200"))   # 调用方最多取最近 N 条情报参与装箱
+_DEFAULT_BUDGET = 3000
+_MIN_TAIL = 48          # 剩余预算不少于此数时，放不下的条目截断后装入
+_ELLIPSIS = "…"
+
+
+# ═══════════════════════════════════════════
+# 1. Token 计数
+# ═══════════════════════════════════════════
+
+_tiktoken_ok = tiktoken is not None
+
+
+@lru_cache(maxsize=32)
+def _encoding(model: str | None):
+    """
+    模型对应的 tiktoken 编码；不可用时返回 None。
+    编码文件下载失败（离线部署）后整个进程改用估算，不再逐模型重试。
+    """
+    global _tiktoken_ok
+    if not _tiktoken_ok:
+        return None
+    try:
+        if model:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                pass
+        return tiktoken.get_encoding(_DEFAULT_ENCODING)
+    except Exception as e:
+        _tiktoken_ok = False
+        logger.warning("tiktoken 编码不可用，改用字符估算: %s", e)
+        return None
+
+
+_CJK = re.compile("[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+_WORD = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+def _estimate(text: str) -> int:
+    """无 tokenizer 时的估算：汉字 / 全角符号各 1，英文约 4 字符 1 个，数字约 3 位 1 个，其余符号各 1。"""
+    n = len(_CJK.findall(text))
+    for run in _WORD.findall(text):
+        if run.isalpha():
+            n += math.ceil(len(run) / 4)
+        elif run.isdigit():
+            n += math.ceil(len(run) / 3)
+        else:
+            n += 1
+    return n
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    """按模型计数 token（model 为空时用默认编码）。"""
+    if not text:
+        return 0
+    enc = _encoding(model)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return _estimate(text)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str | None = None) -> str:
+    """截断到不超过 max_tokens（含末尾省略号）。"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    enc = _encoding(model)
+    if enc is not None:
+        ids = enc.encode(text, disallowed_special=())[:max(0, max_tokens - 1)]
+        return enc.decode(ids).rstrip("�") + _ELLIPSIS
+    # 估算模式：按字符二分
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if _estimate(text[:mid]) + 1 <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo] + _ELLIPSIS
+
+
+# ═══════════════════════════════════════════
+# 2. 场景预算
+# ═══════════════════════════════════════════
+
+def context_budget(task: AITask, registry: dict | None = None) -> int:
+    """该场景允许装填的上下文 token 上限。"""
+    registry = registry or DEFAULT_MODEL_REGISTRY
+    config = registry.get(task, registry[AITask.GENERAL_CHAT])
+    return int(config.get("context_budget", _DEFAULT_BUDGET))
+
+
+def task_model(task: AITask, registry: dict | None = None) -> str | None:
+    """计数用模型：该场景注册的 OpenAI 模型（回退链首选，编码最具代表性）。"""
+    registry = registry or DEFAULT_MODEL_REGISTRY
+    return registry.get(task, registry[AITask.GENERAL_CHAT]).get("openai")
+
+
+# ═══════════════════════════════════════════
+# 3. 装箱
+# ═══════════════════════════════════════════
+
+@dataclass
+class ContextItem:
+    """一条候选上下文（一条情报 / 一个文档碎片）。"""
+    text: str
+    timestamp: datetime | None = None
+    relevance: float | None = None     # 0~1，检索相似度；None 时按 query 计算
+    label: str = ""                    # 条目前缀，如 "[2025-03-01] " / "[文档1] 温升报告.pdf\n"
+
+
+@dataclass
+class PackResult:
+    text: str
+    items: list[ContextItem] = field(default_factory=list)   # 入选条目（保持输入顺序）
+    budget: int = 0
+    tokens_used: int = 0
+    tokens_raw: int = 0          # 不做取舍、全部条目原样拼接时的 token 数
+    deduped: int = 0
+    dropped: int = 0
+    truncated: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_raw - self.tokens_used)
+
+    def stats(self) -> dict:
+        return {
+            "budget": self.budget, "tokens_used": self.tokens_used, "tokens_raw": self.tokens_raw,
+            "tokens_saved": self.tokens_saved, "items": len(self.items),
+            "deduped": self.deduped, "dropped": self.dropped, "truncated": self.truncated,
+        }
+
+
+_NORMALIZE = re.compile(r"[\W_]+")
+
+
+def _shingles(text: str) -> frozenset:
+    norm = _NORMALIZE.sub("", text.lower())
+    if len(norm) < 3:
+        return frozenset([norm])
+    return frozenset(norm[i:i + 3] for i in range(len(norm) - 2))
+
+
+def _near_duplicate(a: frozenset, b: frozenset) -> bool:
+    small, large = sorted((len(a), len(b)))
+    if not large or small / large < _DEDUP_THRESHOLD:      # 长度差太大不可能达到阈值
+        return False
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter) >= _DEDUP_THRESHOLD
+
+
+def _bigrams(text: str) -> set[str]:
+    norm = _NORMALIZE.sub("", text.lower())
+    return {norm[i:i + 2] for i in range(len(norm) - 1)}
+
+
+def _rank(items: list[ContextItem], query: str) -> list[int]:
+    """按 相关度 × 时效 的加权分排序，返回下标（分数相同保持输入顺序）。"""
+    n = len(items)
+    stamps = [it.timestamp for it in items if it.timestamp is not None]
+    newest = max(stamps) if stamps else None
+    q_grams = _bigrams(query) if query else set()
+    has_relevance = bool(q_grams) or any(it.relevance is not None for it in items)
+    weight = _RELEVANCE_WEIGHT if has_relevance else 0.0
+
+    scores = []
+    for i, it in enumerate(items):
+        if it.timestamp is not None and newest is not None:
+            age_days = max(0.0, (newest - it.timestamp).total_seconds() / 86400)
+            recency = 0.5 ** (age_days / _HALF_LIFE_DAYS)
+        else:
+            recency = 1.0 - i / n            # 无时间戳：调用方按新→旧传入
+        if it.relevance is not None:
+            relevance = max(0.0, min(1.0, it.relevance))
+        elif q_grams:
+            relevance = len(q_grams & _bigrams(it.text)) / len(q_grams)
+        else:
+            relevance = 0.0
+        scores.append(weight * relevance + (1 - weight) * recency)
+    return sorted(range(n), key=lambda i: -scores[i])
+
+
+def pack(
+    items: list[ContextItem],
+    task: AITask = AITask.GENERAL_CHAT,
+    *,
+    budget: int | None = None,
+    reserved: int = 0,
+    query: str = "",
+    model: str | None = None,
+    separator: str = "\n",
+    item_cap: int | None = None,
+    registry: dict | None = None,
+) -> PackResult:
+    """
+    在 token 预算内装填上下文。
+
+    Args:
+        items:     候选条目；无时间戳时视输入顺序为新→旧
+        task:      AI 场景，决定默认预算与计数模型
+        budget:    覆盖场景预算
+        reserved:  预算中已被固定内容（项目概况 / 指令）占用的 token
+        query:     用户问题，条目未带 relevance 时据此估算相关度
+        item_cap:  单条上限（默认预算的 1/4），防止一条长文独占预算
+    Returns:
+        PackResult — text 为入选条目按输入顺序以 separator 拼接的结果
+    """
+    model = model or task_model(task, registry)
+    total_budget = budget if budget is not None else context_budget(task, registry)
+    available = max(0, total_budget - reserved)
+    cap = item_cap or max(_MIN_TAIL, available // 4)
+    sep_tokens = count_tokens(separator, model)
+
+    costs = [count_tokens(it.label + it.text, model) for it in items]
+    result = PackResult(text="", budget=available,
+                        tokens_raw=sum(costs) + sep_tokens * max(0, len(items) - 1))
+
+    chosen: dict[int, ContextItem] = {}
+    kept_shingles: list[frozenset] = []
+    remaining = available
+    for i in _rank(items, query):
+        it = items[i]
+        if not it.text.strip():
+            continue
+        sh = _shingles(it.text)
+        if any(_near_duplicate(sh, k) for k in kept_shingles):
+            result.deduped += 1
+            continue
+        cost = costs[i] + (sep_tokens if chosen else 0)
+        if cost <= min(remaining, cap + sep_tokens):
+            chosen[i] = it
+        elif min(remaining, cap) >= _MIN_TAIL:
+            label_cost = count_tokens(it.label, model) + (sep_tokens if chosen else 0)
+            text = truncate_to_tokens(it.text, min(remaining, cap) - label_cost, model)
+            it = ContextItem(text, it.timestamp, it.relevance, it.label)
+            cost = label_cost + count_tokens(text, model)
+            chosen[i] = it
+            result.truncated += 1
+        else:
+            result.dropped += 1
+            continue
+        kept_shingles.append(sh)
+        remaining -= cost
+
+    result.items = [chosen[i] for i in sorted(chosen)]
+    result.text = separator.join(it.label + it.text for it in result.items)
+    result.tokens_used = count_tokens(result.text, model)
+    logger.info(
+        "context pack [%s] %d/%d tokens, saved %d (raw %d) | items %d/%d, dedup %d, dropped %d, truncated %d",
+        task.value, result.tokens_used, available, result.tokens_saved, result.tokens_raw,
+        len(result.items), len(items), result.deduped, result.dropped, result.truncated,
+    )
+    return result
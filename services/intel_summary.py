@@ -0,0 +1,425 @@
+"""
+项目情报分层滚动摘要 — services/intel_summary.py
+==================================================
+把项目不断增长的情报历史压缩为有界的分层摘要，AI 端点改用「全周期摘要 + 最近 N 条原文」：
+  1. 4+1 状态折叠  → 每条情报的结构化解析（现状 / 决策链 / 竞品 / 下一步 / 缺口预警）折叠进摘要状态：
+                     现状与下一步取最新，决策链与竞品按名称合并（同名以新为准），缺口预警取最新一条，
+                     另保留最近几条原文要点；各字段条数 / 字数封顶，摘要大小与情报条数无关。
+                     纯规则合并、不调用 LLM —— 后台线程拿不到前端下发的 Key 也能运行
+  2. 分层          → week（ISO 周）/ month / project 三级，每条情报同时折叠进所属的三级
+  3. 增量          → 每级记录水位 last_log_id，只处理水位之后的新情报；情报被修改 / 删除时整项目重建
+  4. 后台刷新      → Session 提交含 IntelLog 变更时把项目排入后台线程（按项目去重），写请求不等待
+  5. 读取          → 调用方取全周期摘要 + 水位之后尚未折叠的情报 + 最近 N 条原文，Prompt 大小有界
+
+旧版 sri_intel.db 复用 1~2 的折叠 / 渲染逻辑，由 database.py 在写入 visit_logs 的同一事务内增量更新。
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger("intel_summary")
+
+# ── 参数（可通过环境变量覆盖）──
+RAW_LOGS = int(os.environ.get("SRI_SUMMARY_RAW_LOGS", "5"))           # 摘要之外附带的最近原文条数
+_FIELD_CHARS = int(os.environ.get("SRI_SUMMARY_FIELD_CHARS", "160"))  # 单个文本字段截断长度
+_MAX_STATUS = 3
+_MAX_PEOPLE = 20
+_MAX_COMPETITORS = 10
+_MAX_GAPS = 6
+_MAX_NOTES = 5
+_NOTE_CHARS = 100
+
+LEVELS = ("week", "month", "project")
+PROJECT_KEY = "all"
+
+# LLM 解析失败 / 无内容时的占位文案，不计入摘要
+_PLACEHOLDERS = {"未提供项目现状、预算与进度信息", "未提供下一步行动计划"}
+
+
+# ═══════════════════════════════════════════
+# 1. 折叠 & 渲染（与存储无关，新旧两套库共用）
+# ═══════════════════════════════════════════
+
+def _clip(text, limit: int = _FIELD_CHARS) -> str:
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def to_datetime(value) -> datetime | None:
+    """ORM 的 datetime 与 sqlite3 返回的时间字符串统一为 datetime。"""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def stamp(ts: datetime | None) -> str:
+    """状态内的时间统一存为可直接比较大小的字符串；无时间的情报视为最旧。"""
+    return ts.strftime("%Y-%m-%d %H:%M:%S") if ts else ""
+
+
+def period_keys(created_at) -> list[tuple[str, str, datetime | None]]:
+    """一条情报所属的 (级别, 周期键, 周期起点)：ISO 周 / 自然月 / 全周期。"""
+    ts = to_datetime(created_at)
+    keys = []
+    if ts is not None:
+        day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+        iso = ts.isocalendar()
+        keys.append(("week", f"{iso.year}-W{iso.week:02d}", day - timedelta(days=ts.weekday())))
+        keys.append(("month", f"{ts:%Y-%m}", day.replace(day=1)))
+    keys.append(("project", PROJECT_KEY, None))
+    return keys
+
+
+def parse_intel(parsed) -> dict:
+    """ai_parsed_json / ai_parsed_data → dict（解析失败或非对象返回空 dict）。"""
+    if isinstance(parsed, dict):
+        return parsed
+    try:
+        value = json.loads(parsed) if parsed else {}
+    except (TypeError, ValueError):
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+def empty_state() -> dict:
+    return {
+        "log_count": 0, "last_log_id": 0, "first_at": "", "last_at": "",
+        "status": [], "next_steps": None, "people": {}, "competitors": {},
+        "gaps": None, "notes": [],
+    }
+
+
+def _keep_latest(items: dict, limit: int) -> dict:
+    if len(items) <= limit:
+        return items
+    ranked = sorted(items.items(), key=lambda kv: kv[1]["at"], reverse=True)[:limit]
+    return dict(ranked)
+
+
+def _text(value) -> str | None:
+    if isinstance(value, str) and value.strip() and value.strip() not in _PLACEHOLDERS:
+        return _clip(value)
+    return None
+
+
+def fold(state: dict, log_id: int, raw_input, parsed, created_at) -> dict:
+    """把一条情报折叠进摘要状态（原地修改并返回）；情报可以乱序到达，按 created_at 判断新旧。"""
+    at = stamp(to_datetime(created_at))
+    intel = parse_intel(parsed)
+
+    status = _text(intel.get("current_status"))
+    if status:
+        history = [[at, status]] + [s for s in state["status"] if s[1] != status]   # 同一时刻后到者在前
+        state["status"] = sorted(history, key=lambda s: s[0], reverse=True)[:_MAX_STATUS]
+
+    next_steps = _text(intel.get("next_steps"))
+    if next_steps and (state["next_steps"] is None or at >= state["next_steps"][0]):
+        state["next_steps"] = [at, next_steps]
+
+    # 兼容旧格式 stakeholders 和新格式 decision_chain；不保留电话等联系方式
+    for person in intel.get("decision_chain", intel.get("stakeholders")) or []:
+        if not isinstance(person, dict) or not str(person.get("name") or "").strip():
+            continue
+        name = _clip(person["name"], 20)
+        known = state["people"].get(name)
+        if known and known["at"] > at:
+            continue
+        tags = person.get("soft_tags") or []
+        state["people"][name] = {
+            "title": _clip(person.get("title", person.get("role", "")), 30),
+            "attitude": _clip(person.get("attitude", ""), 10),
+            "tags": [_clip(t, 12) for t in tags[:5]] if isinstance(tags, list) else [],
+            "at": at,
+        }
+    state["people"] = _keep_latest(state["people"], _MAX_PEOPLE)
+
+    for comp in intel.get("competitor_info") or []:
+        if not isinstance(comp, dict) or not str(comp.get("name") or "").strip():
+            continue
+        name = _clip(comp["name"], 30)
+        known = state["competitors"].get(name, {"at": ""})
+        newer = at >= known["at"]
+        merged = {"at": max(at, known["at"])}
+        for field in ("quote", "strengths", "weaknesses", "recent_actions"):
+            value = _clip(comp.get(field) or "", 60)
+            # 同名竞品：较新情报的非空字段覆盖旧值
+            merged[field] = (value or known.get(field, "")) if newer else (known.get(field) or value)
+        state["competitors"][name] = merged
+    state["competitors"] = _keep_latest(state["competitors"], _MAX_COMPETITORS)
+
+    gaps = intel.get("gap_alerts")
+    if isinstance(gaps, list) and (state["gaps"] is None or at >= state["gaps"][0]):
+        state["gaps"] = [at, [_clip(g, 40) for g in gaps if isinstance(g, str) and g.strip()][:_MAX_GAPS]]
+
+    note = _clip(raw_input, _NOTE_CHARS)
+    if note and not note.startswith("[立项背景基座更新]"):
+        notes = [[at, note]] + [n for n in state["notes"] if n[1] != note]
+        state["notes"] = sorted(notes, key=lambda n: n[0], reverse=True)[:_MAX_NOTES]
+
+    state["log_count"] += 1
+    state["last_log_id"] = max(state["last_log_id"], log_id)
+    if at and (not state["first_at"] or at < state["first_at"]):
+        state["first_at"] = at
+    state["last_at"] = max(state["last_at"], at)
+    return state
+
+
+def _title(level: str, period_key: str) -> str:
+    if level == "week":
+        return f"{period_key} 周摘要"
+    if level == "month":
+        return f"{period_key} 月摘要"
+    return "全周期情报摘要"
+
+
+def render(state: dict, level: str = "project", period_key: str = PROJECT_KEY) -> str:
+    """摘要状态 → Prompt 用文本（各字段封顶，长度有界）。"""
+    span = f"{state['first_at'][:10]} ~ {state['last_at'][:10]}" if state["first_at"] else "时间未知"
+    lines = [f"【{_title(level, period_key)}】{span}，共 {state['log_count']} 条情报"]
+    if state["status"]:
+        lines.append(f"现状：{state['status'][0][1]}（{state['status'][0][0][:10]}）")
+        for at, text in state["status"][1:]:
+            lines.append(f"  此前（{at[:10]}）：{text}")
+    if state["next_steps"]:
+        lines.append(f"下一步：{state['next_steps'][1]}（{state['next_steps'][0][:10]}）")
+    if state["people"]:
+        people = []
+        for name, p in sorted(state["people"].items(), key=lambda kv: kv[1]["at"], reverse=True):
+            detail = "｜".join(filter(None, [p["title"], p["attitude"], "、".join(p["tags"])]))
+            people.append(f"{name}（{detail}）" if detail else name)
+        lines.append("决策链：" + "；".join(people))
+    if state["competitors"]:
+        comps = []
+        for name, c in sorted(state["competitors"].items(), key=lambda kv: kv[1]["at"], reverse=True):
+            detail = "；".join(
+                f"{label}{c[field]}" for field, label in
+                (("quote", "报价 "), ("strengths", "优势 "), ("weaknesses", "劣势 "), ("recent_actions", "动向 "))
+                if c.get(field)
+            )
+            comps.append(f"{name}（{detail}）" if detail else name)
+        lines.append("竞品：" + "；".join(comps))
+    if state["gaps"] and state["gaps"][1]:
+        lines.append("缺口预警：" + "；".join(state["gaps"][1]))
+    if state["notes"]:
+        lines.append("近期要点：")
+        lines.extend(f"  [{at[:10]}] {text}" for at, text in state["notes"])
+    return "\n".join(lines)
+
+
+def fold_logs(states: dict, logs) -> set:
+    """
+    把一批情报 [(log_id, raw_input, parsed, created_at)] 折叠进
+    states {(level, period_key): {"state", "period_start"}}，返回被改动的键。
+    """
+    touched = set()
+    for log_id, raw_input, parsed, created_at in logs:
+        for level, key, start in period_keys(created_at):
+            entry = states.setdefault((level, key), {"state": empty_state(), "period_start": start})
+            fold(entry["state"], log_id, raw_input, parsed, created_at)
+            touched.add((level, key))
+    return touched
+
+
+# ═══════════════════════════════════════════
+# 2. SaaS 持久化 (intel_summaries)
+# ═══════════════════════════════════════════
+
+def refresh_project(conn: Connection, project_id: int, rebuild: bool = False) -> int:
+    """
+    把水位之后的新情报折叠进该项目的三级摘要，返回处理的情报条数；在调用方事务内执行。
+    rebuild=True 时删除已有摘要后全量重建（情报被修改 / 删除后使用）。
+    """
+    from models import IntelLog, IntelSummary
+
+    if rebuild:
+        conn.execute(delete(IntelSummary).where(IntelSummary.project_id == project_id))
+
+    states, row_ids = {}, {}
+    for row_id, level, key, start, state_json in conn.execute(
+        select(IntelSummary.id, IntelSummary.level, IntelSummary.period_key,
+               IntelSummary.period_start, IntelSummary.state_json)
+        .where(IntelSummary.project_id == project_id)
+    ):
+        states[(level, key)] = {"state": json.loads(state_json), "period_start": start}
+        row_ids[(level, key)] = row_id
+    project_state = states.get(("project", PROJECT_KEY))
+    watermark = project_state["state"]["last_log_id"] if project_state else 0
+
+    logs = conn.execute(
+        select(IntelLog.id, IntelLog.raw_input, IntelLog.ai_parsed_json, IntelLog.created_at)
+        .where(IntelLog.project_id == project_id, IntelLog.id > watermark)
+        .order_by(IntelLog.id)
+    ).all()
+    if not logs:
+        return 0
+
+    now = datetime.utcnow()
+    for level, key in fold_logs(states, logs):
+        entry = states[(level, key)]
+        values = {
+            "log_count": entry["state"]["log_count"],
+            "last_log_id": entry["state"]["last_log_id"],
+            "state_json": json.dumps(entry["state"], ensure_ascii=False),
+            "summary_text": render(entry["state"], level, key),
+            "updated_at": now,
+        }
+        if (level, key) in row_ids:
+            conn.execute(update(IntelSummary).where(IntelSummary.id == row_ids[(level, key)]).values(**values))
+        else:
+            conn.execute(insert(IntelSummary).values(
+                project_id=project_id, level=level, period_key=key,
+                period_start=entry["period_start"], **values,
+            ))
+    return len(logs)
+
+
+def stale_projects(conn: Connection) -> list[int]:
+    """存在水位之后新情报（或尚无摘要）的项目 ID。"""
+    from models import IntelLog, IntelSummary
+
+    watermark = (
+        select(IntelSummary.last_log_id)
+        .where(IntelSummary.project_id == IntelLog.project_id,
+               IntelSummary.level == "project", IntelSummary.period_key == PROJECT_KEY)
+        .scalar_subquery()
+    )
+    return list(conn.execute(
+        select(IntelLog.project_id)
+        .group_by(IntelLog.project_id)
+        .having(func.max(IntelLog.id) > func.coalesce(watermark, 0))
+    ).scalars())
+
+
+# ═══════════════════════════════════════════
+# 3. 后台刷新线程
+# ═══════════════════════════════════════════
+
+class SummaryWorker:
+    """
+    单个后台线程，按项目去重排队、逐个刷新（每个项目一个独立事务）。
+    同一项目连续写入多条情报只会刷新一次；刷新失败记日志，等下次写入或启动补扫重试。
+    """
+
+    def __init__(self, engine: Engine):
+        self._engine = engine
+        self._pending: dict[int, bool] = {}       # project_id → 是否整项目重建
+        self._scan = False
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def schedule(self, project_id: int, rebuild: bool = False):
+        with self._cond:
+            self._pending[project_id] = self._pending.get(project_id, False) or rebuild
+            self._start()
+            self._cond.notify()
+
+    def schedule_stale(self):
+        """启动补扫：在后台线程里找出摘要落后的项目（批量导入 / 旧数据）并排队。"""
+        with self._cond:
+            self._scan = True
+            self._start()
+            self._cond.notify()
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """等待队列清空（CLI / 压测用），超时返回 False。"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._pending and not self._scan and not self._busy, timeout,
+            )
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="intel-summary", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._scan)
+                scan, self._scan = self._scan, False
+                if not scan:
+                    project_id = next(iter(self._pending))
+                    rebuild = self._pending.pop(project_id)
+                self._busy = True
+            try:
+                if scan:
+                    with self._engine.connect() as conn:
+                        for pid in stale_projects(conn):
+                            self.schedule(pid)
+                else:
+                    with self._engine.begin() as conn:
+                        n = refresh_project(conn, project_id, rebuild)
+                    if n:
+                        logger.debug("intel summary: project %s +%d logs", project_id, n)
+            except Exception:
+                logger.exception("intel summary refresh failed")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+
+_worker: SummaryWorker | None = None
+_worker_lock = threading.Lock()
+
+
+def get_summary_worker() -> SummaryWorker:
+    """获取绑定默认同步引擎的后台刷新线程单例。"""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                from db import engine
+                _worker = SummaryWorker(engine)
+    return _worker
+
+
+_hooks_installed = False
+
+
+def install_summary_hooks():
+    """
+    注册 SQLAlchemy Session 事件：flush 时收集新增 / 改动 / 删除的 IntelLog，
+    commit 成功后把对应项目排入后台刷新（新增 → 增量，改动 / 删除 → 重建）；rollback 丢弃。幂等。
+    """
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    from models import IntelLog
+
+    def _after_flush(session, flush_context):
+        pending = session.info.setdefault("intel_summary_projects", {})
+        for obj in session.new:
+            if isinstance(obj, IntelLog) and obj.project_id:
+                pending.setdefault(obj.project_id, False)
+        for obj in (*session.dirty, *session.deleted):
+            if isinstance(obj, IntelLog) and obj.project_id:
+                pending[obj.project_id] = True
+
+    def _after_commit(session):
+        pending = session.info.pop("intel_summary_projects", None)
+        if pending:
+            worker = get_summary_worker()
+            for project_id, rebuild in pending.items():
+                worker.schedule(project_id, rebuild)
+
+    def _after_rollback(session):
+        session.info.pop("intel_summary_projects", None)
+
+    event.listen(Session, "after_flush", _after_flush)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+    _hooks_installed = True
@@ -6,21 +6,29 @@ LLMOps 级别的"模型路由网关 (AI Gateway)"：
   2. ModelRegistry 动态注册表    → 可通过前端/DB 配置覆盖
   3. 5 级回退防线               → 精准异常捕获与无缝降级
   4. AuditLog 审计日志          → 记录每次调用的模型/耗时/结果
+  5. achat 异步通道             → 原生 Async SDK + 竞速模式 + Provider 级并发限流
+  6. 响应缓存                   → 精确/近似命中 + 场景级 TTL (services/ai_cache.py)
+  7. stream 流式通道            → 首 token 前可回退，审计记录首 token 延迟
 
 注意：保留原版 llm_service.py 为旧版兼容层，本文件为新架构。
 """
 
+import asyncio
 import enum
 import json
 import logging
+import os
 import sys
 import time
+import weakref
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Optional
 
 import openai
-from openai import OpenAI
+
+from llm_clients import get_client_registry
+from services.ai_cache import AIResponseCache, get_response_cache
 
 logger = logging.getLogger("llm_gateway")
 logger.setLevel(logging.DEBUG)
@@ -84,6 +92,7 @@ class LLMProvider:
     api_key: str        # 动态传入
     timeout: int = 30   # 超时秒数
     supports_vision: bool = False  # 是否支持多模态
+    max_concurrency: int = 0       # 异步通道并发上限 (0 = 全局默认)
 
 
 @dataclass
@@ -96,6 +105,8 @@ class AuditEntry:
     latency_ms: int
     error: Optional[str] = None
     timestamp: str = ""
+    cached: bool = False
+    first_token_ms: Optional[int] = None    # 仅流式调用记录
 
     def __post_init__(self):
         if not self.timestamp:
@@ -106,7 +117,9 @@ class AuditEntry:
 # 3. 动态模型注册表 (ModelRegistry)
 # ═══════════════════════════════════════════
 
-# 默认的 场景 → (首选模型版本, 回退模型版本, 温度, max_tokens) 映射
+# 默认的 场景 → (首选模型版本, 回退模型版本, 温度, max_tokens, 缓存秒数, 上下文预算) 映射
+# cache_ttl = 0 表示该场景不缓存（出题需每次不同、SOS 需实时）
+# context_budget = 装填项目情报 / 检索文档的 token 上限 (services/context_packer.py)
 DEFAULT_MODEL_REGISTRY: dict[AITask, dict] = {
     AITask.FAST_EXTRACT: {
         "openai": "gpt-4o-mini",
@@ -116,6 +129,8 @@ DEFAULT_MODEL_REGISTRY: dict[AITask, dict] = {
         "local": "deepseek-r1",
         "temperature": 0.1,
         "max_tokens": 4096,
+        "cache_ttl": 3600,
+        "context_budget": 3000,
     },
     AITask.HEAVY_STRATEGY: {
         "openai": "gpt-4o",
@@ -125,6 +140,8 @@ DEFAULT_MODEL_REGISTRY: dict[AITask, dict] = {
         "local": "deepseek-r1",
         "temperature": 0.6,
         "max_tokens": 8192,
+        "cache_ttl": 1800,
+        "context_budget": 6000,
     },
     AITask.VISION_PARSE: {
         "openai": "gpt-4o",
@@ -134,6 +151,8 @@ DEFAULT_MODEL_REGISTRY: dict[AITask, dict] = {
         "local": "deepseek-r1",
         "temperature": 0.2,
         "max_tokens": 4096,
+        "cache_ttl": 86400,
+        "context_budget": 2000,
     },
     AITask.CODE_GEN: {
         "openai": "gpt-4o",
@@ -143,6 +162,8 @@ DEFAULT_MODEL_REGISTRY: dict[AITask, dict] = {
         "local": "deepseek-r1",
         "temperature": 0.3,
         "max_tokens": 4096,
+        "cache_ttl": 3600,
+        "context_budget": 3000,
     },
     AITask.QUIZ_CRITIQUE: {
         "openai": "gpt-4o-mini",
@@ -152,6 +173,8 @@ DEFAULT_MODEL_REGISTRY: dict[AITask, dict] = {
         "local": "deepseek-r1",
         "temperature": 0.5,
         "max_tokens": 4096,
+        "cache_ttl": 0,
+        "context_budget": 2500,
     },
     AITask.SOS_BRIEF: {
         "openai": "gpt-4o-mini",
@@ -161,6 +184,8 @@ DEFAULT_MODEL_REGISTRY: dict[AITask, dict] = {
         "local": "deepseek-r1",
         "temperature": 0.7,
         "max_tokens": 2048,
+        "cache_ttl": 0,
+        "context_budget": 1200,
     },
     AITask.GENERAL_CHAT: {
         "openai": "gpt-4o",
@@ -170,6 +195,8 @@ DEFAULT_MODEL_REGISTRY: dict[AITask, dict] = {
         "local": "deepseek-r1",
         "temperature": 0.6,
         "max_tokens": 4096,
+        "cache_ttl": 600,
+        "context_budget": 4000,
     },
 }
 
@@ -184,7 +211,36 @@ _PROVIDER_KEY_MAP = {
 
 
 # ═══════════════════════════════════════════
-# 4. 企业级全局路由器
+# 4. Provider 级并发限流 (异步通道)
+# ═══════════════════════════════════════════
+
+# 单个 Provider 同时在途的请求上限，超出者排队等待，避免打爆上游 429
+_DEFAULT_MAX_CONCURRENCY = int(os.environ.get("SRI_LLM_MAX_CONCURRENCY", "8"))
+
+# 信号量按事件循环隔离（asyncio 原语不能跨 loop 复用），
+# 同一 loop 内按 (provider, base_url) 全进程共享 —— 网关实例按请求构建，限流必须跨实例生效
+_provider_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _provider_semaphore(provider: LLMProvider) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    per_loop = _provider_semaphores.setdefault(loop, {})
+    key = (provider.name, provider.base_url)
+    sem = per_loop.get(key)
+    if sem is None:
+        sem = asyncio.Semaphore(provider.max_concurrency or _DEFAULT_MAX_CONCURRENCY)
+        per_loop[key] = sem
+    return sem
+
+
+class _ProviderFailed(Exception):
+    """单个 Provider 调用失败（已记录审计日志），携带面向用户的错误摘要。"""
+
+
+# ═══════════════════════════════════════════
+# 5. 企业级全局路由器
 # ═══════════════════════════════════════════
 
 class AIGateway:
@@ -196,15 +252,20 @@ class AIGateway:
     2. 5 级回退防线    — OpenAI → Gemini → Anthropic → xAI → Local
     3. 动态配置覆盖    — 前端/DB 传入 model_overrides 可覆盖默认选择
     4. 审计日志        — 每次调用记录 provider/model/延迟/成败
+    5. 异步通道        — achat() 不占线程，可选 top-N 竞速
+    6. 响应缓存        — 相同场景/模型链/温度/消息直接复用，数据变更自动失效
+    7. 流式输出        — stream() 逐 token 产出，首 token 到达前保持回退语义
     """
 
     def __init__(
         self,
         providers: list[LLMProvider],
         model_registry: dict[AITask, dict] | None = None,
+        cache: AIResponseCache | None = None,
     ):
         self.providers = providers
         self.registry = model_registry or DEFAULT_MODEL_REGISTRY.copy()
+        self.cache = cache
         self.audit_log: list[AuditEntry] = []
 
     # ─────────────────────────────────────
@@ -217,6 +278,8 @@ class AIGateway:
         task: AITask = AITask.GENERAL_CHAT,
         temperature: float | None = None,
         model_overrides: dict | None = None,
+        cache_tags: list[str] | None = None,
+        use_cache: bool = True,
         **kwargs,
     ) -> str:
         """
@@ -228,6 +291,8 @@ class AIGateway:
             temperature:     覆盖默认温度 (None = 使用注册表默认)
             model_overrides: 动态覆盖 {"openai": "gpt-4o", "gemini": "..."}
                              前端设置页面或 DB 配置可传入
+            cache_tags:      缓存失效标签，如 ["project:12"]，该项目数据变更后缓存作废
+            use_cache:       False = 跳过缓存强制重新生成（结果仍会写入缓存）
 
         Returns:
             AI 生成的文本内容
@@ -246,15 +311,14 @@ class AIGateway:
         active_providers = [p for p in self.providers if p.api_key]
         total = len(active_providers)
 
-        for idx, provider in enumerate(active_providers, 1):
-            # 根据场景 + 覆盖确定该 provider 使用的模型版本
-            provider_key = _PROVIDER_KEY_MAP.get(provider.name, "openai")
-            model = (
-                overrides.get(provider_key)                      # 优先：动态覆盖
-                or task_config.get(provider_key)                 # 其次：注册表场景配置
-                or provider.model                                # 兜底：provider 默认
-            )
+        # 根据场景 + 覆盖确定每个 provider 使用的模型版本
+        models = [self._resolve_model(p, task_config, overrides) for p in active_providers]
+        signature = self._chain_signature(active_providers, models)
+        cached = self._cache_lookup(task, task_config, signature, temp, messages, use_cache, cache_tags)
+        if cached is not None:
+            return cached
 
+        for idx, (provider, model) in enumerate(zip(active_providers, models), 1):
             start_time = time.monotonic()
 
             try:
@@ -266,58 +330,366 @@ class AIGateway:
 
                 content = self._call_provider(provider, model, messages, temp)
 
-                elapsed_ms = int((time.monotonic() - start_time) * 1000)
-                print(
-                    f"{_GREEN}{_BOLD}✅ {provider.name} ({model}) "
-                    f"命中成功！耗时 {elapsed_ms}ms{_RESET}",
-                    file=sys.stderr,
-                )
-
-                # 审计日志
-                self.audit_log.append(AuditEntry(
-                    task=task.value, provider=provider.name,
-                    model=model, success=True, latency_ms=elapsed_ms,
-                ))
-
+                self._log_success(provider, model, start_time, task)
+                self._cache_store(task, task_config, signature, temp, messages,
+                                  content, provider, model, cache_tags)
                 return content
 
-            except openai.AuthenticationError as e:
-                msg = f"[{provider.name}] 🔑 AuthError (401): Key 无效"
+            except Exception as e:
+                error_type, msg = self._classify_error(provider, e)
                 errors.append(msg)
-                self._log_fallback(provider, model, "AuthError", e, start_time, task)
+                self._log_fallback(provider, model, error_type, e, start_time, task)
                 continue
 
-            except openai.RateLimitError as e:
-                msg = f"[{provider.name}] 🚦 RateLimit (429): 触发限流"
-                errors.append(msg)
-                self._log_fallback(provider, model, "RateLimit", e, start_time, task)
-                continue
+        # 全部失败
+        self._raise_exhausted(errors, task)
 
-            except openai.APITimeoutError as e:
-                msg = f"[{provider.name}] ⏱️ Timeout ({provider.timeout}s)"
-                errors.append(msg)
-                self._log_fallback(provider, model, "Timeout", e, start_time, task)
-                continue
+    # ─────────────────────────────────────
+    # 核心：异步调用 (不占用线程池)
+    # ─────────────────────────────────────
 
-            except (openai.APIConnectionError, openai.InternalServerError) as e:
-                msg = f"[{provider.name}] 💥 {type(e).__name__}: 服务异常"
-                errors.append(msg)
-                self._log_fallback(provider, model, type(e).__name__, e, start_time, task)
-                continue
+    async def achat(
+        self,
+        messages: list[dict],
+        task: AITask = AITask.GENERAL_CHAT,
+        temperature: float | None = None,
+        model_overrides: dict | None = None,
+        race: int = 0,
+        cache_tags: list[str] | None = None,
+        use_cache: bool = True,
+        **kwargs,
+    ) -> str:
+        """
+        chat() 的异步版本 — 原生 AsyncOpenAI / AsyncAnthropic，等待上游期间让出事件循环。
 
-            except openai.BadRequestError as e:
-                msg = f"[{provider.name}] ⚠️ BadRequest (400): {e}"
-                errors.append(msg)
-                self._log_fallback(provider, model, "BadRequest", e, start_time, task)
-                continue
+        Args:
+            messages / task / temperature / model_overrides / cache_tags / use_cache: 同 chat()
+            race: 竞速路数。>= 2 时前 N 个 Provider 并发请求，
+                  取最先返回的有效答案并取消其余请求；
+                  N 路全部失败后，剩余 Provider 继续顺序回退。
+                  0 / 1 = 与 chat() 相同的逐级回退。
+
+        每个 Provider 受并发上限约束 (LLMProvider.max_concurrency /
+        SRI_LLM_MAX_CONCURRENCY)，超出的请求排队等待。
+
+        Raises:
+            RuntimeError: 全部防线失败
+        """
+        task_config = self.registry.get(task, self.registry[AITask.GENERAL_CHAT])
+        temp = temperature if temperature is not None else task_config.get("temperature", 0.6)
+        overrides = model_overrides or {}
 
+        errors: list[str] = []
+        active_providers = [p for p in self.providers if p.api_key]
+        total = len(active_providers)
+        attempts = [
+            (idx, provider, self._resolve_model(provider, task_config, overrides))
+            for idx, provider in enumerate(active_providers, 1)
+        ]
+        signature = self._chain_signature(active_providers, [m for _, _, m in attempts])
+        cached = await self._acache_lookup(task, task_config, signature, temp, messages, use_cache, cache_tags)
+        if cached is not None:
+            return cached
+        winner: tuple[str, LLMProvider, str] | None = None
+
+        # ── 第一波：top-N 竞速 ──
+        if race >= 2 and len(attempts) >= 2:
+            wave, attempts = attempts[:race], attempts[race:]
+            tasks = [
+                asyncio.create_task(
+                    self._aattempt(provider, model, messages, temp, task, idx, total)
+                )
+                for idx, provider, model in wave
+            ]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    try:
+                        winner = await next_done
+                        break
+                    except _ProviderFailed as e:
+                        errors.append(str(e))
+            finally:
+                # 胜者已产生（或全部失败）→ 取消仍在途的落败请求，释放连接与并发槽位
+                for t in tasks:
+                    if not t.done():
+                        t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        # ── 剩余防线：逐级回退 ──
+        for idx, provider, model in ([] if winner else attempts):
+            try:
+                winner = await self._aattempt(provider, model, messages, temp, task, idx, total)
+                break
+            except _ProviderFailed as e:
+                errors.append(str(e))
+
+        if winner is None:
+            self._raise_exhausted(errors, task)
+        content, provider, model = winner
+        await self._acache_store(task, task_config, signature, temp, messages,
+                                 content, provider, model, cache_tags)
+        return content
+
+    # ─────────────────────────────────────
+    # 核心：流式调用 (SSE)
+    # ─────────────────────────────────────
+
+    async def stream(
+        self,
+        messages: list[dict],
+        task: AITask = AITask.GENERAL_CHAT,
+        temperature: float | None = None,
+        model_overrides: dict | None = None,
+        cache_tags: list[str] | None = None,
+        use_cache: bool = True,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """
+        流式调用入口 — 逐段 yield 文本增量。
+
+        回退语义：首 token 到达之前的任何失败（鉴权/限流/超时/空流）都切换下一防线；
+        首 token 之后已向用户输出内容，中途失败记审计后直接抛出，不再回退。
+        缓存命中时一次性 yield 完整文本。
+
+        Raises:
+            RuntimeError: 首 token 前全部防线失败
+        """
+        task_config = self.registry.get(task, self.registry[AITask.GENERAL_CHAT])
+        temp = temperature if temperature is not None else task_config.get("temperature", 0.6)
+        overrides = model_overrides or {}
+
+        errors: list[str] = []
+        active_providers = [p for p in self.providers if p.api_key]
+        total = len(active_providers)
+        models = [self._resolve_model(p, task_config, overrides) for p in active_providers]
+        signature = self._chain_signature(active_providers, models)
+        cached = await self._acache_lookup(task, task_config, signature, temp, messages, use_cache, cache_tags)
+        if cached is not None:
+            yield cached
+            return
+
+        for idx, (provider, model) in enumerate(zip(active_providers, models), 1):
+            sem = _provider_semaphore(provider)
+            await sem.acquire()
+            start_time = time.monotonic()
+            print(
+                f"{_CYAN}{_BOLD}🔗 [{idx}/{total}] "
+                f"[{task.value}] 流式尝试 {provider.name} ({model})...{_RESET}",
+                file=sys.stderr,
+            )
+            pieces = self._astream_provider(provider, model, messages, temp)
+
+            # ── 首 token 之前：失败即回退 ──
+            try:
+                first = await anext(pieces)
             except Exception as e:
-                msg = f"[{provider.name}] ❓ {type(e).__name__}: {e}"
+                await pieces.aclose()
+                sem.release()
+                if isinstance(e, StopAsyncIteration):
+                    e = ValueError("模型返回空流")
+                error_type, msg = self._classify_error(provider, e)
                 errors.append(msg)
-                self._log_fallback(provider, model, type(e).__name__, e, start_time, task)
+                self._log_fallback(provider, model, error_type, e, start_time, task)
                 continue
+            except BaseException:
+                await pieces.aclose()
+                sem.release()
+                raise
 
-        # 全部失败
+            first_token_ms = int((time.monotonic() - start_time) * 1000)
+            parts = [first]
+
+            # ── 首 token 之后：透传，中途失败不再回退 ──
+            try:
+                yield first
+                async for piece in pieces:
+                    parts.append(piece)
+                    yield piece
+            except Exception as e:
+                error_type, _ = self._classify_error(provider, e)
+                self._log_fallback(provider, model, f"MidStream{error_type}", e, start_time, task)
+                self.audit_log[-1].first_token_ms = first_token_ms
+                raise
+            finally:
+                await pieces.aclose()
+                sem.release()
+
+            self._log_success(provider, model, start_time, task, first_token_ms=first_token_ms)
+            await self._acache_store(task, task_config, signature, temp, messages,
+                                     "".join(parts), provider, model, cache_tags)
+            return
+
+        self._raise_exhausted(errors, task)
+
+    async def _astream_provider(
+        self,
+        provider: LLMProvider,
+        model: str,
+        messages: list[dict],
+        temperature: float,
+    ) -> AsyncIterator[str]:
+        """Provider 原生流式接口 → 非空文本增量。退出时关闭上游流，释放连接。"""
+        if provider.name == "Anthropic":
+            client = get_client_registry().async_anthropic(
+                provider.name, provider.api_key, timeout=provider.timeout,
+            )
+            upstream = await client.messages.create(
+                **self._anthropic_kwargs(model, messages, temperature), stream=True,
+            )
+            try:
+                async for event in upstream:
+                    if event.type == "content_block_delta" and getattr(event.delta, "text", None):
+                        yield event.delta.text
+            finally:
+                await upstream.close()
+        else:
+            client = get_client_registry().async_openai(
+                provider.name, provider.api_key, provider.base_url, provider.timeout,
+            )
+            upstream = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+            )
+            try:
+                async for chunk in upstream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await upstream.close()
+
+    async def _aattempt(
+        self,
+        provider: LLMProvider,
+        model: str,
+        messages: list[dict],
+        temperature: float,
+        task: AITask,
+        idx: int,
+        total: int,
+    ) -> tuple[str, LLMProvider, str]:
+        """单个 Provider 的一次异步尝试（含限流排队、审计日志），返回 (内容, provider, 模型)。"""
+        async with _provider_semaphore(provider):
+            start_time = time.monotonic()
+            print(
+                f"{_CYAN}{_BOLD}🔗 [{idx}/{total}] "
+                f"[{task.value}] 尝试 {provider.name} ({model})...{_RESET}",
+                file=sys.stderr,
+            )
+            try:
+                content = await self._acall_provider(provider, model, messages, temperature)
+                if not content:
+                    raise ValueError("模型返回空内容")
+            except asyncio.CancelledError:
+                logger.debug(
+                    "LLM race cancelled | task=%s provider=%s model=%s",
+                    task.value, provider.name, model,
+                )
+                raise
+            except Exception as e:
+                error_type, msg = self._classify_error(provider, e)
+                self._log_fallback(provider, model, error_type, e, start_time, task)
+                raise _ProviderFailed(msg) from e
+
+            self._log_success(provider, model, start_time, task)
+            return content, provider, model
+
+    # ─────────────────────────────────────
+    # 内部：响应缓存
+    # ─────────────────────────────────────
+
+    @staticmethod
+    def _chain_signature(providers: list[LLMProvider], models: list[str]) -> str:
+        """回退链签名 — 任一 provider/模型变更都视为不同的缓存空间。"""
+        return ",".join(f"{p.name}:{m}" for p, m in zip(providers, models))
+
+    def _cache_lookup(
+        self,
+        task: AITask,
+        task_config: dict,
+        signature: str,
+        temperature: float,
+        messages: list[dict],
+        use_cache: bool,
+        cache_tags: list[str] | None = None,
+    ) -> str | None:
+        if not (use_cache and self.cache is not None and task_config.get("cache_ttl", 0) > 0):
+            return None
+        hit = self.cache.get(task.value, signature, temperature, messages, tags=cache_tags)
+        if hit is None:
+            return None
+        print(
+            f"{_GREEN}{_BOLD}♻️ [{task.value}] 缓存命中 ({hit.kind}) "
+            f"{hit.provider} ({hit.model}){_RESET}",
+            file=sys.stderr,
+        )
+        self.audit_log.append(AuditEntry(
+            task=task.value, provider=hit.provider,
+            model=hit.model, success=True, latency_ms=0, cached=True,
+        ))
+        return hit.text
+
+    def _cache_store(
+        self,
+        task: AITask,
+        task_config: dict,
+        signature: str,
+        temperature: float,
+        messages: list[dict],
+        content: str,
+        provider: LLMProvider,
+        model: str,
+        cache_tags: list[str] | None,
+    ):
+        if self.cache is None:
+            return
+        self.cache.put(
+            task.value, signature, temperature, messages, content,
+            model=model, provider=provider.name,
+            ttl=task_config.get("cache_ttl", 0), tags=cache_tags,
+        )
+
+    # 缓存查找 / 写入含 SQLite 读写与 n-gram 向量计算，异步入口放到线程里执行，不阻塞事件循环
+
+    async def _acache_lookup(self, task: AITask, task_config: dict, *args) -> str | None:
+        if self.cache is None or task_config.get("cache_ttl", 0) <= 0:
+            return None
+        return await asyncio.to_thread(self._cache_lookup, task, task_config, *args)
+
+    async def _acache_store(self, task: AITask, task_config: dict, *args):
+        if self.cache is not None and task_config.get("cache_ttl", 0) > 0:
+            await asyncio.to_thread(self._cache_store, task, task_config, *args)
+
+    # ─────────────────────────────────────
+    # 内部：模型选择 / 异常分类
+    # ─────────────────────────────────────
+
+    @staticmethod
+    def _resolve_model(provider: LLMProvider, task_config: dict, overrides: dict) -> str:
+        provider_key = _PROVIDER_KEY_MAP.get(provider.name, "openai")
+        return (
+            overrides.get(provider_key)                      # 优先：动态覆盖
+            or task_config.get(provider_key)                 # 其次：注册表场景配置
+            or provider.model                                # 兜底：provider 默认
+        )
+
+    @staticmethod
+    def _classify_error(provider: LLMProvider, e: Exception) -> tuple[str, str]:
+        """精准异常捕获 → (错误类型, 面向用户的错误摘要)。"""
+        if isinstance(e, openai.AuthenticationError):
+            return "AuthError", f"[{provider.name}] 🔑 AuthError (401): Key 无效"
+        if isinstance(e, openai.RateLimitError):
+            return "RateLimit", f"[{provider.name}] 🚦 RateLimit (429): 触发限流"
+        if isinstance(e, openai.APITimeoutError):
+            return "Timeout", f"[{provider.name}] ⏱️ Timeout ({provider.timeout}s)"
+        if isinstance(e, (openai.APIConnectionError, openai.InternalServerError)):
+            return type(e).__name__, f"[{provider.name}] 💥 {type(e).__name__}: 服务异常"
+        if isinstance(e, openai.BadRequestError):
+            return "BadRequest", f"[{provider.name}] ⚠️ BadRequest (400): {e}"
+        return type(e).__name__, f"[{provider.name}] ❓ {type(e).__name__}: {e}"
+
+    def _raise_exhausted(self, errors: list[str], task: AITask):
         error_detail = "\n".join(errors)
         print(
             f"{_RED}{_BOLD}🚨 所有 LLM 防线均已失败 (task={task.value})！"
@@ -344,10 +716,8 @@ class AIGateway:
         if provider.name == "Anthropic":
             return self._call_anthropic(provider, model, messages, temperature)
         else:
-            client = OpenAI(
-                api_key=provider.api_key,
-                base_url=provider.base_url,
-                timeout=provider.timeout,
+            client = get_client_registry().openai(
+                provider.name, provider.api_key, provider.base_url, provider.timeout,
             )
             response = client.chat.completions.create(
                 model=model,
@@ -364,11 +734,51 @@ class AIGateway:
         temperature: float,
     ) -> str:
         """Anthropic 原生 SDK 调用（消息格式转换）。"""
-        import anthropic
-        client = anthropic.Anthropic(
-            api_key=provider.api_key,
-            timeout=provider.timeout,
+        client = get_client_registry().anthropic(
+            provider.name, provider.api_key, timeout=provider.timeout,
         )
+        response = client.messages.create(**self._anthropic_kwargs(model, messages, temperature))
+        return response.content[0].text
+
+    async def _acall_provider(
+        self,
+        provider: LLMProvider,
+        model: str,
+        messages: list[dict],
+        temperature: float,
+    ) -> str:
+        """_call_provider 的异步版本。"""
+        if provider.name == "Anthropic":
+            return await self._acall_anthropic(provider, model, messages, temperature)
+        client = get_client_registry().async_openai(
+            provider.name, provider.api_key, provider.base_url, provider.timeout,
+        )
+        response = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+        )
+        return response.choices[0].message.content
+
+    async def _acall_anthropic(
+        self,
+        provider: LLMProvider,
+        model: str,
+        messages: list[dict],
+        temperature: float,
+    ) -> str:
+        """_call_anthropic 的异步版本。"""
+        client = get_client_registry().async_anthropic(
+            provider.name, provider.api_key, timeout=provider.timeout,
+        )
+        response = await client.messages.create(
+            **self._anthropic_kwargs(model, messages, temperature)
+        )
+        return response.content[0].text
+
+    @staticmethod
+    def _anthropic_kwargs(model: str, messages: list[dict], temperature: float) -> dict:
+        """OpenAI messages → Anthropic messages.create 参数（system 单独抽出）。"""
         system_text = ""
         user_msgs = []
         for m in messages:
@@ -388,14 +798,33 @@ class AIGateway:
         }
         if system_text.strip():
             create_kwargs["system"] = system_text.strip()
-
-        response = client.messages.create(**create_kwargs)
-        return response.content[0].text
+        return create_kwargs
 
     # ─────────────────────────────────────
-    # 内部：回退日志
+    # 内部：成功 / 回退日志
     # ─────────────────────────────────────
 
+    def _log_success(
+        self,
+        provider: LLMProvider,
+        model: str,
+        start_time: float,
+        task: AITask,
+        first_token_ms: int | None = None,
+    ):
+        elapsed_ms = int((time.monotonic() - start_time) * 1000)
+        ttft = f"，首 token {first_token_ms}ms" if first_token_ms is not None else ""
+        print(
+            f"{_GREEN}{_BOLD}✅ {provider.name} ({model}) "
+            f"命中成功！耗时 {elapsed_ms}ms{ttft}{_RESET}",
+            file=sys.stderr,
+        )
+        self.audit_log.append(AuditEntry(
+            task=task.value, provider=provider.name,
+            model=model, success=True, latency_ms=elapsed_ms,
+            first_token_ms=first_token_ms,
+        ))
+
     def _log_fallback(
         self,
         provider: LLMProvider,
@@ -438,6 +867,8 @@ class AIGateway:
                 "latency_ms": e.latency_ms,
                 "error": e.error,
                 "timestamp": e.timestamp,
+                "cached": e.cached,
+                "first_token_ms": e.first_token_ms,
             }
             for e in entries
         ]
@@ -446,8 +877,11 @@ class AIGateway:
         """获取调用统计摘要。"""
         total = len(self.audit_log)
         success = sum(1 for e in self.audit_log if e.success)
+        cache_hits = sum(1 for e in self.audit_log if e.cached)
         by_provider: dict[str, dict] = {}
         for e in self.audit_log:
+            if e.cached:
+                continue  # 缓存命中不计入 provider 延迟统计
             if e.provider not in by_provider:
                 by_provider[e.provider] = {"total": 0, "success": 0, "avg_ms": 0, "latencies": []}
             by_provider[e.provider]["total"] += 1
@@ -462,12 +896,13 @@ class AIGateway:
         return {
             "total_calls": total,
             "success_rate": f"{(success / total * 100):.1f}%" if total > 0 else "N/A",
+            "cache_hits": cache_hits,
             "by_provider": by_provider,
         }
 
 
 # ═══════════════════════════════════════════
-# 5. 网关工厂函数
+# 6. 网关工厂函数
 # ═══════════════════════════════════════════
 
 def build_ai_gateway(
@@ -575,11 +1010,11 @@ def build_ai_gateway(
             except ValueError:
                 pass  # 忽略未知场景
 
-    return AIGateway(providers=providers, model_registry=registry)
+    return AIGateway(providers=providers, model_registry=registry, cache=get_response_cache())
 
 
 # ═══════════════════════════════════════════
-# 6. 向后兼容层 (保持旧版 API 不中断)
+# 7. 向后兼容层 (保持旧版 API 不中断)
 # ═══════════════════════════════════════════
 
 # 旧版别名 — 确保已有 routers/api.py 中的 build_llm_router 调用不会崩溃
@@ -0,0 +1,451 @@
+"""
+全文检索引擎 — services/search.py
+==================================
+SQLite FTS5 倒排 + 中文分词，统一检索情报日志 / 关键人 / 知识库：
+  1. 分词          → 装了 jieba 用 cut_for_search，否则 CJK 二元组；英文数字按词小写
+  2. FTS5 表       → search_index(source, ref_id, project_id, title, body)，存分词后文本
+                     rowid = ref_id * 8 + 来源编码，删除 / 更新按 rowid 直达
+  3. 增量维护      → 源表 INSERT / UPDATE / DELETE 触发器把 (source, ref_id) 记入 search_pending，
+                     sync_pending() 批量分词落库（触发器内无法调用 Python 分词）；SaaS 栈由后台线程在
+                     写事务提交后消费队列，检索请求只读
+  4. 排序          → bm25()，标题列权重高于正文
+  5. 高亮          → 按查询词回原文截取片段并以 <mark> 包裹（索引列是分词文本，不宜直接展示）
+
+执行器约定：execute(sql, params=()) 返回可迭代 / 可 fetchall 的结果。
+SaaS 栈传 Connection.exec_driver_sql，旧版栈 (database.py) 传 sqlite3 的 execute，两栈共用本模块。
+"""
+
+import html
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable
+
+try:
+    import jieba
+    jieba.setLogLevel(60)
+except ImportError:
+    jieba = None
+
+Execute = Callable[..., Any]
+
+logger = logging.getLogger("search")
+
+# 分词器：auto（有 jieba 用 jieba）/ jieba / bigram；切换后启动时自动全量重建
+_TOKENIZER_ENV = os.environ.get("SRI_SEARCH_TOKENIZER", "auto")
+_SYNC_BATCH = int(os.environ.get("SRI_SEARCH_SYNC_BATCH", "500"))
+_SNIPPET_CHARS = int(os.environ.get("SRI_SEARCH_SNIPPET_CHARS", "80"))
+
+# bm25 列权重：source, ref_id, project_id 不参与打分，标题 : 正文 = 4 : 1
+BM25 = "bm25(search_index, 0, 0, 0, 4.0, 1.0)"
+
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"      # 扩展 A / 基本区 / 兼容区汉字
+_CJK_RUN = re.compile(f"[{_CJK}]+")
+_TERM = re.compile(f"[{_CJK}]+|[0-9a-z]+")
+
+
+def tokenizer_name() -> str:
+    if _TOKENIZER_ENV == "bigram" or jieba is None:
+        return "bigram"
+    return "jieba"
+
+
+# ═══════════════════════════════════════════
+# 分词
+# ═══════════════════════════════════════════
+
+def _terms(text: str) -> list[str]:
+    """切出 CJK 连续段与英文数字词（已小写）。"""
+    return _TERM.findall((text or "").lower())
+
+
+def _cjk_tokens(run: str) -> list[str]:
+    if tokenizer_name() == "jieba":
+        return [t for t in jieba.cut_for_search(run) if t.strip()]
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def segment(text: str | None) -> str:
+    """索引侧分词：返回空格分隔的 token 串，交给 FTS5 unicode61 按空格切分。"""
+    tokens = []
+    for term in _terms(text or ""):
+        tokens += _cjk_tokens(term) if _CJK_RUN.fullmatch(term) else [term]
+    return " ".join(tokens)
+
+
+def _quote(token: str) -> str:
+    return '"' + token.replace('"', '""') + '"'
+
+
+def match_query(query: str) -> str | None:
+    """
+    查询侧：用户输入 → FTS5 MATCH 表达式，各词之间 AND。
+    二元组模式下 CJK 词转为短语（相邻二元组 = 原文连续出现）；单字与英文数字词按前缀匹配。
+    无有效词返回 None。
+    """
+    parts = []
+    for term in _terms(query):
+        if not _CJK_RUN.fullmatch(term) or len(term) == 1:
+            parts.append(_quote(term) + "*")
+        elif tokenizer_name() == "jieba":
+            parts += [_quote(t) for t in _cjk_tokens(term)]
+        else:
+            parts.append(_quote(" ".join(_cjk_tokens(term))))
+    return " ".join(parts) or None
+
+
+def highlight(text: str | None, query: str, width: int = _SNIPPET_CHARS) -> str:
+    """在原文中定位首个查询词，截取约 width 字的片段，命中处以 <mark> 包裹（其余内容已转义）。"""
+    text = text or ""
+    terms = sorted(set(_terms(query)), key=len, reverse=True)
+    if tokenizer_name() == "jieba":
+        terms += [t for term in terms if _CJK_RUN.fullmatch(term) for t in _cjk_tokens(term)]
+    pattern = re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE) if terms else None
+    first = pattern.search(text) if pattern else None
+
+    start = max(0, first.start() - width // 4) if first else 0
+    start = min(start, max(0, len(text) - width))    # 窗口放得下全文时从头展示（标题）
+    end = min(len(text), start + width)
+    window = text[start:end]
+    out, pos = [], 0
+    for m in pattern.finditer(window) if pattern else ():
+        out += [html.escape(window[pos:m.start()]), "<mark>", html.escape(m.group()), "</mark>"]
+        pos = m.end()
+    out.append(html.escape(window[pos:]))
+    return ("…" if start > 0 else "") + "".join(out) + ("…" if end < len(text) else "")
+
+
+# ═══════════════════════════════════════════
+# 数据源
+# ═══════════════════════════════════════════
+
+def _json_text(raw: str | None) -> str:
+    """AI 解析 JSON 只索引值，不索引键名。"""
+    try:
+        data = json.loads(raw or "")
+    except (TypeError, ValueError):
+        return raw or ""
+    values = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            for v in node.values():
+                walk(v)
+        elif isinstance(node, list):
+            for v in node:
+                walk(v)
+        elif node is not None:
+            values.append(str(node))
+
+    walk(data)
+    return " ".join(values)
+
+
+def _join(*parts) -> str:
+    return "\n".join(p for p in parts if p)
+
+
+@dataclass(frozen=True)
+class Source:
+    """一个被索引的源表：columns 依次传给 to_doc，返回 (title, body) 原文。"""
+    name: str
+    code: int                       # rowid 低 3 位，< 8
+    table: str
+    pk: str
+    project_col: str | None
+    columns: tuple[str, ...]
+    to_doc: Callable[..., tuple[str, str]]
+
+
+SAAS_SOURCES = (
+    Source("intel", 1, "intel_logs", "id", "project_id", ("raw_input", "ai_parsed_json"),
+           lambda raw, parsed: ("", _join(raw, _json_text(parsed)))),
+    Source("stakeholder", 2, "stakeholders", "id", "project_id",
+           ("name", "title", "role_tags", "reports_to", "notes"),
+           lambda name, title, tags, boss, notes: (name or "", _join(title, tags, boss, notes))),
+    Source("kb", 3, "knowledge_docs", "id", None, ("title", "category", "description"),
+           lambda title, category, desc: (title or "", _join(category, desc))),
+)
+
+LEGACY_SOURCES = (
+    Source("kb", 3, "knowledge_base", "doc_id", None, ("title", "category", "description"),
+           lambda title, category, desc: (title or "", _join(category, desc))),
+)
+
+
+def _rowid(source: Source, ref_id: int) -> int:
+    return ref_id * 8 + source.code
+
+
+# ═══════════════════════════════════════════
+# 建表 / 触发器 / 增量同步
+# ═══════════════════════════════════════════
+
+def install(execute: Execute, sources: tuple[Source, ...]):
+    """
+    幂等创建 FTS5 表、待同步队列与各源表触发器。
+    首次安装或分词器变更时把全部源行排入队列（下一次 sync_pending 完成回填）。
+    """
+    execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "source UNINDEXED, ref_id UNINDEXED, project_id UNINDEXED, title, body, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    execute(
+        "CREATE TABLE IF NOT EXISTS search_pending ("
+        "source TEXT NOT NULL, ref_id INTEGER NOT NULL, PRIMARY KEY (source, ref_id)) WITHOUT ROWID"
+    )
+    execute("CREATE TABLE IF NOT EXISTS search_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    for s in sources:
+        enqueue = f"INSERT OR IGNORE INTO search_pending (source, ref_id) VALUES ('{s.name}', %s.{s.pk});"
+        watched = ", ".join(dict.fromkeys((s.project_col,) * bool(s.project_col) + s.columns))
+        execute(f"CREATE TRIGGER IF NOT EXISTS trg_search_{s.table}_ins AFTER INSERT ON {s.table} "
+                f"BEGIN {enqueue % 'NEW'} END")
+        execute(f"CREATE TRIGGER IF NOT EXISTS trg_search_{s.table}_upd AFTER UPDATE OF {watched} "
+                f"ON {s.table} BEGIN {enqueue % 'NEW'} END")
+        execute(f"CREATE TRIGGER IF NOT EXISTS trg_search_{s.table}_del AFTER DELETE ON {s.table} "
+                f"BEGIN {enqueue % 'OLD'} END")
+
+    row = execute("SELECT value FROM search_meta WHERE key = 'tokenizer'").fetchall()
+    if not row or row[0][0] != tokenizer_name():
+        execute("DELETE FROM search_index")
+        for s in sources:
+            execute(f"INSERT OR IGNORE INTO search_pending (source, ref_id) "
+                    f"SELECT '{s.name}', {s.pk} FROM {s.table}")
+        execute("INSERT OR REPLACE INTO search_meta (key, value) VALUES ('tokenizer', ?)",
+                (tokenizer_name(),))
+
+
+def uninstall(execute: Execute, sources: tuple[Source, ...]):
+    """install 的逆操作。"""
+    for s in sources:
+        for suffix in ("ins", "upd", "del"):
+            execute(f"DROP TRIGGER IF EXISTS trg_search_{s.table}_{suffix}")
+    for table in ("search_meta", "search_pending", "search_index"):
+        execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def ensure_index(engine):
+    """
+    启动时调用：补齐表 / 触发器并核对分词器（迁移 0004 之后切换分词器也能自动重建），
+    注册提交后同步钩子，并在后台消费遗留队列。
+    """
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            install(conn.exec_driver_sql, SAAS_SOURCES)
+        install_search_hooks()
+        get_search_worker().schedule()
+
+
+def has_pending(execute: Execute) -> bool:
+    return bool(execute("SELECT 1 FROM search_pending LIMIT 1").fetchall())
+
+
+def sync_pending(execute: Execute, sources: tuple[Source, ...], batch_size: int = _SYNC_BATCH) -> int:
+    """
+    消费待同步队列：删除旧索引行 → 读源表最新内容分词写入 → 出队。须在写事务内调用。
+    先写后读：首条 DELETE 即取得写锁，之后读到的源行不会再被并发修改。返回处理条数。
+    """
+    by_name = {s.name: s for s in sources}
+    total = 0
+    while pending := execute(
+        "SELECT source, ref_id FROM search_pending ORDER BY source, ref_id LIMIT ?", (batch_size,)
+    ).fetchall():
+        groups: dict[str, list[int]] = {}
+        for name, ref_id in pending:
+            groups.setdefault(name, []).append(ref_id)
+        for name, ids in groups.items():
+            marks = ", ".join("?" * len(ids))
+            s = by_name.get(name)
+            if s is not None:
+                execute(f"DELETE FROM search_index WHERE rowid IN ({marks})",
+                        tuple(_rowid(s, i) for i in ids))
+                project = s.project_col or "NULL"
+                rows = execute(
+                    f"SELECT {s.pk}, {project}, {', '.join(s.columns)} FROM {s.table} "
+                    f"WHERE {s.pk} IN ({marks})", tuple(ids),
+                ).fetchall()
+                for ref_id, project_id, *cols in rows:
+                    title, body = s.to_doc(*cols)
+                    execute(
+                        "INSERT INTO search_index (rowid, source, ref_id, project_id, title, body) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (_rowid(s, ref_id), s.name, ref_id, project_id, segment(title), segment(body)),
+                    )
+            execute(f"DELETE FROM search_pending WHERE source = ? AND ref_id IN ({marks})", (name, *ids))
+        total += len(pending)
+    return total
+
+
+# ═══════════════════════════════════════════
+# SaaS 后台同步（写入提交后消费队列，检索请求不写库）
+# ═══════════════════════════════════════════
+
+class SearchSyncWorker:
+    """
+    单个后台线程消费 search_pending：多次提交合并为一次同步，每次同步一个独立写事务。
+    同步失败记日志，队列保留，等下一次写入提交或重启时重试。
+    """
+
+    def __init__(self, engine):
+        self._engine = engine
+        self._dirty = False
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def schedule(self):
+        with self._cond:
+            self._dirty = True
+            self._start()
+            self._cond.notify()
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """等待队列消费完（CLI / 压测用），超时返回 False。"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._dirty and not self._busy, timeout)
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="search-sync", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._dirty)
+                self._dirty = False
+                self._busy = True
+            try:
+                with self._engine.begin() as conn:
+                    if has_pending(conn.exec_driver_sql):
+                        n = sync_pending(conn.exec_driver_sql, SAAS_SOURCES)
+                        logger.debug("search sync: %d rows", n)
+            except Exception:
+                logger.exception("search index sync failed")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+
+_worker: SearchSyncWorker | None = None
+_worker_lock = threading.Lock()
+
+
+def get_search_worker() -> SearchSyncWorker:
+    """获取绑定默认同步引擎的后台同步线程单例。"""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                from db import engine
+                _worker = SearchSyncWorker(engine)
+    return _worker
+
+
+_hooks_installed = False
+
+
+def install_search_hooks():
+    """
+    注册 SQLAlchemy Session 事件：flush 涉及被索引的源表时打标记，commit 成功后唤醒后台同步；
+    rollback 丢弃标记。仅 SQLite（FTS5）生效。幂等。
+    """
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    tables = {s.table for s in SAAS_SOURCES}
+
+    def _after_flush(session, flush_context):
+        if any(getattr(obj, "__tablename__", None) in tables
+               for obj in (*session.new, *session.dirty, *session.deleted)):
+            session.info["search_dirty"] = True
+
+    def _after_commit(session):
+        if session.info.pop("search_dirty", False):
+            get_search_worker().schedule()
+
+    def _after_rollback(session):
+        session.info.pop("search_dirty", None)
+
+    event.listen(Session, "after_flush", _after_flush)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+    _hooks_installed = True
+
+
+# ═══════════════════════════════════════════
+# SaaS 统一检索 (/api/search)
+# ═══════════════════════════════════════════
+
+def search(db, query: str, scope=None, sources: list[str] | None = None, limit: int = 20) -> list[dict]:
+    """
+    检索 SaaS 库：按 bm25 取前 limit 条并回源表高亮。只读，待同步队列由 SearchSyncWorker 在写入提交后消费。
+    scope: 项目可见性条件（utils.dependencies.visible_projects），知识库等无项目归属的行始终可见。
+    """
+    from sqlalchemy import column, literal_column, or_, select, table, text
+
+    from models import Project
+
+    expr = match_query(query)
+    if expr is None:
+        return []
+
+    conn = db.connection()
+    fts = table("search_index", column("source"), column("ref_id"), column("project_id"))
+    score = literal_column(BM25).label("score")
+    stmt = (
+        select(fts.c.source, fts.c.ref_id, fts.c.project_id, score)
+        .where(text("search_index MATCH :q").bindparams(q=expr))
+        .order_by(literal_column("score"), literal_column("search_index.rowid"))
+        .limit(limit)
+    )
+    if scope is not None:
+        # 可见项目集合物化一次，逐条命中只做一次探测（比 JOIN projects 再过滤省一半）
+        visible = select(Project.id).where(scope)
+        stmt = stmt.where(or_(fts.c.project_id.is_(None), fts.c.project_id.in_(visible)))
+    if sources:
+        stmt = stmt.where(fts.c.source.in_(sources))
+    ranked = conn.execute(stmt).all()
+
+    project_ids = {r.project_id for r in ranked if r.project_id is not None}
+    project_names = dict(conn.execute(
+        select(Project.id, Project.name).where(Project.id.in_(project_ids))
+    ).all()) if project_ids else {}
+
+    # 回源表取原文（每个来源一条 IN 查询）
+    by_name = {s.name: s for s in SAAS_SOURCES}
+    originals: dict[tuple[str, int], tuple[str, str]] = {}
+    for name in {r.source for r in ranked}:
+        s = by_name[name]
+        ids = [r.ref_id for r in ranked if r.source == name]
+        rows = conn.exec_driver_sql(
+            f"SELECT {s.pk}, {', '.join(s.columns)} FROM {s.table} "
+            f"WHERE {s.pk} IN ({', '.join('?' * len(ids))})", tuple(ids),
+        ).fetchall()
+        originals.update({(name, ref_id): s.to_doc(*cols) for ref_id, *cols in rows})
+
+    hits = []
+    for r in ranked:
+        title, body = originals.get((r.source, r.ref_id), ("", ""))
+        title = title or project_names.get(r.project_id, "")
+        hits.append({
+            "source": r.source,
+            "id": r.ref_id,
+            "project_id": r.project_id,
+            "project_name": project_names.get(r.project_id),
+            "title": highlight(title, query, width=len(title) or 1),
+            "snippet": highlight(body, query),
+            "score": round(-r.score, 4),
+        })
+    return hits
@@ -0,0 +1,330 @@
+"""
+上传解析流水线 — upload_pipeline.py
+====================================
+job_queue 子进程中执行的三类上传任务（原 api.py 上传端点内的同步逻辑）：
+  1. process_document → PDF / DOCX / TXT 流式提取文本（doc_extract，达到 token 预算即停）
+                         → 逐块脱敏 → 4+1 情报提炼 → 入库
+  2. process_image    → 现场照片多模态识别（品牌 / 型号 / 参数 / 销售建议）→ 入库
+  3. process_media    → 音视频静音对齐分段、并发 Whisper 转写（audio_transcribe，边转边推送部分文本）
+                         → 脱敏 → 4+1 情报提炼 → 入库
+
+每类任务拆为两步：解析（提取 / 识别 / 转写 + LLM，结果按 内容哈希 + 提示词版本 写入 blob_store
+解析缓存）与入库（写情报、为附件建引用、组装响应体）。缓存命中时跳过解析：子进程内直接入库，
+或由 job_queue 在提交时调 replay() 当场完成。
+
+发往 LLM 的文本一律经 utils/masking 流式脱敏（按块处理，跨块的手机号 / 卡号照样命中，内存与文档大小无关）；
+入库的原文片段不脱敏（内网可见，与 SaaS 端 raw_input 原则一致）。
+
+每个函数接收 job_queue.JobContext，返回值即任务结果（与原同步接口的响应体一致，另含 cached）；
+输入本身的问题抛 JobError 直接失败，其余异常交给队列按退避重试。
+"""
+
+import base64
+import hashlib
+import json
+import os
+import time
+from functools import lru_cache
+
+import audio_transcribe
+import blob_store
+from doc_extract import ExtractError, ExtractStats, iter_chunks
+from job_queue import JobContext, JobError
+from services.context_packer import truncate_to_tokens
+from utils.masking import get_engine as get_mask_engine
+from utils.masking import iter_slices
+
+DOCUMENT_SUFFIXES = ("pdf", "docx", "txt")
+IMAGE_SUFFIXES = ("jpg", "jpeg", "png")
+MEDIA_SUFFIXES = ("mp3", "wav", "m4a", "mp4", "mov", "webm", "ogg", "flac")
+
+_DOC_TOKEN_BUDGET = int(os.environ.get("SRI_DOC_TOKEN_BUDGET", "3000"))    # 文档送入 LLM 的正文上限
+_RAW_HEAD_CHARS = 2000                                                     # 入库的原文片段长度
+_TRANSCRIPT_LLM_CHARS = 4000                                               # 转写稿送入 LLM 的字数上限
+_PROGRESS_INTERVAL = 0.5                                                   # 提取阶段进度上报间隔（秒）
+
+# 鉴权 / 请求体错误重试也不会成功（openai 与 anthropic SDK 的异常同名）
+_PERMANENT_LLM_ERRORS = {"AuthenticationError", "PermissionDeniedError", "BadRequestError", "NotFoundError"}
+
+_VISION_PROMPT = "请提取这张业务照片中的品牌、型号、关键参数，并给出销售建议。"
+_VISION_MODELS = {"anthropic": "claude-3-5-sonnet-20241022", "openai": "gpt-4o-mini"}
+
+
+def _llm_call(stage: str, fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        if type(e).__name__ in _PERMANENT_LLM_ERRORS:
+            raise JobError(f"{stage}失败: {e}") from e
+        raise
+
+
+def _save(job: JobContext, raw_text: str, parsed: str):
+    from database import save_intelligence
+    save_intelligence(
+        job.project_id, raw_text, parsed,
+        attachment_hash=job.file_hash,
+        attachment_url=blob_store.attach(job.file_hash, job.project_id, job.filename),
+    )
+
+
+def _masked_prefix(text: str, limit: int) -> str:
+    """长文本流式脱敏后取前 limit 字（先脱敏后截断：截断处的号码不会漏出半截）。"""
+    out, size = [], 0
+    for piece in get_mask_engine().stream(iter_slices(text)):
+        out.append(piece)
+        size += len(piece)
+        if size >= limit:
+            break
+    return "".join(out)[:limit]
+
+
+def _as_intelligence(parsed_json_str: str) -> dict:
+    try:
+        return json.loads(parsed_json_str)
+    except (json.JSONDecodeError, TypeError):
+        return {"raw_response": parsed_json_str}
+
+
+# ═══════════════════════════════════════════
+# 0. 解析缓存
+# ═══════════════════════════════════════════
+
+@lru_cache(maxsize=None)
+def prompt_version(kind: str) -> str:
+    """影响解析结果的提示词 / 模型 / 截断预算 / 脱敏规则的摘要；任一变化即缓存版本变化。"""
+    from llm_service import SYSTEM_PROMPT
+
+    mask_rules = [r.name for r in get_mask_engine().rules]
+    parts = {
+        "document": [SYSTEM_PROMPT, _DOC_TOKEN_BUDGET, mask_rules],
+        "image": [_VISION_PROMPT, _VISION_MODELS],
+        "media": [SYSTEM_PROMPT, audio_transcribe.VERSION, mask_rules, _TRANSCRIPT_LLM_CHARS],
+    }[kind]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def cached_payload(kind: str, file_hash: str) -> dict | None:
+    """同一内容此前的解析结果（job_queue 提交时查询）。"""
+    return blob_store.cache_get(file_hash, kind, prompt_version(kind))
+
+
+def replay(job: JobContext, payload: dict) -> dict:
+    """用缓存的解析结果直接入库，返回任务结果（job_queue 提交时调用，不经进程池、不调用 LLM）。"""
+    result = _APPLY[job.kind](job, payload)
+    result["cached"] = True
+    return result
+
+
+def _run(job: JobContext, parse) -> dict:
+    payload = cached_payload(job.kind, job.file_hash)
+    if payload is not None:
+        job.progress(0.9, "命中解析缓存，入库")
+        return replay(job, payload)
+    payload = parse(job)
+    if payload.pop("cacheable", True):
+        blob_store.cache_put(job.file_hash, job.kind, prompt_version(job.kind), payload)
+    job.progress(0.9, "入库")
+    result = _APPLY[job.kind](job, payload)
+    result["cached"] = False
+    return result
+
+
+# ═══════════════════════════════════════════
+# 1. 文档
+# ═══════════════════════════════════════════
+
+def extract_document_text(job: JobContext) -> tuple[str, str, ExtractStats]:
+    """
+    落盘文档 → 逐块脱敏的纯文本（doc_extract 页级并行、达到 token 预算即停），提取过程中按页上报进度。
+    返回 (脱敏文本, 原文开头 _RAW_HEAD_CHARS 字, 统计)；脱敏文本已截断到 SRI_DOC_TOKEN_BUDGET 以内。
+    解析失败抛 JobError。
+    """
+    stats = ExtractStats()
+    raw_head: list[str] = []
+
+    def source():
+        reported, head = time.monotonic(), 0
+        for i, chunk in enumerate(iter_chunks(job.path, job.suffix, token_budget=_DOC_TOKEN_BUDGET, stats=stats)):
+            if i:
+                chunk = "\n" + chunk                        # 与原 "\n".join 拼接一致
+            if head < _RAW_HEAD_CHARS:
+                raw_head.append(chunk[:_RAW_HEAD_CHARS - head])
+                head += len(raw_head[-1])
+            if time.monotonic() - reported >= _PROGRESS_INTERVAL:
+                reported = time.monotonic()
+                done = min(1.0, stats.tokens / _DOC_TOKEN_BUDGET)
+                if stats.pages_total:
+                    done = max(done, stats.pages_read / stats.pages_total)
+                    job.progress(0.1 + 0.3 * done, f"提取文本 {stats.pages_read}/{stats.pages_total} 页")
+                else:
+                    job.progress(0.1 + 0.3 * done, "提取文本")
+            yield chunk
+
+    try:
+        text = "".join(get_mask_engine().stream(source()))
+    except ExtractError as e:
+        raise JobError(str(e)) from e
+    if stats.truncated:
+        text = truncate_to_tokens(text, _DOC_TOKEN_BUDGET)
+    return text, "".join(raw_head), stats
+
+
+def _parse_document(job: JobContext) -> dict:
+    if not job.api_key:
+        raise JobError("未提供 API Key。请在设置中输入 OpenAI API Key")
+
+    job.progress(0.1, "提取文本")
+    extracted_text, raw_head, stats = extract_document_text(job)
+    if not extracted_text.strip():
+        raise JobError("文件中未提取到有效文本内容")
+
+    job.progress(0.4, "AI 解析")
+    from llm_service import parse_visit_log
+    parsed_json_str = _llm_call("AI 解析", parse_visit_log, job.api_key, extracted_text)
+    return {"text": extracted_text, "raw_head": raw_head, "parsed": parsed_json_str, "extraction": stats.to_dict()}
+
+
+def _apply_document(job: JobContext, payload: dict) -> dict:
+    _save(job, payload["raw_head"], payload["parsed"])
+    return {
+        "success": True,
+        "filename": job.filename,
+        "extracted_text_length": len(payload["text"]),
+        "extraction": payload["extraction"],
+        "intelligence": _as_intelligence(payload["parsed"]),
+    }
+
+
+def process_document(job: JobContext) -> dict:
+    return _run(job, _parse_document)
+
+
+# ═══════════════════════════════════════════
+# 2. 图片
+# ═══════════════════════════════════════════
+
+def _vision(api_key: str, suffix: str, b64_img: str) -> str:
+    media_type = "jpeg" if suffix == "jpg" else suffix
+    if api_key.startswith("sk-ant-"):
+        # Anthropic Claude 视觉 API
+        from llm_service import get_anthropic_client
+        client = get_anthropic_client(api_key)
+        response = client.messages.create(
+            model=_VISION_MODELS["anthropic"],
+            max_tokens=2000,
+            messages=[{
+                "role": "user",
+                "content": [
+                    {"type": "image", "source": {"type": "base64", "media_type": f"image/{media_type}", "data": b64_img}},
+                    {"type": "text", "text": _VISION_PROMPT},
+                ],
+            }],
+        )
+        return response.content[0].text
+    # OpenAI GPT-4o 视觉 API
+    from llm_service import get_openai_client
+    client = get_openai_client(api_key)
+    response = client.chat.completions.create(
+        model=_VISION_MODELS["openai"],
+        messages=[{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": _VISION_PROMPT},
+                {"type": "image_url", "image_url": {"url": f"data:image/{media_type};base64,{b64_img}"}},
+            ],
+        }],
+    )
+    return response.choices[0].message.content or ""
+
+
+def _parse_image(job: JobContext) -> dict:
+    if not job.api_key:
+        raise JobError("请先配置 API Key")
+
+    job.progress(0.1, "图片编码")
+    b64_img = base64.b64encode(job.read_bytes()).decode("utf-8")
+
+    job.progress(0.3, "视觉识别")
+    return {"parsed_intel": _llm_call("图片解析", _vision, job.api_key, job.suffix, b64_img)}
+
+
+def _apply_image(job: JobContext, payload: dict) -> dict:
+    parsed_intel = payload["parsed_intel"]
+    _save(job, f"[图片情报] {job.filename}", f"【🚨 深度文档/视觉情报提取】\n{parsed_intel}")
+    return {
+        "success": True,
+        "filename": job.filename,
+        "parsed_intel": parsed_intel,
+        "message": "✅ 现场图片情报已解析并入库！",
+    }
+
+
+def process_image(job: JobContext) -> dict:
+    return _run(job, _parse_image)
+
+
+# ═══════════════════════════════════════════
+# 3. 音视频
+# ═══════════════════════════════════════════
+
+def whisper_key(api_key: str) -> str:
+    """Whisper 只接受 OpenAI Key：Anthropic Key 时回退到环境变量 OPENAI_API_KEY（无则为空）。"""
+    if not api_key.startswith("sk-ant-"):
+        return api_key
+    env_key = os.environ.get("OPENAI_API_KEY", "")
+    return "" if env_key.startswith("sk-ant-") else env_key
+
+
+def _parse_media(job: JobContext) -> dict:
+    key = whisper_key(job.api_key)
+    if not key:
+        raise JobError("音频转录需要 OpenAI API Key（Whisper 服务）。请设置环境变量 OPENAI_API_KEY，或使用 OpenAI 密钥。")
+
+    # Step 1: 分段并发转写（直接读 blob 文件；每完成一段推送一次已拼接的部分文本）
+    job.progress(0.1, "语音转写")
+    from llm_service import get_openai_client
+    whisper = audio_transcribe.openai_whisper(get_openai_client(key))
+    stats = audio_transcribe.TranscribeStats()
+
+    def on_partial(text: str, done: int, total: int):
+        job.progress(0.1 + 0.5 * done / total, f"语音转写 {done}/{total} 段", partial=text)
+
+    try:
+        transcribed_text = _llm_call("音频转录", audio_transcribe.transcribe, job.path, whisper,
+                                     on_partial=on_partial, stats=stats)
+    except audio_transcribe.TranscribeError as e:
+        raise JobError(str(e)) from e
+    if not transcribed_text.strip():
+        raise JobError("转录结果为空，未识别到有效语音内容")
+
+    # Step 2: 脱敏后 AI 解析转录文本（失败不影响转录结果入库，但不进缓存，下次上传重新解析）
+    job.progress(0.6, "AI 解析")
+    try:
+        from llm_service import parse_visit_log
+        masked = _masked_prefix(transcribed_text, _TRANSCRIPT_LLM_CHARS)
+        parsed_json_str, cacheable = parse_visit_log(job.api_key, masked), True
+    except Exception as e:
+        parsed_json_str, cacheable = f"转录成功但 AI 解析失败: {str(e)}", False
+    return {"transcribed_text": transcribed_text, "parsed": parsed_json_str, "cacheable": cacheable,
+            "transcription": stats.to_dict()}
+
+
+def _apply_media(job: JobContext, payload: dict) -> dict:
+    transcribed_text = payload["transcribed_text"]
+    _save(job, transcribed_text[:_RAW_HEAD_CHARS], payload["parsed"])
+    return {
+        "success": True,
+        "filename": job.filename,
+        "transcribed_text": transcribed_text,
+        "transcription": payload.get("transcription"),
+        "intelligence": _as_intelligence(payload["parsed"]),
+        "message": f"✅ 音频/视频转录完成（{len(transcribed_text)}字），情报已入库！",
+    }
+
+
+def process_media(job: JobContext) -> dict:
+    return _run(job, _parse_media)
+
+
+_APPLY = {"document": _apply_document, "image": _apply_image, "media": _apply_media}
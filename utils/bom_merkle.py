@@ -0,0 +1,230 @@
+"""
+BOM 默克尔树 — utils/bom_merkle.py
+==================================
+天眼引擎的实现层。原实现每次建单 / 改单 / 提交 / 校验都把整张 BOM 排序、序列化成 JSON 再整体 SHA-256，
+哈希不一致时只能报「变了」，VP 看不出变的是哪一行：
+  1. 逐行叶子       → 每个 BOMItem 一片叶子 H(0x00 ‖ 型号长度:型号 ‖ 序号|数量|单价)；
+                      行键 = (型号, 序号)，同型号多行按出现次序编号 1、2、3…
+  2. 默克尔根       → 叶子按行键排序后两两合并 H(0x01 ‖ 左 ‖ 右)，落单节点直接上提；根即 tamper_hash
+  3. 增量更新       → update() 改一行只重算叶子到根路径上的 log n 个节点；
+                      apply() 用新明细整单替换时逐行比对原值，行键不变则只重算改动行的路径
+  4. 逐行差异       → diff() 一趟算出变更行：行数相同时自根向下只走哈希不同的子树（O(k log n)），
+                      有增删行时按行键有序归并一遍（O(n)）；每行给出 数量 / 单价 旧值 → 新值
+  5. 快照           → snapshot() 把叶子明细存入 DealDesk.bom_merkle（与 tamper_hash 并列），
+                      load() 复建整棵树，供下次校验给出逐行差异
+
+用法：
+    tree = BOMMerkle.from_items([{"model": "XGN15", "qty": 10, "price": 15000}, ...])
+    deal.tamper_hash, deal.bom_merkle = tree.root, tree.snapshot()
+    changes = BOMMerkle.load(deal.bom_merkle).diff(current_tree)
+    describe_changes(changes)       # → "XGN15 数量 10→12；新增 SCB11 ×2 @¥86,000.00"
+"""
+
+import hashlib
+import json
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+_SUMMARY_LINES = 20          # 变更摘要最多逐条列出的行数，其余折叠为「等 N 行」
+_EMPTY_ROOT = hashlib.sha256(b"").hexdigest()
+
+
+@dataclass(frozen=True)
+class BOMLine:
+    model: str          # 产品型号
+    seq: int            # 同型号第几行（从 1 起）
+    qty: int            # 核定数量
+    price: float        # 单价（元）
+
+    @property
+    def key(self) -> tuple[str, int]:
+        return self.model, self.seq
+
+    @property
+    def label(self) -> str:
+        return self.model if self.seq == 1 else f"{self.model}（第 {self.seq} 行）"
+
+    def digest(self) -> bytes:
+        # 型号带长度前缀，其余字段是数字，编码无歧义（比 json.dumps 快数倍，建树耗时主要在这里）
+        payload = f"{len(self.model)}:{self.model}{self.seq}|{self.qty}|{self.price!r}"
+        return hashlib.sha256(b"\x00" + payload.encode("utf-8")).digest()
+
+
+@dataclass(frozen=True)
+class LineChange:
+    old: BOMLine | None     # None → 新增行
+    new: BOMLine | None     # None → 删除行
+
+    @property
+    def kind(self) -> str:
+        if self.old is None:
+            return "added"
+        return "removed" if self.new is None else "changed"
+
+    def describe(self) -> str:
+        if self.old is None:
+            return f"新增 {self.new.label} ×{self.new.qty} @¥{self.new.price:,.2f}"
+        if self.new is None:
+            return f"删除 {self.old.label} ×{self.old.qty} @¥{self.old.price:,.2f}"
+        parts = []
+        if self.old.qty != self.new.qty:
+            parts.append(f"数量 {self.old.qty}→{self.new.qty}")
+        if self.old.price != self.new.price:
+            parts.append(f"单价 ¥{self.old.price:,.2f}→¥{self.new.price:,.2f}")
+        return f"{self.new.label} {'，'.join(parts)}"
+
+    def to_dict(self) -> dict[str, Any]:
+        line = self.new or self.old
+        return {
+            "model": line.model,
+            "seq": line.seq,
+            "change": self.kind,
+            "old_qty": self.old.qty if self.old else None,
+            "new_qty": self.new.qty if self.new else None,
+            "old_price": self.old.price if self.old else None,
+            "new_price": self.new.price if self.new else None,
+        }
+
+
+def _node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def lines_from_items(bom_items: Iterable[dict[str, Any]]) -> list[BOMLine]:
+    """[{"model", "qty", "price"}, ...] → 按行键排序的 BOMLine（与 compute_bom_hash 同样的归一化）。"""
+    seen: Counter = Counter()
+    lines = []
+    for item in bom_items:
+        model = str(item.get("model", ""))
+        seen[model] += 1
+        lines.append(BOMLine(model, seen[model], int(item.get("qty") or 0), float(item.get("price") or 0)))
+    lines.sort(key=lambda line: line.key)
+    return lines
+
+
+def describe_changes(changes: list[LineChange]) -> str:
+    """变更列表 → 一行摘要（超过 _SUMMARY_LINES 行时折叠）。"""
+    shown = "；".join(c.describe() for c in changes[:_SUMMARY_LINES])
+    if len(changes) > _SUMMARY_LINES:
+        shown += f"；等共 {len(changes)} 行"
+    return shown
+
+
+class BOMMerkle:
+    """一张 BOM 的默克尔树：levels[0] 为叶子，levels[-1] 为根。"""
+
+    def __init__(self, lines: list[BOMLine]):
+        self.lines = lines
+        self._build()
+
+    @classmethod
+    def from_items(cls, bom_items: Iterable[dict[str, Any]]) -> "BOMMerkle":
+        return cls(lines_from_items(bom_items))
+
+    @classmethod
+    def load(cls, snapshot: str) -> "BOMMerkle":
+        """snapshot() 的逆操作；快照损坏抛 ValueError。"""
+        try:
+            rows = json.loads(snapshot)
+            lines = [BOMLine(str(m), int(s), int(q), float(p)) for m, s, q, p in rows]
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"BOM 快照无法解析: {e}") from e
+        lines.sort(key=lambda line: line.key)
+        return cls(lines)
+
+    def snapshot(self) -> str:
+        return json.dumps([[l.model, l.seq, l.qty, l.price] for l in self.lines],
+                          ensure_ascii=False, separators=(",", ":"))
+
+    def items(self) -> list[dict[str, Any]]:
+        """还原为 compute_bom_hash 的输入格式（按型号排序，同型号保持原次序）。"""
+        return [{"model": l.model, "qty": l.qty, "price": l.price} for l in self.lines]
+
+    @property
+    def root(self) -> str:
+        return self._levels[-1][0].hex() if self.lines else _EMPTY_ROOT
+
+    # ── 构建 / 增量更新 ──
+
+    def _build(self):
+        self._index = {line.key: i for i, line in enumerate(self.lines)}
+        if len(self._index) != len(self.lines):
+            raise ValueError("BOM 行键重复")
+        level = [line.digest() for line in self.lines]
+        self._levels = [level]
+        while len(level) > 1:
+            level = [_node(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                     for i in range(0, len(level), 2)]
+            self._levels.append(level)
+
+    def update(self, line: BOMLine):
+        """替换同行键的一行，只重算该叶子到根的路径。行键不存在抛 KeyError。"""
+        i = self._index[line.key]
+        self.lines[i] = line
+        self._levels[0][i] = line.digest()
+        for depth in range(1, len(self._levels)):
+            below, i = self._levels[depth - 1], i // 2
+            left = below[2 * i]
+            self._levels[depth][i] = _node(left, below[2 * i + 1]) if 2 * i + 1 < len(below) else left
+
+    def apply(self, bom_items: Iterable[dict[str, Any]]) -> list[LineChange]:
+        """
+        用新明细整单替换，返回相对替换前的变更。
+        行键集合不变（只改数量 / 单价）时逐行比对原值、只更新改动行；有增删行时整树重建。
+        """
+        lines = lines_from_items(bom_items)
+        if [l.key for l in lines] != [l.key for l in self.lines]:
+            changes = self._merge(self.lines, lines)
+            self.lines = lines
+            self._build()
+            return changes
+        changes = [LineChange(old, new) for old, new in zip(self.lines, lines) if old != new]
+        for change in changes:
+            self.update(change.new)
+        return changes
+
+    # ── 差异 ──
+
+    def diff(self, other: "BOMMerkle") -> list[LineChange]:
+        """self 为基准、other 为当前，按行键顺序返回变更行。"""
+        if self.root == other.root:
+            return []
+        if len(self.lines) == len(other.lines):
+            # 行数相同 → 两树同形，只下探哈希不同的子树；叶子哈希含行键，未下探的行键必然一致
+            leaves = self._differing(other)
+            if all(self.lines[i].key == other.lines[i].key for i in leaves):
+                return [LineChange(self.lines[i], other.lines[i]) for i in leaves]
+        return self._merge(self.lines, other.lines)
+
+    def _differing(self, other: "BOMMerkle") -> list[int]:
+        found, stack = [], [(len(self._levels) - 1, 0)]
+        while stack:
+            depth, i = stack.pop()
+            if self._levels[depth][i] == other._levels[depth][i]:
+                continue
+            if depth == 0:
+                found.append(i)
+                continue
+            width = len(self._levels[depth - 1])
+            stack.extend((depth - 1, c) for c in (2 * i + 1, 2 * i) if c < width)
+        return sorted(found)
+
+    @staticmethod
+    def _merge(old: list[BOMLine], new: list[BOMLine]) -> list[LineChange]:
+        """两组已按行键排序的行一趟归并。"""
+        changes, i, j = [], 0, 0
+        while i < len(old) or j < len(new):
+            if j >= len(new) or (i < len(old) and old[i].key < new[j].key):
+                changes.append(LineChange(old[i], None))
+                i += 1
+            elif i >= len(old) or new[j].key < old[i].key:
+                changes.append(LineChange(None, new[j]))
+                j += 1
+            else:
+                if old[i] != new[j]:
+                    changes.append(LineChange(old[i], new[j]))
+                i += 1
+                j += 1
+        return changes
@@ -12,9 +12,10 @@ from typing import Annotated
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from db import SessionLocal
+from db import AsyncSessionLocal, SessionLocal
 from models import User, UserRole, Project
 
 # ── JWT 配置 ──
@@ -42,6 +43,18 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    生成请求级 AsyncSession（高频只读端点专用）。
+    全程 await，不占用 Starlette 线程池。
+    """
+    db = AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
 # ═══════════════════════════════════════════
 # 2. JWT 工具函数
 # ═══════════════════════════════════════════
@@ -99,6 +112,23 @@ async def get_current_user(
         def handler(user: User = Depends(get_current_user)):
             ...
     """
+    user_id = _user_id_from_credentials(credentials)
+    user = db.query(User).filter(User.id == user_id).first()
+    return _ensure_active(user)
+
+
+async def get_current_user_async(
+    credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(_bearer_scheme)] = None,
+    db: AsyncSession = Depends(get_async_db),
+) -> User:
+    """get_current_user 的异步版本，配合 get_async_db 使用。"""
+    user_id = _user_id_from_credentials(credentials)
+    user = await db.get(User, user_id)
+    return _ensure_active(user)
+
+
+def _user_id_from_credentials(credentials: HTTPAuthorizationCredentials | None) -> int:
+    """Bearer Token → user_id，任何异常均返回 401。"""
     if credentials is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -113,8 +143,10 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token 格式异常：缺少 sub 字段",
         )
+    return int(user_id)
+
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
+def _ensure_active(user: User | None) -> User:
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -145,24 +177,51 @@ def require_role(*allowed_roles: UserRole):
     async def _role_checker(
         user: User = Depends(get_current_user),
     ) -> User:
-        # admin 拥有超级权限，任何端点均可通行
-        if user.role == UserRole.ADMIN:
-            return user
-        if user.role not in allowed_roles:
-            role_names = ", ".join(r.value for r in allowed_roles)
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail=f"🔒 权限拦截：此操作仅限 [{role_names}] 角色，"
-                       f"您当前角色为 [{user.role.value}]",
-            )
-        return user
+        return _check_role(user, allowed_roles)
     return _role_checker
 
 
+def require_role_async(*allowed_roles: UserRole):
+    """require_role 的异步版本（走 get_current_user_async）。"""
+    async def _role_checker(
+        user: User = Depends(get_current_user_async),
+    ) -> User:
+        return _check_role(user, allowed_roles)
+    return _role_checker
+
+
+def _check_role(user: User, allowed_roles: tuple[UserRole, ...]) -> User:
+    # admin 拥有超级权限，任何端点均可通行
+    if user.role == UserRole.ADMIN:
+        return user
+    if user.role not in allowed_roles:
+        role_names = ", ".join(r.value for r in allowed_roles)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"🔒 权限拦截：此操作仅限 [{role_names}] 角色，"
+                   f"您当前角色为 [{user.role.value}]",
+        )
+    return user
+
+
 # ═══════════════════════════════════════════
 # 5. 项目归属校验
 # ═══════════════════════════════════════════
 
+def visible_projects(user: User):
+    """
+    项目列表级可见性条件（WHERE 子句），None 表示不过滤：
+    - sales:         仅自己 owner 的项目
+    - tech/director: 同战区项目
+    - vp/admin/finance: 全部
+    """
+    if user.role == UserRole.SALES:
+        return Project.owner_id == user.id
+    if user.role in (UserRole.TECH, UserRole.DIRECTOR):
+        return Project.dept == user.dept
+    return None
+
+
 def require_project_access(project_id_param: str = "project_id"):
     """
     项目归属 & 可见性校验：
@@ -0,0 +1,296 @@
+"""
+隐私脱敏规则引擎 — utils/masking.py
+====================================
+mask_sensitive_info 的实现层。所有发往云端 LLM 的文本都先经过这里，位于每次 AI 调用的热路径上：
+  1. 规则注册表     → MaskRule(名称, 正则, 占位标签, 校验函数)；register_rule() 插拔，
+                      SRI_MASK_RULES="phone,money,..." 指定启用哪些（默认启用 enabled=True 的规则）
+  2. 单遍扫描       → 启用的规则按注册顺序编译成一个命名分组交替正则，一次扫描全部规则；
+                      同一位置多条规则都能匹配时先注册者优先（更具体的规则放前面）。
+                      各规则声明首字符集 first 时，交替式前加其并集的前瞻：中文正文里绝大多数位置
+                      一次字符集判断即跳过，不必逐条尝试分支
+  3. 校验兜底       → 身份证校验位、银行卡 Luhn 不通过的候选不脱敏，改试后续规则（订单号 / 物料号不误伤）
+  4. 可逆令牌       → tokenize() 把同一值映射为同一编号令牌 [PHONE_1]，TokenVault.restore() 把 LLM 输出里的
+                      令牌还原为原值（结果只在内网展示时使用）；mask() 仍输出 [PHONE_MASK] 这类不可逆占位
+  5. 流式脱敏       → stream() 逐块脱敏任意长的文本流（上传文档 / 转写稿）：缓冲区末尾保留 SRI_MASK_STREAM_HOLD
+                      字符不输出、等下一块拼上再判定，跨块的手机号照样命中；另留几个已输出字符供后视断言参考。
+                      内存只与块大小 + 保留窗口有关，与文本总长无关；单个命中不超过保留窗口时与整段 mask() 结果一致
+
+内置规则（注册顺序即优先级）：
+    id_card    18 位身份证（校验位）        → [ID_CARD_MASK]
+    bank_card  16~19 位银行卡（Luhn，可含空格 / 连字符分组） → [BANK_CARD_MASK]
+    phone      11 位手机号（原版规则）       → [PHONE_MASK]
+    email      邮箱                         → [EMAIL_MASK]
+    money      数字+万/元（原版规则）        → [MONEY_MASK]
+    address    省/市 + 区/县 + 路/街/号（模糊匹配，默认不启用）→ [ADDRESS_MASK]
+
+用法：
+    get_engine().mask("张工 13812345678，预算 300万")          # → "张工 [PHONE_MASK]，预算 [MONEY_MASK]"
+    masked, vault = get_engine().tokenize(text)                  # → "张工 [PHONE_1]，预算 [MONEY_1]"
+    vault.restore(llm_output)
+    for piece in get_engine().stream(iter_slices(transcript)): ...
+"""
+
+import os
+import re
+import threading
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass
+
+# ── 参数（可通过环境变量覆盖）──
+_STREAM_HOLD = int(os.environ.get("SRI_MASK_STREAM_HOLD", "256"))     # 流式脱敏保留窗口（≥ 单个命中的最大长度）
+_STREAM_CONTEXT = 8                                                   # 保留的已输出字符数（供 (?<!\d) 等后视断言）
+_SLICE_CHARS = 64 * 1024
+
+
+@dataclass(frozen=True)
+class MaskRule:
+    name: str                                       # 规则名（SRI_MASK_RULES 中引用）
+    pattern: str                                    # 正则；编译时整体包一层命名分组，内部分组不受影响
+    label: str                                      # 占位标签：[LABEL_MASK] / [LABEL_n]
+    validator: Callable[[str], bool] | None = None  # 命中后二次校验，不通过视为未命中
+    enabled: bool = True                            # 未配置 SRI_MASK_RULES 时是否启用
+    first: str | None = None                        # 匹配首字符的字符集内容（如 r"\d"），用于预筛；None 表示不确定
+
+
+# ═══════════════════════════════════════════
+# 1. 校验函数
+# ═══════════════════════════════════════════
+
+_ID_WEIGHTS = (7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2)
+
+
+def _id_card_ok(value: str) -> bool:
+    """GB 11643 校验位。"""
+    total = sum(int(c) * w for c, w in zip(value[:17], _ID_WEIGHTS))
+    return "10X98765432"[total % 11] == value[17].upper()
+
+
+def _luhn_ok(value: str) -> bool:
+    digits = [int(c) for c in value if c.isdigit()]
+    if not 16 <= len(digits) <= 19:
+        return False
+    total = 0
+    for i, d in enumerate(reversed(digits)):
+        if i % 2:
+            d = d * 2 - 9 if d > 4 else d * 2
+        total += d
+    return total % 10 == 0
+
+
+# ═══════════════════════════════════════════
+# 2. 引擎
+# ═══════════════════════════════════════════
+
+_TOKEN_RE = re.compile(r"\[([A-Z][A-Z_]*)_(\d+)\]")
+
+
+class TokenVault:
+    """tokenize() 的令牌表：同一 (标签, 原值) 始终得到同一令牌，可跨多段文本复用（如合并请求的多条笔记）。"""
+
+    def __init__(self):
+        self._tokens: dict[tuple[str, str], str] = {}
+        self._values: dict[str, str] = {}
+        self._counts: Counter = Counter()
+
+    def token(self, label: str, value: str) -> str:
+        key = (label, value)
+        token = self._tokens.get(key)
+        if token is None:
+            self._counts[label] += 1
+            token = f"[{label}_{self._counts[label]}]"
+            self._tokens[key] = token
+            self._values[token] = value
+        return token
+
+    def restore(self, text: str) -> str:
+        """把文本中由本令牌表签发的令牌还原为原值；未知令牌原样保留。"""
+        if not self._values or not text:
+            return text
+        return _TOKEN_RE.sub(lambda m: self._values.get(m.group(0), m.group(0)), text)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class MaskingEngine:
+    """一组规则编译后的扫描器（不可变，线程安全）。"""
+
+    def __init__(self, rules: Sequence[MaskRule]):
+        self.rules = tuple(rules)
+        self._combined = None
+        if self.rules:
+            alternation = "|".join(f"(?P<r{i}>{r.pattern})" for i, r in enumerate(self.rules))
+            if all(r.first for r in self.rules):
+                alternation = f"(?=[{''.join(r.first for r in self.rules)}])(?:{alternation})"
+            self._combined = re.compile(alternation)
+        self._singles = tuple(re.compile(r.pattern) for r in self.rules)
+
+    def finditer(self, text: str, pos: int = 0, endpos: int | None = None) -> Iterator[tuple[int, int, MaskRule]]:
+        """按位置顺序产出 (起, 止, 规则)；校验不通过的候选改试后续规则，都不行则从下一个字符继续扫描。"""
+        if self._combined is None:
+            return
+        endpos = len(text) if endpos is None else endpos
+        search = self._combined.search
+        while pos < endpos and (m := search(text, pos, endpos)):
+            start, index = m.start(), int(m.lastgroup[1:])
+            end = m.end()
+            rule = self.rules[index]
+            if rule.validator is not None and not rule.validator(m.group()):
+                index, end = self._fallback(text, start, endpos, index)
+                if index < 0:
+                    pos = start + 1
+                    continue
+                rule = self.rules[index]
+            yield start, end, rule
+            pos = end if end > start else start + 1
+
+    def _fallback(self, text: str, start: int, endpos: int, failed: int) -> tuple[int, int]:
+        for index in range(failed + 1, len(self.rules)):
+            m = self._singles[index].match(text, start, endpos)
+            if m and m.end() > start:
+                validator = self.rules[index].validator
+                if validator is None or validator(m.group()):
+                    return index, m.end()
+        return -1, start
+
+    @staticmethod
+    def _emitter(vault: TokenVault | None) -> Callable[[MaskRule, str], str]:
+        if vault is None:
+            return lambda rule, _: f"[{rule.label}_MASK]"
+        return lambda rule, value: vault.token(rule.label, value)
+
+    def _replace(self, text: str, emit: Callable[[MaskRule, str], str]) -> str:
+        out, pos = [], 0
+        for start, end, rule in self.finditer(text):
+            out.append(text[pos:start])
+            out.append(emit(rule, text[start:end]))
+            pos = end
+        if not out:
+            return text
+        out.append(text[pos:])
+        return "".join(out)
+
+    def mask(self, text: str) -> str:
+        """不可逆脱敏：命中片段替换为 [LABEL_MASK]。"""
+        if not text:
+            return text
+        return self._replace(text, self._emitter(None))
+
+    def tokenize(self, text: str, vault: TokenVault | None = None) -> tuple[str, TokenVault]:
+        """可逆脱敏：命中片段替换为编号令牌，返回 (脱敏文本, 令牌表)；传入 vault 则在其上继续编号。"""
+        vault = vault if vault is not None else TokenVault()
+        if not text:
+            return text, vault
+        return self._replace(text, self._emitter(vault)), vault
+
+    def stream(self, chunks: Iterable[str], *, vault: TokenVault | None = None,
+               hold: int = _STREAM_HOLD) -> Iterator[str]:
+        """
+        流式脱敏：逐块产出脱敏文本（传 vault 则为可逆令牌），拼接结果与整段 mask() / tokenize() 一致。
+        末尾 hold 个字符留到下一块再判定；上游提前结束（如达到 token 预算）时关闭生成器即可，不会多读。
+        """
+        emit = self._emitter(vault)
+        buf, start = "", 0                  # buf[:start] 为已输出的上下文
+        for chunk in chunks:
+            if not chunk:
+                continue
+            buf += chunk
+            limit = len(buf) - hold
+            if limit <= start:
+                continue
+            out, pos = [], start
+            for s, e, rule in self.finditer(buf, start):
+                if s >= limit:              # 起点落在保留窗口内：可能随下一块变化
+                    break
+                out.append(buf[pos:s])
+                out.append(emit(rule, buf[s:e]))
+                pos = e
+            cut = max(pos, limit)
+            out.append(buf[pos:cut])
+            yield "".join(out)
+            keep = max(0, cut - _STREAM_CONTEXT)
+            buf, start = buf[keep:], cut - keep
+        if len(buf) > start:
+            out, pos = [], start
+            for s, e, rule in self.finditer(buf, start):
+                out.append(buf[pos:s])
+                out.append(emit(rule, buf[s:e]))
+                pos = e
+            out.append(buf[pos:])
+            yield "".join(out)
+
+
+def iter_slices(text: str, size: int = _SLICE_CHARS) -> Iterator[str]:
+    """把已在内存中的长字符串按 size 字符切片产出（配合 stream()，避免整段替换生成的中间副本）。"""
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+# ═══════════════════════════════════════════
+# 3. 规则注册表
+# ═══════════════════════════════════════════
+
+_registry: dict[str, MaskRule] = {}
+_engine: MaskingEngine | None = None
+_engine_lock = threading.Lock()
+
+
+def register_rule(rule: MaskRule, *, replace: bool = False):
+    """注册规则（追加在已有规则之后，即优先级最低）；replace=True 时原位覆盖同名规则。"""
+    global _engine
+    if not re.fullmatch(r"[A-Z][A-Z_]*", rule.label):
+        raise ValueError(f"占位标签须为大写字母 / 下划线: {rule.label!r}")
+    with _engine_lock:
+        if rule.name in _registry and not replace:
+            raise ValueError(f"脱敏规则已存在: {rule.name}")
+        _registry[rule.name] = rule
+        _engine = None
+
+
+def registered_rules() -> list[MaskRule]:
+    return list(_registry.values())
+
+
+def get_engine() -> MaskingEngine:
+    """按 SRI_MASK_RULES（逗号分隔的规则名；未设置则取 enabled=True 的规则）编译的进程级引擎。"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                selected = os.environ.get("SRI_MASK_RULES", "").strip()
+                if selected:
+                    names = {n.strip() for n in selected.split(",") if n.strip()}
+                    unknown = names - _registry.keys()
+                    if unknown:
+                        raise ValueError(f"SRI_MASK_RULES 含未注册的规则: {sorted(unknown)}")
+                    rules = [r for r in _registry.values() if r.name in names]
+                else:
+                    rules = [r for r in _registry.values() if r.enabled]
+                _engine = MaskingEngine(rules)
+    return _engine
+
+
+# ── 内置规则（注册顺序即同位置匹配的优先级）──
+register_rule(MaskRule(
+    "id_card",
+    r"(?<!\d)[1-9]\d{5}(?:18|19|20)\d{2}(?:0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01])\d{3}[\dXx](?!\d)",
+    "ID_CARD", _id_card_ok, first=r"1-9",
+))
+register_rule(MaskRule(
+    "bank_card", r"(?<!\d)[3-6]\d{3}(?:[ -]?\d{4}){2}[ -]?\d{4,7}(?!\d)", "BANK_CARD", _luhn_ok, first=r"3-6",
+))
+# 原版规则 1：11 位手机号（兼容中文上下文，\b 对 CJK 字符无效）
+register_rule(MaskRule("phone", r"(?<!\d)1[3-9]\d{9}(?!\d)", "PHONE", first="1"))
+register_rule(MaskRule(
+    "email", r"(?<![A-Za-z0-9._%+-])[A-Za-z0-9._%+-]{1,64}@[A-Za-z0-9-]{1,63}(?:\.[A-Za-z0-9-]{1,63})*\.[A-Za-z]{2,24}", "EMAIL",
+    first=r"A-Za-z0-9._%+\-",
+))
+# 原版规则 2：数字+万/元（金额）
+register_rule(MaskRule("money", r"\d+(?:\.\d+)?\s*[万元]", "MONEY", first=r"\d"))
+register_rule(MaskRule(
+    "address",
+    r"[\u4e00-\u9fa5]{2,8}?(?:省|自治区|市)[\u4e00-\u9fa5]{1,10}?(?:市|区|县|州)"
+    r"[\u4e00-\u9fa5\d]{1,20}?(?:路|街|道|巷|大道)(?:\d{1,5}号)?",
+    "ADDRESS", enabled=False, first=r"\u4e00-\u9fa5",
+))
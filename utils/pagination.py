@@ -0,0 +1,173 @@
+"""
+Keyset 分页 & 稀疏字段 — utils/pagination.py
+==============================================
+routers/* 列表端点共享：
+  1. 游标分页    → ?after=<游标>&limit=，按 (排序列..., id) 做 keyset 比较，深翻页无 OFFSET 扫描；
+                   limit / after 都不传时与旧版一致返回全部行（不分页、不返回游标），
+                   只传 after 时按 DEFAULT_LIMIT 分页
+  2. 不透明游标  → base64url(JSON)，绑定排序键签名，跨端点复用直接 400
+  3. 下一页游标  → 响应头 X-Next-Cursor（最后一页不返回），响应体仍为 list，兼容旧前端
+  4. 稀疏字段    → ?fields=id,name,stage 只 SELECT 所需列，跳过完整 *Out 模型序列化
+
+用法：
+    _KEYSET = Keyset(Project.updated_at, Project.id, desc=True)
+
+    @router.get("", response_model=list[ProjectOut])
+    async def list_projects(response: Response, page: PageParams = Depends(page_params), ...):
+        q = select(Project).where(...)
+        return await apaginate(db, q, _KEYSET, page, ProjectOut, response)
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime
+
+from fastapi import HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+# ── 分页参数（可通过环境变量覆盖）──
+DEFAULT_LIMIT = int(os.environ.get("SRI_PAGE_DEFAULT_LIMIT", "50"))
+MAX_LIMIT = int(os.environ.get("SRI_PAGE_MAX_LIMIT", "200"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass
+class PageParams:
+    after: str | None
+    limit: int | None           # None = 不分页（兼容未传 limit / after 的旧客户端）
+    fields: list[str] | None
+
+
+def page_params(
+    after: str | None = Query(None, description="上一页响应头 X-Next-Cursor 返回的游标"),
+    limit: int | None = Query(None, ge=1, le=MAX_LIMIT,
+                              description=f"每页条数；不传且无 after 时返回全部（传 after 时默认 {DEFAULT_LIMIT}）"),
+    fields: str | None = Query(None, description="稀疏字段（逗号分隔），如 id,name,stage"),
+) -> PageParams:
+    """列表端点通用查询参数。"""
+    selected = None
+    if fields:
+        selected = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    if limit is None and after:
+        limit = DEFAULT_LIMIT
+    return PageParams(after=after, limit=limit, fields=selected or None)
+
+
+class Keyset:
+    """
+    一组 keyset 排序列（统一升序或降序）。
+    最后一列须唯一（通常为主键 id），保证翻页不重不漏；排序列必须为非空列
+    （NULL 参与行值比较结果为 NULL，翻页会中断或跳行，见 migrations v0007）。
+    """
+
+    def __init__(self, *columns, desc: bool = True):
+        self.columns = columns
+        self.desc = desc
+        self.keys = [c.key for c in columns]
+        signature = f"{columns[0].table.name}:{','.join(self.keys)}:{int(desc)}"
+        self._tag = hashlib.sha256(signature.encode("utf-8")).hexdigest()[:8]
+
+    def order_by(self) -> list:
+        return [c.desc() if self.desc else c.asc() for c in self.columns]
+
+    def after(self, values: list):
+        """严格位于游标之后的行。"""
+        row, bound = tuple_(*self.columns), tuple_(*values)
+        return row < bound if self.desc else row > bound
+
+    def encode(self, row) -> str:
+        values = [getattr(row, k) for k in self.keys]
+        payload = {"k": self._tag, "v": [v.isoformat() if isinstance(v, datetime) else v for v in values]}
+        raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    def decode(self, cursor: str) -> list:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            payload = json.loads(raw)
+            if payload.get("k") != self._tag or len(payload["v"]) != len(self.columns):
+                raise ValueError("cursor mismatch")
+            return [
+                self._coerce(col, v) for col, v in zip(self.columns, payload["v"])
+            ]
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError, AttributeError):
+            raise HTTPException(400, "分页游标无效或已过期，请从第一页重新加载")
+
+    @staticmethod
+    def _coerce(column, value):
+        if value is None:
+            return None
+        python_type = column.type.python_type
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+        return python_type(value)
+
+
+# ─────────────────────────────────────────
+# 内部：语句构建 / 结果组装
+# ─────────────────────────────────────────
+
+def _sparse_columns(query: Select, keyset: Keyset, fields: list[str], schema: type[BaseModel]) -> list:
+    """校验稀疏字段，返回需要 SELECT 的列（含 keyset 排序列，用于生成游标）。"""
+    entity = query.column_descriptions[0]["entity"]
+    allowed = set(schema.model_fields) & set(entity.__mapper__.column_attrs.keys())
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise HTTPException(400, f"不支持的字段: {', '.join(unknown)}；可选: {', '.join(sorted(allowed))}")
+    names = list(dict.fromkeys(fields + keyset.keys))
+    return [getattr(entity, n) for n in names]
+
+
+def _build(query: Select, keyset: Keyset, page: PageParams, schema: type[BaseModel]) -> Select:
+    if page.fields:
+        query = query.with_only_columns(*_sparse_columns(query, keyset, page.fields, schema))
+    if page.after:
+        query = query.where(keyset.after(keyset.decode(page.after)))
+    query = query.order_by(*keyset.order_by())
+    # 多取一行判断是否还有下一页
+    return query if page.limit is None else query.limit(page.limit + 1)
+
+
+def _finish(rows: list, keyset: Keyset, page: PageParams, response: Response):
+    has_more = page.limit is not None and len(rows) > page.limit
+    rows = rows[: page.limit]
+    next_cursor = keyset.encode(rows[-1]) if has_more and rows else None
+
+    if page.fields:
+        # 稀疏字段：直接输出所需列，绕过 response_model 的整对象校验与序列化
+        body = [{f: getattr(r, f) for f in page.fields} for r in rows]
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+        return JSONResponse(content=jsonable_encoder(body), headers=headers)
+
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+
+# ─────────────────────────────────────────
+# 对外：同步 / 异步两套入口
+# ─────────────────────────────────────────
+
+async def apaginate(db: AsyncSession, query: Select, keyset: Keyset, page: PageParams,
+                    schema: type[BaseModel], response: Response):
+    """异步端点分页：返回 ORM 对象列表（交给 response_model），稀疏字段时返回 JSONResponse。"""
+    result = await db.execute(_build(query, keyset, page, schema))
+    rows = result.all() if page.fields else result.scalars().all()
+    return _finish(list(rows), keyset, page, response)
+
+
+def paginate(db: Session, query: Select, keyset: Keyset, page: PageParams,
+             schema: type[BaseModel], response: Response):
+    """同步端点分页（语义同 apaginate）。"""
+    result = db.execute(_build(query, keyset, page, schema))
+    rows = result.all() if page.fields else result.scalars().all()
+    return _finish(list(rows), keyset, page, response)
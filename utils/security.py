@@ -1,15 +1,18 @@
 """
 隐私脱敏引擎 — utils/security.py
 =================================
-移植自原版 app.py:187-193，完整保留所有正则规则。
+移植自原版 app.py:187-193，完整保留所有正则规则（规则注册表与单遍扫描见 utils/masking.py）。
+BOM 防篡改哈希的逐行默克尔树见 utils/bom_merkle.py。
 原则：原文存库（内网可见），发往云端 LLM 的一律脱敏。
 """
 
 import hashlib
 import json
-import re
 from typing import Any
 
+from utils.bom_merkle import BOMMerkle, LineChange, describe_changes
+from utils.masking import TokenVault, get_engine
+
 
 # ═══════════════════════════════════════════
 # 1. 隐私脱敏函数（原版全量保留）
@@ -17,18 +20,23 @@ from typing import Any
 
 def mask_sensitive_info(text: str) -> str:
     """
-    对文本进行本地隐私脱敏：手机号 & 金额。
+    对文本进行本地隐私脱敏（utils/masking 已启用规则一次扫描）。
     ── 原版规则 100% 保留 ──
     规则 1：11 位连续数字（手机号） → [PHONE_MASK]
     规则 2：数字+万/元（金额）       → [MONEY_MASK]
+    新增：身份证 / 银行卡（均校验）/ 邮箱 → [ID_CARD_MASK] / [BANK_CARD_MASK] / [EMAIL_MASK]
     """
     if not text:
         return text
-    # 规则 1：11 位手机号（兼容中文上下文，\b 对 CJK 字符无效）
-    text = re.sub(r"(?<!\d)1[3-9]\d{9}(?!\d)", "[PHONE_MASK]", text)
-    # 规则 2：数字+万/元（金额）
-    text = re.sub(r"\d+(\.\d+)?\s*[万元]", "[MONEY_MASK]", text)
-    return text
+    return get_engine().mask(text)
+
+
+def tokenize_sensitive_info(text: str, vault: TokenVault | None = None) -> tuple[str, TokenVault]:
+    """
+    可逆脱敏：敏感值替换为编号令牌（[PHONE_1]…），返回 (脱敏文本, 令牌表)。
+    LLM 输出经 vault.restore() 还原原值 —— 只用于内网展示 / 入库，不得再发往云端。
+    """
+    return get_engine().tokenize(text, vault)
 
 
 # ═══════════════════════════════════════════
@@ -37,8 +45,9 @@ def mask_sensitive_info(text: str) -> str:
 
 def compute_bom_hash(bom_items: list[dict[str, Any]]) -> str:
     """
-    基于 BOM 明细列表计算 SHA-256 防篡改哈希。
-    用于 DealDesk / Contract 的天眼引擎比对。
+    基于 BOM 明细列表计算 SHA-256 整体防篡改哈希。
+    用于 Contract 的 BOM 快照锁定，以及未存默克尔快照的存量 DealDesk 比对
+    （DealDesk 新哈希为 BOMMerkle.root，见 utils/bom_merkle.py）。
 
     Args:
         bom_items: 结构示例 [{"model": "XGN15", "qty": 10, "price": 15000}, ...]
@@ -58,22 +67,55 @@ def compute_bom_hash(bom_items: list[dict[str, Any]]) -> str:
     return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 
-def verify_bom_integrity(current_bom: list[dict], stored_hash: str) -> tuple[bool, str]:
+def verify_bom_integrity(current_bom: list[dict], stored_hash: str,
+                         snapshot: str | None = None) -> tuple[bool, str]:
     """
     天眼引擎：验证前端提交的 BOM 是否与数据库底单一致。
 
+    Args:
+        snapshot: DealDesk.bom_merkle（默克尔叶子快照）；有快照时变更摘要逐行列出
+
     Returns:
         (is_valid, diff_summary)
         - is_valid=True :  哈希一致，未被篡改
         - is_valid=False:  哈希异动，返回变更摘要
     """
-    current_hash = compute_bom_hash(current_bom)
+    is_valid, summary, _ = diff_bom_integrity(BOMMerkle.from_items(current_bom), stored_hash, snapshot)
+    return is_valid, summary
+
+
+def diff_bom_integrity(current: BOMMerkle, stored_hash: str,
+                       snapshot: str | None) -> tuple[bool, str, list[LineChange]]:
+    """
+    verify_bom_integrity 的逐行版本，返回 (is_valid, diff_summary, 变更行)。
+    - 有快照且快照根与 stored_hash 一致 → 一趟比对得出每行 数量 / 单价 旧值 → 新值
+    - 快照与 stored_hash 不符（库被绕过接口改写）→ 快照不可信，只比根哈希，不给逐行差异
+    - 无快照（存量底单）→ 按旧版整体哈希比对
+    """
+    if snapshot:
+        if current.root == stored_hash:     # 未改动（常见路径）不必载入快照
+            return True, "", []
+        try:
+            baseline = BOMMerkle.load(snapshot)
+        except ValueError:
+            baseline = None
+        if baseline is not None and baseline.root == stored_hash:
+            changes = baseline.diff(current)
+            if not changes:
+                return True, "", []
+            return False, (
+                f"🚨 天眼侦测到该报价单已被修改！共 {len(changes)} 行变更：{describe_changes(changes)}"
+            ), changes
+        current_hash = current.root
+    else:
+        current_hash = compute_bom_hash(current.items())
+
     if current_hash == stored_hash:
-        return True, ""
+        return True, "", []
     return False, (
         "🚨 天眼侦测到该报价单已被修改！"
         f"原始哈希: {stored_hash[:12]}... → 当前哈希: {current_hash[:12]}..."
-    )
+    ), []
 
 
 # ═══════════════════════════════════════════
@@ -0,0 +1,696 @@
+"""
+本地向量检索引擎 — vector_store.py
+====================================
+为 rag_qa_module 产出真实的 retrieved_docs（替代 app.py 现场问答的占位检索）：
+  1. 切块        → 知识库（标题 / 摘要 / 本地文件正文）与拜访情报按句切块，约 400 字、80 字重叠
+  2. 本地嵌入    → 默认特征哈希嵌入（汉字单字 + 二元组 + 英文词，纯 NumPy，免下载、纯 CPU）；
+                   设置 SRI_EMBED_MODEL 且安装 sentence-transformers 时改用该模型（强制 device=cpu）
+  3. IVF 主段    → 球面 k-means 粗聚类，向量按簇连续存放于 float16 内存映射文件，查询只扫 nprobe 个簇
+  4. 增量段      → sync() 按游标追加新情报 / 新文档到 delta 段（暴力扫描），超阈值自动并入主段；
+                   只追加不回看，已入库内容被修改 / 删除后需 rebuild
+  5. 元数据过滤  → source / project_id / category 与向量同序定长存放；指定 project_id 时走精确扫描
+
+目录布局（SRI_VECTOR_DIR，默认 <项目根>/vector_index/）：
+    manifest.json          维度 / 模型 / 代数 / 条数 / 同步游标（原子替换，读者据此只读完整数据）
+    main.<gen>.f16 / .meta 主段向量与元数据（按簇排序）    centroids.<gen>.npy / offsets.<gen>.npy
+    delta.<gen>.f16 / .meta 增量段（追加写）               chunks.db  chunk_id → 原文 / 文件名 / 来源
+
+用法：
+    from vector_store import get_vector_store
+    docs = get_vector_store().search("温升试验", k=5, source="kb")
+
+CLI:
+    python vector_store.py rebuild | sync | stats | search <query>
+"""
+
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows：仅进程内加锁
+    fcntl = None
+
+_PROJECT_ROOT = Path(__file__).resolve().parent
+
+# ── 参数（可通过环境变量覆盖）──
+_VECTOR_DIR = os.environ.get("SRI_VECTOR_DIR", str(_PROJECT_ROOT / "vector_index"))
+_EMBED_MODEL = os.environ.get("SRI_EMBED_MODEL", "")              # 空 = 特征哈希嵌入
+_HASH_DIM = int(os.environ.get("SRI_EMBED_HASH_DIM", "384"))
+_CHUNK_CHARS = int(os.environ.get("SRI_CHUNK_CHARS", "400"))
+_CHUNK_OVERLAP = int(os.environ.get("SRI_CHUNK_OVERLAP", "80"))
+_NPROBE = int(os.environ.get("SRI_VECTOR_NPROBE", "32"))
+_DELTA_MAX = int(os.environ.get("SRI_VECTOR_DELTA_MAX", "20000"))  # 增量段超过即并入主段
+_FLAT_MAX = 2000                                                   # 主段不足此数不聚类
+_NLIST_MAX = 4096
+_BATCH = 32768
+
+SOURCES = {"kb": 1, "intel": 2}
+
+META_DTYPE = np.dtype([
+    ("chunk_id", "<i8"), ("project_id", "<i4"), ("category", "<i2"), ("source", "i1"),
+])
+
+
+# ═══════════════════════════════════════════════════════════════
+# 切块
+# ═══════════════════════════════════════════════════════════════
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;\n])")
+
+
+def chunk_text(text: str, size: int = _CHUNK_CHARS, overlap: int = _CHUNK_OVERLAP) -> list[str]:
+    """按句累积到约 size 字切块，相邻块保留 overlap 字重叠；超长句硬切。"""
+    text = (text or "").strip()
+    if not text:
+        return []
+    pieces = []
+    for sentence in _SENTENCE_END.split(text):
+        while len(sentence) > size:
+            pieces.append(sentence[:size])
+            sentence = sentence[size - overlap:]
+        if sentence:
+            pieces.append(sentence)
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) > size:
+            chunks.append(current.strip())
+            current = current[-overlap:] if overlap else ""
+        current += piece
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+
+# ═══════════════════════════════════════════════════════════════
+# 嵌入模型
+# ═══════════════════════════════════════════════════════════════
+
+_TOKEN_RE = re.compile("[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9a-z]+")
+
+
+class HashingEmbedder:
+    """
+    特征哈希嵌入：汉字单字 (0.5) + 二元组 (1.0) + 英文数字词 (1.0)，crc32 散列到 dim 维并带符号，L2 归一化。
+    纯词面相似度，无语义泛化；换用 SRI_EMBED_MODEL 后需 rebuild。
+    """
+
+    def __init__(self, dim: int = _HASH_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> tuple[list[int], list[float]]:
+        idx, weights = [], []
+        for run in _TOKEN_RE.findall(text.lower()):
+            if run[0].isascii():
+                feats = [(run, 1.0)]
+            else:
+                feats = [(ch, 0.5) for ch in run] + [(run[i:i + 2], 1.0) for i in range(len(run) - 1)]
+            for token, w in feats:
+                h = zlib.crc32(token.encode("utf-8"))
+                idx.append(h % self.dim)
+                weights.append(w if h & 0x80000000 else -w)
+        return idx, weights
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            idx, weights = self._features(text or "")
+            if idx:
+                out[row] = np.bincount(idx, weights=weights, minlength=self.dim)
+        return _normalize(out)
+
+
+class SentenceTransformerEmbedder:
+    """sentence-transformers 本地模型（如 BAAI/bge-small-zh-v1.5），强制 CPU 推理。"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self._model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vecs = self._model.encode(texts, batch_size=32, normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vecs, dtype=np.float32)
+
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (mat / norms).astype(np.float32, copy=False)
+
+
+def make_embedder():
+    if _EMBED_MODEL:
+        try:
+            return SentenceTransformerEmbedder(_EMBED_MODEL)
+        except ImportError:
+            print(f"⚠️ 未安装 sentence-transformers，{_EMBED_MODEL} 不可用，降级为特征哈希嵌入")
+    return HashingEmbedder()
+
+
+# ═══════════════════════════════════════════════════════════════
+# 数据源（旧版 sri_intel.db）
+# ═══════════════════════════════════════════════════════════════
+
+@dataclass
+class Chunk:
+    source: str
+    ref_id: int
+    project_id: int
+    category: str
+    filename: str
+    source_type: str
+    text: str
+
+
+def _read_file_text(path: str) -> str:
+    """知识库本地文件正文（pdf / docx / txt），不存在或解析失败返回空串。"""
+    p = Path(path)
+    if not p.is_absolute():
+        p = _PROJECT_ROOT / p
+    if not path or not p.is_file():
+        return ""
+    suffix = p.suffix.lower()
+    try:
+        if suffix == ".pdf":
+            import PyPDF2
+            return "\n".join(page.extract_text() or "" for page in PyPDF2.PdfReader(str(p)).pages)
+        if suffix == ".docx":
+            from docx import Document
+            return "\n".join(para.text for para in Document(str(p)).paragraphs if para.text.strip())
+        if suffix in (".txt", ".md"):
+            raw = p.read_bytes()
+            for encoding in ("utf-8", "gbk"):
+                try:
+                    return raw.decode(encoding)
+                except UnicodeDecodeError:
+                    continue
+    except Exception as e:
+        print(f"⚠️ 知识库文件解析失败 {path}: {e}")
+    return ""
+
+
+def _intel_text(raw_input: str | None, parsed: str | None) -> str:
+    """拜访情报：原始口述 + AI 解析结果中的文本值（不含 JSON 键名）。"""
+    values = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            for v in node.values():
+                walk(v)
+        elif isinstance(node, list):
+            for v in node:
+                walk(v)
+        elif node not in (None, ""):
+            values.append(str(node))
+
+    try:
+        walk(json.loads(parsed or ""))
+    except (TypeError, ValueError):
+        values.append(parsed or "")
+    return "\n".join(filter(None, [raw_input or "", " ".join(values)]))
+
+
+def iter_source_chunks(cursors: dict[str, int]):
+    """游标之后的新知识库文档与拜访情报切块，产出 (Chunk, 新游标)。"""
+    from db_pool import get_pool
+
+    with get_pool().read() as conn:
+        kb_rows = conn.execute(
+            "SELECT doc_id, title, category, description, file_path FROM knowledge_base "
+            "WHERE doc_id > ? ORDER BY doc_id", (cursors.get("kb", 0),),
+        ).fetchall()
+        log_rows = conn.execute(
+            "SELECT log_id, project_id, raw_input, ai_parsed_data FROM visit_logs "
+            "WHERE log_id > ? ORDER BY log_id", (cursors.get("intel", 0),),
+        ).fetchall()
+
+    for doc_id, title, category, description, file_path in kb_rows:
+        body = "\n".join(filter(None, [title, description, _read_file_text(file_path or "")]))
+        filename = Path(file_path).name if file_path else title
+        for text in chunk_text(body):
+            yield Chunk("kb", doc_id, 0, category or "", filename, "document", text), ("kb", doc_id)
+    for log_id, project_id, raw_input, parsed in log_rows:
+        for text in chunk_text(_intel_text(raw_input, parsed)):
+            yield Chunk("intel", log_id, project_id or 0, "拜访情报", f"拜访情报 #{log_id}",
+                        "intel", text), ("intel", log_id)
+
+
+# ═══════════════════════════════════════════════════════════════
+# 索引构建：球面 k-means + 按簇重排
+# ═══════════════════════════════════════════════════════════════
+
+def _kmeans(sample: np.ndarray, nlist: int, iters: int = 8, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(sample, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        nonempty = counts > 0
+        sums = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+        centroids[nonempty] = sums
+        # 空簇随机重置，避免 nlist 有效值塌缩
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids = _normalize(centroids)
+    return centroids
+
+
+def _assign(vecs: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    out = np.empty(len(vecs), dtype=np.int32)
+    for i in range(0, len(vecs), _BATCH):
+        block = np.asarray(vecs[i:i + _BATCH], dtype=np.float32)
+        out[i:i + _BATCH] = (block @ centroids.T).argmax(axis=1)
+    return out
+
+
+def _nlist_for(n: int) -> int:
+    if n < _FLAT_MAX:
+        return 1
+    return min(_NLIST_MAX, int(2 * math.sqrt(n)))
+
+
+# ═══════════════════════════════════════════════════════════════
+# VectorStore
+# ═══════════════════════════════════════════════════════════════
+
+class VectorStore:
+    """
+    IVF 主段 + 暴力扫描增量段。
+    ─────────────────────────────
+    - 写（sync / rebuild / add_chunks）：进程内锁 + 目录文件锁串行化，写完原子替换 manifest
+    - 读（search）：manifest 变化时重新映射文件；只读取 manifest 记录的条数，不会读到半写数据
+    """
+
+    def __init__(self, root: str = _VECTOR_DIR, embedder=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.embedder = embedder or make_embedder()
+        self._lock = threading.Lock()
+        self._loaded_key = None
+        self._main = self._delta = None
+
+    # ─────────────────────────────────────
+    # manifest / 文件
+    # ─────────────────────────────────────
+
+    @property
+    def _manifest_path(self) -> Path:
+        return self.root / "manifest.json"
+
+    def _read_manifest(self) -> dict:
+        try:
+            return json.loads(self._manifest_path.read_text("utf-8"))
+        except FileNotFoundError:
+            return {
+                "model": self.embedder.name, "dim": self.embedder.dim,
+                "generation": 0, "main_count": 0, "nlist": 0,
+                "delta_generation": 0, "delta_count": 0,
+                "categories": [""], "cursors": {},
+            }
+
+    def _write_manifest(self, manifest: dict):
+        tmp = self._manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False), "utf-8")
+        os.replace(tmp, self._manifest_path)
+
+    def _path(self, kind: str, gen: int, ext: str) -> Path:
+        return self.root / f"{kind}.{gen}.{ext}"
+
+    def _writer(self):
+        store = self
+
+        class _Guard:
+            def __enter__(self):
+                store._lock.acquire()
+                self.fh = open(store.root / ".lock", "w")
+                if fcntl is not None:
+                    fcntl.flock(self.fh, fcntl.LOCK_EX)
+                return self
+
+            def __exit__(self, *exc):
+                if fcntl is not None:
+                    fcntl.flock(self.fh, fcntl.LOCK_UN)
+                self.fh.close()
+                store._lock.release()
+
+        return _Guard()
+
+    def _chunks_db(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.root / "chunks.db", timeout=30)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "chunk_id INTEGER PRIMARY KEY, source TEXT, ref_id INTEGER, project_id INTEGER, "
+            "category TEXT, filename TEXT, source_type TEXT, text TEXT)"
+        )
+        return conn
+
+    def _segment(self, m: dict, kind: str):
+        """按 manifest 映射主段 / 增量段：(向量 memmap, 元数据 memmap)，空段返回 None。"""
+        gen = m["generation"] if kind == "main" else m["delta_generation"]
+        count = m["main_count"] if kind == "main" else m["delta_count"]
+        if count == 0:
+            return None
+        dim = m["dim"]
+        vecs = np.memmap(self._path(kind, gen, "f16"), dtype=np.float16, mode="r", shape=(count, dim))
+        meta = np.memmap(self._path(kind, gen, "meta"), dtype=META_DTYPE, mode="r", shape=(count,))
+        return vecs, meta
+
+    def _load(self):
+        """manifest 变化时重新映射主段 / 增量段。"""
+        try:
+            st = self._manifest_path.stat()
+            key = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            key = None
+        if key == self._loaded_key:
+            return
+        self._manifest = m = self._read_manifest()
+        self._main = self._segment(m, "main")
+        if self._main is not None:
+            self._centroids = np.load(self._path("centroids", m["generation"], "npy"))
+            self._offsets = np.load(self._path("offsets", m["generation"], "npy"))
+        self._delta = self._segment(m, "delta")
+        self._loaded_key = key
+
+    # ─────────────────────────────────────
+    # 写入
+    # ─────────────────────────────────────
+
+    def _encode_categories(self, manifest: dict, names: list[str]) -> np.ndarray:
+        table = manifest["categories"]
+        codes = []
+        for name in names:
+            if name not in table:
+                table.append(name)
+            codes.append(table.index(name))
+        return np.asarray(codes, dtype=np.int16)
+
+    def add_chunks(self, chunks: list[Chunk], cursors: dict[str, int] | None = None,
+                   compact: bool = True) -> int:
+        """
+        嵌入并追加到增量段；cursors 随同一次 manifest 替换推进（崩溃时不会跳过数据）。
+        持锁后按 manifest 中的最新游标丢弃已入库的块：并发 sync() 读到同一旧游标时不会重复追加，
+        游标只前进不后退。返回实际新增块数。
+        """
+        with self._writer():
+            m = self._read_manifest()
+            self._check_model(m)
+            done = m["cursors"]
+            chunks = [c for c in chunks if c.ref_id > done.get(c.source, 0)]
+            if chunks:
+                with self._chunks_db() as db:
+                    start = db.execute("SELECT COALESCE(MAX(chunk_id), 0) FROM chunks").fetchone()[0] + 1
+                    ids = np.arange(start, start + len(chunks), dtype=np.int64)
+                    db.executemany(
+                        "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(int(i), c.source, c.ref_id, c.project_id, c.category, c.filename,
+                          c.source_type, c.text) for i, c in zip(ids, chunks)],
+                    )
+                vecs = self.embedder.embed([c.text for c in chunks]).astype(np.float16)
+                meta = np.empty(len(chunks), dtype=META_DTYPE)
+                meta["chunk_id"] = ids
+                meta["project_id"] = [c.project_id for c in chunks]
+                meta["category"] = self._encode_categories(m, [c.category for c in chunks])
+                meta["source"] = [SOURCES[c.source] for c in chunks]
+                # 按 manifest 记录的条数截断：上次写入若中途失败，尾部残留字节在此丢弃
+                gen, count = m["delta_generation"], m["delta_count"]
+                for ext, arr, width in (("f16", vecs, vecs.shape[1] * 2), ("meta", meta, META_DTYPE.itemsize)):
+                    path = self._path("delta", gen, ext)
+                    with open(path, "ab") as f:
+                        f.truncate(count * width)
+                        f.write(arr.tobytes())
+                m["delta_count"] = count + len(chunks)
+            for source, ref_id in (cursors or {}).items():
+                done[source] = max(ref_id, done.get(source, 0))
+            self._write_manifest(m)
+            if compact and m["delta_count"] > _DELTA_MAX:
+                self._compact(m)
+        return len(chunks)
+
+    def _check_model(self, m: dict):
+        if m["main_count"] + m["delta_count"] and m["model"] != self.embedder.name:
+            raise RuntimeError(
+                f"向量索引由 {m['model']} 构建，当前嵌入模型为 {self.embedder.name}，"
+                "请先执行 python vector_store.py rebuild"
+            )
+        m["model"], m["dim"] = self.embedder.name, self.embedder.dim
+
+    def sync(self, batch_size: int = 256, compact: bool = True) -> int:
+        """
+        把游标之后的新知识库文档 / 拜访情报增量写入索引，返回新增块数。
+        只按游标追加：已入库的文档 / 情报被修改或删除后，旧块仍可检索，需执行 rebuild()。
+        """
+        total, batch, cursors, last = 0, [], {}, None
+        for chunk, (source, ref_id) in iter_source_chunks(self._read_manifest()["cursors"]):
+            # 只在行边界分批：同一文档 / 情报的块必须与推进到它的游标一起写入
+            if len(batch) >= batch_size and (source, ref_id) != last:
+                total += self.add_chunks(batch, dict(cursors), compact)
+                batch = []
+            batch.append(chunk)
+            cursors[source] = ref_id
+            last = (source, ref_id)
+        if batch or cursors:
+            total += self.add_chunks(batch, cursors, compact)
+        return total
+
+    def rebuild(self) -> int:
+        """清空后全量重建（更换嵌入模型 / 知识库文档被修改后执行）。"""
+        with self._writer():
+            for path in self.root.iterdir():
+                if path.name != ".lock":
+                    path.unlink()
+            self._loaded_key = None
+        total = self.sync(compact=False)      # 全部写入增量段后一次性聚类
+        with self._writer():
+            self._compact(self._read_manifest())
+        return total
+
+    def _compact(self, m: dict):
+        """主段 + 增量段合并后重新聚类，写入新一代文件（调用方持有写锁）。"""
+        parts = [seg for seg in (self._segment(m, "main"), self._segment(m, "delta")) if seg is not None]
+        if not parts:
+            return
+        vecs = np.concatenate([np.asarray(v) for v, _ in parts]) if len(parts) > 1 else parts[0][0]
+        meta = np.concatenate([np.asarray(x) for _, x in parts]) if len(parts) > 1 else parts[0][1]
+        new = dict(m, generation=m["generation"] + 1, delta_generation=m["delta_generation"] + 1,
+                   delta_count=0)
+        new.update(self._write_main(vecs, meta, new["generation"]))
+        self._write_manifest(new)
+        for kind, gen in (("main", m["generation"]), ("delta", m["delta_generation"]),
+                          ("centroids", m["generation"]), ("offsets", m["generation"])):
+            for ext in ("f16", "meta", "npy"):
+                self._path(kind, gen, ext).unlink(missing_ok=True)
+
+    def _write_main(self, vecs, meta, gen: int) -> dict:
+        """聚类、按簇排序并写出主段文件；返回需写入 manifest 的字段。"""
+        n, dim = vecs.shape
+        nlist = _nlist_for(n)
+        rng = np.random.default_rng(gen)
+        if nlist > 1:
+            sample_idx = np.sort(rng.choice(n, min(n, nlist * 32), replace=False))
+            centroids = _kmeans(np.asarray(vecs[sample_idx], dtype=np.float32), nlist, seed=gen)
+            assign = _assign(vecs, centroids)
+        else:
+            centroids = _normalize(np.asarray(vecs, dtype=np.float32).mean(axis=0, keepdims=True))
+            assign = np.zeros(n, dtype=np.int32)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=nlist)))).astype(np.int64)
+
+        out_vecs = np.memmap(self._path("main", gen, "f16"), dtype=np.float16, mode="w+", shape=(n, dim))
+        out_meta = np.memmap(self._path("main", gen, "meta"), dtype=META_DTYPE, mode="w+", shape=(n,))
+        for i in range(0, n, _BATCH):
+            rows = np.sort(order[i:i + _BATCH])          # 有序访问源文件，回填到对应位置
+            pos = np.argsort(np.argsort(order[i:i + _BATCH]))
+            out_vecs[i:i + len(rows)] = np.asarray(vecs[rows])[pos]
+            out_meta[i:i + len(rows)] = np.asarray(meta[rows])[pos]
+        out_vecs.flush()
+        out_meta.flush()
+        del out_vecs, out_meta
+        np.save(self._path("centroids", gen, "npy"), centroids.astype(np.float32))
+        np.save(self._path("offsets", gen, "npy"), offsets)
+        return {"main_count": n, "nlist": nlist}
+
+    def build_from_arrays(self, vecs: np.ndarray, meta: np.ndarray):
+        """直接以 (向量, META_DTYPE 元数据) 构建主段（压测 / 外部批量导入用，不写 chunks.db）。"""
+        if vecs.dtype != np.float16:
+            vecs = _normalize(np.asarray(vecs, dtype=np.float32))
+        with self._writer():
+            m = self._read_manifest()
+            new = dict(m, model=self.embedder.name, dim=vecs.shape[1], generation=m["generation"] + 1)
+            new.update(self._write_main(vecs, meta, new["generation"]))
+            self._write_manifest(new)
+
+    # ─────────────────────────────────────
+    # 检索
+    # ─────────────────────────────────────
+
+    def _scan(self, seg, q: np.ndarray, rows, mask_fn) -> tuple[np.ndarray, np.ndarray]:
+        """对段内 rows（切片或行号数组）打分，mask_fn 过滤元数据。"""
+        vecs, meta = seg
+        block, block_meta = vecs[rows], np.asarray(meta[rows])
+        keep = mask_fn(block_meta)
+        if keep is not None:
+            block, block_meta = np.asarray(block)[keep], block_meta[keep]
+        scores = np.asarray(block, dtype=np.float32) @ q
+        return scores, block_meta["chunk_id"]
+
+    def search_vector(self, q: np.ndarray, k: int = 5, source: str | None = None,
+                      project_id: int | None = None, category: str | None = None,
+                      nprobe: int = _NPROBE) -> list[tuple[int, float]]:
+        """向量 top-k：返回 [(chunk_id, 余弦相似度)]，按相似度降序。"""
+        self._load()
+        m = self._manifest
+        q = np.asarray(q, dtype=np.float32)
+        conds = []
+        if source:
+            conds.append(("source", SOURCES[source]))
+        if project_id is not None:
+            conds.append(("project_id", project_id))
+        if category:
+            if category not in m["categories"]:
+                return []
+            conds.append(("category", m["categories"].index(category)))
+
+        def mask_fn(meta):
+            if not conds:
+                return None
+            keep = np.ones(len(meta), dtype=bool)
+            for field, value in conds:
+                keep &= meta[field] == value
+            return keep
+
+        results = []
+        if self._delta is not None:
+            results.append(self._scan(self._delta, q, slice(None), mask_fn))
+        if self._main is not None:
+            if project_id is not None:
+                # 单项目数据量小：先按元数据定位行，再精确打分
+                rows = np.flatnonzero(self._main[1]["project_id"] == project_id)
+                results.append(self._scan(self._main, q, rows, mask_fn))
+            else:
+                nlist = len(self._offsets) - 1
+                probe = min(nprobe, nlist)
+                cscores = self._centroids @ q
+                ranked = np.argsort(-cscores)
+                found = scanned = start = 0
+                target = probe
+                while True:
+                    for c in ranked[start:probe]:
+                        lo, hi = self._offsets[c], self._offsets[c + 1]
+                        if hi > lo:
+                            scores, ids = self._scan(self._main, q, slice(lo, hi), mask_fn)
+                            results.append((scores, ids))
+                            found += len(ids)
+                            scanned += hi - lo
+                    if conds and start == 0 and scanned:
+                        # 有过滤时按实测选择度放大探测簇数，使命中候选量接近无过滤时（封顶 8 倍）
+                        target = min(nlist, nprobe * 8, math.ceil(probe * scanned / max(found, 1)))
+                    # 候选不足 k 条（过滤太严）时继续扩大
+                    if (found >= k and probe >= target) or probe >= nlist:
+                        break
+                    start, probe = probe, min(nlist, max(target, probe * 4) if found < k else target)
+
+        if not results:
+            return []
+        scores = np.concatenate([s for s, _ in results])
+        ids = np.concatenate([i for _, i in results])
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def search(self, query: str, k: int = 5, source: str | None = None,
+               project_id: int | None = None, category: str | None = None) -> list[dict]:
+        """
+        文本 top-k 检索，返回 rag_qa_module.build_context_str 所需的 retrieved_docs：
+        [{content, filename, similarity, metadata{source, source_type, asset_type, project_id, ref_id, chunk_id}}]
+        """
+        q = self.embedder.embed([query])[0]
+        hits = self.search_vector(q, k, source=source, project_id=project_id, category=category)
+        if not hits:
+            return []
+        ids = [cid for cid, _ in hits]
+        with self._chunks_db() as db:
+            rows = {r[0]: r for r in db.execute(
+                "SELECT chunk_id, source, ref_id, project_id, category, filename, source_type, text "
+                f"FROM chunks WHERE chunk_id IN ({', '.join('?' * len(ids))})", ids,
+            )}
+        docs = []
+        for cid, score in hits:
+            if cid not in rows:
+                continue
+            _, src, ref_id, pid, cat, filename, source_type, text = rows[cid]
+            docs.append({
+                "content": text,
+                "filename": filename,
+                "similarity": round(score, 4),
+                "metadata": {
+                    "source": src, "source_type": source_type, "asset_type": cat,
+                    "project_id": pid or None, "ref_id": ref_id, "chunk_id": cid,
+                },
+            })
+        return docs
+
+    def stats(self) -> dict:
+        self._load()
+        m = self._manifest
+        return {
+            "model": m["model"], "dim": m["dim"], "main": m["main_count"], "delta": m["delta_count"],
+            "nlist": m["nlist"], "nprobe": _NPROBE, "cursors": m["cursors"], "path": str(self.root),
+        }
+
+
+# ── 进程级单例 ──
+_store: VectorStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    """获取默认目录的向量库单例。"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = VectorStore()
+    return _store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SRI 本地向量检索引擎")
+    parser.add_argument("command", choices=["rebuild", "sync", "stats", "search"])
+    parser.add_argument("query", nargs="?", default="")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    store = get_vector_store()
+    if args.command == "rebuild":
+        print(f"✅ 全量重建完成：{store.rebuild()} 块")
+    elif args.command == "sync":
+        print(f"✅ 增量同步完成：新增 {store.sync()} 块")
+    elif args.command == "stats":
+        print(json.dumps(store.stats(), ensure_ascii=False, indent=2))
+    else:
+        store.sync()
+        for doc in store.search(args.query, k=args.k):
+            print(f"[{doc['similarity']:.3f}] {doc['filename']}: {doc['content'][:80]}")